@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.similarity import DEFAULT_TOP_K, METRICS, rebuild_similarity_index
+
+
+class Command(BaseCommand):
+    help = 'Tính lại chỉ mục người dùng tương đồng từ bài hát yêu thích và lịch sử nghe'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K, help='Số người dùng tương đồng lưu cho mỗi người')
+        parser.add_argument('--metric', choices=METRICS, default='cosine', help='Độ đo tương đồng')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Số người dùng tính mỗi lô')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = rebuild_similarity_index(
+            k=options['top_k'], metric=options['metric'], batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Đã ghi {written} cặp người dùng tương đồng trong {time.perf_counter() - started:.2f}s'
+        ))
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.1 on 2026-10-17 04:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_passwordresettoken_attempted_uses_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(default=0.0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('similar_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_users', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'user_similarities',
+                'indexes': [models.Index(fields=['user', '-score'], name='user_similarity_score_idx')],
+                'unique_together': {('user', 'similar_user')},
+            },
+        ),
+    ]
@@ -153,3 +153,23 @@ class UserConnection(models.Model):
     def are_connected(cls, user1, user2):
         """Kiểm tra xem hai người dùng đã kết nối chưa"""
         return True
+
+class UserSimilarity(models.Model):
+    """
+    Top-K người dùng có gu âm nhạc giống nhất với một người dùng, tính sẵn từ
+    bài hát yêu thích và lịch sử nghe - xem accounts/similarity.py
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='similar_users', on_delete=models.CASCADE)
+    similar_user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='+', on_delete=models.CASCADE)
+    score = models.FloatField(default=0.0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'user_similarities'
+        unique_together = ('user', 'similar_user')
+        indexes = [
+            models.Index(fields=['user', '-score'], name='user_similarity_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} ~ {self.similar_user_id}: {self.score:.3f}"
@@ -0,0 +1,31 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+
+from .models import User
+
+
+@receiver(m2m_changed, sender=User.favorite_songs.through)
+def refresh_similar_users(sender, instance, action, reverse, pk_set, **kwargs):
+    """Cập nhật chỉ mục người dùng tương đồng khi danh sách bài hát yêu thích thay đổi"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        user_ids = {instance.pk}
+    elif pk_set:
+        # song.favorited_by.add(...): pk_set là id người dùng
+        user_ids = set(pk_set)
+    else:
+        return
+
+    def refresh():
+        from .similarity import get_similarity_settings, refresh_in_background, refresh_user_similarity
+        # Mặc định chạy trong luồng nền, không giữ request thích / bỏ thích
+        if get_similarity_settings()['REFRESH_IN_BACKGROUND']:
+            refresh_in_background(user_ids)
+            return
+        for user_id in user_ids:
+            refresh_user_similarity(user_id)
+
+    transaction.on_commit(refresh)
@@ -0,0 +1,263 @@
+"""
+Chỉ mục người dùng tương đồng dùng cho API gợi ý người dùng.
+
+Mỗi người dùng được biểu diễn bằng một vector thưa trên tập bài hát: bài hát
+yêu thích có trọng số ``FAVORITE_WEIGHT``, bài hát đã nghe có trọng số
+log(1 + số lượt nghe). Độ tương đồng giữa hai người dùng là cosine của hai
+vector (hoặc Jaccard trên tập bài hát), top-K kết quả của mỗi người dùng được
+lưu trong bảng ``user_similarities`` nên API chỉ cần đọc một lần theo index.
+
+- ``rebuild_similarity_index``: tính lại toàn bộ theo lô bằng phép nhân ma
+  trận thưa (lệnh ``build_user_similarity``)
+- ``refresh_user_similarity``: cập nhật riêng một người dùng khi danh sách
+  yêu thích thay đổi (qua signal m2m_changed), chỉ so sánh với tối đa
+  ``MAX_CANDIDATES`` người có nhiều bài hát chung nhất
+- ``refresh_in_background``: signal chỉ đánh dấu người dùng cần cập nhật, một
+  luồng nền duy nhất xử lý lần lượt nên request thích / bỏ thích không phải chờ
+
+Cấu hình (settings.USER_SIMILARITY):
+    REFRESH_IN_BACKGROUND = True   # False: cập nhật ngay khi commit (test)
+    MAX_CANDIDATES        = 1000
+"""
+import heapq
+import logging
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Min, Q
+from scipy import sparse
+
+from music.models import SongPlayHistory
+from music.recommender import build_matrix
+
+from .models import User, UserSimilarity
+
+logger = logging.getLogger(__name__)
+
+FAVORITE_WEIGHT = 3.0
+DEFAULT_TOP_K = 20
+METRICS = ('cosine', 'jaccard')
+
+DEFAULT_SIMILARITY = {
+    'REFRESH_IN_BACKGROUND': True,
+    'MAX_CANDIDATES': 1000,
+}
+
+# Người dùng chờ cập nhật và luồng nền đang xử lý (nếu có)
+_pending = set()
+_pending_lock = threading.Lock()
+_worker = None
+
+
+def get_similarity_settings():
+    return {**DEFAULT_SIMILARITY, **getattr(settings, 'USER_SIMILARITY', {})}
+
+
+def load_user_vectors(user_ids=None):
+    """Dựng InteractionMatrix người dùng × bài hát (giới hạn trong ``user_ids`` nếu có)"""
+    favorites = User.favorite_songs.through.objects.all()
+    plays = SongPlayHistory.objects.all()
+    if user_ids is not None:
+        favorites = favorites.filter(user_id__in=user_ids)
+        plays = plays.filter(user_id__in=user_ids)
+
+    users, songs, weights = [], [], []
+    for user_id, song_id in favorites.values_list('user_id', 'song_id').iterator(chunk_size=10000):
+        users.append(user_id)
+        songs.append(song_id)
+        weights.append(FAVORITE_WEIGHT)
+
+    grouped_plays = plays.values('user_id', 'song_id').annotate(plays=Count('id')).order_by()
+    for row in grouped_plays.values_list('user_id', 'song_id', 'plays').iterator(chunk_size=10000):
+        users.append(row[0])
+        songs.append(row[1])
+        weights.append(np.log1p(row[2]))
+
+    return build_matrix(users, songs, weights)
+
+
+def _similarity_rows(matrix, rows, metric):
+    """Ma trận thưa độ tương đồng giữa các dòng ``rows`` và mọi dòng của ``matrix``"""
+    if metric == 'jaccard':
+        binary = matrix.copy()
+        binary.data[:] = 1
+        sizes = np.asarray(binary.sum(axis=1)).ravel()
+        product = (binary[rows] @ binary.T).tocsr()
+        row_index = np.repeat(np.asarray(rows), np.diff(product.indptr))
+        union = sizes[row_index] + sizes[product.indices] - product.data
+        product.data = (product.data / union).astype(np.float32)
+        return product
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    normalized = sparse.diags(1.0 / norms).astype(np.float32) @ matrix
+    return (normalized[rows] @ normalized.T).tocsr()
+
+
+def top_similar(matrix, rows, k=DEFAULT_TOP_K, metric='cosine'):
+    """
+    Trả về {dòng: [(dòng tương đồng, điểm), ...]} giảm dần theo điểm, không gồm
+    chính người dùng đó và các cặp không có bài hát chung.
+    """
+    if metric not in METRICS:
+        raise ValueError(f'Độ đo không hợp lệ: {metric}')
+
+    product = _similarity_rows(matrix, rows, metric)
+    result = {}
+    for offset, row in enumerate(rows):
+        start, end = product.indptr[offset], product.indptr[offset + 1]
+        columns, scores = product.indices[start:end], product.data[start:end]
+        mask = (columns != row) & (scores > 0)
+        columns, scores = columns[mask], scores[mask]
+        if len(scores) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+            columns, scores = columns[best], scores[best]
+        order = np.lexsort((columns, -scores))
+        result[row] = [(int(columns[i]), float(scores[i])) for i in order]
+    return result
+
+
+def rebuild_similarity_index(k=DEFAULT_TOP_K, metric='cosine', batch_size=1000):
+    """Tính lại toàn bộ chỉ mục, trả về số dòng đã ghi"""
+    vectors = load_user_vectors()
+    n_users = vectors.matrix.shape[0]
+    written = 0
+
+    with transaction.atomic():
+        # Người dùng không còn bài hát yêu thích / lượt nghe nào thì không còn gợi ý
+        UserSimilarity.objects.exclude(user_id__in=vectors.user_ids.tolist()).delete()
+
+    for start in range(0, n_users, batch_size):
+        rows = list(range(start, min(start + batch_size, n_users)))
+        similar = top_similar(vectors.matrix, rows, k=k, metric=metric)
+        objects = [
+            UserSimilarity(
+                user_id=int(vectors.user_ids[row]),
+                similar_user_id=int(vectors.user_ids[other]),
+                score=score,
+            )
+            for row, pairs in similar.items()
+            for other, score in pairs
+        ]
+        with transaction.atomic():
+            UserSimilarity.objects.filter(user_id__in=vectors.user_ids[rows].tolist()).delete()
+            UserSimilarity.objects.bulk_create(objects, batch_size=1000)
+        written += len(objects)
+
+    return written
+
+
+def _candidate_user_ids(user_id, limit=None):
+    """
+    Những người dùng có ít nhất một bài hát yêu thích / đã nghe chung với
+    ``user_id``, tối đa ``limit`` người có nhiều bài hát chung nhất
+    """
+    if limit is None:
+        limit = get_similarity_settings()['MAX_CANDIDATES']
+    Favorite = User.favorite_songs.through
+    shared_songs = (
+        Q(song_id__in=Favorite.objects.filter(user_id=user_id).values('song_id'))
+        | Q(song_id__in=SongPlayHistory.objects.filter(user_id=user_id).values('song_id'))
+    )
+
+    # Mỗi nguồn chỉ lấy ``limit`` người đứng đầu trong cơ sở dữ liệu, rồi gộp lại
+    shared = {}
+    for rows in (Favorite.objects.filter(shared_songs), SongPlayHistory.objects.filter(shared_songs)):
+        top = rows.exclude(user_id=user_id).values('user_id').annotate(
+            shared=Count('song_id', distinct=True)
+        ).order_by('-shared', 'user_id').values_list('user_id', 'shared')[:limit]
+        for other, count in top:
+            shared[other] = shared.get(other, 0) + count
+    return set(heapq.nlargest(limit, shared, key=lambda other: (shared[other], -other)))
+
+
+def refresh_user_similarity(user_id, k=DEFAULT_TOP_K, metric='cosine'):
+    """
+    Cập nhật chỉ mục cho một người dùng: tính lại top-K của người đó và cập nhật
+    điểm của người đó trong danh sách của những người dùng liên quan.
+    """
+    # Những người đang có ``user_id`` trong top-K cũng được tính điểm, kể cả khi nằm
+    # ngoài tập ứng viên bị giới hạn, để không xóa mất dòng của họ mà không thêm lại
+    related = _candidate_user_ids(user_id) | set(
+        UserSimilarity.objects.filter(similar_user_id=user_id).values_list('user_id', flat=True)
+    )
+    vectors = load_user_vectors(related | {user_id})
+    positions = {int(pk): row for row, pk in enumerate(vectors.user_ids)}
+
+    scores = {}
+    if user_id in positions:
+        row = positions[user_id]
+        scores = {
+            int(vectors.user_ids[other]): score
+            for other, score in top_similar(vectors.matrix, [row], k=len(positions), metric=metric)[row]
+        }
+    top = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+    with transaction.atomic():
+        UserSimilarity.objects.filter(user_id=user_id).delete()
+        UserSimilarity.objects.bulk_create([
+            UserSimilarity(user_id=user_id, similar_user_id=other, score=score) for other, score in top
+        ])
+
+        # Chiều ngược lại: người dùng này có thể vào / ra / đổi vị trí trong top-K của người khác
+        UserSimilarity.objects.filter(user_id__in=related, similar_user_id=user_id).delete()
+
+        current = {
+            row['user_id']: (row['total'], row['lowest'])
+            for row in UserSimilarity.objects.filter(user_id__in=related)
+            .values('user_id').annotate(total=Count('id'), lowest=Min('score')).order_by()
+        }
+        additions = []
+        overflowing = []
+        for other in related:
+            score = scores.get(other, 0.0)
+            if score <= 0:
+                continue
+            total, lowest = current.get(other, (0, None))
+            if total < k:
+                additions.append(UserSimilarity(user_id=other, similar_user_id=user_id, score=score))
+            elif score > lowest:
+                additions.append(UserSimilarity(user_id=other, similar_user_id=user_id, score=score))
+                overflowing.append(other)
+        UserSimilarity.objects.bulk_create(additions)
+
+        for other in overflowing:
+            weakest = UserSimilarity.objects.filter(user_id=other).order_by('score', '-similar_user_id').first()
+            if weakest is not None:
+                weakest.delete()
+
+    return len(top)
+
+
+def refresh_in_background(user_ids):
+    """
+    Đánh dấu ``user_ids`` cần cập nhật; một luồng nền duy nhất cập nhật lần
+    lượt, người dùng được đánh dấu nhiều lần trong lúc chờ chỉ cập nhật một lần
+    """
+    global _worker
+    with _pending_lock:
+        _pending.update(user_ids)
+        if _worker is not None:
+            return
+        _worker = threading.Thread(target=_drain_pending, name='user-similarity-refresh', daemon=True)
+        _worker.start()
+
+
+def _drain_pending():
+    global _worker
+    close_old_connections()
+    try:
+        while True:
+            with _pending_lock:
+                if not _pending:
+                    _worker = None
+                    return
+                user_id = _pending.pop()
+            try:
+                refresh_user_similarity(user_id)
+            except Exception as e:
+                logger.error(f"Không thể cập nhật người dùng tương đồng của {user_id}: {str(e)}")
+    finally:
+        close_old_connections()
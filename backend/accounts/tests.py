@@ -1,4 +1,6 @@
-from django.test import TestCase
+from unittest import mock
+
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
@@ -139,3 +141,103 @@ class PermissionTests(TestCase):
         self.assertTrue(self.regular_user.can_manage_content)
         self.assertFalse(self.regular_user.can_manage_users)
         self.assertTrue(self.regular_user.can_manage_playlists)
+
+
+class UserSimilarityTests(TestCase):
+    def setUp(self):
+        from music.models import Song
+        self.users = [
+            User.objects.create_user(username=f'taste{i}', email=f'taste{i}@example.com', password='password123')
+            for i in range(4)
+        ]
+        self.songs = [
+            Song.objects.create(
+                title=f'Song {i}', artist='Artist', duration=100,
+                audio_file='songs/taste.mp3', uploaded_by=self.users[0]
+            )
+            for i in range(4)
+        ]
+
+    def test_top_similar_metrics(self):
+        """Test cosine / Jaccard xếp người dùng có nhiều bài hát chung lên trước"""
+        from music.recommender import build_matrix
+        from .similarity import top_similar
+
+        vectors = build_matrix([0, 0, 0, 1, 1, 1, 2, 3], [0, 1, 2, 0, 1, 2, 0, 3], [1.0] * 8)
+        for metric in ('cosine', 'jaccard'):
+            result = top_similar(vectors.matrix, [0], k=5, metric=metric)[0]
+            self.assertEqual([row for row, _ in result], [1, 2])
+            self.assertAlmostEqual(result[0][1], 1.0, places=5)
+
+    @override_settings(USER_SIMILARITY={'MAX_CANDIDATES': 1})
+    def test_candidates_are_capped_and_refresh_leaves_the_request(self):
+        """Test chỉ so sánh với người có nhiều bài hát chung nhất và signal chỉ đánh dấu cho luồng nền"""
+        from .similarity import _candidate_user_ids
+
+        a, b, c, d = self.users
+        a.favorite_songs.add(*self.songs[:3])
+        b.favorite_songs.add(*self.songs[:3])
+        c.favorite_songs.add(self.songs[0])
+        self.assertEqual(_candidate_user_ids(a.id), {b.id})
+
+        with mock.patch('accounts.similarity.refresh_user_similarity') as refresh, \
+                mock.patch('accounts.similarity.refresh_in_background') as background:
+            with self.captureOnCommitCallbacks(execute=True):
+                d.favorite_songs.add(self.songs[0])
+        background.assert_called_once_with({d.id})
+        refresh.assert_not_called()
+
+    @override_settings(USER_SIMILARITY={'REFRESH_IN_BACKGROUND': False, 'MAX_CANDIDATES': 1})
+    def test_capped_refresh_keeps_reverse_rows_of_other_users(self):
+        """Test người ngoài tập ứng viên bị giới hạn vẫn giữ người dùng vừa cập nhật trong top-K"""
+        from django.core.management import call_command
+        from io import StringIO
+        from .models import UserSimilarity
+        from .similarity import _candidate_user_ids, refresh_user_similarity
+
+        a, b, c, d = self.users
+        a.favorite_songs.add(*self.songs[:3])
+        b.favorite_songs.add(*self.songs[:3])
+        c.favorite_songs.add(self.songs[0])
+        d.favorite_songs.add(self.songs[1])
+        call_command('build_user_similarity', stdout=StringIO())
+        self.assertEqual(_candidate_user_ids(a.id), {b.id})
+
+        refresh_user_similarity(a.id)
+        for other in (b, c, d):
+            self.assertTrue(UserSimilarity.objects.filter(user=other, similar_user=a).exists())
+
+    @override_settings(USER_SIMILARITY={'REFRESH_IN_BACKGROUND': False})
+    def test_index_rebuild_and_incremental_refresh(self):
+        """Test chỉ mục được dựng lại, cập nhật khi đổi bài hát yêu thích và API đọc một lần"""
+        from django.core.management import call_command
+        from io import StringIO
+        from .models import UserSimilarity
+
+        a, b, c, d = self.users
+        a.favorite_songs.add(self.songs[0], self.songs[1])
+        b.favorite_songs.add(self.songs[0], self.songs[1])
+        c.favorite_songs.add(self.songs[1], self.songs[2])
+        call_command('build_user_similarity', stdout=StringIO())
+
+        self.assertEqual(
+            list(UserSimilarity.objects.filter(user=a).order_by('-score').values_list('similar_user', flat=True)),
+            [b.id, c.id]
+        )
+
+        # d thích bài 2: xuất hiện trong danh sách của c ngay sau khi commit
+        with self.captureOnCommitCallbacks(execute=True):
+            d.favorite_songs.add(self.songs[2], self.songs[3])
+        self.assertTrue(UserSimilarity.objects.filter(user=c, similar_user=d).exists())
+        self.assertTrue(UserSimilarity.objects.filter(user=d, similar_user=c).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            d.favorite_songs.clear()
+        self.assertFalse(UserSimilarity.objects.filter(similar_user=d).exists())
+
+        client = APIClient()
+        client.force_authenticate(user=a)
+        with self.assertNumQueries(1):
+            response = client.get('/api/v1/accounts/users/recommendations/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data], [b.id, c.id])
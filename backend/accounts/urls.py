@@ -3,7 +3,7 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     UserViewSet, AdminViewSet,  # Thêm AdminViewSet vào import
     # Sửa lại các imports phù hợp với views.py
-    UserSuggestionsView,
+    UserSuggestionsView, UserRecommendationView,
     ConnectionRequestView, AcceptConnectionView, 
     DeclineConnectionView, RemoveConnectionView,
     BlockUserView, PendingConnectionsView,
@@ -24,6 +24,8 @@ admin_router = DefaultRouter()
 admin_router.register(r'users', AdminViewSet)
 
 urlpatterns = [
+    # Đặt trước router để không bị route users/<pk>/ bắt mất
+    path('users/recommendations/', UserRecommendationView.as_view(), name='user_recommendations'),
     path('', include(router.urls)),
     
     path('admin/', include(admin_router.urls)),
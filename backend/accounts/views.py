@@ -7,7 +7,7 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from django.core.exceptions import ValidationError
-from .models import User, PasswordResetToken, UserConnection
+from .models import User, PasswordResetToken, UserConnection, UserSimilarity
 from .serializers import UserSerializer, UserRegistrationSerializer, PublicUserSerializer, AdminUserSerializer, CompleteUserSerializer, CustomTokenObtainPairSerializer, AdminUserCreateSerializer, ForgotPasswordSerializer, VerifyPasswordResetTokenSerializer, UserConnectionSerializer
 from rest_framework.views import APIView
 from .permissions import IsAdminUser, IsOwnerOrReadOnly, ReadOnly
@@ -525,32 +525,12 @@ class UserRecommendationView(generics.ListAPIView):
     def get_queryset(self):
         user = self.request.user
         
-        favorite_genres = set()
-        for song in user.favorite_songs.all():
-            if song.genre:
-                favorite_genres.add(song.genre)
+        # Chỉ mục tính sẵn từ bài hát yêu thích và lịch sử nghe - xem accounts/similarity.py
+        similar = UserSimilarity.objects.filter(user=user).select_related('similar_user').order_by('-score')[:10]
+        recommended_users = [row.similar_user for row in similar]
         
-        similar_users = User.objects.exclude(id=user.id)
-        
-        if not favorite_genres:
-            return similar_users.order_by('?')[:10]
-        
-        user_scores = []
-        for other_user in similar_users:
-            score = 0
-            common_favorites = user.favorite_songs.filter(
-                id__in=other_user.favorite_songs.values_list('id', flat=True)
-            ).count()
-            score += common_favorites * 3  # Trọng số cao cho bài hát yêu thích chung
-            
-            for song in other_user.favorite_songs.all():
-                if song.genre and song.genre in favorite_genres:
-                    score += 1
-            
-            user_scores.append((other_user, score))
-        
-        user_scores.sort(key=lambda x: x[1], reverse=True)
-        recommended_users = [user for user, score in user_scores[:10]]
+        if not recommended_users:
+            return User.objects.exclude(id=user.id).order_by('?')[:10]
         
         return recommended_users
 
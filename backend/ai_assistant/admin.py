@@ -2,7 +2,7 @@
 Admin configuration for AI Assistant app
 """
 from django.contrib import admin
-from .models import AIConversation, AIMessage, AISystemPrompt
+from .models import AIConversation, AIJob, AIMessage, AISystemPrompt
 
 class AIMessageInline(admin.TabularInline):
     """Inline display of messages in a conversation"""
@@ -37,6 +37,15 @@ class AIMessageAdmin(admin.ModelAdmin):
     
     short_content.short_description = 'Content'
 
+@admin.register(AIJob)
+class AIJobAdmin(admin.ModelAdmin):
+    """Admin interface for queued AI requests"""
+    list_display = ('id', 'user', 'status', 'priority', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('status', 'priority', 'created_at')
+    search_fields = ('prompt', 'user__username')
+    readonly_fields = ('created_at', 'started_at', 'finished_at')
+    raw_id_fields = ('conversation', 'response')
+
 @admin.register(AISystemPrompt)
 class AISystemPromptAdmin(admin.ModelAdmin):
     """Admin interface for System Prompts"""
@@ -11,4 +11,4 @@ class AIAssistantConfig(AppConfig):
     
     def ready(self):
         """Perform initialization when app is ready"""
-        pass 
\ No newline at end of file
+        import ai_assistant.signals  # noqa: F401 
\ No newline at end of file
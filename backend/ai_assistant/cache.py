@@ -0,0 +1,195 @@
+"""
+Response cache for first-turn prompts.
+
+Users ask the same FAQ-style questions over and over ("how do I make a
+playlist"), and a first-turn answer depends only on the prompt and the
+system context. Those answers are cached in two tiers:
+
+- an in-process LRU with TTL, answering repeated prompts in microseconds
+- Django's cache, so answers are shared between workers and survive restarts
+
+Prompts are normalised before hashing (Unicode NFKC, case folding,
+punctuation stripped, whitespace collapsed), so trivial variations share an
+entry. With ``SIMILARITY`` set, a local miss also matches a cached prompt
+of the same context whose word-set Jaccard similarity reaches the threshold.
+
+Multi-turn replies depend on the whole history and are never cached.
+Hit/miss counters are kept per process (see ``stats``).
+
+Configuration (settings.AI_ASSISTANT_RESPONSE_CACHE):
+    ENABLED      = True
+    TTL          = 3600    # seconds
+    MAX_ENTRIES  = 1000    # size of the in-process tier
+    SIMILARITY   = None    # e.g. 0.8 to enable near-duplicate matching
+"""
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+DEFAULT_RESPONSE_CACHE = {
+    'ENABLED': True,
+    'TTL': 3600,
+    'MAX_ENTRIES': 1000,
+    'SIMILARITY': None,
+}
+
+CACHE_PREFIX = 'ai:response:'
+
+_PUNCTUATION = re.compile(r'[^\w\s]', re.UNICODE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_prompt(text: Optional[str]) -> str:
+    """Canonical form of a prompt used for cache keys"""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKC', text).casefold()
+    text = _PUNCTUATION.sub(' ', text)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier (in-process LRU + Django cache) store of first-turn responses
+
+    Args:
+        namespace (str): Distinguishes models/backends so their answers never mix
+        ttl (int): Seconds an entry stays valid in both tiers
+        max_entries (int): Capacity of the in-process tier
+        similarity (Optional[float]): Jaccard threshold for near-duplicate prompts
+    """
+    def __init__(self, namespace: str = '', ttl: int = DEFAULT_RESPONSE_CACHE['TTL'],
+                 max_entries: int = DEFAULT_RESPONSE_CACHE['MAX_ENTRIES'],
+                 similarity: Optional[float] = None, enabled: bool = True):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self.enabled = enabled
+        # key -> (expires_at, context digest, prompt words, response)
+        self._entries = OrderedDict()
+        self._counters = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, namespace: str = '') -> 'ResponseCache':
+        options = {**DEFAULT_RESPONSE_CACHE, **getattr(settings, 'AI_ASSISTANT_RESPONSE_CACHE', {})}
+        return cls(
+            namespace=namespace,
+            ttl=options['TTL'],
+            max_entries=options['MAX_ENTRIES'],
+            similarity=options['SIMILARITY'],
+            enabled=options['ENABLED'],
+        )
+
+    def _keys(self, prompt: str, context: Optional[str]):
+        normalized = normalize_prompt(prompt)
+        context_digest = _digest(self.namespace, normalize_prompt(context))
+        return _digest(context_digest, normalized), context_digest, normalized
+
+    def get(self, prompt: str, context: Optional[str] = None, local_only: bool = False) -> Optional[str]:
+        """
+        Cached response for ``prompt`` under ``context``, or None
+
+        Args:
+            local_only (bool): Only consult the in-process tier (safe to call on
+                the event loop, never touches the network)
+        """
+        if not self.enabled:
+            return None
+        key, context_digest, normalized = self._keys(prompt, context)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._counters['local_hits'] += 1
+                return entry[3]
+            if entry is not None:
+                del self._entries[key]
+
+            if self.similarity:
+                response = self._similar(context_digest, set(normalized.split()), now)
+                if response is not None:
+                    self._counters['similar_hits'] += 1
+                    return response
+
+        if local_only:
+            return None
+
+        response = cache.get(CACHE_PREFIX + key)
+        if response is None:
+            with self._lock:
+                self._counters['misses'] += 1
+            return None
+
+        with self._lock:
+            self._counters['shared_hits'] += 1
+            self._remember(key, context_digest, normalized, response, now)
+        return response
+
+    def set(self, prompt: str, context: Optional[str], response: str) -> None:
+        """Store ``response`` in both tiers"""
+        if not self.enabled or not response:
+            return
+        key, context_digest, normalized = self._keys(prompt, context)
+        with self._lock:
+            self._remember(key, context_digest, normalized, response, time.monotonic())
+            self._counters['stores'] += 1
+        cache.set(CACHE_PREFIX + key, response, self.ttl)
+
+    def _remember(self, key, context_digest, normalized, response, now):
+        self._entries[key] = (now + self.ttl, context_digest, frozenset(normalized.split()), response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _similar(self, context_digest, words, now):
+        """Best near-duplicate prompt in the local tier (caller holds the lock)"""
+        if not words:
+            return None
+        best, best_score = None, self.similarity
+        for key, (expires_at, entry_context, entry_words, response) in self._entries.items():
+            if entry_context != context_digest or expires_at <= now:
+                continue
+            score = len(words & entry_words) / len(words | entry_words)
+            if score >= best_score:
+                best, best_score = key, score
+        if best is None:
+            return None
+        self._entries.move_to_end(best)
+        return self._entries[best][3]
+
+    def clear_local(self) -> None:
+        """Drop the in-process tier (the shared tier expires by TTL)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters of this process"""
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+        hits = counters.get('local_hits', 0) + counters.get('shared_hits', 0) + counters.get('similar_hits', 0)
+        lookups = hits + counters.get('misses', 0)
+        return {
+            'local_hits': counters.get('local_hits', 0),
+            'shared_hits': counters.get('shared_hits', 0),
+            'similar_hits': counters.get('similar_hits', 0),
+            'misses': counters.get('misses', 0),
+            'stores': counters.get('stores', 0),
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'local_entries': size,
+        }
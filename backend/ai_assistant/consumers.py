@@ -1,16 +1,23 @@
 """
 WebSocket consumers for AI Assistant app
 """
+import asyncio
 import json
 import logging
 import traceback
+import uuid
 from typing import Dict, Optional, Any
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from channels.layers import get_channel_layer
 from django.contrib.auth import get_user_model
+from chat.typing import TypingCoalescer
 from .models import AIConversation, AIMessage
-from .gemini_client import GeminiClient
+from .gateway import AIGatewayBusy, get_gateway
+from .gemini_client import get_client
+from .resilience import CircuitOpenError
+from .memory import load_history, refresh_summary_in_background
+from .retrieval import catalog_context
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -24,6 +31,8 @@ class AIChatConsumer(AsyncWebsocketConsumer):
         self.conversation_id = None
         self.conversation_group_name = None
         self.channel_layer = get_channel_layer()
+        self.generation_tasks = set()
+        self.typing = None
         
     async def connect(self):
         """Handle WebSocket connection"""
@@ -58,10 +67,22 @@ class AIChatConsumer(AsyncWebsocketConsumer):
                 self.channel_name
             )
         
+        # Typing events from the client are coalesced before reaching the channel layer
+        self.typing = TypingCoalescer(
+            self.channel_layer, self.conversation_group_name, self.user.id, extra={'role': 'user'}
+        )
+        
         await self.accept()
     
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection"""
+        # Nobody is left to receive the reply: stop waiting on the model
+        for task in list(self.generation_tasks):
+            task.cancel()
+        
+        if self.typing:
+            await self.typing.stop()
+        
         # Leave conversation group
         if self.conversation_group_name and self.channel_layer:
             await self.channel_layer.group_discard(
@@ -99,6 +120,8 @@ class AIChatConsumer(AsyncWebsocketConsumer):
         try:
             prompt = data.get('message', '')
             system_context = data.get('system_context')
+            # Stream the reply as message_delta frames unless the client opts out
+            stream = data.get('stream', True)
             conversation_id = data.get('conversation_id') or self.conversation_id
             
             # Get or create conversation
@@ -130,6 +153,7 @@ class AIChatConsumer(AsyncWebsocketConsumer):
                         self.conversation_group_name,
                         self.channel_name
                     )
+                self.typing.group = self.conversation_group_name
             
             # Save user message
             await self.save_message(
@@ -152,8 +176,13 @@ class AIChatConsumer(AsyncWebsocketConsumer):
                     }
                 )
             
-            # Generate AI response (non-blocking)
-            await self.generate_ai_response(conversation, prompt, system_context)
+            # Generate AI response (non-blocking): run as a task so this consumer keeps
+            # dispatching group events (message_delta frames) while the model generates
+            task = asyncio.create_task(
+                self.generate_ai_response(conversation, prompt, system_context, stream=stream)
+            )
+            self.generation_tasks.add(task)
+            task.add_done_callback(self.generation_tasks.discard)
             
         except Exception as e:
             logger.error(f"Error handling message: {str(e)}")
@@ -162,8 +191,15 @@ class AIChatConsumer(AsyncWebsocketConsumer):
                 'error': str(e)
             }))
     
-    async def generate_ai_response(self, conversation, prompt, system_context=None):
-        """Generate AI response in a non-blocking way"""
+    async def generate_ai_response(self, conversation, prompt, system_context=None, stream=True):
+        """
+        Generate AI response in a non-blocking way
+
+        When ``stream`` is true the reply is forwarded chunk by chunk as
+        ``message_delta`` events, then persisted once and sent as a final
+        ``chat_message`` carrying the same ``stream_id``.
+        """
+        stream_id = uuid.uuid4().hex if stream else None
         try:
             # Send typing indicator
             if self.channel_layer:
@@ -176,37 +212,71 @@ class AIChatConsumer(AsyncWebsocketConsumer):
                     }
                 )
             
-            # Get conversation history
-            history = await self.get_conversation_history(conversation)
-            
-            # Initialize Gemini client
-            client = GeminiClient()
+            # Memory window (latest messages + summary of older ones) instead of the full history
+            memory = await self.load_memory(conversation, system_context)
+            history = memory.history
+            system_context = memory.system_context
+
+            # Matching songs / albums / artists / genres from our catalog ground the answer
+            catalog = await self.find_catalog_matches(prompt)
+            if catalog:
+                system_context = f"{system_context}\n\n{catalog}" if system_context else catalog
             
-            # Use system context from conversation if not explicitly provided
-            if not system_context and conversation.system_context:
-                system_context = conversation.system_context
+            # Shared Gemini client (reuses models and the response cache)
+            client = get_client()
             
-            # Generate response
-            if len(history) > 1:
+            # Generate response off the event loop, within the gateway's concurrency limits
+            gateway = get_gateway()
+            # A repeated first-turn prompt is answered from the in-process cache without the model
+            cached = None
+            if memory.is_first_turn:
+                cached = client.response_cache.get(prompt, system_context, local_only=True)
+            if cached is not None:
+                response = cached
+            elif stream:
+                if not memory.is_first_turn:
+                    chunks = gateway.stream(
+                        self.user.id,
+                        client.stream_chat_response,
+                        history=history,
+                        system_instructions=system_context
+                    )
+                else:
+                    chunks = gateway.stream(
+                        self.user.id,
+                        client.stream_text_response,
+                        prompt=prompt,
+                        context=system_context
+                    )
+                response = await self.forward_stream(chunks, stream_id, conversation.id)
+            elif not memory.is_first_turn:
                 # Use chat history for context
-                response = client.generate_chat_response(
+                response = await gateway.run(
+                    self.user.id,
+                    client.generate_chat_response,
                     history=history,
                     system_instructions=system_context
                 )
             else:
                 # Simple response for first message
-                response = client.generate_text_response(
+                response = await gateway.run(
+                    self.user.id,
+                    client.generate_text_response,
                     prompt=prompt,
                     context=system_context
                 )
             
             # Save assistant response
-            await self.save_message(
+            message = await self.save_message(
                 conversation=conversation,
                 role='assistant',
                 content=response
             )
             
+            # Fold messages that left the window into the summary, off the request path
+            if memory.summary_due:
+                refresh_summary_in_background(conversation.id)
+            
             # Send response to the group
             if self.channel_layer:
                 await self.channel_layer.group_send(
@@ -215,7 +285,9 @@ class AIChatConsumer(AsyncWebsocketConsumer):
                         'type': 'chat_message',
                         'message': response,
                         'role': 'assistant',
-                        'conversation_id': conversation.id
+                        'conversation_id': conversation.id,
+                        'message_id': message.id,
+                        'stream_id': stream_id
                     }
                 )
             
@@ -230,6 +302,22 @@ class AIChatConsumer(AsyncWebsocketConsumer):
                     }
                 )
             
+        except (AIGatewayBusy, CircuitOpenError) as e:
+            # Rejected before reaching the model (gateway full or circuit open):
+            # tell this socket only, nothing is saved
+            await self.send(text_data=json.dumps({
+                'error': str(e),
+                'conversation_id': conversation.id
+            }))
+            if self.channel_layer:
+                await self.channel_layer.group_send(
+                    self.conversation_group_name,
+                    {
+                        'type': 'typing_indicator',
+                        'is_typing': False,
+                        'role': 'assistant'
+                    }
+                )
         except Exception as e:
             logger.error(f"Error generating AI response: {str(e)}")
             logger.error(traceback.format_exc())
@@ -250,6 +338,7 @@ class AIChatConsumer(AsyncWebsocketConsumer):
                         'message': error_message,
                         'role': 'assistant',
                         'conversation_id': conversation.id,
+                        'stream_id': stream_id,
                         'is_error': True
                     }
                 )
@@ -265,22 +354,31 @@ class AIChatConsumer(AsyncWebsocketConsumer):
                     }
                 )
     
+    async def forward_stream(self, chunks, stream_id, conversation_id):
+        """
+        Forward chunks from an async iterator (AIGateway.stream) as message_delta
+        events and return the assembled text
+        """
+        parts = []
+        async for chunk in chunks:
+            parts.append(chunk)
+            if self.channel_layer:
+                await self.channel_layer.group_send(
+                    self.conversation_group_name,
+                    {
+                        'type': 'message_delta',
+                        'delta': chunk,
+                        'index': len(parts) - 1,
+                        'stream_id': stream_id,
+                        'conversation_id': conversation_id
+                    }
+                )
+        return ''.join(parts)
+    
     async def handle_typing(self, data):
         """Handle typing indicator events"""
-        is_typing = data.get('is_typing', False)
-        
-        # Broadcast typing status to group
-        if self.channel_layer:
-            user_id = self.user.id if self.user and hasattr(self.user, 'id') else None
-            await self.channel_layer.group_send(
-                self.conversation_group_name,
-                {
-                    'type': 'typing_indicator',
-                    'is_typing': is_typing,
-                    'user_id': user_id,
-                    'role': 'user'
-                }
-            )
+        # Broadcast only state changes, at most one per CHAT_TYPING['INTERVAL']
+        await self.typing.update(data.get('is_typing', False))
     
     async def chat_message(self, event):
         """Send chat message to WebSocket"""
@@ -290,9 +388,23 @@ class AIChatConsumer(AsyncWebsocketConsumer):
             'role': event['role'],
             'conversation_id': event.get('conversation_id'),
             'user_id': event.get('user_id'),
+            'message_id': event.get('message_id'),
+            'stream_id': event.get('stream_id'),
+            'job_id': event.get('job_id'),
             'is_error': event.get('is_error', False)
         }))
     
+    async def message_delta(self, event):
+        """Send one streamed chunk of an assistant reply to WebSocket"""
+        await self.send(text_data=json.dumps({
+            'type': 'message_delta',
+            'delta': event['delta'],
+            'index': event['index'],
+            'stream_id': event['stream_id'],
+            'role': 'assistant',
+            'conversation_id': event.get('conversation_id')
+        }))
+    
     async def typing_indicator(self, event):
         """Send typing indicator status to WebSocket"""
         await self.send(text_data=json.dumps({
@@ -302,45 +414,48 @@ class AIChatConsumer(AsyncWebsocketConsumer):
             'user_id': event.get('user_id')
         }))
     
-    @database_sync_to_async
-    def user_has_access_to_conversation(self, user, conversation_id):
+    # Single-query lookups use the async ORM directly; multi-step work (memory window,
+    # catalog search) stays in one database_sync_to_async hop
+    
+    async def user_has_access_to_conversation(self, user, conversation_id):
         """Check if user has access to the specified conversation"""
         try:
-            return AIConversation.objects.filter(
+            return await AIConversation.objects.filter(
                 id=conversation_id, 
                 user=user
-            ).exists()
+            ).aexists()
         except Exception:
             return False
     
-    @database_sync_to_async
-    def get_conversation(self, conversation_id):
+    async def get_conversation(self, conversation_id):
         """Get conversation by ID if user has access"""
         try:
-            return AIConversation.objects.get(id=conversation_id, user=self.user)
+            return await AIConversation.objects.aget(id=conversation_id, user=self.user)
         except AIConversation.DoesNotExist:
             return None
     
-    @database_sync_to_async
-    def create_conversation(self, user, title, system_context=None):
+    async def create_conversation(self, user, title, system_context=None):
         """Create a new conversation"""
-        return AIConversation.objects.create(
+        return await AIConversation.objects.acreate(
             user=user,
             title=title,
             system_context=system_context
         )
     
-    @database_sync_to_async
-    def save_message(self, conversation, role, content):
+    async def save_message(self, conversation, role, content):
         """Save message to database"""
-        return AIMessage.objects.create(
+        return await AIMessage.objects.acreate(
             conversation=conversation,
             role=role,
             content=content
         )
     
     @database_sync_to_async
-    def get_conversation_history(self, conversation):
-        """Get all messages for a conversation"""
-        messages = AIMessage.objects.filter(conversation=conversation).order_by('created_at')
-        return [{'role': msg.role, 'content': msg.content} for msg in messages]
\ No newline at end of file
+    def load_memory(self, conversation, system_context=None):
+        """Get the memory window and summary for a conversation"""
+        return load_history(conversation, system_context)
+
+    @database_sync_to_async
+    def find_catalog_matches(self, prompt):
+        """Top catalog hits for the prompt, formatted for the system instruction"""
+        return catalog_context(prompt)
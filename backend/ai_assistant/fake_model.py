@@ -0,0 +1,218 @@
+"""
+Offline stand-in for ``google.generativeai.GenerativeModel``.
+
+Implements the subset of the model API used by ``GeminiClient``
+(``generate_content`` with structured ``contents`` and ``stream=True``,
+``start_chat().send_message``) and emits the reply in timed chunks, so
+time-to-first-byte and total latency can be measured without network access
+or an API key.
+
+Enable it with ``AI_ASSISTANT_MODEL_BACKEND = 'fake'``; chunk timing comes
+from ``AI_ASSISTANT_FAKE_MODEL``. ``FaultInjectingModel`` additionally fails or
+stalls on demand (``FAILURE_RATE`` in the settings), to exercise the circuit
+breaker and retries of ai_assistant/resilience.py.
+"""
+import copy
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Union
+
+from django.conf import settings
+from google.api_core import exceptions as api_exceptions
+
+DEFAULT_FAKE_MODEL = {
+    'FIRST_CHUNK_DELAY': 0.3,
+    'CHUNK_DELAY': 0.05,
+    'CHUNK_WORDS': 4,
+    'FAILURE_RATE': 0.0,
+}
+
+
+def _text_of(content: Any) -> str:
+    """Extract the plain text from a prompt in any of the shapes genai accepts"""
+    if content is None:
+        return ''
+    if isinstance(content, str):
+        return content
+    if isinstance(content, dict):
+        if 'text' in content:
+            return content['text']
+        return _text_of(content.get('parts'))
+    if isinstance(content, (list, tuple)):
+        texts = [_text_of(part) for part in content]
+        return '\n'.join(text for text in texts if text)
+    return ''
+
+
+def _prompt_of(contents: Any) -> str:
+    """The text the model should answer: the last turn of a structured history"""
+    if isinstance(contents, (list, tuple)) and contents and isinstance(contents[-1], dict) and 'role' in contents[-1]:
+        return _text_of(contents[-1])
+    return _text_of(contents)
+
+
+class FakeResponse:
+    """A complete (or single-chunk) response exposing ``.text`` like genai's"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeStreamResponse:
+    """Iterable of ``FakeResponse`` chunks; ``.text`` is the full reply once consumed"""
+
+    def __init__(self, chunks: List[str], first_delay: float, delay: float):
+        self._chunks = chunks
+        self._first_delay = first_delay
+        self._delay = delay
+        self.text = ''.join(chunks)
+
+    def __iter__(self) -> Iterator[FakeResponse]:
+        for index, chunk in enumerate(self._chunks):
+            time.sleep(self._first_delay if index == 0 else self._delay)
+            yield FakeResponse(chunk)
+
+
+class FakeChatSession:
+    """Minimal ``ChatSession``: records history and answers with the fake model"""
+
+    def __init__(self, model: 'FakeGenerativeModel', history: Optional[list] = None):
+        self.model = model
+        self.history = list(history or [])
+
+    def send_message(self, content: Any, stream: bool = False, **kwargs):
+        self.history.append({'role': 'user', 'parts': [_text_of(content)]})
+        response = self.model.generate_content(content, stream=stream)
+        self.history.append({'role': 'model', 'parts': [response.text]})
+        return response
+
+
+class FakeGenerativeModel:
+    """
+    Deterministic model that echoes the prompt (or answers with ``reply``).
+
+    Args:
+        reply: Fixed reply text, or a callable receiving the prompt text
+        first_chunk_delay: Seconds before the first chunk (simulated time-to-first-byte)
+        chunk_delay: Seconds between subsequent chunks
+        chunk_words: Number of words per streamed chunk
+
+    ``calls`` counts model round-trips (shared by copies made with
+    ``with_system_instruction``) and ``last_contents`` keeps the most recent
+    request for inspection.
+    """
+
+    def __init__(self, reply: Union[str, Callable[[str], str], None] = None,
+                 first_chunk_delay: float = DEFAULT_FAKE_MODEL['FIRST_CHUNK_DELAY'],
+                 chunk_delay: float = DEFAULT_FAKE_MODEL['CHUNK_DELAY'],
+                 chunk_words: int = DEFAULT_FAKE_MODEL['CHUNK_WORDS']):
+        self.reply = reply
+        self.first_chunk_delay = first_chunk_delay
+        self.chunk_delay = chunk_delay
+        self.chunk_words = max(1, chunk_words)
+        self.system_instruction = None
+        self.last_contents = None
+        self._root = self
+        self.calls = 0
+
+    def with_system_instruction(self, system_instruction: str) -> 'FakeGenerativeModel':
+        """Copy of this model bound to ``system_instruction``, like GenerativeModel(system_instruction=...)"""
+        model = copy.copy(self)
+        model.system_instruction = system_instruction
+        return model
+
+    @classmethod
+    def from_settings(cls) -> 'FakeGenerativeModel':
+        """Build a fake model with timings from ``AI_ASSISTANT_FAKE_MODEL``"""
+        options = {**DEFAULT_FAKE_MODEL, **getattr(settings, 'AI_ASSISTANT_FAKE_MODEL', {})}
+        timings = {
+            'first_chunk_delay': options['FIRST_CHUNK_DELAY'],
+            'chunk_delay': options['CHUNK_DELAY'],
+            'chunk_words': options['CHUNK_WORDS'],
+        }
+        if options['FAILURE_RATE']:
+            return FaultInjectingModel(failure_rate=options['FAILURE_RATE'], **timings)
+        return cls(**timings)
+
+    def answer(self, prompt: str) -> str:
+        """The full reply for ``prompt``"""
+        if callable(self.reply):
+            return self.reply(prompt)
+        if self.reply is not None:
+            return self.reply
+        return f"You said: {prompt}"
+
+    def split(self, text: str) -> List[str]:
+        """Split ``text`` into chunks of ``chunk_words`` words, keeping whitespace"""
+        words = text.split(' ')
+        return [
+            ' '.join(words[start:start + self.chunk_words]) + (' ' if start + self.chunk_words < len(words) else '')
+            for start in range(0, len(words), self.chunk_words)
+        ]
+
+    def generate_content(self, contents: Any, stream: bool = False, **kwargs):
+        self._root.calls += 1
+        self._root.last_contents = contents
+        text = self.answer(_prompt_of(contents))
+        chunks = self.split(text)
+        if stream:
+            return FakeStreamResponse(chunks, self.first_chunk_delay, self.chunk_delay)
+        # A blocking call only returns once the whole reply has been "generated"
+        time.sleep(self.first_chunk_delay + self.chunk_delay * max(len(chunks) - 1, 0))
+        return FakeResponse(text)
+
+    def start_chat(self, history: Optional[list] = None, **kwargs) -> FakeChatSession:
+        return FakeChatSession(self, history)
+
+
+class FaultInjectingModel(FakeGenerativeModel):
+    """
+    Fake model that fails or stalls on demand.
+
+    Args:
+        faults: Scripted outcomes, one per call, used before ``failure_rate``
+            applies: None (answer normally), an exception (raised) or a number
+            (extra seconds of latency, then answer)
+        failure_rate: Probability that an unscripted call raises ``error``
+        error: Exception raised for random failures (default: 503 Service Unavailable)
+        seed: Seed of the random failures, for reproducible runs
+
+    Other arguments are those of FakeGenerativeModel. ``faults_injected``
+    counts the calls that failed on purpose.
+    """
+
+    def __init__(self, faults: Iterable[Any] = (), failure_rate: float = 0.0,
+                 error: Optional[BaseException] = None, seed: Optional[int] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.faults = deque(faults)
+        self.failure_rate = failure_rate
+        self.error = error or api_exceptions.ServiceUnavailable('Injected fault: model unavailable')
+        self.faults_injected = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def inject(self, *faults: Any) -> None:
+        """Queue more scripted outcomes"""
+        with self._lock:
+            self.faults.extend(faults)
+
+    def _next_fault(self) -> Any:
+        with self._lock:
+            if self.faults:
+                return self.faults.popleft()
+            if self.failure_rate and self._random.random() < self.failure_rate:
+                return self.error
+            return None
+
+    def generate_content(self, contents: Any, stream: bool = False, **kwargs):
+        root = self._root
+        fault = root._next_fault()
+        if isinstance(fault, (int, float)):
+            time.sleep(fault)
+        elif fault is not None:
+            with root._lock:
+                root.faults_injected += 1
+            raise fault
+        return super().generate_content(contents, stream=stream, **kwargs)
@@ -0,0 +1,158 @@
+"""
+Async gateway for model calls made from the event loop.
+
+GeminiClient is synchronous: calling it directly from a consumer blocks the
+Daphne event loop, and with it every websocket on the worker, for the whole
+generation. The gateway runs calls in a dedicated thread pool and bounds them:
+
+- a global limit on generations in flight per process (AI_ASSISTANT_MAX_CONCURRENCY)
+- a per-user limit (AI_ASSISTANT_MAX_PER_USER); requests over it are rejected
+  at once with AIGatewayBusy instead of queueing behind the user's others
+- a timeout for the whole call or stream (AI_ASSISTANT_TIMEOUT)
+
+Cancelling the awaiting task (e.g. when the socket disconnects) stops waiting
+immediately and closes a stream so no further chunks are pulled. A call that
+is already running in a thread finishes in the background and its result is
+dropped.
+"""
+import asyncio
+import functools
+import threading
+import weakref
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Optional
+
+from django.conf import settings
+
+_DONE = object()
+
+
+class AIGatewayError(Exception):
+    """Base class for requests the gateway refused or abandoned"""
+
+
+class AIGatewayBusy(AIGatewayError):
+    """The user already has the maximum number of generations in flight"""
+
+
+class AIGatewayTimeout(AIGatewayError):
+    """The model did not finish within the configured timeout"""
+
+
+def _close_quietly(iterator):
+    try:
+        iterator.close()
+    except Exception:
+        # The generator may still be executing in another thread; it is
+        # released with its last reference instead
+        pass
+
+
+class AIGateway:
+    """
+    Runs blocking model calls off the event loop with bounded concurrency
+
+    Args:
+        max_concurrency (Optional[int]): Generations in flight per process
+        max_per_user (Optional[int]): Generations in flight per user
+        timeout (Optional[float]): Seconds allowed for a call or a whole stream
+    """
+    def __init__(self, max_concurrency: Optional[int] = None, max_per_user: Optional[int] = None,
+                 timeout: Optional[float] = None):
+        self.max_concurrency = max_concurrency or getattr(settings, 'AI_ASSISTANT_MAX_CONCURRENCY', 8)
+        self.max_per_user = max_per_user or getattr(settings, 'AI_ASSISTANT_MAX_PER_USER', 2)
+        self.timeout = timeout or getattr(settings, 'AI_ASSISTANT_TIMEOUT', 60.0)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='ai-gateway')
+        # asyncio.Semaphore is bound to one event loop; keep one per loop
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._active = Counter()
+        self._lock = threading.Lock()
+
+    def in_flight(self, user_id: Optional[int] = None) -> int:
+        """Number of admitted requests (running or waiting for a slot), overall or for one user"""
+        with self._lock:
+            if user_id is None:
+                return sum(self._active.values())
+            return self._active.get(user_id, 0)
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    @asynccontextmanager
+    async def _slot(self, user_id: Optional[int]):
+        with self._lock:
+            if self._active.get(user_id, 0) >= self.max_per_user:
+                raise AIGatewayBusy(
+                    f"You already have {self.max_per_user} AI requests in progress, please wait for them to finish"
+                )
+            self._active[user_id] += 1
+        try:
+            async with self._semaphore():
+                yield
+        finally:
+            with self._lock:
+                self._active[user_id] -= 1
+                if self._active[user_id] <= 0:
+                    del self._active[user_id]
+
+    def _timeout_error(self) -> AIGatewayTimeout:
+        return AIGatewayTimeout(f"The AI model did not answer within {self.timeout:g} seconds")
+
+    async def run(self, user_id: Optional[int], func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run ``func(*args, **kwargs)`` in the gateway's thread pool and return its result"""
+        loop = asyncio.get_running_loop()
+        async with self._slot(user_id):
+            future = loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+            try:
+                return await asyncio.wait_for(future, self.timeout)
+            except asyncio.TimeoutError:
+                raise self._timeout_error()
+
+    async def stream(self, user_id: Optional[int], func: Callable[..., Any], *args, **kwargs) -> AsyncIterator[Any]:
+        """
+        Iterate asynchronously over the synchronous iterator returned by
+        ``func(*args, **kwargs)``, pulling each item in the thread pool.
+        ``func`` is called on the event loop, so it must return lazily (e.g. a
+        generator function such as GeminiClient.stream_chat_response).
+        """
+        loop = asyncio.get_running_loop()
+        async with self._slot(user_id):
+            deadline = loop.time() + self.timeout
+            iterator = iter(func(*args, **kwargs))
+            try:
+                while True:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        raise self._timeout_error()
+                    try:
+                        item = await asyncio.wait_for(
+                            loop.run_in_executor(self.executor, next, iterator, _DONE), remaining
+                        )
+                    except asyncio.TimeoutError:
+                        raise self._timeout_error()
+                    if item is _DONE:
+                        return
+                    yield item
+            finally:
+                # Stop the upstream stream early when the consumer went away or timed out
+                self.executor.submit(_close_quietly, iterator)
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> AIGateway:
+    """The process-wide gateway shared by all consumers"""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = AIGateway()
+    return _gateway
@@ -1,21 +1,133 @@
 """
 Gemini API client for handling interactions with the Google AI API
 """
+import base64
 import os
 import json
 import logging
-from typing import Dict, List, Optional, Any, Union
+import threading
+from typing import Dict, Iterator, List, Optional, Any, Union
 import google.generativeai as genai
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .cache import ResponseCache
+from .fake_model import FakeGenerativeModel
+from .resilience import CircuitOpenError, Resilience
 
 logger = logging.getLogger(__name__)
 
+# Vai trò trong AIMessage -> vai trò trong contents của Gemini
+ROLE_MAP = {
+    'user': 'user',
+    'assistant': 'model',
+    'model': 'model',
+}
+
+SUMMARY_INSTRUCTION = (
+    "You maintain the memory of a conversation between a user and the Spotify Chat assistant. "
+    "Merge the previous summary and the new messages into one concise summary in the conversation's "
+    "language. Keep facts, the user's preferences and open questions; drop greetings and small talk."
+)
+
+# Số system instruction khác nhau được giữ model sẵn (mỗi instruction một GenerativeModel)
+MAX_CACHED_MODELS = 32
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    Cheap offline token estimate (~4 characters per token), used for
+    budgeting so truncation never needs a count_tokens round-trip
+    """
+    if not text:
+        return 0
+    return len(text) // 4 + 1
+
+
+def build_contents(history: List[Dict[str, str]], max_tokens: Optional[int] = None,
+                   reserved_tokens: int = 0) -> List[Dict[str, Any]]:
+    """
+    Convert a message history into Gemini ``contents``
+
+    Consecutive messages with the same role are merged so turns alternate
+    user/model, and the oldest turns are dropped once the estimated size
+    passes ``max_tokens`` (minus ``reserved_tokens`` for the system
+    instruction). The latest user turn is always kept and the result always
+    starts with a user turn.
+
+    Args:
+        history (List[Dict[str, str]]): Messages with 'role' and 'content', oldest first
+        max_tokens (Optional[int]): Token budget for the whole request
+        reserved_tokens (int): Tokens already used by the system instruction
+
+    Returns:
+        List[Dict[str, Any]]: ``[{'role': 'user'|'model', 'parts': [text]}, ...]``
+    """
+    turns = []
+    for msg in history:
+        role = ROLE_MAP.get(msg.get('role'))
+        content = msg.get('content')
+        if role is None or not content:
+            continue
+        if turns and turns[-1]['role'] == role:
+            turns[-1]['parts'][0] += f"\n\n{content}"
+        else:
+            turns.append({'role': role, 'parts': [content]})
+
+    if max_tokens is not None:
+        budget = max_tokens - reserved_tokens
+        kept = []
+        used = 0
+        for turn in reversed(turns):
+            cost = estimate_tokens(turn['parts'][0])
+            if kept and used + cost > budget:
+                break
+            kept.append(turn)
+            used += cost
+        turns = kept[::-1]
+
+    # Gemini yêu cầu hội thoại bắt đầu bằng lượt của người dùng
+    while turns and turns[0]['role'] != 'user':
+        turns.pop(0)
+    return turns
+
+
 class GeminiClient:
     """
     Client class for interacting with the Gemini API
     """
-    def __init__(self):
-        """Initialize the Gemini client with API key from environment variables"""
+    def __init__(self, model: Optional[Any] = None, response_cache: Optional[ResponseCache] = None,
+                 resilience: Optional[Resilience] = None):
+        """
+        Initialize the Gemini client with API key from environment variables
+
+        Args:
+            model (Optional[Any]): Model object to use instead of Gemini (e.g. a
+                FakeGenerativeModel in tests)
+            response_cache (Optional[ResponseCache]): Cache for first-turn replies;
+                by default configured from settings, disabled for an injected model
+            resilience (Optional[Resilience]): Circuit breaker, retries and metrics
+                wrapped around every model call; by default configured from settings
+        """
+        self.max_context_tokens = getattr(settings, 'AI_ASSISTANT_CONTEXT_TOKENS', 8000)
+        self.resilience = resilience or Resilience.from_settings()
+        self._models = {}
+
+        if model is not None:
+            self.model = model
+            self.response_cache = response_cache or ResponseCache(enabled=False)
+            return
+
+        # Model giả lập chạy offline, không cần API key
+        if getattr(settings, 'AI_ASSISTANT_MODEL_BACKEND', 'gemini') == 'fake':
+            self.model = FakeGenerativeModel.from_settings()
+            self.response_cache = response_cache or ResponseCache.from_settings(namespace='fake')
+            return
+
+        model_name = getattr(settings, 'AI_ASSISTANT_GEMINI_MODEL', 'gemini-1.5-flash')
+        self.response_cache = response_cache or ResponseCache.from_settings(namespace=model_name)
+
         try:
             api_key = os.environ.get('GEMINI_API_KEY')
             if not api_key:
@@ -25,7 +137,7 @@ class GeminiClient:
             genai.configure(api_key=api_key)
             
             # Khởi tạo model
-            self.model = genai.GenerativeModel('gemini-pro')
+            self.model = genai.GenerativeModel(model_name)
             logger.info("Gemini API client initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Gemini API client: {str(e)}")
@@ -37,73 +149,195 @@ class GeminiClient:
         
         Args:
             prompt (str): The user's prompt/question
-            context (Optional[str]): Additional context about the system
+            context (Optional[str]): Additional context about the system, sent as
+                the system instruction
             
         Returns:
-            str: The generated response
+            str: The generated response (answered from the response cache when
+                the same prompt was asked before)
+            
+        Raises:
+            CircuitOpenError: The model has been failing and calls are refused for now;
+                other errors are returned as an apology message
         """
+        cached = self.response_cache.get(prompt, context)
+        if cached is not None:
+            return cached
         try:
-            # Combine system context with user prompt if provided
-            if context:
-                full_prompt = f"{context}\n\nUser question: {prompt}"
-            else:
-                full_prompt = prompt
-                
-            response = self.model.generate_content(full_prompt)
-            return response.text
+            response = self.resilience.call('generate_text', self._model_for(context).generate_content, prompt)
+            text = response.text
+            self.response_cache.set(prompt, context, text)
+            return text
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"Error generating response from Gemini API: {str(e)}")
             return f"Sorry, I encountered an error: {str(e)}"
+
+    def stream_text_response(self, prompt: str, context: Optional[str] = None) -> Iterator[str]:
+        """
+        Stream a text response chunk by chunk
+
+        Args:
+            prompt (str): The user's prompt/question
+            context (Optional[str]): Additional context about the system, sent as
+                the system instruction
+
+        Yields:
+            str: Pieces of the generated response, in order
+
+        Raises:
+            Exception: Errors from the API are logged and re-raised so the caller
+                can discard a partial reply
+        """
+        cached = self.response_cache.get(prompt, context)
+        if cached is not None:
+            yield cached
+            return
+        try:
+            response = self.resilience.stream(
+                'stream_text', self._model_for(context).generate_content, prompt, stream=True
+            )
+            parts = []
+            for chunk in response:
+                if chunk.text:
+                    parts.append(chunk.text)
+                    yield chunk.text
+            # Chỉ lưu khi đã nhận đủ phản hồi
+            self.response_cache.set(prompt, context, ''.join(parts))
+        except Exception as e:
+            logger.error(f"Error streaming response from Gemini API: {str(e)}")
+            raise
     
     def generate_chat_response(self, history: List[Dict[str, str]], 
                                system_instructions: Optional[str] = None) -> str:
         """
-        Generate a response for an ongoing conversation
+        Generate a response for an ongoing conversation with a single model call
         
         Args:
-            history (List[Dict[str, str]]): List of message dictionaries with 'role' and 'content'
+            history (List[Dict[str, str]]): List of message dictionaries with 'role' and 'content',
+                ending with the user's new message
             system_instructions (Optional[str]): System instructions to guide the model
             
         Returns:
             str: The generated response
+            
+        Raises:
+            CircuitOpenError: The model has been failing and calls are refused for now;
+                other errors are returned as an apology message
         """
         try:
-            # Tạo một đối tượng chat session
-            chat = self.model.start_chat(history=[])
-            
-            # Thêm system instructions nếu được cung cấp
-            if system_instructions:
-                chat.send_message(f"SYSTEM: {system_instructions}")
-            
-            # Thêm lịch sử trò chuyện
-            for msg in history[:-1]:  # Không thêm tin nhắn cuối cùng của người dùng
-                role = msg["role"]
-                content = msg["content"]
-                # Trong genai API mới, chúng ta gửi từng tin nhắn riêng lẻ
-                chat.send_message(content)
-            
-            # Lấy tin nhắn cuối cùng của người dùng
-            last_msg = history[-1] if history else {"content": ""}
-            
-            # Gửi tin nhắn cuối cùng và nhận phản hồi
-            response = chat.send_message(last_msg["content"])
+            response = self.resilience.call(
+                'generate_chat',
+                self._model_for(system_instructions).generate_content,
+                self._chat_contents(history, system_instructions)
+            )
             return response.text
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"Error generating chat response from Gemini API: {str(e)}")
             return f"Sorry, I encountered an error: {str(e)}"
+
+    def stream_chat_response(self, history: List[Dict[str, str]],
+                             system_instructions: Optional[str] = None) -> Iterator[str]:
+        """
+        Stream a response for an ongoing conversation chunk by chunk
+
+        Args:
+            history (List[Dict[str, str]]): List of message dictionaries with 'role' and 'content'
+            system_instructions (Optional[str]): System instructions to guide the model
+
+        Yields:
+            str: Pieces of the generated response, in order
+        """
+        try:
+            response = self.resilience.stream(
+                'stream_chat',
+                self._model_for(system_instructions).generate_content,
+                self._chat_contents(history, system_instructions),
+                stream=True
+            )
+            for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            logger.error(f"Error streaming chat response from Gemini API: {str(e)}")
+            raise
+
+    def generate_summary(self, messages: List[Dict[str, str]], previous_summary: Optional[str] = None,
+                         max_words: int = 150) -> str:
+        """
+        Fold messages into a running conversation summary
+
+        Args:
+            messages (List[Dict[str, str]]): Messages to fold in, oldest first
+            previous_summary (Optional[str]): Summary of everything before ``messages``
+            max_words (int): Length limit given to the model
+
+        Returns:
+            str: The updated summary
+
+        Raises:
+            Exception: API errors are raised, so a failed call never replaces
+                the stored summary with an error message
+        """
+        transcript = "\n".join(
+            f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}" for msg in messages
+        )
+        prompt = (
+            f"Previous summary:\n{previous_summary or '(none)'}\n\n"
+            f"New messages:\n{transcript}\n\n"
+            f"Write the updated summary in at most {max_words} words."
+        )
+        response = self.resilience.call('summary', self._model_for(SUMMARY_INSTRUCTION).generate_content, prompt)
+        return response.text.strip()
+
+    def _chat_contents(self, history: List[Dict[str, str]],
+                       system_instructions: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Structured, token-budgeted contents for one chat turn"""
+        # Tin nhắn vai trò system trong lịch sử bị bỏ qua, chỉ dùng system instruction
+        contents = build_contents(
+            history,
+            max_tokens=self.max_context_tokens,
+            reserved_tokens=estimate_tokens(system_instructions),
+        )
+        if not contents:
+            raise ValueError("Conversation history has no user message")
+        return contents
+
+    def _model_for(self, system_instructions: Optional[str] = None):
+        """Model bound to ``system_instructions`` (created once per distinct instruction)"""
+        if not system_instructions:
+            return self.model
+        model = self._models.get(system_instructions)
+        if model is None:
+            if len(self._models) >= MAX_CACHED_MODELS:
+                self._models.clear()
+            if isinstance(self.model, genai.GenerativeModel):
+                model = genai.GenerativeModel(self.model.model_name, system_instruction=system_instructions)
+            else:
+                model = self.model.with_system_instruction(system_instructions)
+            self._models[system_instructions] = model
+        return model
     
     def generate_multimodal_response(self, prompt: str, image_data: Union[str, bytes], 
-                                    context: Optional[str] = None) -> str:
+                                    context: Optional[str] = None, mime_type: str = 'image/jpeg') -> str:
         """
         Generate a response based on both text and image
         
         Args:
             prompt (str): The user's text prompt
-            image_data (Union[str, bytes]): Image data or URL
+            image_data (Union[str, bytes]): Image bytes, base64-encoded image or URL
             context (Optional[str]): Additional context
+            mime_type (str): MIME type of the image bytes
             
         Returns:
             str: The generated response
+            
+        Raises:
+            CircuitOpenError: The model has been failing and calls are refused for now;
+                other errors are returned as an apology message
         """
         try:
             # Chuẩn bị dữ liệu đầu vào
@@ -115,8 +349,10 @@ class GeminiClient:
                 image_part = {"image_url": image_data}
                 parts.append(image_part)
             else:
-                # Nếu là dữ liệu nhị phân
-                parts.append({"image": image_data})
+                # Nếu là dữ liệu nhị phân (hoặc base64): gửi dạng blob kèm MIME type
+                if isinstance(image_data, str):
+                    image_data = base64.b64decode(image_data)
+                parts.append({"mime_type": mime_type, "data": image_data})
             
             # Thêm context nếu có
             if context:
@@ -128,8 +364,35 @@ class GeminiClient:
             parts.append(full_prompt)
             
             # Tạo nội dung
-            response = self.model.generate_content(parts)
+            response = self.resilience.call('multimodal', self.model.generate_content, parts)
             return response.text
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"Error generating multimodal response from Gemini API: {str(e)}")
-            return f"Sorry, I encountered an error processing your image: {str(e)}"
\ No newline at end of file
+            return f"Sorry, I encountered an error processing your image: {str(e)}"
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> GeminiClient:
+    """
+    The process-wide client shared by views and consumers, so model objects
+    and the response cache are reused instead of rebuilt per request
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = GeminiClient()
+    return _client
+
+
+@receiver(setting_changed)
+def reset_client(setting, **kwargs):
+    """Rebuild the shared client when AI settings change (override_settings in tests)"""
+    global _client
+    if setting.startswith('AI_ASSISTANT_'):
+        _client = None
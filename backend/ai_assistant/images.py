@@ -0,0 +1,136 @@
+"""
+Image preparation for multimodal AI requests.
+
+Phone photos are often several megabytes and 12+ megapixels, far more than
+the model needs to describe them. Sent as-is they inflate the request, the
+worker's memory and the model's latency. Before an upload goes to the model
+it is:
+
+- decoded with Pillow in a small dedicated thread pool, so request threads
+  are not all decoding at once; for JPEG, ``draft`` lets the decoder scale
+  down while decoding
+- rotated according to its EXIF orientation, then downsized to at most
+  ``MAX_SIDE`` pixels on its longest side
+- re-encoded as JPEG at ``QUALITY`` (transparent images are flattened on
+  white); no metadata is copied, so EXIF (GPS position, device...) is stripped
+- cached in Django's cache by the SHA-256 of the uploaded bytes, so an image
+  sent again is not decoded again
+
+Configuration (settings.AI_ASSISTANT_IMAGES):
+    MAX_SIDE          = 1024
+    QUALITY           = 80
+    MAX_UPLOAD_BYTES  = 20 * 1024 * 1024
+    MAX_PIXELS        = 50_000_000    # decompression bomb guard
+    CACHE_TTL         = 86400         # seconds
+    WORKERS           = 2
+"""
+import hashlib
+import io
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+DEFAULT_IMAGES = {
+    'MAX_SIDE': 1024,
+    'QUALITY': 80,
+    'MAX_UPLOAD_BYTES': 20 * 1024 * 1024,
+    'MAX_PIXELS': 50_000_000,
+    'CACHE_TTL': 86400,
+    'WORKERS': 2,
+}
+
+CACHE_PREFIX = 'ai:image:'
+OUTPUT_MIME_TYPE = 'image/jpeg'
+
+
+class ImageProcessingError(ValueError):
+    """The upload is not an image we can prepare for the model"""
+
+
+class PreparedImage(NamedTuple):
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    original_bytes: int
+    digest: str
+    cached: bool = False
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - len(self.data)
+
+
+def get_image_settings() -> Dict[str, int]:
+    return {**DEFAULT_IMAGES, **getattr(settings, 'AI_ASSISTANT_IMAGES', {})}
+
+
+def _encode(raw: bytes, max_side: int, quality: int, max_pixels: int):
+    try:
+        image = Image.open(io.BytesIO(raw))
+        if image.width * image.height > max_pixels:
+            raise ImageProcessingError(f"Image is too large ({image.width}x{image.height} pixels)")
+        # JPEG: giải mã thẳng ở kích thước nhỏ hơn (scale DCT 1/2, 1/4, 1/8) thay vì giải mã đầy đủ rồi thu nhỏ
+        image.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        output = io.BytesIO()
+        image.save(output, format='JPEG', quality=quality)
+        return output.getvalue(), image.width, image.height
+    except ImageProcessingError:
+        raise
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as e:
+        raise ImageProcessingError(f"Could not read the image: {str(e)}")
+
+
+def prepare_image(raw: bytes) -> PreparedImage:
+    """Bounded, metadata-free JPEG version of ``raw`` (from the cache when it was seen before)"""
+    options = get_image_settings()
+    if len(raw) > options['MAX_UPLOAD_BYTES']:
+        raise ImageProcessingError(
+            f"Image is larger than {options['MAX_UPLOAD_BYTES'] // (1024 * 1024)} MB"
+        )
+
+    digest = hashlib.sha256(raw).hexdigest()
+    key = f"{CACHE_PREFIX}{options['MAX_SIDE']}:{options['QUALITY']}:{digest}"
+    cached = cache.get(key)
+    if cached is not None:
+        data, width, height = cached
+        return PreparedImage(data, OUTPUT_MIME_TYPE, width, height, len(raw), digest, cached=True)
+
+    data, width, height = _encode(raw, options['MAX_SIDE'], options['QUALITY'], options['MAX_PIXELS'])
+    cache.set(key, (data, width, height), options['CACHE_TTL'])
+    return PreparedImage(data, OUTPUT_MIME_TYPE, width, height, len(raw), digest)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=get_image_settings()['WORKERS'], thread_name_prefix='ai-image'
+                )
+    return _executor
+
+
+def submit_image(raw: bytes) -> 'Future[PreparedImage]':
+    """Start preparing ``raw`` in the image pool; the caller can do other work meanwhile"""
+    return _get_executor().submit(prepare_image, raw)
@@ -0,0 +1,263 @@
+"""
+Queue of AI text requests answered outside the HTTP request.
+
+A synchronous AITextRequestView call holds an HTTP worker for the whole
+model round-trip; under bursty load the pool runs dry and unrelated
+endpoints start timing out. In job mode (``"mode": "job"``) the view only
+stores the user message and an AIJob row, then answers 202 at once.
+``manage.py run_ai_workers`` drains the queue with a pool of worker
+coroutines:
+
+- jobs are claimed highest priority first, then oldest, with a conditional
+  UPDATE so two workers (or two processes) never take the same job
+- the model call runs in a thread and is answered like a synchronous
+  request (memory window, response cache for first turns)
+- the reply is saved, the job marked done and the reply pushed to the
+  ``ai_chat_{conversation_id}`` group, so open AI chat sockets receive it
+  like any other message; other clients poll ``GET /api/v1/ai/jobs/{id}/``
+- jobs left running by a worker that died are queued again after
+  ``STALE_AFTER`` seconds, up to ``MAX_ATTEMPTS`` runs
+- while the model circuit is open (see resilience.py) a claimed job goes
+  back to the queue and its worker waits for the circuit to let calls through
+
+Backpressure: once ``QUEUE_LIMIT`` jobs are waiting, ``enqueue`` raises
+AIQueueFull and the view answers 429 with a Retry-After header.
+
+Configuration (settings.AI_ASSISTANT_JOBS):
+    WORKERS        = 4
+    QUEUE_LIMIT    = 200
+    RETRY_AFTER    = 10     # seconds, sent with 429
+    POLL_INTERVAL  = 0.5    # seconds an idle worker waits before looking again
+    STALE_AFTER    = 300
+    MAX_ATTEMPTS   = 3
+"""
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Dict, Optional
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .gemini_client import get_client
+from .memory import load_history, refresh_summary_in_background
+from .models import AIConversation, AIJob, AIMessage
+from .resilience import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOBS = {
+    'WORKERS': 4,
+    'QUEUE_LIMIT': 200,
+    'RETRY_AFTER': 10,
+    'POLL_INTERVAL': 0.5,
+    'STALE_AFTER': 300,
+    'MAX_ATTEMPTS': 3,
+}
+
+PRIORITIES = {
+    'low': AIJob.PRIORITY_LOW,
+    'normal': AIJob.PRIORITY_NORMAL,
+    'high': AIJob.PRIORITY_HIGH,
+}
+
+
+class AIQueueFull(Exception):
+    """Too many jobs are waiting; the client should retry after ``retry_after`` seconds"""
+    def __init__(self, depth: int, retry_after: int):
+        super().__init__(f"The AI queue is full ({depth} requests waiting), please retry in {retry_after} seconds")
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+def get_job_settings() -> Dict:
+    return {**DEFAULT_JOBS, **getattr(settings, 'AI_ASSISTANT_JOBS', {})}
+
+
+def queue_depth() -> int:
+    return AIJob.objects.filter(status=AIJob.STATUS_QUEUED).count()
+
+
+def queue_position(job: AIJob) -> int:
+    """Number of queued jobs that will be claimed before ``job``"""
+    if job.status != AIJob.STATUS_QUEUED:
+        return 0
+    return AIJob.objects.filter(status=AIJob.STATUS_QUEUED).filter(
+        Q(priority__gt=job.priority) | Q(priority=job.priority, created_at__lt=job.created_at)
+    ).count()
+
+
+def enqueue(user, prompt: str, conversation: Optional[AIConversation] = None,
+            system_context: Optional[str] = None, priority: int = AIJob.PRIORITY_NORMAL) -> AIJob:
+    """
+    Save the user's message and queue the request for an answer
+
+    Raises:
+        AIQueueFull: ``QUEUE_LIMIT`` jobs are already waiting
+    """
+    options = get_job_settings()
+    depth = queue_depth()
+    if depth >= options['QUEUE_LIMIT']:
+        raise AIQueueFull(depth, options['RETRY_AFTER'])
+
+    with transaction.atomic():
+        if conversation is None:
+            conversation = AIConversation.objects.create(
+                user=user,
+                title=prompt[:50] + "..." if len(prompt) > 50 else prompt,
+                system_context=system_context
+            )
+        AIMessage.objects.create(conversation=conversation, role='user', content=prompt)
+        return AIJob.objects.create(
+            user=user,
+            conversation=conversation,
+            prompt=prompt,
+            system_context=system_context,
+            priority=priority,
+        )
+
+
+def claim_next(candidates: int = 5) -> Optional[AIJob]:
+    """Mark the next queued job as running and return it, or None if the queue is empty"""
+    job_ids = list(
+        AIJob.objects.filter(status=AIJob.STATUS_QUEUED)
+        .order_by('-priority', 'created_at', 'id')
+        .values_list('id', flat=True)[:candidates]
+    )
+    for job_id in job_ids:
+        # Chỉ một worker cập nhật được hàng còn ở trạng thái queued
+        claimed = AIJob.objects.filter(id=job_id, status=AIJob.STATUS_QUEUED).update(
+            status=AIJob.STATUS_RUNNING, started_at=timezone.now(), attempts=F('attempts') + 1
+        )
+        if claimed:
+            return AIJob.objects.select_related('conversation').get(id=job_id)
+    return None
+
+
+def execute_job(job: AIJob) -> AIMessage:
+    """Answer a claimed job and save the reply (blocking: run it in a thread)"""
+    memory = load_history(job.conversation, job.system_context)
+    client = get_client()
+    if memory.is_first_turn:
+        text = client.generate_text_response(prompt=job.prompt, context=memory.system_context)
+    else:
+        text = client.generate_chat_response(history=memory.history, system_instructions=memory.system_context)
+
+    with transaction.atomic():
+        message = AIMessage.objects.create(conversation=job.conversation, role='assistant', content=text)
+        AIJob.objects.filter(id=job.id).update(
+            status=AIJob.STATUS_DONE, response=message, error='', finished_at=timezone.now()
+        )
+    if memory.summary_due:
+        refresh_summary_in_background(job.conversation_id)
+    return message
+
+
+def fail_job(job_id: int, error: str) -> None:
+    AIJob.objects.filter(id=job_id).update(status=AIJob.STATUS_FAILED, error=error, finished_at=timezone.now())
+
+
+def release_job(job_id: int) -> None:
+    """Put a claimed job back in the queue without counting the attempt"""
+    AIJob.objects.filter(id=job_id).update(
+        status=AIJob.STATUS_QUEUED, started_at=None, attempts=F('attempts') - 1
+    )
+
+
+def requeue_stale() -> int:
+    """Queue again the jobs a dead worker left running; returns how many"""
+    options = get_job_settings()
+    stale = AIJob.objects.filter(
+        status=AIJob.STATUS_RUNNING,
+        started_at__lt=timezone.now() - timedelta(seconds=options['STALE_AFTER'])
+    )
+    stale.filter(attempts__gte=options['MAX_ATTEMPTS']).update(
+        status=AIJob.STATUS_FAILED, error='The worker running this job stopped', finished_at=timezone.now()
+    )
+    return stale.update(status=AIJob.STATUS_QUEUED, started_at=None)
+
+
+class AIJobWorkerPool:
+    """
+    Worker coroutines draining the AI job queue
+
+    Args:
+        workers (Optional[int]): Jobs answered concurrently
+        poll_interval (Optional[float]): Seconds an idle worker waits before looking again
+    """
+    def __init__(self, workers: Optional[int] = None, poll_interval: Optional[float] = None):
+        options = get_job_settings()
+        self.workers = workers or options['WORKERS']
+        self.poll_interval = options['POLL_INTERVAL'] if poll_interval is None else poll_interval
+        self.channel_layer = get_channel_layer()
+        self.processed = 0
+
+    async def run(self, stop: Optional[asyncio.Event] = None, drain: bool = False) -> int:
+        """
+        Answer jobs until ``stop`` is set, or until the queue is empty when ``drain``
+        is true. Returns the number of jobs processed.
+        """
+        requeued = await database_sync_to_async(requeue_stale)()
+        if requeued:
+            logger.warning(f"Requeued {requeued} AI jobs left running by a stopped worker")
+        await asyncio.gather(*(self.worker(stop, drain) for _ in range(self.workers)))
+        return self.processed
+
+    async def worker(self, stop: Optional[asyncio.Event], drain: bool) -> None:
+        while stop is None or not stop.is_set():
+            job = await database_sync_to_async(claim_next)(self.workers)
+            if job is None:
+                if drain:
+                    return
+                if stop is None:
+                    await asyncio.sleep(self.poll_interval)
+                else:
+                    try:
+                        await asyncio.wait_for(stop.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                continue
+            await self.process(job)
+
+    async def process(self, job: AIJob) -> None:
+        group = f'ai_chat_{job.conversation_id}'
+        await self.group_send(group, {'type': 'typing_indicator', 'is_typing': True, 'role': 'assistant'})
+        try:
+            # Lời gọi model chạy trong thread riêng, không chặn các worker khác
+            message = await database_sync_to_async(execute_job, thread_sensitive=False)(job)
+        except CircuitOpenError as e:
+            # Model đang lỗi: trả job về hàng đợi và chờ circuit thử lại thay vì đánh dấu thất bại
+            logger.warning(f"AI job {job.id} requeued: {str(e)}")
+            await database_sync_to_async(release_job)(job.id)
+            await asyncio.sleep(e.retry_after)
+        except Exception as e:
+            logger.error(f"Error in AI job {job.id}: {str(e)}")
+            await database_sync_to_async(fail_job)(job.id, str(e))
+            await self.group_send(group, {
+                'type': 'chat_message',
+                'message': f"Sorry, I encountered an error: {str(e)}",
+                'role': 'assistant',
+                'conversation_id': job.conversation_id,
+                'job_id': job.id,
+                'is_error': True
+            })
+        else:
+            await self.group_send(group, {
+                'type': 'chat_message',
+                'message': message.content,
+                'role': 'assistant',
+                'conversation_id': job.conversation_id,
+                'message_id': message.id,
+                'job_id': job.id
+            })
+        finally:
+            self.processed += 1
+            await self.group_send(group, {'type': 'typing_indicator', 'is_typing': False, 'role': 'assistant'})
+
+    async def group_send(self, group: str, event: Dict) -> None:
+        if self.channel_layer:
+            await self.channel_layer.group_send(group, event)
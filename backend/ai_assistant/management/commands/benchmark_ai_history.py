@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ai_assistant.fake_model import FakeGenerativeModel
+from ai_assistant.gemini_client import GeminiClient
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare model calls and latency per chat turn: replaying every previous message '
+        'into a chat session (old behaviour) versus one structured generate_content call, '
+        'against a stub model with a fixed per-call latency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lengths', type=int, nargs='+', default=[10, 40, 100],
+                            help='Conversation lengths (number of messages) to measure')
+        parser.add_argument('--latency', type=float, default=0.05, help='Seconds per model call')
+        parser.add_argument('--words', type=int, default=60, help='Words per message')
+
+    def replay(self, model, history, system_instructions):
+        """One turn the way the client used to do it: one send_message per previous message"""
+        chat = model.start_chat(history=[])
+        chat.send_message(f"SYSTEM: {system_instructions}")
+        for msg in history[:-1]:
+            chat.send_message(msg['content'])
+        return chat.send_message(history[-1]['content']).text
+
+    def handle(self, *args, **options):
+        system_instructions = 'You are a music assistant for the Spotify Chat app.'
+        text = ' '.join(f'word{i}' for i in range(options['words']))
+
+        for length in options['lengths']:
+            history = [
+                {'role': 'user' if i % 2 == 0 else 'assistant', 'content': text}
+                for i in range(length - 1 if length % 2 == 0 else length)
+            ]
+
+            model = FakeGenerativeModel(reply='ok', first_chunk_delay=options['latency'], chunk_delay=0)
+            started = time.perf_counter()
+            self.replay(model, history, system_instructions)
+            replay_time, replay_calls = time.perf_counter() - started, model.calls
+
+            model = FakeGenerativeModel(reply='ok', first_chunk_delay=options['latency'], chunk_delay=0)
+            client = GeminiClient(model=model)
+            started = time.perf_counter()
+            client.generate_chat_response(history, system_instructions=system_instructions)
+            single_time, single_calls = time.perf_counter() - started, model.calls
+
+            sent = len(model.last_contents)
+            self.stdout.write(
+                f'{len(history)} messages: replay {replay_calls} calls / {replay_time * 1000:.0f}ms, '
+                f'structured {single_calls} call / {single_time * 1000:.0f}ms '
+                f'({sent} turns within the token budget)'
+            )
+
+        self.stdout.write(self.style.SUCCESS('Done'))
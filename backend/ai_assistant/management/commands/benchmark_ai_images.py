@@ -0,0 +1,73 @@
+import io
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from ai_assistant.images import get_image_settings, prepare_image
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure what image preparation saves on multimodal requests: payload size, '
+        'preparation time (first upload and re-sent image) and the upload time of the '
+        'payload at a given bandwidth, for synthetic photos with EXIF'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', default=['4032x3024', '1920x1080', '800x600'],
+                            help='Photo sizes (WIDTHxHEIGHT)')
+        parser.add_argument('--quality', type=int, default=92, help='JPEG quality of the synthetic photos')
+        parser.add_argument('--upload-mbps', type=float, default=20.0,
+                            help='Bandwidth used to estimate the upload time of a payload to the model API')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement (median reported)')
+
+    def photo(self, width, height, quality):
+        """Photo-like JPEG: smooth gradient plus sensor noise, with EXIF orientation and camera tags"""
+        gradient = Image.radial_gradient('L').resize((width, height))
+        noise = Image.effect_noise((width, height), 40)
+        image = Image.merge('RGB', (gradient, noise, Image.blend(gradient, noise, 0.5)))
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90
+        exif[0x010F] = 'PhoneMaker'
+        exif[0x0110] = 'PhoneModel 12'
+        output = io.BytesIO()
+        image.save(output, format='JPEG', quality=quality, exif=exif.tobytes())
+        return output.getvalue()
+
+    def median_ms(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return sorted(timings)[len(timings) // 2]
+
+    def handle(self, *args, **options):
+        settings_used = get_image_settings()
+        bytes_per_ms = options['upload_mbps'] * 1_000_000 / 8 / 1000
+        self.stdout.write(f"MAX_SIDE={settings_used['MAX_SIDE']} QUALITY={settings_used['QUALITY']}")
+
+        for size in options['sizes']:
+            width, height = (int(value) for value in size.lower().split('x'))
+            raw = self.photo(width, height, options['quality'])
+
+            def cold():
+                cache.clear()
+                return prepare_image(raw)
+
+            cold_ms = self.median_ms(cold, options['repeat'])
+            prepared = prepare_image(raw)
+            cached_ms = self.median_ms(lambda: prepare_image(raw), options['repeat'])
+
+            before_ms = len(raw) / bytes_per_ms
+            after_ms = cold_ms + len(prepared.data) / bytes_per_ms
+            self.stdout.write(
+                f'{size}: {len(raw) / 1024:.0f} KB -> {len(prepared.data) / 1024:.0f} KB '
+                f'({prepared.width}x{prepared.height}, {prepared.bytes_saved / len(raw):.0%} saved); '
+                f'prepare {cold_ms:.1f}ms, re-sent {cached_ms:.2f}ms; '
+                f'payload + upload at {options["upload_mbps"]:g} Mbit/s: {before_ms:.0f}ms -> {after_ms:.0f}ms'
+            )
+
+        self.stdout.write(self.style.SUCCESS('Done'))
@@ -0,0 +1,52 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from ai_assistant.fake_model import FakeGenerativeModel
+from ai_assistant.gemini_client import GeminiClient
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare time-to-first-byte of blocking and streaming replies using the offline '
+        'fake model (no GEMINI_API_KEY or network needed)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--words', type=int, default=120, help='Number of words in each reply')
+        parser.add_argument('--first-chunk-delay', type=float, default=0.3)
+        parser.add_argument('--chunk-delay', type=float, default=0.05)
+        parser.add_argument('--chunk-words', type=int, default=4)
+
+    def handle(self, *args, **options):
+        model = FakeGenerativeModel(
+            reply=' '.join(f'word{i}' for i in range(options['words'])),
+            first_chunk_delay=options['first_chunk_delay'],
+            chunk_delay=options['chunk_delay'],
+            chunk_words=options['chunk_words'],
+        )
+        client = GeminiClient(model=model)
+
+        blocking, first_chunk, streamed_total = [], [], []
+        for _ in range(options['runs']):
+            started = time.perf_counter()
+            client.generate_text_response('benchmark')
+            blocking.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            first = None
+            for _chunk in client.stream_text_response('benchmark'):
+                if first is None:
+                    first = time.perf_counter() - started
+            first_chunk.append(first)
+            streamed_total.append(time.perf_counter() - started)
+
+        self.stdout.write(f'Blocking reply, first byte = full reply: {statistics.median(blocking) * 1000:.0f}ms')
+        self.stdout.write(f'Streaming reply, first chunk: {statistics.median(first_chunk) * 1000:.0f}ms')
+        self.stdout.write(f'Streaming reply, last chunk: {statistics.median(streamed_total) * 1000:.0f}ms')
+        self.stdout.write(self.style.SUCCESS(
+            f'Time-to-first-byte reduced {statistics.median(blocking) / statistics.median(first_chunk):.1f}x '
+            f'(median of {options["runs"]} runs)'
+        ))
@@ -0,0 +1,74 @@
+import itertools
+import random
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from ai_assistant.retrieval import (
+    KIND_ARTIST, KIND_GENRE, KIND_SONG, CatalogIndex, build_index,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Build a catalog retrieval index over a synthetic catalog (no database needed) '
+        'and measure lookup latency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--songs', type=int, default=1_000_000, help='Number of synthetic songs')
+        parser.add_argument('--queries', type=int, default=500, help='Number of lookups to time')
+        parser.add_argument('--vocabulary', type=int, default=50_000, help='Distinct title words')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def documents(self, options, rng):
+        words = [f'w{i}' for i in range(options['vocabulary'])]
+        # Tần suất từ theo phân phối Zipf như tên bài hát thật: vài từ rất phổ biến
+        cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+        artists = [f'artist{i} {rng.choice(words)}' for i in range(max(1, options['songs'] // 20))]
+        genres = [f'genre{i}' for i in range(50)]
+
+        for pk, name in enumerate(genres, 1):
+            yield KIND_GENRE, pk, name, [(name, 2.0)]
+        for pk, name in enumerate(artists, 1):
+            yield KIND_ARTIST, pk, name, [(name, 2.0)]
+        for pk in range(1, options['songs'] + 1):
+            title = ' '.join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(1, 5)))
+            artist, genre = rng.choice(artists), rng.choice(genres)
+            yield KIND_SONG, pk, f'{title} - {artist}', [(title, 2.0), (artist, 1.0), (genre, 0.5)]
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with tempfile.TemporaryDirectory() as path:
+            started = time.perf_counter()
+            meta = build_index(self.documents(options, rng), path)
+            self.stdout.write(
+                f'Built {meta["documents"]} documents, {meta["terms"]} terms, {meta["postings"]} postings '
+                f'in {time.perf_counter() - started:.1f}s'
+            )
+
+            index = CatalogIndex(path)
+            words = list(index.vocab)
+            queries = [' '.join(rng.choices(words, k=rng.randint(1, 4))) for _ in range(options['queries'])]
+            # Từ phổ biến nhất: trường hợp xấu nhất, phải đọc nhiều posting nhất
+            lengths = np.diff(index.indptr)
+            queries += [' '.join(words[term_id] for term_id in lengths.argsort()[-4:])] * 20
+            index.search(queries[0])
+
+            timings = []
+            for query in queries:
+                started = time.perf_counter()
+                index.search(query, k=5)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+
+            def percentile(p):
+                return timings[min(len(timings) - 1, int(len(timings) * p))]
+
+            self.stdout.write(
+                f'{len(timings)} lookups: p50 {percentile(0.5):.2f}ms, p95 {percentile(0.95):.2f}ms, '
+                f'p99 {percentile(0.99):.2f}ms, max {timings[-1]:.2f}ms'
+            )
+        self.stdout.write(self.style.SUCCESS('Done'))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ai_assistant.retrieval import build_index, catalog_documents, get_catalog_settings
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the catalog retrieval index used by the AI assistant from the database. '
+        'Running processes load the new build within RELOAD_INTERVAL seconds.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help='Index directory (default: AI_ASSISTANT_CATALOG["INDEX_DIR"])')
+
+    def handle(self, *args, **options):
+        path = options['path'] or get_catalog_settings()['INDEX_DIR']
+        started = time.perf_counter()
+        meta = build_index(catalog_documents(), path)
+        kinds = ', '.join(f'{count} {kind}' for kind, count in meta['kinds'].items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Built catalog index in {path}: {kinds}; {meta["terms"]} terms, {meta["postings"]} postings '
+            f'({time.perf_counter() - started:.1f}s)'
+        ))
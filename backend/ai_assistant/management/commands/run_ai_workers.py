@@ -0,0 +1,35 @@
+import asyncio
+import signal
+
+from django.core.management.base import BaseCommand
+
+from ai_assistant.jobs import AIJobWorkerPool
+
+
+class Command(BaseCommand):
+    help = (
+        'Answer queued AI text requests (generate-text with mode=job) with a pool of worker '
+        'coroutines, pushing each reply to the ai_chat_{conversation_id} group'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='Jobs answered concurrently (default: AI_ASSISTANT_JOBS["WORKERS"])')
+        parser.add_argument('--drain', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        pool = AIJobWorkerPool(workers=options['workers'])
+
+        async def main():
+            stop = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    loop.add_signal_handler(signum, stop.set)
+                except NotImplementedError:
+                    # Windows: Ctrl+C dừng tiến trình bằng KeyboardInterrupt
+                    pass
+            return await pool.run(stop=stop, drain=options['drain'])
+
+        self.stdout.write(f'Running {pool.workers} AI workers')
+        processed = asyncio.run(main())
+        self.stdout.write(self.style.SUCCESS(f'Stopped after answering {processed} AI jobs'))
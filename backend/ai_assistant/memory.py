@@ -0,0 +1,171 @@
+"""
+Bounded conversation memory for the AI assistant.
+
+Instead of reloading and sending the whole AIMessage history every turn, a
+turn sees:
+
+- the last ``WINDOW_MESSAGES`` messages verbatim, loaded newest-first through
+  the (conversation, -created_at) index
+- a rolling summary of everything older, stored on AIConversation and
+  passed to the model as part of the system instruction
+
+Once ``SUMMARY_EVERY`` unsummarised messages have fallen out of the window
+they are folded into the summary by one model call, in a background thread
+so the turn that triggered it is not delayed. ``summary_until_id`` only
+moves forward, so a slow or repeated refresh never overwrites a newer
+summary. Until that happens the unsummarised messages are still sent
+verbatim, so nothing drops out of the context.
+
+Per turn the model therefore receives at most
+``WINDOW_MESSAGES + SUMMARY_EVERY`` messages plus a summary of about
+``SUMMARY_WORDS`` words, however long the conversation gets.
+
+Configuration (settings.AI_ASSISTANT_MEMORY):
+    WINDOW_MESSAGES = 12
+    SUMMARY_EVERY   = 8
+    SUMMARY_BATCH   = 50     # most messages folded in by one summary call
+    SUMMARY_WORDS   = 150
+"""
+import logging
+import threading
+from typing import Dict, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .gemini_client import get_client
+from .models import AIConversation, AIMessage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEMORY = {
+    'WINDOW_MESSAGES': 12,
+    'SUMMARY_EVERY': 8,
+    'SUMMARY_BATCH': 50,
+    'SUMMARY_WORDS': 150,
+}
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def get_memory_settings() -> Dict[str, int]:
+    return {**DEFAULT_MEMORY, **getattr(settings, 'AI_ASSISTANT_MEMORY', {})}
+
+
+class Memory(NamedTuple):
+    history: List[Dict[str, str]]
+    system_context: Optional[str]
+    summary: str
+    tokens: int
+    summary_due: bool
+
+    @property
+    def is_first_turn(self) -> bool:
+        """Nothing precedes the user's message (the turn can be answered from the response cache)"""
+        return len(self.history) <= 1 and not self.summary
+
+
+def with_summary(system_context: Optional[str], summary: Optional[str]) -> Optional[str]:
+    """System instruction carrying the summary of the earlier conversation"""
+    if not summary:
+        return system_context
+    memory = f"Summary of the earlier conversation:\n{summary}"
+    return f"{system_context}\n\n{memory}" if system_context else memory
+
+
+def load_history(conversation: AIConversation, system_context: Optional[str] = None) -> Memory:
+    """
+    Load the memory window of ``conversation`` (its latest user message
+    included) with one indexed query
+
+    Args:
+        system_context: Instructions for this turn; defaults to the conversation's
+    """
+    options = get_memory_settings()
+    limit = options['WINDOW_MESSAGES'] + options['SUMMARY_EVERY']
+    rows = list(
+        AIMessage.objects.filter(conversation=conversation, id__gt=conversation.summary_until_id)
+        .order_by('-created_at')
+        .values('role', 'content', 'token_count')[:limit]
+    )
+    rows.reverse()
+
+    context = with_summary(system_context or conversation.system_context, conversation.summary)
+    return Memory(
+        history=[{'role': row['role'], 'content': row['content']} for row in rows],
+        system_context=context,
+        summary=conversation.summary,
+        tokens=sum(row['token_count'] for row in rows),
+        # The reply about to be saved makes one more unsummarised message
+        summary_due=len(rows) + 1 >= limit,
+    )
+
+
+class PendingSummary(NamedTuple):
+    previous_summary: str
+    messages: List[Dict[str, str]]
+    until_id: int
+
+
+def pending_summary(conversation_id: int) -> Optional[PendingSummary]:
+    """Messages outside the window waiting to be folded into the summary, if enough have piled up"""
+    options = get_memory_settings()
+    conversation = AIConversation.objects.only('summary', 'summary_until_id').get(id=conversation_id)
+    outside_window = list(
+        AIMessage.objects.filter(conversation_id=conversation_id, id__gt=conversation.summary_until_id)
+        .order_by('-created_at')
+        .values_list('id', flat=True)[options['WINDOW_MESSAGES']:]
+    )
+    if len(outside_window) < options['SUMMARY_EVERY']:
+        return None
+
+    ids = sorted(outside_window)[:options['SUMMARY_BATCH']]
+    messages = list(AIMessage.objects.filter(id__in=ids).order_by('created_at').values('role', 'content'))
+    return PendingSummary(conversation.summary, messages, ids[-1])
+
+
+def store_summary(conversation_id: int, summary: str, until_id: int) -> bool:
+    """Save a summary unless a newer one is already stored"""
+    return bool(
+        AIConversation.objects.filter(id=conversation_id, summary_until_id__lt=until_id).update(
+            summary=summary, summary_until_id=until_id, summary_updated_at=timezone.now()
+        )
+    )
+
+
+def refresh_summary(conversation_id: int, client=None) -> bool:
+    """Fold pending messages into the summary; returns True if it changed"""
+    pending = pending_summary(conversation_id)
+    if pending is None:
+        return False
+
+    client = client or get_client()
+    summary = client.generate_summary(
+        pending.messages,
+        previous_summary=pending.previous_summary,
+        max_words=get_memory_settings()['SUMMARY_WORDS'],
+    )
+    return store_summary(conversation_id, summary, pending.until_id)
+
+
+def refresh_summary_in_background(conversation_id: int) -> None:
+    """Run refresh_summary in a daemon thread, at most one per conversation at a time"""
+    with _refreshing_lock:
+        if conversation_id in _refreshing:
+            return
+        _refreshing.add(conversation_id)
+
+    def run():
+        close_old_connections()
+        try:
+            refresh_summary(conversation_id)
+        except Exception as e:
+            logger.error(f"Failed to refresh summary of AI conversation {conversation_id}: {str(e)}")
+        finally:
+            close_old_connections()
+            with _refreshing_lock:
+                _refreshing.discard(conversation_id)
+
+    threading.Thread(target=run, name=f'ai-summary-{conversation_id}', daemon=True).start()
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.1 on 2026-10-17 04:29
+
+from django.db import migrations, models
+from django.db.models.functions import Length
+
+
+def backfill_token_counts(apps, schema_editor):
+    """Estimate token counts of existing messages (~4 characters per token, as estimate_tokens)"""
+    AIMessage = apps.get_model('ai_assistant', 'AIMessage')
+    batch = []
+    for message_id, length in AIMessage.objects.annotate(length=Length('content')).values_list('id', 'length').iterator():
+        batch.append(AIMessage(id=message_id, token_count=(length or 0) // 4 + 1))
+        if len(batch) >= 1000:
+            AIMessage.objects.bulk_update(batch, ['token_count'])
+            batch = []
+    AIMessage.objects.bulk_update(batch, ['token_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_assistant', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aiconversation',
+            name='summary',
+            field=models.TextField(blank=True, default='', help_text='Rolling summary of the messages older than the memory window'),
+        ),
+        migrations.AddField(
+            model_name='aiconversation',
+            name='summary_until_id',
+            field=models.PositiveBigIntegerField(default=0, help_text='Messages with an id up to this value are folded into the summary'),
+        ),
+        migrations.AddField(
+            model_name='aiconversation',
+            name='summary_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='aimessage',
+            name='token_count',
+            field=models.PositiveIntegerField(default=0, help_text='Estimated number of tokens in the content'),
+        ),
+        migrations.AddIndex(
+            model_name='aimessage',
+            index=models.Index(fields=['conversation', '-created_at'], name='ai_message_window_idx'),
+        ),
+        migrations.RunPython(backfill_token_counts, migrations.RunPython.noop),
+    ]
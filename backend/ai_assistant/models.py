@@ -5,6 +5,8 @@ from django.db import models
 from django.conf import settings
 from django.utils import timezone
 
+from .gemini_client import estimate_tokens
+
 class AIConversation(models.Model):
     """Model to store AI conversation sessions"""
     user = models.ForeignKey(
@@ -17,6 +19,11 @@ class AIConversation(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     system_context = models.TextField(blank=True, null=True, 
         help_text="System context/instructions for this conversation")
+    summary = models.TextField(blank=True, default='',
+        help_text="Rolling summary of the messages older than the memory window")
+    summary_until_id = models.PositiveBigIntegerField(default=0,
+        help_text="Messages with an id up to this value are folded into the summary")
+    summary_updated_at = models.DateTimeField(blank=True, null=True)
     
     class Meta:
         ordering = ['-updated_at']
@@ -45,13 +52,82 @@ class AIMessage(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     has_image = models.BooleanField(default=False)
+    token_count = models.PositiveIntegerField(default=0,
+        help_text="Estimated number of tokens in the content")
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Loading the memory window: newest messages of one conversation
+            models.Index(fields=['conversation', '-created_at'], name='ai_message_window_idx'),
+        ]
         
     def __str__(self):
         return f"{self.role}: {self.content[:50]}..."
 
+    def save(self, *args, **kwargs):
+        if not self.token_count:
+            self.token_count = estimate_tokens(self.content)
+        super().save(*args, **kwargs)
+
+class AIJob(models.Model):
+    """A queued AI text request, answered by the workers of ``manage.py run_ai_workers``"""
+    PRIORITY_LOW = 0
+    PRIORITY_NORMAL = 5
+    PRIORITY_HIGH = 10
+    PRIORITY_CHOICES = (
+        (PRIORITY_LOW, 'Low'),
+        (PRIORITY_NORMAL, 'Normal'),
+        (PRIORITY_HIGH, 'High'),
+    )
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    )
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='ai_jobs'
+    )
+    conversation = models.ForeignKey(
+        AIConversation,
+        on_delete=models.CASCADE,
+        related_name='jobs'
+    )
+    prompt = models.TextField()
+    system_context = models.TextField(blank=True, null=True)
+    priority = models.PositiveSmallIntegerField(choices=PRIORITY_CHOICES, default=PRIORITY_NORMAL)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    response = models.ForeignKey(
+        AIMessage,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Claiming the next job: highest priority first, then oldest
+            models.Index(fields=['status', '-priority', 'created_at'], name='ai_job_queue_idx'),
+        ]
+    
+    def __str__(self):
+        return f"AIJob {self.id} ({self.status}) - {self.user_id}"
+
 class AISystemPrompt(models.Model):
     """Predefined system prompts for different AI use cases"""
     name = models.CharField(max_length=100)
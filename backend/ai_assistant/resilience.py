@@ -0,0 +1,397 @@
+"""
+Resilience layer around model calls: circuit breaker, retries with hedging
+and latency metrics.
+
+When the upstream model slows down or fails, every call used to wait for
+its full timeout and end as an error message, while callers kept piling on.
+Every GeminiClient call to the model now goes through ``Resilience.call``
+(or ``Resilience.stream``):
+
+- Circuit breaker: after ``FAILURE_THRESHOLD`` consecutive upstream errors
+  the circuit opens and calls fail at once with CircuitOpenError. After
+  ``RESET_TIMEOUT`` seconds one probe call is let through (half-open); its
+  success closes the circuit, its failure opens it again. Only transient
+  upstream errors (5xx, 429, deadlines, connection errors) count; a bad
+  request says nothing about the model's health.
+- Retries: a transient error is retried up to ``MAX_ATTEMPTS`` attempts in
+  total, ``RETRY_BACKOFF`` seconds apart (doubling). With ``HEDGE_DELAY``
+  set, a call still running after that many seconds gets a second,
+  identical attempt in parallel and the first success wins (trading extra
+  upstream calls for tail latency). Streams are only retried before their
+  first chunk and never hedged.
+- Metrics: per-method latency histograms, error and rejection counts,
+  retries and hedges, and time to first chunk for streams, exported by the
+  admin endpoint ``GET /api/v1/ai/metrics/``. Counters are per process.
+
+Configuration (settings.AI_ASSISTANT_RESILIENCE):
+    FAILURE_THRESHOLD  = 5
+    RESET_TIMEOUT      = 30     # seconds the circuit stays open before a probe
+    MAX_ATTEMPTS       = 2      # attempts per call, retries and hedges included
+    RETRY_BACKOFF      = 0.5    # seconds before the first retry
+    HEDGE_DELAY        = None   # e.g. 2.0 to hedge calls slower than 2 seconds
+"""
+import bisect
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from django.conf import settings
+from google.api_core import exceptions as api_exceptions
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESILIENCE = {
+    'FAILURE_THRESHOLD': 5,
+    'RESET_TIMEOUT': 30,
+    'MAX_ATTEMPTS': 2,
+    'RETRY_BACKOFF': 0.5,
+    'HEDGE_DELAY': None,
+}
+
+# Upper bounds of the latency buckets, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Lỗi tạm thời từ phía model: được thử lại và tính vào circuit breaker
+TRANSIENT_ERRORS = (
+    api_exceptions.ServerError,
+    api_exceptions.TooManyRequests,
+    api_exceptions.DeadlineExceeded,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+def is_transient(error: BaseException) -> bool:
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+class CircuitOpenError(Exception):
+    """The model has been failing; calls are refused until ``retry_after`` seconds have passed"""
+    def __init__(self, retry_after: float):
+        super().__init__(
+            f"The AI assistant is temporarily unavailable, please try again in {max(1, round(retry_after))} seconds"
+        )
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after ``failure_threshold`` consecutive failures -> half-open
+    (one probe) after ``reset_timeout`` seconds -> closed on success
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def retry_after(self) -> float:
+        """Seconds until a call may be let through (0 when one would be now)"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return 0.0
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                return remaining
+            return self.reset_timeout if self._probing else 0.0
+
+    def before_call(self) -> None:
+        """Admit a call or raise CircuitOpenError"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpenError(remaining)
+            if self._probing:
+                # Một lời gọi thăm dò đang chạy, các lời gọi khác vẫn bị từ chối
+                raise CircuitOpenError(self.reset_timeout)
+            self.state = self.HALF_OPEN
+            self._probing = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("AI model circuit closed")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                    logger.warning(f"AI model circuit opened after {self.failures} consecutive errors")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def release(self) -> None:
+        """A call ended without telling anything about the model's health (e.g. a bad request)"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        retry_after = self.retry_after()
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'times_opened': self.times_opened,
+                'retry_after': round(retry_after, 3),
+            }
+
+
+class LatencyHistogram:
+    """Latencies of one method in fixed buckets, with error/rejection counters"""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.calls = 0
+        self.errors = 0
+        self.rejected = 0
+        self.retries = 0
+        self.hedges = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Upper bound of the bucket holding the given fraction of observations"""
+        observed = sum(self.counts)
+        if not observed:
+            return None
+        rank = fraction * observed
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def snapshot(self) -> Dict[str, Any]:
+        observed = sum(self.counts)
+
+        def ms(seconds):
+            return None if seconds is None or seconds == float('inf') else round(seconds * 1000, 1)
+
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'rejected': self.rejected,
+            'error_rate': round(self.errors / self.calls, 4) if self.calls else 0.0,
+            'retries': self.retries,
+            'hedges': self.hedges,
+            'mean_ms': ms(self.total / observed) if observed else None,
+            'p50_ms': ms(self.percentile(0.5)),
+            'p95_ms': ms(self.percentile(0.95)),
+            'p99_ms': ms(self.percentile(0.99)),
+            'buckets': {
+                **{f'le_{ms(bound):g}ms': count for bound, count in zip(self.buckets, self.counts)},
+                'inf': self.counts[-1],
+            },
+        }
+
+
+class Resilience:
+    """
+    Circuit breaker, retries / hedging and metrics for one client's model calls
+
+    Args:
+        failure_threshold (int): Consecutive transient errors that open the circuit
+        reset_timeout (float): Seconds the circuit stays open before a probe
+        max_attempts (int): Attempts per call, retries and hedges included
+        retry_backoff (float): Seconds before the first retry (doubled after each)
+        hedge_delay (Optional[float]): Start a parallel attempt for calls slower than this
+    """
+    def __init__(self, failure_threshold: int = DEFAULT_RESILIENCE['FAILURE_THRESHOLD'],
+                 reset_timeout: float = DEFAULT_RESILIENCE['RESET_TIMEOUT'],
+                 max_attempts: int = DEFAULT_RESILIENCE['MAX_ATTEMPTS'],
+                 retry_backoff: float = DEFAULT_RESILIENCE['RETRY_BACKOFF'],
+                 hedge_delay: Optional[float] = DEFAULT_RESILIENCE['HEDGE_DELAY']):
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_backoff = retry_backoff
+        self.hedge_delay = hedge_delay
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @classmethod
+    def from_settings(cls) -> 'Resilience':
+        options = {**DEFAULT_RESILIENCE, **getattr(settings, 'AI_ASSISTANT_RESILIENCE', {})}
+        return cls(
+            failure_threshold=options['FAILURE_THRESHOLD'],
+            reset_timeout=options['RESET_TIMEOUT'],
+            max_attempts=options['MAX_ATTEMPTS'],
+            retry_backoff=options['RETRY_BACKOFF'],
+            hedge_delay=options['HEDGE_DELAY'],
+        )
+
+    def _histogram(self, method: str) -> LatencyHistogram:
+        histogram = self._histograms.get(method)
+        if histogram is None:
+            histogram = self._histograms.setdefault(method, LatencyHistogram())
+        return histogram
+
+    def _count(self, method: str, field: str, amount: int = 1) -> None:
+        with self._lock:
+            histogram = self._histogram(method)
+            setattr(histogram, field, getattr(histogram, field) + amount)
+
+    def _observe(self, method: str, seconds: float, error: bool = False) -> None:
+        with self._lock:
+            histogram = self._histogram(method)
+            histogram.calls += 1
+            histogram.errors += int(error)
+            histogram.observe(seconds)
+
+    def _admit(self, method: str) -> None:
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self._count(method, 'rejected')
+            raise
+
+    def _settle(self, error: Optional[BaseException]) -> None:
+        if error is None:
+            self.breaker.record_success()
+        elif is_transient(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.release()
+
+    def call(self, method: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Call ``func(*args, **kwargs)`` through the breaker, with retries / hedging"""
+        self._admit(method)
+        started = time.perf_counter()
+        try:
+            if self.hedge_delay and self.max_attempts > 1:
+                result = self._hedged(method, func, args, kwargs)
+            else:
+                result = self._retried(method, func, args, kwargs)
+        except Exception as e:
+            self._settle(e)
+            self._observe(method, time.perf_counter() - started, error=True)
+            raise
+        self._settle(None)
+        self._observe(method, time.perf_counter() - started)
+        return result
+
+    def _retried(self, method, func, args, kwargs):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_attempts or not is_transient(e):
+                    raise
+                logger.warning(f"Retrying AI call {method} after error: {str(e)}")
+                self._count(method, 'retries')
+                time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='ai-hedge')
+            return self._executor
+
+    def _hedged(self, method, func, args, kwargs):
+        executor = self._get_executor()
+        pending = {executor.submit(func, *args, **kwargs)}
+        launched, last_error = 1, None
+        while pending:
+            timeout = self.hedge_delay if launched < self.max_attempts else None
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # Quá HEDGE_DELAY mà chưa có kết quả: chạy song song thêm một lần thử
+                self._count(method, 'hedges')
+                pending.add(executor.submit(func, *args, **kwargs))
+                launched += 1
+                continue
+            for future in done:
+                error = future.exception()
+                if error is None:
+                    # Các lần thử còn lại chạy nốt trong nền, kết quả bị bỏ qua
+                    return future.result()
+                last_error = error
+                if not is_transient(error):
+                    raise error
+            if not pending and launched < self.max_attempts:
+                self._count(method, 'retries')
+                time.sleep(self.retry_backoff)
+                pending.add(executor.submit(func, *args, **kwargs))
+                launched += 1
+        raise last_error
+
+    def stream(self, method: str, func: Callable[..., Any], *args, **kwargs) -> Iterator[Any]:
+        """
+        Iterate over ``func(*args, **kwargs)`` through the breaker. A transient
+        error before the first item is retried; later ones are raised.
+        """
+        self._admit(method)
+        started = time.perf_counter()
+        first_item = False
+        attempt = 1
+        try:
+            while True:
+                try:
+                    for item in func(*args, **kwargs):
+                        if not first_item:
+                            first_item = True
+                            self._observe(f'{method}:first_chunk', time.perf_counter() - started)
+                        yield item
+                    break
+                except GeneratorExit:
+                    raise
+                except Exception as e:
+                    if first_item or attempt >= self.max_attempts or not is_transient(e):
+                        raise
+                    logger.warning(f"Retrying AI call {method} after error: {str(e)}")
+                    self._count(method, 'retries')
+                    time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+                    attempt += 1
+        except GeneratorExit:
+            # The caller stopped reading: neither a success nor an upstream failure
+            self.breaker.release()
+            raise
+        except Exception as e:
+            self._settle(e)
+            self._observe(method, time.perf_counter() - started, error=True)
+            raise
+        self._settle(None)
+        self._observe(method, time.perf_counter() - started)
+
+    def available(self) -> bool:
+        """Whether a call would currently be admitted (without admitting one)"""
+        return self.breaker.retry_after() == 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Breaker state and per-method metrics of this process"""
+        with self._lock:
+            methods = {method: histogram.snapshot() for method, histogram in sorted(self._histograms.items())}
+        return {
+            'circuit': self.breaker.snapshot(),
+            'config': {
+                'max_attempts': self.max_attempts,
+                'retry_backoff': self.retry_backoff,
+                'hedge_delay': self.hedge_delay,
+                'failure_threshold': self.breaker.failure_threshold,
+                'reset_timeout': self.breaker.reset_timeout,
+            },
+            'methods': methods,
+        }
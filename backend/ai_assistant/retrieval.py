@@ -0,0 +1,522 @@
+"""
+Catalog retrieval for the AI assistant.
+
+The model knows nothing about our library, so questions like "songs similar
+to X that you have" are answered from a local TF-IDF index over Song, Album,
+Artist and Genre. The top matches for a message are added to the system
+instruction (``catalog_context``), so the model recommends only what exists.
+
+The index lives in ``INDEX_DIR`` as plain NumPy arrays opened with
+``mmap_mode='r'``: workers share the pages through the OS cache, loading is
+instant and no network or model is involved.
+
+    meta.json            build id, start time, document count
+    vocab.json           terms; the position is the term id
+    idf.npy              float32[terms]
+    indptr.npy           int64[terms + 1]   postings of term t: indptr[t]:indptr[t + 1]
+    postings_doc.npy     int32[nnz]         per term, highest weight first
+    postings_weight.npy  float32[nnz]       tf-idf, documents L2-normalised
+    doc_keys.npy         int64[docs]        pk * 4 + kind
+    sorted_keys.npy      int64[docs]        doc_keys sorted, with
+    key_order.npy        int64[docs]        their document positions
+    label_offsets.npy    int64[docs + 1]
+    labels.npy           uint8[...]         UTF-8 labels, concatenated
+
+A lookup reads at most ``MAX_POSTINGS`` postings for each of the (at most
+``MAX_QUERY_TERMS``) query terms, adds them up in a per-thread scratch
+buffer and keeps the best with argpartition, so its cost does not grow with
+the catalog size. Text is case-folded and stripped of diacritics, so
+"son tung" matches "Sơn Tùng".
+
+Changes are applied incrementally: post_save / post_delete on the four models
+(ai_assistant/signals.py) update a small in-memory delta of the loaded index,
+which supersedes the base document. Bulk ``update()`` calls do not send
+signals and are picked up by the next rebuild (``manage.py
+build_catalog_index``, e.g. from cron). Other processes load a new build
+within ``RELOAD_INTERVAL`` seconds and keep the changes made after it started.
+The index is never built on the request path: until the command has produced
+a first build, retrieval returns no catalog context.
+
+Configuration (settings.AI_ASSISTANT_CATALOG):
+    ENABLED          = True
+    INDEX_DIR        = BASE_DIR / 'var' / 'catalog_index'
+    TOP_K            = 5
+    MIN_SCORE        = 0.2     # cosine similarity, 0..1
+    MAX_POSTINGS     = 10000
+    RELOAD_INTERVAL  = 60      # seconds between checks for a new build
+"""
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import threading
+import time
+import unicodedata
+import uuid
+from array import array
+from collections import Counter, defaultdict, namedtuple
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CATALOG = {
+    'ENABLED': True,
+    'INDEX_DIR': None,
+    'TOP_K': 5,
+    'MIN_SCORE': 0.2,
+    'MAX_POSTINGS': 10000,
+    'RELOAD_INTERVAL': 60,
+}
+
+KINDS = ('song', 'album', 'artist', 'genre')
+KIND_SONG, KIND_ALBUM, KIND_ARTIST, KIND_GENRE = range(len(KINDS))
+
+MAX_QUERY_TERMS = 8
+
+# Từ chỉ ý định trong câu hỏi, không giúp phân biệt bài hát
+STOPWORDS = frozenset("""
+    a an and any are by can find for from give have i in is it like list me my of on or our play please
+    recommend show similar some song songs something the to track tracks what which with you your
+    bai hat nhac cua cho toi minh tim goi y giong nhu va la co nao gi mot nhung cac trong ve
+""".split())
+
+CatalogHit = namedtuple('CatalogHit', ['kind', 'id', 'label', 'score'])
+
+# (kind, pk, label, [(text, weight), ...])
+Document = Tuple[int, int, str, List[Tuple[str, float]]]
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+_COMBINING = re.compile(r'[\u0300-\u036f]')
+
+
+def get_catalog_settings() -> Dict:
+    options = {**DEFAULT_CATALOG, **getattr(settings, 'AI_ASSISTANT_CATALOG', {})}
+    if not options['INDEX_DIR']:
+        options['INDEX_DIR'] = Path(settings.BASE_DIR) / 'var' / 'catalog_index'
+    return options
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Case-folded tokens without diacritics"""
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKD', text.casefold().replace('đ', 'd'))
+    return _TOKEN.findall(_COMBINING.sub('', text))
+
+
+def weighted_terms(fields: Iterable[Tuple[str, float]]) -> Counter:
+    """Term frequencies of a document, each field counted with its weight"""
+    terms = Counter()
+    for text, weight in fields:
+        for term in tokenize(text):
+            terms[term] += weight
+    return terms
+
+
+def _song_document(pk, title, artist, album, genre) -> Document:
+    extra = ', '.join(part for part in (album, genre) if part)
+    label = f"{title} - {artist}" + (f" ({extra})" if extra else '')
+    return KIND_SONG, pk, label, [(title, 2.0), (artist, 1.0), (album, 0.5), (genre, 0.5)]
+
+
+def _album_document(pk, title, artist) -> Document:
+    return KIND_ALBUM, pk, f"{title} - {artist}", [(title, 2.0), (artist, 1.0)]
+
+
+def _artist_document(pk, name) -> Document:
+    return KIND_ARTIST, pk, name, [(name, 2.0)]
+
+
+def _genre_document(pk, name) -> Document:
+    return KIND_GENRE, pk, name, [(name, 2.0)]
+
+
+def _sources():
+    from music.models import Album, Artist, Genre, Song
+    return {
+        Song: (('id', 'title', 'artist', 'album', 'genre'), _song_document),
+        Album: (('id', 'title', 'artist'), _album_document),
+        Artist: (('id', 'name'), _artist_document),
+        Genre: (('id', 'name'), _genre_document),
+    }
+
+
+def document_for(instance) -> Optional[Document]:
+    """Index document of a Song / Album / Artist / Genre instance"""
+    source = _sources().get(type(instance))
+    if source is None:
+        return None
+    fields, make = source
+    return make(*(getattr(instance, field) for field in fields))
+
+
+def catalog_documents() -> Iterator[Document]:
+    """Every document of the catalog, streamed from the database"""
+    for model, (fields, make) in _sources().items():
+        for row in model.objects.order_by().values_list(*fields).iterator(chunk_size=2000):
+            yield make(*row)
+
+
+def _swap_directory(source: Path, target: Path) -> None:
+    """Replace ``target`` by ``source``; open memory maps of the old files stay valid"""
+    old = None
+    if target.exists():
+        old = target.with_name(f'{target.name}.old-{uuid.uuid4().hex}')
+        os.rename(target, old)
+    os.rename(source, target)
+    if old is not None:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def build_index(documents: Iterable[Document], path, started_at: Optional[float] = None) -> Dict:
+    """
+    Build the index files for ``documents`` into ``path`` (replacing any previous build)
+
+    Args:
+        started_at (Optional[float]): When the documents were read; changes made
+            after it are kept by processes that reload this build
+    Returns:
+        The build's metadata
+    """
+    path = Path(path)
+    started_at = started_at or time.time()
+    vocab = {}
+    post_terms, post_docs, post_tfs = array('i'), array('i'), array('f')
+    doc_keys, label_offsets = array('q'), array('q', [0])
+    labels = bytearray()
+
+    for position, (kind, pk, label, fields) in enumerate(documents):
+        for term, tf in weighted_terms(fields).items():
+            post_terms.append(vocab.setdefault(term, len(vocab)))
+            post_docs.append(position)
+            post_tfs.append(tf)
+        doc_keys.append(pk * len(KINDS) + kind)
+        labels += label.encode('utf-8')
+        label_offsets.append(len(labels))
+
+    doc_count, term_count = len(doc_keys), len(vocab)
+    terms = np.frombuffer(post_terms, dtype=np.int32)
+    docs = np.frombuffer(post_docs, dtype=np.int32)
+    weights = np.frombuffer(post_tfs, dtype=np.float32).astype(np.float64)
+
+    df = np.bincount(terms, minlength=term_count)
+    idf = np.log((doc_count + 1) / (df + 1)) + 1
+    weights *= idf[terms]
+    norms = np.sqrt(np.bincount(docs, weights * weights, minlength=doc_count))
+    weights /= norms[docs]
+    # Theo từ, rồi theo trọng số giảm dần: đọc phần đầu là đủ cho top-k
+    order = np.lexsort((-weights, terms))
+    indptr = np.zeros(term_count + 1, dtype=np.int64)
+    np.cumsum(df, out=indptr[1:])
+
+    keys = np.frombuffer(doc_keys, dtype=np.int64)
+    key_order = np.argsort(keys, kind='stable')
+    meta = {
+        'build_id': uuid.uuid4().hex,
+        'started_at': started_at,
+        'built_at': time.time(),
+        'documents': doc_count,
+        'terms': term_count,
+        'postings': int(len(terms)),
+        'kinds': {name: int(count) for name, count in zip(KINDS, np.bincount(keys % len(KINDS), minlength=len(KINDS)))},
+    }
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    staging = path.with_name(f'{path.name}.tmp-{uuid.uuid4().hex}')
+    staging.mkdir()
+    np.save(staging / 'idf.npy', idf.astype(np.float32))
+    np.save(staging / 'indptr.npy', indptr)
+    np.save(staging / 'postings_doc.npy', docs[order])
+    np.save(staging / 'postings_weight.npy', weights[order].astype(np.float32))
+    np.save(staging / 'doc_keys.npy', keys)
+    np.save(staging / 'sorted_keys.npy', keys[key_order])
+    np.save(staging / 'key_order.npy', key_order.astype(np.int64))
+    np.save(staging / 'label_offsets.npy', np.frombuffer(label_offsets, dtype=np.int64))
+    np.save(staging / 'labels.npy', np.frombuffer(bytes(labels), dtype=np.uint8))
+    with open(staging / 'vocab.json', 'w', encoding='utf-8') as f:
+        json.dump(list(vocab), f, ensure_ascii=False)
+    # meta.json được ghi cuối cùng: thư mục chỉ hợp lệ khi đã có nó
+    with open(staging / 'meta.json', 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    _swap_directory(staging, path)
+    return meta
+
+
+def read_meta(path) -> Optional[Dict]:
+    try:
+        with open(Path(path) / 'meta.json', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class CatalogIndex:
+    """
+    Memory-mapped TF-IDF index of the catalog plus an in-memory delta of later changes
+
+    Args:
+        path: Directory written by ``build_index``
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.meta = read_meta(self.path)
+        if self.meta is None:
+            raise FileNotFoundError(f"No catalog index in {self.path}")
+        with open(self.path / 'vocab.json', encoding='utf-8') as f:
+            self.vocab = {term: term_id for term_id, term in enumerate(json.load(f))}
+
+        def load(name):
+            return np.load(self.path / f'{name}.npy', mmap_mode='r')
+
+        self.idf = load('idf')
+        self.indptr = load('indptr')
+        self.postings_doc = load('postings_doc')
+        self.postings_weight = load('postings_weight')
+        self.doc_keys = load('doc_keys')
+        self.sorted_keys = load('sorted_keys')
+        self.key_order = load('key_order')
+        self.label_offsets = load('label_offsets')
+        self.labels = load('labels')
+        self.doc_count = len(self.doc_keys)
+        self.unseen_idf = math.log(self.doc_count + 1) + 1
+
+        # key -> (changed_at, label or None when deleted, term frequencies)
+        self._delta = {}
+        self._delta_postings = defaultdict(dict)
+        self._tombstones = set()
+        self._tombstone_array = np.empty(0, dtype=np.int64)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def build_id(self) -> str:
+        return self.meta['build_id']
+
+    def __len__(self) -> int:
+        with self._lock:
+            added = sum(1 for key, entry in self._delta.items() if entry[1] is not None and self._position(key) is None)
+            return self.doc_count - len(self._tombstones) + added
+
+    def _scratch(self) -> np.ndarray:
+        """Score accumulator of this thread, all zeros between lookups"""
+        scratch = getattr(self._local, 'scores', None)
+        if scratch is None:
+            scratch = self._local.scores = np.zeros(self.doc_count, dtype=np.float32)
+        return scratch
+
+    def _position(self, key: int) -> Optional[int]:
+        index = int(np.searchsorted(self.sorted_keys, key))
+        if index < self.doc_count and self.sorted_keys[index] == key:
+            return int(self.key_order[index])
+        return None
+
+    def _label(self, position: int) -> str:
+        start, end = self.label_offsets[position], self.label_offsets[position + 1]
+        return self.labels[start:end].tobytes().decode('utf-8')
+
+    def _weights(self, terms: Counter) -> Dict[str, float]:
+        """L2-normalised tf-idf weights under this build's IDF"""
+        weights = {
+            term: tf * (float(self.idf[self.vocab[term]]) if term in self.vocab else self.unseen_idf)
+            for term, tf in terms.items()
+        }
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        return {term: weight / norm for term, weight in weights.items()} if norm else {}
+
+    def _apply(self, key: int, changed_at: float, label: Optional[str], terms: Counter) -> None:
+        """Record a change (caller holds the lock)"""
+        previous = self._delta.pop(key, None)
+        if previous is not None:
+            for term in previous[2]:
+                postings = self._delta_postings.get(term)
+                if postings is not None:
+                    postings.pop(key, None)
+                    if not postings:
+                        del self._delta_postings[term]
+        self._delta[key] = (changed_at, label, terms)
+        if label is not None:
+            for term, weight in self._weights(terms).items():
+                self._delta_postings[term][key] = weight
+
+        position = self._position(key)
+        if position is not None and position not in self._tombstones:
+            self._tombstones.add(position)
+            self._tombstone_array = np.fromiter(self._tombstones, dtype=np.int64, count=len(self._tombstones))
+
+    def upsert(self, kind: int, pk: int, label: str, fields: List[Tuple[str, float]]) -> None:
+        """Index a new or changed document"""
+        terms = weighted_terms(fields)
+        with self._lock:
+            self._apply(pk * len(KINDS) + kind, time.time(), label, terms)
+
+    def remove(self, kind: int, pk: int) -> None:
+        """Drop a deleted document"""
+        with self._lock:
+            self._apply(pk * len(KINDS) + kind, time.time(), None, Counter())
+
+    def adopt_changes(self, other: 'CatalogIndex') -> None:
+        """Carry over the changes ``other`` received after this build started reading the database"""
+        with other._lock:
+            changes = [(key, entry) for key, entry in other._delta.items() if entry[0] >= self.meta['started_at']]
+        with self._lock:
+            for key, (changed_at, label, terms) in changes:
+                self._apply(key, changed_at, label, terms)
+
+    def search(self, query: str, k: int = 5, min_score: float = 0.0, kinds: Optional[Sequence[str]] = None,
+               max_postings: int = DEFAULT_CATALOG['MAX_POSTINGS']) -> List[CatalogHit]:
+        """
+        Top ``k`` documents by cosine similarity to ``query``
+
+        Args:
+            kinds (Optional[Sequence[str]]): Restrict to some of 'song', 'album', 'artist', 'genre'
+            max_postings (int): Postings read per query term (highest weights first)
+        """
+        counts = Counter(term for term in tokenize(query) if term not in STOPWORDS)
+        if not counts or k <= 0:
+            return []
+        query_weights = self._weights(counts)
+        terms = sorted(query_weights, key=query_weights.get, reverse=True)[:MAX_QUERY_TERMS]
+        kind_ids = None if kinds is None else np.array([KINDS.index(kind) for kind in kinds])
+
+        with self._lock:
+            tombstones = self._tombstone_array
+            delta = [(term, list(self._delta_postings[term].items())) for term in terms if term in self._delta_postings]
+            delta_labels = {key: entry[1] for key, entry in self._delta.items() if entry[1] is not None} if delta else {}
+
+        candidates = {}
+        doc_parts, weight_parts = [], []
+        for term in terms:
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start = int(self.indptr[term_id])
+            end = min(int(self.indptr[term_id + 1]), start + max_postings)
+            doc_parts.append(self.postings_doc[start:end])
+            weight_parts.append(self.postings_weight[start:end] * np.float32(query_weights[term]))
+
+        if doc_parts:
+            docs = np.concatenate(doc_parts)
+            weights = np.concatenate(weight_parts)
+            if kind_ids is not None:
+                mask = np.isin(self.doc_keys[docs] % len(KINDS), kind_ids)
+                docs, weights = docs[mask], weights[mask]
+            scores = self._scratch()
+            np.add.at(scores, docs, weights)
+            scores[tombstones] = 0
+            doc_scores = scores[docs]
+            scores[docs] = 0
+            # Mỗi tài liệu xuất hiện tối đa len(terms) lần trong docs
+            limit = min(len(docs), k * len(terms))
+            top = np.argpartition(-doc_scores, limit - 1)[:limit] if limit < len(docs) else np.arange(len(docs))
+            for i in top:
+                score = float(doc_scores[i])
+                if score > 0:
+                    candidates[('base', int(docs[i]))] = score
+
+        delta_scores = Counter()
+        for term, postings in delta:
+            for key, weight in postings:
+                delta_scores[key] += weight * query_weights[term]
+        for key, score in delta_scores.items():
+            if kind_ids is None or key % len(KINDS) in kind_ids:
+                candidates[('delta', key)] = score
+
+        best = sorted(candidates.items(), key=lambda item: item[1], reverse=True)
+        hits = []
+        for (source, ref), score in best:
+            if score < min_score or len(hits) >= k:
+                break
+            if source == 'base':
+                key, label = int(self.doc_keys[ref]), self._label(ref)
+            else:
+                key, label = ref, delta_labels[ref]
+            hits.append(CatalogHit(KINDS[key % len(KINDS)], key // len(KINDS), label, round(score, 4)))
+        return hits
+
+
+_index = None
+_index_lock = threading.Lock()
+_checked_at = 0.0
+
+
+def loaded_catalog_index() -> Optional[CatalogIndex]:
+    """The index of this process if it was already loaded (signals never trigger a build)"""
+    return _index
+
+
+def get_catalog_index() -> Optional[CatalogIndex]:
+    """
+    The process-wide index loaded from INDEX_DIR, reloaded when a new build
+    appears; None until ``build_catalog_index`` has written a first build
+    """
+    global _index, _checked_at
+    options = get_catalog_settings()
+    path = Path(options['INDEX_DIR'])
+    now = time.monotonic()
+
+    if _checked_at and now - _checked_at < options['RELOAD_INTERVAL']:
+        return _index
+
+    with _index_lock:
+        if not _checked_at or now - _checked_at >= options['RELOAD_INTERVAL']:
+            meta = read_meta(path)
+            if meta is None:
+                if _index is None:
+                    logger.warning(f"Catalog index not built yet in {path}: run manage.py build_catalog_index")
+            elif _index is None:
+                _index = CatalogIndex(path)
+            elif meta['build_id'] != _index.build_id:
+                index = CatalogIndex(path)
+                index.adopt_changes(_index)
+                _index = index
+            _checked_at = now
+    return _index
+
+
+def search_catalog(query: str, k: Optional[int] = None, kinds: Optional[Sequence[str]] = None) -> List[CatalogHit]:
+    """Catalog items matching ``query``; never raises (retrieval must not break a chat turn)"""
+    options = get_catalog_settings()
+    if not options['ENABLED'] or not query:
+        return []
+    try:
+        index = get_catalog_index()
+        if index is None:
+            return []
+        return index.search(
+            query,
+            k=k or options['TOP_K'],
+            min_score=options['MIN_SCORE'],
+            kinds=kinds,
+            max_postings=options['MAX_POSTINGS'],
+        )
+    except Exception as e:
+        logger.error(f"Catalog search failed: {str(e)}")
+        return []
+
+
+def catalog_context(query: str, k: Optional[int] = None) -> Optional[str]:
+    """Top catalog matches for ``query`` formatted for the system instruction, or None"""
+    hits = search_catalog(query, k)
+    if not hits:
+        return None
+    lines = '\n'.join(f"- {hit.kind} #{hit.id}: {hit.label}" for hit in hits)
+    return (
+        "Items from this app's music catalog that match the user's message. When the user asks "
+        "what the library contains or wants recommendations from it, use only these:\n" + lines
+    )
+
+
+@receiver(setting_changed)
+def reset_catalog_index(setting, **kwargs):
+    """Drop the loaded index when its settings change (override_settings in tests)"""
+    global _index, _checked_at
+    if setting == 'AI_ASSISTANT_CATALOG':
+        _index, _checked_at = None, 0.0
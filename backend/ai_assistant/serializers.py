@@ -2,7 +2,7 @@
 Serializers for the AI Assistant app
 """
 from rest_framework import serializers
-from .models import AIConversation, AIMessage, AISystemPrompt
+from .models import AIConversation, AIJob, AIMessage, AISystemPrompt
 
 class AIMessageSerializer(serializers.ModelSerializer):
     """Serializer for individual AI messages"""
@@ -40,6 +40,27 @@ class AITextRequestSerializer(serializers.Serializer):
     prompt = serializers.CharField(required=True)
     conversation_id = serializers.IntegerField(required=False, allow_null=True)
     system_context = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+    # 'job': xếp hàng yêu cầu và trả về 202 ngay, kết quả lấy qua /jobs/{id}/ hoặc WebSocket
+    mode = serializers.ChoiceField(choices=['sync', 'job'], required=False, default='sync')
+    priority = serializers.ChoiceField(choices=['low', 'normal', 'high'], required=False, default='normal')
+
+class AIJobSerializer(serializers.ModelSerializer):
+    """Serializer for queued AI requests (job mode)"""
+    priority = serializers.CharField(source='get_priority_display', read_only=True)
+    response = serializers.CharField(source='response.content', read_only=True, default=None)
+    message_id = serializers.IntegerField(source='response_id', read_only=True)
+    position = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = AIJob
+        fields = ['id', 'status', 'priority', 'conversation', 'position', 'response', 'message_id',
+                  'error', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
+    
+    def get_position(self, obj):
+        """Number of queued requests that will be answered first"""
+        from .jobs import queue_position
+        return queue_position(obj)
 
 class AIMultiModalRequestSerializer(serializers.Serializer):
     """Serializer for multimodal (text + image) AI requests"""
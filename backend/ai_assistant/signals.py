@@ -0,0 +1,44 @@
+"""
+Signals keeping the catalog retrieval index (ai_assistant/retrieval.py) up to date
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from music.catalog import SONG_LINKS
+from music.models import Album, Artist, Genre, Song
+
+from .retrieval import document_for, loaded_catalog_index
+
+
+@receiver(post_save, sender=Song)
+@receiver(post_save, sender=Album)
+@receiver(post_save, sender=Artist)
+@receiver(post_save, sender=Genre)
+def index_catalog_object(sender, instance, raw=False, created=False, **kwargs):
+    """Add or update the object in the loaded index, and the songs showing its new name"""
+    index = loaded_catalog_index()
+    if raw or index is None:
+        return
+    index.upsert(*document_for(instance))
+
+    if sender is Song or created:
+        return
+    # music.signals.rename_linked_songs đã cập nhật tên trên các bài hát bằng update()
+    _, ref_field, _, name_field = next(link for link in SONG_LINKS if link[2] is sender)
+    if getattr(instance, '_old_catalog_name', None) in (None, getattr(instance, name_field)):
+        return
+    for song in Song.objects.filter(**{ref_field: instance}).only('id', 'title', 'artist', 'album', 'genre'):
+        index.upsert(*document_for(song))
+
+
+@receiver(post_delete, sender=Song)
+@receiver(post_delete, sender=Album)
+@receiver(post_delete, sender=Artist)
+@receiver(post_delete, sender=Genre)
+def remove_catalog_object(sender, instance, **kwargs):
+    """Drop the object from the loaded index"""
+    index = loaded_catalog_index()
+    if index is None:
+        return
+    kind, pk = document_for(instance)[:2]
+    index.remove(kind, pk)
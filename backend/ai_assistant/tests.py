@@ -0,0 +1,774 @@
+import asyncio
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+
+import numpy as np
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from google.api_core import exceptions as api_exceptions
+from PIL import Image
+from rest_framework.test import APIClient
+
+from chat.models import Conversation
+from chat.routing import websocket_urlpatterns as chat_websocket_urlpatterns
+from music.models import Artist, Song
+
+from .cache import ResponseCache, normalize_prompt
+from .fake_model import FakeGenerativeModel, FaultInjectingModel
+from .gateway import AIGateway, AIGatewayBusy, AIGatewayTimeout, get_gateway
+from .gemini_client import GeminiClient, build_contents, estimate_tokens, get_client
+from .images import ImageProcessingError, prepare_image
+from .jobs import AIJobWorkerPool, claim_next, enqueue, requeue_stale
+from .memory import load_history, refresh_summary
+from .models import AIConversation, AIJob, AIMessage
+from .resilience import CircuitOpenError, Resilience
+from .retrieval import (
+    CatalogIndex, build_index, catalog_documents, get_catalog_index, loaded_catalog_index, search_catalog,
+)
+from .routing import websocket_urlpatterns
+
+User = get_user_model()
+
+FAKE_MODEL_SETTINGS = {
+    'FIRST_CHUNK_DELAY': 0.2,
+    'CHUNK_DELAY': 0.05,
+    'CHUNK_WORDS': 2,
+}
+
+
+# Consumers build the catalog index on first use: keep it out of the source tree
+_catalog_dir = None
+_catalog_settings = None
+
+
+def setUpModule():
+    global _catalog_dir, _catalog_settings
+    _catalog_dir = tempfile.mkdtemp()
+    _catalog_settings = override_settings(AI_ASSISTANT_CATALOG={'INDEX_DIR': _catalog_dir})
+    _catalog_settings.enable()
+
+
+def tearDownModule():
+    _catalog_settings.disable()
+    shutil.rmtree(_catalog_dir, ignore_errors=True)
+
+
+async def receive_until(communicator, predicate, timeout=5):
+    """Collect (arrival time, frame) pairs until ``predicate(frame)`` is true"""
+    frames = []
+    while True:
+        frame = json.loads(await communicator.receive_from(timeout=timeout))
+        frames.append((time.perf_counter(), frame))
+        if predicate(frame):
+            return frames
+
+
+class StreamingResponseTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='listener', email='listener@example.com', password='pass12345')
+
+    def test_client_streams_chunks_in_order(self):
+        model = FakeGenerativeModel(reply='one two three four five', first_chunk_delay=0, chunk_delay=0, chunk_words=2)
+        client = GeminiClient(model=model)
+
+        chunks = list(client.stream_text_response('hello'))
+        self.assertEqual(chunks, ['one two ', 'three four ', 'five'])
+
+        history = [{'role': 'user', 'content': 'hi'}, {'role': 'assistant', 'content': 'hey'},
+                   {'role': 'user', 'content': 'again'}]
+        self.assertEqual(''.join(client.stream_chat_response(history)), 'one two three four five')
+
+    @override_settings(AI_ASSISTANT_MODEL_BACKEND='fake', AI_ASSISTANT_FAKE_MODEL=FAKE_MODEL_SETTINGS)
+    def test_consumer_forwards_deltas_before_persisting_reply(self):
+        async def scenario():
+            communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/ai/chat/')
+            communicator.scope['user'] = self.user
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+
+            started = time.perf_counter()
+            await communicator.send_to(text_data=json.dumps({
+                'type': 'message', 'message': 'play something calm for tonight please'
+            }))
+            frames = await receive_until(
+                communicator, lambda f: f.get('type') == 'message' and f.get('role') == 'assistant'
+            )
+            await communicator.disconnect()
+            return started, frames
+
+        started, frames = async_to_sync(scenario)()
+
+        deltas = [(at, f) for at, f in frames if f['type'] == 'message_delta']
+        final_at, final = frames[-1]
+        self.assertGreater(len(deltas), 1)
+        self.assertEqual([f['index'] for _, f in deltas], list(range(len(deltas))))
+        self.assertEqual(''.join(f['delta'] for _, f in deltas), final['message'])
+        self.assertTrue(all(f['stream_id'] == final['stream_id'] for _, f in deltas))
+
+        # The first chunk arrives after the simulated time-to-first-byte, well before the full reply
+        first_delta_at = deltas[0][0]
+        self.assertLess(first_delta_at - started, final_at - started - 0.1)
+
+        conversation = AIConversation.objects.get(user=self.user)
+        replies = AIMessage.objects.filter(conversation=conversation, role='assistant')
+        self.assertEqual(replies.count(), 1)
+        self.assertEqual(replies.get().id, final['message_id'])
+        self.assertEqual(replies.get().content, 'You said: play something calm for tonight please')
+
+
+class ChatHistoryTest(TransactionTestCase):
+    def history(self, length, words=20):
+        text = ' '.join(['word'] * words)
+        return [
+            {'role': 'user' if i % 2 == 0 else 'assistant', 'content': f'{i} {text}'}
+            for i in range(length)
+        ]
+
+    def test_chat_turn_is_a_single_structured_call(self):
+        model = FakeGenerativeModel(reply='sure', first_chunk_delay=0, chunk_delay=0)
+        client = GeminiClient(model=model)
+        history = self.history(41)
+
+        response = client.generate_chat_response(history, system_instructions='Be brief.')
+
+        self.assertEqual(response, 'sure')
+        self.assertEqual(model.calls, 1)
+        self.assertEqual([turn['role'] for turn in model.last_contents[:4]], ['user', 'model', 'user', 'model'])
+        self.assertEqual(model.last_contents[-1], {'role': 'user', 'parts': [history[-1]['content']]})
+        # The system prompt travels as a system instruction, not as a conversation turn
+        self.assertEqual(client._model_for('Be brief.').system_instruction, 'Be brief.')
+        self.assertFalse(any('Be brief.' in turn['parts'][0] for turn in model.last_contents))
+
+    def test_history_is_truncated_to_token_budget(self):
+        history = self.history(201, words=50)
+        contents = build_contents(history, max_tokens=2000, reserved_tokens=100)
+
+        self.assertLessEqual(sum(estimate_tokens(turn['parts'][0]) for turn in contents), 1900)
+        self.assertEqual(contents[0]['role'], 'user')
+        self.assertEqual(contents[-1]['parts'][0], history[-1]['content'])
+        self.assertLess(len(contents), len(history))
+
+        # The newest user turn survives even when it alone exceeds the budget
+        self.assertEqual(len(build_contents(history, max_tokens=10)), 1)
+
+    def test_same_role_messages_are_merged(self):
+        contents = build_contents([
+            {'role': 'user', 'content': 'hi'},
+            {'role': 'system', 'content': 'ignored'},
+            {'role': 'user', 'content': 'anyone?'},
+        ])
+        self.assertEqual(contents, [{'role': 'user', 'parts': ['hi\n\nanyone?']}])
+
+
+class AIGatewayTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_per_user_cap_and_timeout(self):
+        gateway = AIGateway(max_concurrency=4, max_per_user=1, timeout=0.2)
+
+        async def scenario():
+            slow = asyncio.create_task(gateway.run(1, time.sleep, 0.1))
+            await asyncio.sleep(0.01)
+            with self.assertRaises(AIGatewayBusy):
+                await gateway.run(1, time.sleep, 0)
+            # Other users are not affected by user 1's cap
+            await gateway.run(2, time.sleep, 0)
+            await slow
+
+            with self.assertRaises(AIGatewayTimeout):
+                await gateway.run(1, time.sleep, 0.5)
+            return gateway.in_flight()
+
+        self.assertEqual(async_to_sync(scenario)(), 0)
+
+    @override_settings(AI_ASSISTANT_MODEL_BACKEND='fake', AI_ASSISTANT_FAKE_MODEL={
+        'FIRST_CHUNK_DELAY': 1.0, 'CHUNK_DELAY': 0, 'CHUNK_WORDS': 50,
+    })
+    def test_chat_sockets_stay_responsive_during_ai_generations(self):
+        users = [
+            User.objects.create_user(username=f'ai{i}', email=f'ai{i}@example.com', password='pass12345')
+            for i in range(10)
+        ]
+        alice, bob = users[:2]
+        conversation = Conversation.get_or_create_conversation(alice, bob)
+
+        async def scenario():
+            ai_sockets = []
+            for user in users:
+                communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/ai/chat/')
+                communicator.scope['user'] = user
+                await communicator.connect()
+                ai_sockets.append(communicator)
+
+            chat = WebsocketCommunicator(
+                URLRouter(chat_websocket_urlpatterns), f'/ws/chat/{conversation.id}/'
+            )
+            chat.scope['user'] = alice
+            await chat.connect()
+            await chat.receive_from()  # CONNECTED
+
+            for communicator in ai_sockets:
+                await communicator.send_to(text_data=json.dumps({
+                    'type': 'message', 'message': 'recommend me a song', 'stream': False
+                }))
+            await asyncio.sleep(0.2)
+            in_flight = get_gateway().in_flight()
+
+            round_trips = []
+            for i in range(3):
+                started = time.perf_counter()
+                await chat.send_to(text_data=json.dumps({'message': f'ping {i}'}))
+                frame = json.loads(await chat.receive_from(timeout=2))
+                round_trips.append(time.perf_counter() - started)
+                self.assertEqual(frame['data']['message'], f'ping {i}')
+
+            replies = 0
+            for communicator in ai_sockets:
+                frames = await receive_until(
+                    communicator, lambda f: f.get('type') == 'message' and f.get('role') == 'assistant'
+                )
+                replies += frames[-1][1]['message'] == 'You said: recommend me a song'
+                await communicator.disconnect()
+            await chat.disconnect()
+            return in_flight, round_trips, replies
+
+        in_flight, round_trips, replies = async_to_sync(scenario)()
+
+        self.assertEqual(in_flight, 10)
+        # Each generation holds its call for a second; chat messages must not wait for them
+        self.assertLess(max(round_trips), 0.3)
+        self.assertEqual(replies, 10)
+
+    @override_settings(AI_ASSISTANT_MODEL_BACKEND='fake', AI_ASSISTANT_FAKE_MODEL={
+        'FIRST_CHUNK_DELAY': 0.3, 'CHUNK_DELAY': 0.3, 'CHUNK_WORDS': 1,
+    })
+    def test_disconnect_cancels_generation(self):
+        user = User.objects.create_user(username='leaver', email='leaver@example.com', password='pass12345')
+
+        async def scenario():
+            communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/ai/chat/')
+            communicator.scope['user'] = user
+            await communicator.connect()
+            await communicator.send_to(text_data=json.dumps({
+                'type': 'message', 'message': 'a long question that streams slowly'
+            }))
+            await receive_until(communicator, lambda f: f.get('type') == 'message_delta')
+            await communicator.disconnect()
+            await asyncio.sleep(0.1)
+            return get_gateway().in_flight(user.id)
+
+        self.assertEqual(async_to_sync(scenario)(), 0)
+        self.assertFalse(AIMessage.objects.filter(conversation__user=user, role='assistant').exists())
+
+
+class ResponseCacheTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def cached_client(self, **options):
+        model = FakeGenerativeModel(first_chunk_delay=0.05, chunk_delay=0)
+        return model, GeminiClient(model=model, response_cache=ResponseCache(namespace='test', **options))
+
+    def test_normalized_prompts_share_an_entry(self):
+        self.assertEqual(normalize_prompt('  How do I make a PLAYLIST?! '), 'how do i make a playlist')
+
+        model, client = self.cached_client()
+        first = client.generate_text_response('How do I make a playlist?', context='Help users.')
+
+        started = time.perf_counter()
+        second = client.generate_text_response('how do i make a   playlist', context='Help users.')
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(first, second)
+        self.assertEqual(model.calls, 1)
+        self.assertLess(elapsed, 0.005)
+        self.assertEqual(client.response_cache.stats()['local_hits'], 1)
+
+        # Another system context is another question
+        client.generate_text_response('How do I make a playlist?', context='Be a DJ.')
+        self.assertEqual(model.calls, 2)
+
+    def test_shared_tier_survives_a_new_process_cache(self):
+        model, client = self.cached_client()
+        client.generate_text_response('what is a podcast')
+        client.response_cache.clear_local()
+
+        client.generate_text_response('what is a podcast')
+        self.assertEqual(model.calls, 1)
+        self.assertEqual(client.response_cache.stats()['shared_hits'], 1)
+
+    def test_lru_eviction_ttl_and_similarity(self):
+        response_cache = ResponseCache(namespace='test', max_entries=2, ttl=60, similarity=0.7)
+        response_cache.set('first question', None, 'a')
+        response_cache.set('second question', None, 'b')
+        response_cache.set('third question', None, 'c')
+        self.assertIsNone(response_cache.get('first question', local_only=True))
+        self.assertEqual(response_cache.get('third question', local_only=True), 'c')
+
+        response_cache.set('how do i make a playlist', None, 'tap new playlist')
+        self.assertEqual(response_cache.get('how can i make a playlist', local_only=True), 'tap new playlist')
+        self.assertEqual(response_cache.stats()['similar_hits'], 1)
+
+        expiring = ResponseCache(namespace='test', ttl=0)
+        expiring.set('stale', None, 'old')
+        self.assertIsNone(expiring.get('stale', local_only=True))
+
+    @override_settings(AI_ASSISTANT_MODEL_BACKEND='fake')
+    def test_streamed_replies_are_cached_and_stats_exposed(self):
+        model, client = self.cached_client()
+        self.assertEqual(''.join(client.stream_text_response('hello there')), 'You said: hello there')
+        self.assertEqual(list(client.stream_text_response('Hello there!')), ['You said: hello there'])
+        self.assertEqual(model.calls, 1)
+
+        admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='pass12345', is_staff=True
+        )
+        api = APIClient()
+        api.force_authenticate(admin)
+        response = api.get('/api/v1/ai/cache/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, get_client().response_cache.stats())
+
+
+@override_settings(AI_ASSISTANT_MEMORY={
+    'WINDOW_MESSAGES': 6, 'SUMMARY_EVERY': 4, 'SUMMARY_BATCH': 50, 'SUMMARY_WORDS': 50,
+})
+class ConversationMemoryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='memo', email='memo@example.com', password='pass12345')
+        self.conversation = AIConversation.objects.create(user=self.user, title='Long chat', system_context='Be nice.')
+        self.summaries = FakeGenerativeModel(
+            reply=lambda prompt: f'summary #{prompt.count("User:")}', first_chunk_delay=0, chunk_delay=0
+        )
+        self.client = GeminiClient(model=self.summaries)
+
+    def add_turn(self, i):
+        AIMessage.objects.create(conversation=self.conversation, role='user', content=f'question {i} ' * 20)
+        AIMessage.objects.create(conversation=self.conversation, role='assistant', content=f'answer {i} ' * 20)
+
+    def test_messages_store_token_counts(self):
+        message = AIMessage.objects.create(conversation=self.conversation, role='user', content='x' * 400)
+        self.assertEqual(message.token_count, estimate_tokens('x' * 400))
+
+    def test_window_is_loaded_with_one_query(self):
+        for i in range(20):
+            self.add_turn(i)
+
+        with self.assertNumQueries(1):
+            memory = load_history(self.conversation)
+
+        # Nothing summarised yet: the window plus the messages waiting for a summary
+        self.assertEqual(len(memory.history), 10)
+        self.assertTrue(memory.history[-1]['content'].startswith('answer 19'))
+        self.assertEqual(memory.system_context, 'Be nice.')
+        self.assertTrue(memory.summary_due)
+
+    def test_summary_keeps_cost_per_turn_bounded(self):
+        costs = []
+        for i in range(60):
+            AIMessage.objects.create(conversation=self.conversation, role='user', content=f'question {i} ' * 20)
+            self.conversation.refresh_from_db()
+            memory = load_history(self.conversation)
+            costs.append(memory.tokens + estimate_tokens(memory.system_context))
+            AIMessage.objects.create(conversation=self.conversation, role='assistant', content=f'answer {i} ' * 20)
+            if memory.summary_due:
+                refresh_summary(self.conversation.id, client=self.client)
+
+        self.conversation.refresh_from_db()
+        self.assertTrue(self.conversation.summary.startswith('summary #'))
+        self.assertIn('Summary of the earlier conversation', load_history(self.conversation).system_context)
+        # Cost stops growing once the window is full
+        self.assertEqual(max(costs[20:]), max(costs[10:20]))
+        self.assertLess(max(costs), sum(m.token_count for m in AIMessage.objects.all()) / 5)
+
+    def test_summary_only_moves_forward(self):
+        for i in range(10):
+            self.add_turn(i)
+        self.assertTrue(refresh_summary(self.conversation.id, client=self.client))
+        self.conversation.refresh_from_db()
+        until = self.conversation.summary_until_id
+        self.assertEqual(
+            until, AIMessage.objects.filter(conversation=self.conversation).order_by('-created_at')[6].id
+        )
+
+        # Not enough new messages outside the window: nothing to do
+        self.assertFalse(refresh_summary(self.conversation.id, client=self.client))
+        self.assertEqual(self.summaries.calls, 1)
+
+    @override_settings(AI_ASSISTANT_MODEL_BACKEND='fake', AI_ASSISTANT_FAKE_MODEL={
+        'FIRST_CHUNK_DELAY': 0, 'CHUNK_DELAY': 0, 'CHUNK_WORDS': 50,
+    })
+    def test_text_request_sends_only_the_window(self):
+        for i in range(30):
+            self.add_turn(i)
+        api = APIClient()
+        api.force_authenticate(self.user)
+
+        response = api.post('/api/v1/ai/generate-text/', {
+            'prompt': 'and now?', 'conversation_id': self.conversation.id
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['response'], 'You said: and now?')
+        self.assertLessEqual(len(get_client().model.last_contents), 10)
+
+
+class CatalogRetrievalTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        index_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, index_dir, True)
+        self.catalog_settings = {'INDEX_DIR': index_dir, 'MIN_SCORE': 0.1}
+        override = override_settings(AI_ASSISTANT_CATALOG=self.catalog_settings)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user(username='listener', email='listener@example.com', password='pass12345')
+        self.artist = Artist.objects.create(name='Sơn Tùng M-TP')
+        self.add_song('Lạc Trôi', 'Sơn Tùng M-TP', genre='V-Pop')
+        self.add_song('Chúng Ta Của Hiện Tại', 'Sơn Tùng M-TP', genre='V-Pop')
+        self.add_song('Bohemian Rhapsody', 'Queen', genre='Rock')
+        # Chat turns never build the index, build it like manage.py build_catalog_index
+        build_index(catalog_documents(), index_dir)
+
+    def add_song(self, title, artist, genre=''):
+        return Song.objects.create(
+            title=title, artist=artist, genre=genre, duration=200,
+            audio_file='songs/test.mp3', uploaded_by=self.user,
+        )
+
+    def labels(self, query, **kwargs):
+        return [hit.label for hit in search_catalog(query, **kwargs)]
+
+    def test_no_catalog_context_until_the_index_is_built(self):
+        index_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, index_dir, True)
+        with override_settings(AI_ASSISTANT_CATALOG={**self.catalog_settings, 'INDEX_DIR': index_dir}):
+            self.assertEqual(search_catalog('lac troi'), [])
+            self.assertIsNone(get_catalog_index())
+            self.assertEqual(os.listdir(index_dir), [])
+
+    def test_search_ignores_case_and_diacritics(self):
+        hits = search_catalog('bài hát của son tung')
+        self.assertEqual({(hit.kind, hit.label) for hit in hits[:3]}, {
+            ('artist', 'Sơn Tùng M-TP'),
+            ('song', 'Lạc Trôi - Sơn Tùng M-TP (V-Pop)'),
+            ('song', 'Chúng Ta Của Hiện Tại - Sơn Tùng M-TP (V-Pop)'),
+        })
+        self.assertEqual(self.labels('LAC TROI', kinds=['song']), ['Lạc Trôi - Sơn Tùng M-TP (V-Pop)'])
+        self.assertEqual(self.labels('something like queen')[0], 'Bohemian Rhapsody - Queen (Rock)')
+        self.assertEqual(search_catalog('hello'), [])
+
+        # The index is served from memory-mapped files
+        index = get_catalog_index()
+        self.assertIsInstance(index.postings_doc, np.memmap)
+        self.assertEqual(CatalogIndex(index.path).build_id, index.build_id)
+
+    def test_signals_update_the_loaded_index(self):
+        index = get_catalog_index()
+        song = self.add_song('Nơi Này Có Anh', 'Sơn Tùng M-TP')
+        self.assertEqual(self.labels('noi nay co anh', k=1), ['Nơi Này Có Anh - Sơn Tùng M-TP'])
+
+        song.title = 'Hãy Trao Cho Anh'
+        song.save()
+        self.assertNotIn('Nơi Này Có Anh - Sơn Tùng M-TP', self.labels('noi nay co anh'))
+        self.assertEqual(self.labels('hay trao cho anh', k=1), ['Hãy Trao Cho Anh - Sơn Tùng M-TP'])
+
+        song.delete()
+        self.assertEqual(self.labels('hay trao cho anh', kinds=['song']), [])
+
+        # Renaming an artist re-indexes the songs that show its name
+        self.artist.name = 'Sơn Tùng'
+        self.artist.save()
+        self.assertIn('Lạc Trôi - Sơn Tùng (V-Pop)', self.labels('lac troi'))
+        self.assertIs(loaded_catalog_index(), index)
+
+    def test_new_build_keeps_changes_made_after_it_started(self):
+        with override_settings(AI_ASSISTANT_CATALOG={**self.catalog_settings, 'RELOAD_INTERVAL': 0}):
+            old = get_catalog_index()
+            started_at = time.time()
+            documents = list(catalog_documents())
+            self.add_song('Muộn Rồi Mà Sao Còn', 'Sơn Tùng M-TP')
+            build_index(documents, self.catalog_settings['INDEX_DIR'], started_at=started_at)
+
+            index = get_catalog_index()
+            self.assertIsNot(index, old)
+            self.assertIn('Muộn Rồi Mà Sao Còn - Sơn Tùng M-TP', self.labels('muon roi ma sao con'))
+
+    @override_settings(AI_ASSISTANT_MODEL_BACKEND='fake', AI_ASSISTANT_FAKE_MODEL={
+        'FIRST_CHUNK_DELAY': 0, 'CHUNK_DELAY': 0, 'CHUNK_WORDS': 50,
+    })
+    def test_consumer_adds_catalog_hits_to_system_instruction(self):
+        async def scenario():
+            communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/ai/chat/')
+            communicator.scope['user'] = self.user
+            await communicator.connect()
+            await communicator.send_to(text_data=json.dumps({
+                'type': 'message', 'message': 'songs similar to Lac Troi in your library?'
+            }))
+            await receive_until(communicator, lambda f: f.get('type') == 'message' and f.get('role') == 'assistant')
+            await communicator.disconnect()
+
+        async_to_sync(scenario)()
+        instruction = '\n'.join(get_client()._models)
+        self.assertIn('song #', instruction)
+        self.assertIn('Lạc Trôi - Sơn Tùng M-TP (V-Pop)', instruction)
+
+
+@override_settings(AI_ASSISTANT_IMAGES={'MAX_SIDE': 512, 'QUALITY': 80})
+class ImagePipelineTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def photo(self, width, height, mode='RGB', format='JPEG'):
+        image = Image.effect_noise((width, height), 30).convert(mode)
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90
+        exif[0x010F] = 'PhoneMaker'
+        output = io.BytesIO()
+        image.save(output, format=format, exif=exif.tobytes())
+        return output.getvalue()
+
+    def test_downsizes_strips_exif_and_caches(self):
+        raw = self.photo(2000, 1000)
+        prepared = prepare_image(raw)
+
+        self.assertEqual(prepared.mime_type, 'image/jpeg')
+        # Rotated according to EXIF, then bounded to MAX_SIDE
+        self.assertEqual((prepared.width, prepared.height), (256, 512))
+        self.assertLess(len(prepared.data), len(raw))
+        self.assertGreater(prepared.bytes_saved, 0)
+        output = Image.open(io.BytesIO(prepared.data))
+        self.assertEqual(output.size, (256, 512))
+        self.assertEqual(len(output.getexif()), 0)
+        self.assertFalse(prepared.cached)
+
+        again = prepare_image(raw)
+        self.assertTrue(again.cached)
+        self.assertEqual(again.data, prepared.data)
+
+    def test_transparent_and_invalid_images(self):
+        prepared = prepare_image(self.photo(300, 200, mode='RGBA', format='PNG'))
+        self.assertEqual(Image.open(io.BytesIO(prepared.data)).mode, 'RGB')
+
+        with self.assertRaises(ImageProcessingError):
+            prepare_image(b'not an image')
+        with override_settings(AI_ASSISTANT_IMAGES={'MAX_UPLOAD_BYTES': 10}):
+            with self.assertRaises(ImageProcessingError):
+                prepare_image(self.photo(20, 20))
+
+    @override_settings(AI_ASSISTANT_MODEL_BACKEND='fake', AI_ASSISTANT_FAKE_MODEL={
+        'FIRST_CHUNK_DELAY': 0, 'CHUNK_DELAY': 0, 'CHUNK_WORDS': 50,
+    })
+    def test_multimodal_request_sends_prepared_image(self):
+        user = User.objects.create_user(username='listener', email='listener@example.com', password='pass12345')
+        api = APIClient()
+        api.force_authenticate(user)
+        raw = self.photo(1600, 1200)
+
+        response = api.post('/api/v1/ai/generate-multimodal/', {
+            'prompt': 'what album cover is this?',
+            'image': SimpleUploadedFile('cover.jpg', raw, content_type='image/jpeg'),
+        }, format='multipart')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['response'], 'You said: what album cover is this?')
+        image_part = get_client().model.last_contents[0]
+        self.assertEqual(image_part['mime_type'], 'image/jpeg')
+        self.assertLess(len(image_part['data']), len(raw))
+        self.assertEqual(Image.open(io.BytesIO(image_part['data'])).size, (384, 512))
+
+
+@override_settings(AI_ASSISTANT_MODEL_BACKEND='fake', AI_ASSISTANT_FAKE_MODEL={
+    'FIRST_CHUNK_DELAY': 0, 'CHUNK_DELAY': 0, 'CHUNK_WORDS': 50,
+})
+class AIJobQueueTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='listener', email='listener@example.com', password='pass12345')
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def post_job(self, prompt, **extra):
+        return self.api.post('/api/v1/ai/generate-text/', {'prompt': prompt, 'mode': 'job', **extra}, format='json')
+
+    def test_job_result_is_pushed_to_the_conversation_group_and_polled(self):
+        response = self.post_job('what is a podcast')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'queued')
+        self.assertEqual(response.data['position'], 0)
+        self.assertIsNone(response.data['response'])
+        job_id, conversation_id = response.data['id'], response.data['conversation']
+        self.assertEqual(AIMessage.objects.filter(conversation_id=conversation_id, role='user').count(), 1)
+
+        async def scenario():
+            communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/ai/chat/{conversation_id}/')
+            communicator.scope['user'] = self.user
+            await communicator.connect()
+            processed = await AIJobWorkerPool(workers=2, poll_interval=0).run(drain=True)
+            frames = await receive_until(communicator, lambda f: f.get('type') == 'message')
+            await communicator.disconnect()
+            return processed, frames[-1][1]
+
+        processed, frame = async_to_sync(scenario)()
+        self.assertEqual(processed, 1)
+        self.assertEqual(frame['job_id'], job_id)
+        self.assertEqual(frame['message'], 'You said: what is a podcast')
+
+        polled = self.api.get(f'/api/v1/ai/jobs/{job_id}/')
+        self.assertEqual(polled.data['status'], 'done')
+        self.assertEqual(polled.data['response'], 'You said: what is a podcast')
+        self.assertEqual(polled.data['message_id'], frame['message_id'])
+
+        # Other users cannot see the job
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(username='other', email='other@example.com', password='pass12345'))
+        self.assertEqual(other.get(f'/api/v1/ai/jobs/{job_id}/').status_code, 404)
+
+    def test_jobs_are_claimed_by_priority_then_age(self):
+        staff = User.objects.create_user(username='staff', email='staff@example.com', password='pass12345', is_staff=True)
+        low = enqueue(self.user, 'low', priority=AIJob.PRIORITY_LOW)
+        first = self.post_job('first').data['id']
+        # Only staff may ask for high priority
+        clamped = self.post_job('wants high', priority='high').data
+        self.assertEqual(clamped['priority'], 'Normal')
+        high = enqueue(staff, 'urgent', priority=AIJob.PRIORITY_HIGH)
+
+        order = [claim_next().id for _ in range(4)]
+        self.assertEqual(order, [high.id, first, clamped['id'], low.id])
+        self.assertIsNone(claim_next())
+        self.assertEqual(AIJob.objects.filter(status=AIJob.STATUS_RUNNING, attempts=1).count(), 4)
+
+    @override_settings(AI_ASSISTANT_JOBS={'QUEUE_LIMIT': 2, 'RETRY_AFTER': 7})
+    def test_full_queue_answers_429_with_retry_after(self):
+        self.assertEqual(self.post_job('one').status_code, 202)
+        self.assertEqual(self.post_job('two').status_code, 202)
+
+        response = self.post_job('three')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '7')
+        self.assertEqual(AIJob.objects.count(), 2)
+        self.assertFalse(AIMessage.objects.filter(content='three').exists())
+
+    @override_settings(AI_ASSISTANT_JOBS={'STALE_AFTER': 60, 'MAX_ATTEMPTS': 2})
+    def test_jobs_of_a_stopped_worker_are_requeued(self):
+        retried = enqueue(self.user, 'retry me')
+        exhausted = enqueue(self.user, 'give up')
+        long_ago = timezone.now() - timedelta(minutes=5)
+        AIJob.objects.filter(id=retried.id).update(status=AIJob.STATUS_RUNNING, started_at=long_ago, attempts=1)
+        AIJob.objects.filter(id=exhausted.id).update(status=AIJob.STATUS_RUNNING, started_at=long_ago, attempts=2)
+
+        self.assertEqual(requeue_stale(), 1)
+        retried.refresh_from_db()
+        exhausted.refresh_from_db()
+        self.assertEqual(retried.status, AIJob.STATUS_QUEUED)
+        self.assertEqual(exhausted.status, AIJob.STATUS_FAILED)
+
+
+class ResilienceTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='listener', email='listener@example.com', password='pass12345')
+
+    def faulty_client(self, faults=(), **options):
+        model = FaultInjectingModel(faults=faults, first_chunk_delay=0, chunk_delay=0, chunk_words=50)
+        options = {'failure_threshold': 2, 'reset_timeout': 0.2, 'max_attempts': 1, 'retry_backoff': 0, **options}
+        return GeminiClient(model=model, resilience=Resilience(**options)), model
+
+    def test_circuit_opens_fails_fast_and_closes_after_probe(self):
+        error = FaultInjectingModel().error
+        client, model = self.faulty_client([error, error])
+
+        for prompt in ('one', 'two'):
+            self.assertIn('Sorry, I encountered an error', client.generate_text_response(prompt))
+        self.assertEqual(client.resilience.breaker.state, 'open')
+
+        # Open: refused without calling the model
+        with self.assertRaises(CircuitOpenError):
+            client.generate_text_response('three')
+        self.assertEqual(model.faults_injected, 2)
+
+        # After RESET_TIMEOUT a single probe goes through and closes the circuit
+        time.sleep(0.25)
+        self.assertEqual(client.generate_text_response('four'), 'You said: four')
+        metrics = client.resilience.snapshot()
+        self.assertEqual(metrics['circuit']['state'], 'closed')
+        self.assertEqual(metrics['circuit']['times_opened'], 1)
+        self.assertEqual(metrics['methods']['generate_text']['calls'], 3)
+        self.assertEqual(metrics['methods']['generate_text']['errors'], 2)
+        self.assertEqual(metrics['methods']['generate_text']['rejected'], 1)
+
+    def test_transient_errors_are_retried_and_bad_requests_are_not_counted(self):
+        client, model = self.faulty_client([FaultInjectingModel().error], max_attempts=2)
+        self.assertEqual(client.generate_text_response('retry'), 'You said: retry')
+        self.assertEqual(client.resilience.snapshot()['methods']['generate_text']['retries'], 1)
+
+        bad_request = api_exceptions.InvalidArgument('bad prompt')
+        client, model = self.faulty_client([bad_request] * 3)
+        for prompt in ('a', 'b', 'c'):
+            client.generate_text_response(prompt)
+        self.assertEqual(model.faults_injected, 3)
+        self.assertEqual(client.resilience.breaker.state, 'closed')
+
+    def test_hedged_attempt_wins_over_a_slow_call(self):
+        client, model = self.faulty_client([1.0, None], max_attempts=2, hedge_delay=0.05)
+        started = time.perf_counter()
+        self.assertEqual(client.generate_text_response('hedge'), 'You said: hedge')
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertEqual(client.resilience.snapshot()['methods']['generate_text']['hedges'], 1)
+
+    @override_settings(
+        AI_ASSISTANT_MODEL_BACKEND='fake',
+        AI_ASSISTANT_FAKE_MODEL={'FIRST_CHUNK_DELAY': 0, 'CHUNK_DELAY': 0, 'CHUNK_WORDS': 50, 'FAILURE_RATE': 1.0},
+        AI_ASSISTANT_RESILIENCE={'FAILURE_THRESHOLD': 1, 'RESET_TIMEOUT': 60, 'MAX_ATTEMPTS': 1},
+    )
+    def test_open_circuit_answers_503_without_saving_messages(self):
+        api = APIClient()
+        api.force_authenticate(self.user)
+        first = api.post('/api/v1/ai/generate-text/', {'prompt': 'first'}, format='json')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(get_client().resilience.breaker.state, 'open')
+        saved = AIMessage.objects.count()
+
+        response = api.post('/api/v1/ai/generate-text/', {'prompt': 'second'}, format='json')
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(1 <= int(response['Retry-After']) <= 60)
+        self.assertEqual(AIMessage.objects.count(), saved)
+
+        async def scenario():
+            communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/ai/chat/')
+            communicator.scope['user'] = self.user
+            await communicator.connect()
+            await communicator.send_to(text_data=json.dumps({'type': 'message', 'message': 'third'}))
+            frames = await receive_until(communicator, lambda f: 'error' in f)
+            await communicator.disconnect()
+            return frames[-1][1]
+
+        frame = async_to_sync(scenario)()
+        self.assertIn('temporarily unavailable', frame['error'])
+        # Only the reply to the first request (the apology) was saved
+        self.assertEqual(AIMessage.objects.filter(role='assistant').count(), 1)
+
+        # Metrics are for admins only
+        self.assertEqual(api.get('/api/v1/ai/metrics/').status_code, 403)
+        admin = APIClient()
+        admin.force_authenticate(User.objects.create_user(
+            username='admin', email='admin@example.com', password='pass12345', is_staff=True
+        ))
+        metrics = admin.get('/api/v1/ai/metrics/').data
+        self.assertEqual(metrics['circuit']['state'], 'open')
+        self.assertEqual(metrics['methods']['stream_text']['rejected'], 1)
+        self.assertIn('job_queue_depth', metrics)
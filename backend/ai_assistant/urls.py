@@ -18,6 +18,9 @@ urlpatterns = [
     path('', include(router.urls)),
     path('generate-text/', views.AITextRequestView.as_view(), name='generate-text'),
     path('generate-multimodal/', views.AIMultiModalRequestView.as_view(), name='generate-multimodal'),
+    path('jobs/<int:pk>/', views.AIJobDetailView.as_view(), name='ai-job-detail'),
+    path('cache/stats/', views.AIResponseCacheStatsView.as_view(), name='ai-cache-stats'),
+    path('metrics/', views.AIMetricsView.as_view(), name='ai-metrics'),
     path('system-instructions/', views.SystemInstructionsView.as_view(), name='system-instructions'),
     path('api-documentation/', views.APIDocumentationView.as_view(), name='api-documentation'),
 ] 
\ No newline at end of file
@@ -3,18 +3,18 @@ Views for the AI Assistant app
 """
 import logging
 import json
-import base64
 from django.conf import settings
+from django.db import transaction
 from django.shortcuts import get_object_or_404, render
 from django.http import JsonResponse
 
 from rest_framework import viewsets, status, generics
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.decorators import action, permission_classes
 
-from .models import AIConversation, AIMessage, AISystemPrompt
+from .models import AIConversation, AIJob, AIMessage, AISystemPrompt
 from .serializers import (
     AIConversationSerializer, 
     AIMessageSerializer,
@@ -22,8 +22,14 @@ from .serializers import (
     AITextRequestSerializer,
     AIMultiModalRequestSerializer,
     AIResponseSerializer,
+    AIJobSerializer,
 )
-from .gemini_client import GeminiClient
+from .gateway import get_gateway
+from .gemini_client import get_client
+from .images import ImageProcessingError, submit_image
+from .jobs import PRIORITIES, AIQueueFull, enqueue, queue_depth
+from .memory import load_history, refresh_summary_in_background
+from .resilience import CircuitOpenError
 
 logger = logging.getLogger(__name__)
 
@@ -70,8 +76,20 @@ class AIConversationViewSet(viewsets.ModelViewSet):
         conversation = self.get_object()
         # Keep only system messages if they exist
         AIMessage.objects.filter(conversation=conversation).exclude(role='system').delete()
+        # The summary describes the deleted messages
+        AIConversation.objects.filter(id=conversation.id).update(summary='', summary_until_id=0, summary_updated_at=None)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+def model_unavailable(retry_after):
+    """503 answer while the model circuit is open"""
+    retry_after = max(1, round(retry_after))
+    return Response(
+        {'error': f"The AI assistant is temporarily unavailable, please try again in {retry_after} seconds",
+         'retry_after': retry_after},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={'Retry-After': str(retry_after)}
+    )
+
 class AITextRequestView(APIView):
     """API view for handling text-based AI requests"""
     permission_classes = [IsAuthenticated]
@@ -87,7 +105,7 @@ class AITextRequestView(APIView):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            gemini_client = GeminiClient()
+            gemini_client = get_client()
             prompt = validated_data.get('prompt')
             if not prompt:
                 return Response(
@@ -98,6 +116,16 @@ class AITextRequestView(APIView):
             conversation_id = validated_data.get('conversation_id')
             system_context = validated_data.get('system_context')
             
+            # Job mode: queue the request instead of holding this worker for the model call
+            if validated_data.get('mode') == 'job':
+                return self.enqueue_job(request, prompt, conversation_id, system_context,
+                                        validated_data.get('priority'))
+            
+            # Model đang lỗi (circuit mở): từ chối ngay, trước khi lưu tin nhắn
+            retry_after = gemini_client.resilience.breaker.retry_after()
+            if retry_after:
+                return model_unavailable(retry_after)
+            
             # Handle conversation context
             if conversation_id:
                 # Continue existing conversation
@@ -105,14 +133,6 @@ class AITextRequestView(APIView):
                     AIConversation, id=conversation_id, user=request.user
                 )
                 
-                # Get conversation history
-                history = []
-                for msg in AIMessage.objects.filter(conversation=conversation).order_by('created_at'):
-                    history.append({'role': msg.role, 'content': msg.content})
-                
-                # Add the current message
-                history.append({'role': 'user', 'content': prompt})
-                
                 # Save user message
                 AIMessage.objects.create(
                     conversation=conversation,
@@ -120,16 +140,17 @@ class AITextRequestView(APIView):
                     content=prompt
                 )
                 
-                # Get system context from conversation if not provided
-                if not system_context and conversation.system_context:
-                    system_context = conversation.system_context
+                # Memory window (latest messages + summary of older ones) instead of the full history
+                memory = load_history(conversation, system_context)
                 
                 # Generate response with conversation history
                 ai_response = gemini_client.generate_chat_response(
-                    history=history,
-                    system_instructions=system_context
+                    history=memory.history,
+                    system_instructions=memory.system_context
                 )
             else:
+                memory = None
+                
                 # Create a new conversation
                 conversation = AIConversation.objects.create(
                     user=request.user,
@@ -157,6 +178,11 @@ class AITextRequestView(APIView):
                 content=ai_response
             )
             
+            # Fold messages that left the window into the summary, off the request path
+            if memory is not None and memory.summary_due:
+                conversation_pk = conversation.id
+                transaction.on_commit(lambda: refresh_summary_in_background(conversation_pk))
+            
             # Return the response
             response_serializer = AIResponseSerializer({
                 'response': ai_response,
@@ -164,6 +190,8 @@ class AITextRequestView(APIView):
             })
             return Response(response_serializer.data)
         
+        except CircuitOpenError as e:
+            return model_unavailable(e.retry_after)
         except Exception as e:
             logger.error(f"Error in AI text request: {str(e)}")
             return Response(
@@ -171,6 +199,37 @@ class AITextRequestView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def enqueue_job(self, request, prompt, conversation_id, system_context, priority):
+        """Save the user message, queue the request and answer 202 with the job"""
+        conversation = None
+        if conversation_id:
+            conversation = get_object_or_404(
+                AIConversation, id=conversation_id, user=request.user
+            )
+        
+        # Độ ưu tiên cao chỉ dành cho tài khoản nhân viên
+        priority = PRIORITIES.get(priority, AIJob.PRIORITY_NORMAL)
+        if priority > AIJob.PRIORITY_NORMAL and not request.user.is_staff:
+            priority = AIJob.PRIORITY_NORMAL
+        
+        try:
+            job = enqueue(request.user, prompt, conversation, system_context, priority)
+        except AIQueueFull as e:
+            return Response(
+                {'error': str(e), 'retry_after': e.retry_after},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={'Retry-After': str(e.retry_after)}
+            )
+        return Response(AIJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+class AIJobDetailView(generics.RetrieveAPIView):
+    """Status and result of a queued AI request (job mode of generate-text)"""
+    permission_classes = [IsAuthenticated]
+    serializer_class = AIJobSerializer
+    
+    def get_queryset(self):
+        return AIJob.objects.filter(user=self.request.user).select_related('response')
+
 class AIMultiModalRequestView(APIView):
     """API view for handling multimodal (text + image) AI requests"""
     permission_classes = [IsAuthenticated]
@@ -186,7 +245,7 @@ class AIMultiModalRequestView(APIView):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            gemini_client = GeminiClient()
+            gemini_client = get_client()
             prompt = validated_data.get('prompt')
             if not prompt:
                 return Response(
@@ -204,15 +263,30 @@ class AIMultiModalRequestView(APIView):
             conversation_id = validated_data.get('conversation_id')
             system_context = validated_data.get('system_context')
             
-            # Read image data
-            image_data = base64.b64encode(image.read()).decode('utf-8')
+            retry_after = gemini_client.resilience.breaker.retry_after()
+            if retry_after:
+                return model_unavailable(retry_after)
+            
+            # Decode, downsize and re-encode the upload (EXIF stripped) in the image pool
+            # while the conversation is looked up
+            pending_image = submit_image(image.read())
             
             # Handle conversation
+            conversation = None
             if conversation_id:
                 conversation = get_object_or_404(
                     AIConversation, id=conversation_id, user=request.user
                 )
-            else:
+            
+            try:
+                prepared_image = pending_image.result()
+            except ImageProcessingError as e:
+                return Response(
+                    {'error': str(e)}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            if conversation is None:
                 conversation = AIConversation.objects.create(
                     user=request.user,
                     title=prompt[:50] + "..." if len(prompt) > 50 else prompt,
@@ -234,8 +308,9 @@ class AIMultiModalRequestView(APIView):
             # Generate response
             ai_response = gemini_client.generate_multimodal_response(
                 prompt=prompt,
-                image_data=image_data,
-                context=system_context
+                image_data=prepared_image.data,
+                context=system_context,
+                mime_type=prepared_image.mime_type
             )
             
             # Save assistant response
@@ -252,6 +327,8 @@ class AIMultiModalRequestView(APIView):
             })
             return Response(response_serializer.data)
             
+        except CircuitOpenError as e:
+            return model_unavailable(e.retry_after)
         except Exception as e:
             logger.error(f"Error in AI multimodal request: {str(e)}")
             return Response(
@@ -259,6 +336,28 @@ class AIMultiModalRequestView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+class AIResponseCacheStatsView(APIView):
+    """Admin endpoint exposing the response cache hit/miss counters of this process"""
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        """Get the response cache counters"""
+        return Response(get_client().response_cache.stats())
+
+class AIMetricsView(APIView):
+    """Admin endpoint exposing model call latencies, error rates and circuit state of this process"""
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        """Get the model call metrics"""
+        client = get_client()
+        return Response({
+            **client.resilience.snapshot(),
+            'response_cache': client.response_cache.stats(),
+            'gateway_in_flight': get_gateway().in_flight(),
+            'job_queue_depth': queue_depth(),
+        })
+
 class SystemInstructionsView(APIView):
     """API view for getting predefined system instructions"""
     permission_classes = [IsAuthenticated]
@@ -494,11 +593,31 @@ class APIDocumentationView(APIView):
                             "request": {
                                 "prompt": "string (câu hỏi cho AI)",
                                 "conversation_id": "integer (tùy chọn)",
-                                "system_context": "string (tùy chọn)"
+                                "system_context": "string (tùy chọn)",
+                                "mode": "string (tùy chọn: sync (mặc định) | job - xếp hàng và trả về 202 ngay)",
+                                "priority": "string (tùy chọn, mode=job: low | normal | high - high chỉ dành cho nhân viên)"
                             },
                             "response": {
                                 "response": "string (phản hồi từ AI)",
                                 "conversation_id": "integer"
+                            },
+                            "response_job": "job object (mode=job, 202); 429 kèm header Retry-After khi hàng đợi đầy",
+                            "response_unavailable": "503 kèm header Retry-After khi model đang lỗi (circuit mở)"
+                        },
+                        "job": {
+                            "url": "/api/v1/ai/jobs/{id}/",
+                            "method": "GET",
+                            "description": "Trạng thái và kết quả của yêu cầu đã xếp hàng (phản hồi cũng được gửi tới WebSocket ai_chat của hội thoại)",
+                            "request": {},
+                            "response": {
+                                "id": "integer",
+                                "status": "string (queued|running|done|failed)",
+                                "priority": "string",
+                                "conversation": "integer",
+                                "position": "integer (số yêu cầu được xử lý trước)",
+                                "response": "string (khi status=done)",
+                                "message_id": "integer",
+                                "error": "string"
                             }
                         },
                         "generate_multimodal": {
@@ -540,6 +659,20 @@ class APIDocumentationView(APIView):
                                 "previous": "string",
                                 "results": "array of system prompt objects"
                             }
+                        },
+                        "metrics": {
+                            "url": "/api/v1/ai/metrics/",
+                            "method": "GET",
+                            "description": "Độ trễ (p50/p95/p99), tỉ lệ lỗi, số lần thử lại và trạng thái circuit breaker của các lời gọi model trong tiến trình này (chỉ admin)",
+                            "request": {},
+                            "response": {
+                                "circuit": "object (state: closed|open|half_open, consecutive_failures, times_opened, retry_after)",
+                                "config": "object",
+                                "methods": "object (theo phương thức: calls, errors, rejected, retries, hedges, p50_ms, p95_ms, p99_ms, buckets)",
+                                "response_cache": "object",
+                                "gateway_in_flight": "integer",
+                                "job_queue_depth": "integer"
+                            }
                         }
                     }
                 }
@@ -553,11 +686,17 @@ class APIDocumentationView(APIView):
                             "type": "message",
                             "message": "string (nội dung tin nhắn)",
                             "conversation_id": "integer (tùy chọn)",
-                            "system_context": "string (tùy chọn)"
+                            "system_context": "string (tùy chọn)",
+                            "stream": "boolean (mặc định true: nhận phản hồi theo từng khối message_delta)"
                         },
                         "receive": {
-                            "type": "message|typing",
+                            "type": "message|message_delta|typing",
                             "message": "string (khi type=message)",
+                            "delta": "string (khi type=message_delta: khối tiếp theo của phản hồi)",
+                            "index": "integer (khi type=message_delta: thứ tự khối)",
+                            "stream_id": "string (chung cho các khối và tin nhắn hoàn chỉnh cuối cùng)",
+                            "message_id": "integer (id AIMessage đã lưu, khi type=message)",
+                            "job_id": "integer (khi phản hồi đến từ yêu cầu đã xếp hàng)",
                             "is_typing": "boolean (khi type=typing)",
                             "role": "string (assistant|user)",
                             "conversation_id": "integer",
@@ -269,6 +269,117 @@ if DEBUG:
 else:
     SITE_URL = os.environ.get('SITE_URL', 'https://spotifybackend.shop')
 
+# Cấu hình bộ đệm lượt nghe (music/play_buffer.py)
+PLAY_BUFFER = {
+    'ENABLED': env.bool('PLAY_BUFFER_ENABLED', default=True),
+    'FLUSH_INTERVAL': env.float('PLAY_BUFFER_FLUSH_INTERVAL', default=5.0),
+    'FLUSH_SIZE': env.int('PLAY_BUFFER_FLUSH_SIZE', default=500),
+    'MAX_SIZE': env.int('PLAY_BUFFER_MAX_SIZE', default=100000),
+}
+
+# Backend phân phối file âm thanh cho stream / download (music/delivery.py)
+# Các lựa chọn: SendfileBackend, AsyncChunkedBackend, XAccelRedirectBackend, XSendfileBackend
+MUSIC_FILE_DELIVERY_BACKEND = env('MUSIC_FILE_DELIVERY_BACKEND', default='music.delivery.SendfileBackend')
+MUSIC_FILE_DELIVERY_ACCEL_PREFIX = '/protected-media/'
+
+# Cập nhật chỉ mục người dùng tương đồng (accounts/similarity.py) khi bài hát yêu thích thay đổi:
+# chạy trong một luồng nền, chỉ so sánh với tối đa MAX_CANDIDATES người có nhiều bài hát chung nhất
+USER_SIMILARITY = {
+    'REFRESH_IN_BACKGROUND': env.bool('USER_SIMILARITY_REFRESH_IN_BACKGROUND', default=True),
+    'MAX_CANDIDATES': env.int('USER_SIMILARITY_MAX_CANDIDATES', default=1000),
+}
+
+# Snapshot thống kê cho trang admin (music/dashboard.py): số giây trước khi được làm mới nền
+ADMIN_DASHBOARD_TTL = env.int('ADMIN_DASHBOARD_TTL', default=300)
+
+# Model dùng cho AI Assistant: 'gemini' (mặc định) hoặc 'fake' (ai_assistant/fake_model.py, chạy offline
+# không cần GEMINI_API_KEY, trả lời theo từng khối có độ trễ cấu hình được để đo độ trễ streaming)
+AI_ASSISTANT_MODEL_BACKEND = env('AI_ASSISTANT_MODEL_BACKEND', default='gemini')
+AI_ASSISTANT_GEMINI_MODEL = env('AI_ASSISTANT_GEMINI_MODEL', default='gemini-1.5-flash')
+# Ngân sách token (ước lượng) cho lịch sử + system instruction gửi kèm mỗi lượt chat
+AI_ASSISTANT_CONTEXT_TOKENS = env.int('AI_ASSISTANT_CONTEXT_TOKENS', default=8000)
+# Giới hạn lời gọi model từ WebSocket (ai_assistant/gateway.py): số lượt sinh đồng thời mỗi process,
+# số lượt đồng thời mỗi người dùng và thời gian tối đa (giây) cho một lượt
+AI_ASSISTANT_MAX_CONCURRENCY = env.int('AI_ASSISTANT_MAX_CONCURRENCY', default=8)
+AI_ASSISTANT_MAX_PER_USER = env.int('AI_ASSISTANT_MAX_PER_USER', default=2)
+AI_ASSISTANT_TIMEOUT = env.float('AI_ASSISTANT_TIMEOUT', default=60.0)
+# Bộ nhớ hội thoại AI (ai_assistant/memory.py): số tin nhắn gần nhất gửi nguyên văn, số tin nhắn
+# ngoài cửa sổ tích lũy trước khi được tóm tắt lại, số tin tối đa mỗi lần tóm tắt, độ dài bản tóm tắt
+AI_ASSISTANT_MEMORY = {
+    'WINDOW_MESSAGES': env.int('AI_MEMORY_WINDOW_MESSAGES', default=12),
+    'SUMMARY_EVERY': env.int('AI_MEMORY_SUMMARY_EVERY', default=8),
+    'SUMMARY_BATCH': env.int('AI_MEMORY_SUMMARY_BATCH', default=50),
+    'SUMMARY_WORDS': env.int('AI_MEMORY_SUMMARY_WORDS', default=150),
+}
+# Cache câu trả lời cho câu hỏi đầu tiên của hội thoại (ai_assistant/cache.py)
+AI_ASSISTANT_RESPONSE_CACHE = {
+    'ENABLED': env.bool('AI_RESPONSE_CACHE_ENABLED', default=True),
+    'TTL': env.int('AI_RESPONSE_CACHE_TTL', default=3600),
+    'MAX_ENTRIES': env.int('AI_RESPONSE_CACHE_MAX_ENTRIES', default=1000),
+    # Ngưỡng Jaccard để coi hai câu hỏi gần giống nhau là một (None: chỉ khớp chính xác sau chuẩn hóa)
+    'SIMILARITY': env.float('AI_RESPONSE_CACHE_SIMILARITY', default=None),
+}
+# Chỉ mục tìm kiếm danh mục nhạc cho AI (ai_assistant/retrieval.py): các bài hát / album / nghệ sĩ /
+# thể loại khớp nhất với tin nhắn được thêm vào system instruction. Xây lại bằng `manage.py build_catalog_index`
+AI_ASSISTANT_CATALOG = {
+    'ENABLED': env.bool('AI_CATALOG_ENABLED', default=True),
+    'INDEX_DIR': env('AI_CATALOG_INDEX_DIR', default=str(BASE_DIR / 'var' / 'catalog_index')),
+    'TOP_K': env.int('AI_CATALOG_TOP_K', default=5),
+    # Độ tương đồng cosine tối thiểu (0..1) để một kết quả được đưa vào prompt
+    'MIN_SCORE': env.float('AI_CATALOG_MIN_SCORE', default=0.2),
+    # Số posting tối đa đọc cho mỗi từ của truy vấn (giới hạn độ trễ với danh mục lớn)
+    'MAX_POSTINGS': env.int('AI_CATALOG_MAX_POSTINGS', default=10000),
+    'RELOAD_INTERVAL': env.int('AI_CATALOG_RELOAD_INTERVAL', default=60),
+}
+# Xử lý ảnh trước khi gửi cho model (ai_assistant/images.py): cạnh dài tối đa, chất lượng JPEG,
+# kích thước upload tối đa, thời gian cache ảnh đã xử lý và số luồng giải mã ảnh
+AI_ASSISTANT_IMAGES = {
+    'MAX_SIDE': env.int('AI_IMAGE_MAX_SIDE', default=1024),
+    'QUALITY': env.int('AI_IMAGE_QUALITY', default=80),
+    'MAX_UPLOAD_BYTES': env.int('AI_IMAGE_MAX_UPLOAD_BYTES', default=20 * 1024 * 1024),
+    'MAX_PIXELS': env.int('AI_IMAGE_MAX_PIXELS', default=50_000_000),
+    'CACHE_TTL': env.int('AI_IMAGE_CACHE_TTL', default=86400),
+    'WORKERS': env.int('AI_IMAGE_WORKERS', default=2),
+}
+# Hàng đợi yêu cầu AI (ai_assistant/jobs.py, chạy worker bằng `manage.py run_ai_workers`): số worker,
+# số yêu cầu chờ tối đa trước khi trả về 429, giá trị Retry-After (giây), chu kỳ kiểm tra hàng đợi,
+# thời gian trước khi yêu cầu của worker đã dừng được xếp hàng lại và số lần chạy tối đa
+AI_ASSISTANT_JOBS = {
+    'WORKERS': env.int('AI_JOBS_WORKERS', default=4),
+    'QUEUE_LIMIT': env.int('AI_JOBS_QUEUE_LIMIT', default=200),
+    'RETRY_AFTER': env.int('AI_JOBS_RETRY_AFTER', default=10),
+    'POLL_INTERVAL': env.float('AI_JOBS_POLL_INTERVAL', default=0.5),
+    'STALE_AFTER': env.int('AI_JOBS_STALE_AFTER', default=300),
+    'MAX_ATTEMPTS': env.int('AI_JOBS_MAX_ATTEMPTS', default=3),
+}
+# Thời gian (giây) lưu người dùng theo jti của token khi bắt tay WebSocket
+CHAT_WS_USER_CACHE_TTL = env.int('CHAT_WS_USER_CACHE_TTL', default=60)
+# Thời gian (giây) tối đa giữ bộ đếm socket trực tuyến của người dùng (chat/presence.py)
+CHAT_PRESENCE_TTL = env.int('CHAT_PRESENCE_TTL', default=86400)
+# Gộp sự kiện "đang gõ" của WebSocket chat (chat/typing.py): chỉ phát khi trạng thái
+# thay đổi, tối đa một lần mỗi INTERVAL giây; tự tắt sau TIMEOUT giây không có sự kiện
+CHAT_TYPING = {
+    'COALESCE': env.bool('CHAT_TYPING_COALESCE', default=True),
+    'INTERVAL': env.float('CHAT_TYPING_INTERVAL', default=0.5),
+    'TIMEOUT': env.float('CHAT_TYPING_TIMEOUT', default=6),
+}
+# Circuit breaker, thử lại và đo độ trễ các lời gọi model (ai_assistant/resilience.py);
+# HEDGE_DELAY (giây) bật gửi song song lần thử thứ hai cho các lời gọi chậm
+AI_ASSISTANT_RESILIENCE = {
+    'FAILURE_THRESHOLD': env.int('AI_CIRCUIT_FAILURE_THRESHOLD', default=5),
+    'RESET_TIMEOUT': env.float('AI_CIRCUIT_RESET_TIMEOUT', default=30),
+    'MAX_ATTEMPTS': env.int('AI_CALL_MAX_ATTEMPTS', default=2),
+    'RETRY_BACKOFF': env.float('AI_CALL_RETRY_BACKOFF', default=0.5),
+    'HEDGE_DELAY': env.float('AI_CALL_HEDGE_DELAY', default=None),
+}
+AI_ASSISTANT_FAKE_MODEL = {
+    'FIRST_CHUNK_DELAY': env.float('AI_FAKE_FIRST_CHUNK_DELAY', default=0.3),
+    'CHUNK_DELAY': env.float('AI_FAKE_CHUNK_DELAY', default=0.05),
+    'CHUNK_WORDS': env.int('AI_FAKE_CHUNK_WORDS', default=4),
+    # Tỉ lệ lời gọi model giả bị lỗi 503, để thử circuit breaker
+    'FAILURE_RATE': env.float('AI_FAKE_FAILURE_RATE', default=0.0),
+}
+
 # Cấu hình Swagger
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Spotify Chat API',
@@ -65,7 +65,7 @@ class ConversationAdmin(admin.ModelAdmin):
     list_display = ('id', 'get_participants', 'messages_count', 'last_activity', 'is_active')
     list_filter = ('is_active', 'created_at')
     search_fields = ('participants__username', 'participants__email')
-    readonly_fields = ('created_at', 'updated_at', 'messages_count', 'last_activity')
+    readonly_fields = ('created_at', 'updated_at', 'last_message', 'last_message_at', 'messages_count', 'last_activity')
     
     def get_participants(self, obj):
         participants = obj.participants.all()
@@ -77,10 +77,7 @@ class ConversationAdmin(admin.ModelAdmin):
     messages_count.short_description = 'Số tin nhắn'
     
     def last_activity(self, obj):
-        last_msg = obj.last_message
-        if last_msg:
-            return last_msg.timestamp
-        return obj.updated_at
+        return obj.last_message_at or obj.updated_at
     last_activity.short_description = 'Hoạt động cuối'
     
     def get_queryset(self, request):
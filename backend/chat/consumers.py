@@ -1,14 +1,112 @@
 import json
+from datetime import datetime, timezone as dt_timezone
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef, Q, Subquery
 from django.utils import timezone
 from asgiref.sync import sync_to_async
 from .models import Message, ChatRestriction, Conversation
+from .presence import online_users, user_connected, user_disconnected
+from .events import send_to_users, user_group_name
+from .receipts import mark_read
+from .typing import TypingCoalescer
 
 User = get_user_model()
 
+# Hạn chế vĩnh viễn hoặc không có ngày hết hạn
+RESTRICTED_FOREVER = datetime.max.replace(tzinfo=dt_timezone.utc)
+
+
+def chat_state_query(conversation_id, user):
+    """
+    Một truy vấn cho cả bắt tay WebSocket: cuộc trò chuyện kèm ``is_participant``,
+    ``other_participant_id``, ``restricted_forever`` và ``restricted_until``
+    (hạn chế có thời hạn còn hiệu lực xa nhất) của ``user``
+    """
+    participants = Conversation.participants.through.objects.filter(conversation=OuterRef('pk'))
+    restrictions = ChatRestriction.objects.filter(user=user, is_active=True)
+    return Conversation.objects.filter(id=conversation_id).annotate(
+        is_participant=Exists(participants.filter(user=user)),
+        other_participant_id=Subquery(participants.exclude(user=user).values('user_id')[:1]),
+        restricted_forever=Exists(
+            restrictions.filter(Q(restriction_type='PERMANENT') | Q(expires_at__isnull=True))
+        ),
+        restricted_until=Subquery(
+            restrictions.filter(expires_at__gt=timezone.now()).order_by('-expires_at').values('expires_at')[:1]
+        ),
+    )
+
+
+def restricted_until(restrictions):
+    """Thời điểm hết hạn chế xa nhất trong các hạn chế đang hiệu lực (RESTRICTED_FOREVER nếu vĩnh viễn)"""
+    until = None
+    for restriction_type, expires_at in restrictions:
+        if restriction_type == 'PERMANENT' or expires_at is None:
+            return RESTRICTED_FOREVER
+        if expires_at > timezone.now() and (until is None or expires_at > until):
+            until = expires_at
+    return until
+
+
+def parse_message(data):
+    """Nội dung, loại tin nhắn, song_id, playlist_id của một khung tin nhắn; None nếu không hợp lệ"""
+    message = (data.get('message') or '').strip()
+    message_type = data.get('message_type', 'TEXT')
+    if message_type not in [choice[0] for choice in Message.MESSAGE_TYPES]:
+        message_type = 'TEXT'
+    if not message and message_type == 'TEXT':
+        return None
+    return message, message_type, data.get('song_id'), data.get('playlist_id')
+
+
+def create_message(sender, conversation, receiver_id, content, message_type):
+    """
+    Lưu tin nhắn; Message.save() cập nhật tin nhắn mới nhất của cuộc trò chuyện
+    và số tin chưa đọc của người nhận trong cùng một giao dịch. ``conversation``
+    là một instance (có thể chỉ có id) để Message.save() không phải truy vấn lại.
+    """
+    # song_id / playlist_id chỉ được chuyển tiếp trong sự kiện WebSocket,
+    # Message không còn cột shared_song / shared_playlist
+    return Message.objects.create(
+        sender=sender,
+        receiver_id=receiver_id,
+        conversation=conversation,
+        content=content,
+        is_read=False,
+        message_type=message_type,
+    )
+
+
+def message_event(message, sender, song_id=None, playlist_id=None):
+    """Sự kiện chat_message gửi tới group của người gửi và người nhận"""
+    message_data = {
+        'id': message.id,
+        'conversation_id': message.conversation_id,
+        'sender_id': sender.id,
+        'sender_username': sender.username,
+        'receiver_id': message.receiver_id,
+        'message': message.content,
+        'message_type': message.message_type,
+        'timestamp': message.timestamp.isoformat(),
+        'is_read': False
+    }
+    if song_id and message.message_type == 'SONG':
+        message_data['song_id'] = song_id
+    if playlist_id and message.message_type == 'PLAYLIST':
+        message_data['playlist_id'] = playlist_id
+    return {
+        'type': 'chat_message',
+        'conversation_id': message.conversation_id,
+        'message_data': message_data
+    }
+
 class ChatConsumer(AsyncWebsocketConsumer):
+    """
+    Kết nối cho một cuộc trò chuyện (ws/chat/<id>/). Nhận sự kiện qua group
+    ``user_{id}`` của người dùng và chỉ chuyển xuống các sự kiện của cuộc trò
+    chuyện này; client mới nên dùng UserChatConsumer (ws/chat/).
+    """
     ERROR_CODES = {
         'UNAUTHORIZED': 4001,
         'USER_NOT_FOUND': 4004,
@@ -22,8 +120,13 @@ class ChatConsumer(AsyncWebsocketConsumer):
         super().__init__(*args, **kwargs)
         self.conversation_id = None
         self.conversation = None
-        self.room_group_name = None
         self.user = None
+        self.typing = None
+        # Trạng thái được nạp khi kết nối và giữ suốt kết nối, nạp lại khi nhận chat_state_changed
+        self.is_participant = False
+        self.receiver_id = None
+        self.restricted_until = None
+        self.user_group_name = None
 
     async def connect(self):
         self.user = self.scope["user"]
@@ -34,79 +137,79 @@ class ChatConsumer(AsyncWebsocketConsumer):
             await self.close(code=self.ERROR_CODES['UNAUTHORIZED'])
             return
 
-        # Kiểm tra xem cuộc trò chuyện có tồn tại không
-        self.conversation = await self.get_conversation(self.conversation_id)
-        if not self.conversation:
+        # Cuộc trò chuyện, tư cách thành viên và hạn chế chat được nạp bằng một truy vấn cho cả kết nối
+        # (ChatRestrictionMiddleware không kiểm tra lại hạn chế cho đường dẫn này)
+        state = await self.load_state()
+        if state is None:
             await self.send_error('CONVERSATION_NOT_FOUND', f'Không tìm thấy cuộc trò chuyện ID: {self.conversation_id}')
             await self.close(code=self.ERROR_CODES['CONVERSATION_NOT_FOUND'])
             return
+        self.apply_state(state)
 
         # Kiểm tra xem người dùng có tham gia vào cuộc trò chuyện không
-        if not await self.check_user_in_conversation(self.user, self.conversation):
+        if not self.is_participant:
             await self.send_error('UNAUTHORIZED', 'Bạn không phải là thành viên của cuộc trò chuyện này')
             await self.close(code=self.ERROR_CODES['UNAUTHORIZED'])
             return
 
         # Kiểm tra xem người dùng có bị hạn chế không
-        if await self.check_user_restriction(self.user):
+        if self.is_restricted():
             await self.send_error('RESTRICTED', 'Tính năng chat của bạn đã bị hạn chế')
             await self.close(code=self.ERROR_CODES['RESTRICTED'])
             return
 
-        self.room_group_name = f'chat_{self.conversation_id}'
-
-        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        # Tin nhắn, con trỏ đã đọc, trạng thái gõ và thay đổi hạn chế đều đến qua group của người dùng
+        self.user_group_name = user_group_name(self.user.id)
+        await self.channel_layer.group_add(self.user_group_name, self.channel_name)
+        # Sự kiện đang gõ được gộp lại, chỉ phát khi trạng thái thay đổi, tới group của người nhận
+        self.typing = TypingCoalescer(
+            self.channel_layer, user_group_name(self.receiver_id), self.user.id,
+            extra={'username': self.user.username, 'conversation_id': self.conversation.id}
+        )
         await self.accept()
         await self.send_success('CONNECTED', 'Kết nối WebSocket thành công')
 
     async def disconnect(self, close_code):
-        if self.room_group_name:
-            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        if self.typing:
+            await self.typing.stop()
+        if self.user_group_name:
+            await self.channel_layer.group_discard(self.user_group_name, self.channel_name)
 
     async def receive(self, text_data):
         try:
             data = json.loads(text_data)
-            message = data.get('message', '').strip()
-            message_type = data.get('message_type', 'TEXT')
-            
-            if message_type not in [choice[0] for choice in Message.MESSAGE_TYPES]:
-                message_type = 'TEXT'
-                
-            song_id = data.get('song_id')
-            playlist_id = data.get('playlist_id')
-            
-            if not message and message_type == 'TEXT':
+
+            # Client báo đã đọc tới một tin nhắn: {"type": "read", "message_id": ...}
+            if data.get('type') == 'read':
+                await self.mark_read(data.get('message_id'))
+                return
+
+            # Client báo đang gõ: {"type": "typing", "is_typing": true}
+            if data.get('type') == 'typing':
+                await self.typing.update(data.get('is_typing', False))
+                return
+
+            parsed = parse_message(data)
+            if parsed is None:
                 await self.send_error('INVALID_MESSAGE', 'Tin nhắn không hợp lệ')
                 return
+            message, message_type, song_id, playlist_id = parsed
 
-            receiver = await self.get_other_participant(self.conversation, self.user)
-            
-            saved_message = await self.save_message(message, message_type, receiver, song_id, playlist_id)
+            # Hạn chế có thời hạn được so với giờ hiện tại, không cần truy vấn lại
+            if self.is_restricted():
+                await self.send_error('RESTRICTED', 'Tính năng chat của bạn đã bị hạn chế')
+                await self.close(code=self.ERROR_CODES['RESTRICTED'])
+                return
+
+            saved_message = await self.save_message(message, message_type, self.receiver_id, song_id, playlist_id)
             if saved_message:
-                await self.update_conversation_time(self.conversation)
-                
-                message_data = {
-                    'id': saved_message.id,
-                    'sender_id': self.user.id,
-                    'sender_username': self.user.username,
-                    'receiver_id': receiver.id if receiver else None,
-                    'message': message,
-                    'message_type': message_type,
-                    'timestamp': timezone.now().isoformat(),
-                    'is_read': False
-                }
-                
-                if song_id and message_type == 'SONG':
-                    message_data['song_id'] = song_id
-                if playlist_id and message_type == 'PLAYLIST':
-                    message_data['playlist_id'] = playlist_id
-                
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        'type': 'chat_message',
-                        'message_data': message_data
-                    }
+                # Người nhận tự ẩn "đang gõ" khi nhận tin nhắn, không cần phát thêm sự kiện
+                await self.typing.stop(broadcast=False)
+                # Một group_send cho mỗi người nhận (cả các socket khác của người gửi)
+                await send_to_users(
+                    self.channel_layer,
+                    [self.user.id, self.receiver_id],
+                    message_event(saved_message, self.user, song_id, playlist_id)
                 )
 
         except json.JSONDecodeError:
@@ -114,80 +217,98 @@ class ChatConsumer(AsyncWebsocketConsumer):
         except Exception as e:
             await self.send_error('INTERNAL_ERROR', f'Lỗi hệ thống: {str(e)}')
 
+    def is_own_conversation(self, conversation_id):
+        return conversation_id == self.conversation.id
+
     async def chat_message(self, event):
+        if not self.is_own_conversation(event['conversation_id']):
+            return
         await self.send(text_data=json.dumps({
             'type': 'message',
             'data': event['message_data']
         }))
 
-    @database_sync_to_async
-    def get_conversation(self, conversation_id):
-        try:
-            return Conversation.objects.get(id=conversation_id)
-        except Conversation.DoesNotExist:
-            return None
+    async def typing_indicator(self, event):
+        # Không gửi lại trạng thái gõ cho chính người đang gõ
+        if event['user_id'] == self.user.id or not self.is_own_conversation(event.get('conversation_id')):
+            return
+        await self.send(text_data=json.dumps({
+            'type': 'typing',
+            'data': {
+                'user_id': event['user_id'],
+                'username': event.get('username'),
+                'conversation_id': event.get('conversation_id'),
+                'is_typing': event['is_typing']
+            }
+        }))
 
-    @database_sync_to_async
-    def check_user_in_conversation(self, user, conversation):
-        return conversation.participants.filter(id=user.id).exists()
+    async def presence(self, event):
+        # Chỉ chuyển trạng thái trực tuyến của người còn lại trong cuộc trò chuyện
+        if event['data']['user_id'] != self.receiver_id:
+            return
+        await self.send(text_data=json.dumps({
+            'type': 'presence',
+            'data': event['data']
+        }))
 
-    @database_sync_to_async
-    def get_other_participant(self, conversation, user):
-        return conversation.get_other_participant(user)
+    async def chat_state_changed(self, event):
+        """Người tham gia hoặc hạn chế chat đã thay đổi: nạp lại trạng thái đã lưu"""
+        conversation_ids = event.get('conversation_ids')
+        if conversation_ids is not None and self.conversation.id not in conversation_ids:
+            return
+        state = await self.load_state()
+        if state is None:
+            await self.send_error('CONVERSATION_NOT_FOUND', f'Không tìm thấy cuộc trò chuyện ID: {self.conversation_id}')
+            await self.close(code=self.ERROR_CODES['CONVERSATION_NOT_FOUND'])
+            return
+        self.apply_state(state)
+        if not self.is_participant:
+            await self.send_error('UNAUTHORIZED', 'Bạn không phải là thành viên của cuộc trò chuyện này')
+            await self.close(code=self.ERROR_CODES['UNAUTHORIZED'])
+        elif self.is_restricted():
+            await self.send_error('RESTRICTED', 'Tính năng chat của bạn đã bị hạn chế')
+            await self.close(code=self.ERROR_CODES['RESTRICTED'])
+
+    async def read_receipt(self, event):
+        if not self.is_own_conversation(event['conversation_id']):
+            return
+        await self.send(text_data=json.dumps({
+            'type': 'read',
+            'data': event['data']
+        }))
+
+    async def load_state(self):
+        """Cuộc trò chuyện, tư cách thành viên và thời điểm hết hạn chế chat của người dùng"""
+        # ORM bất đồng bộ: không qua database_sync_to_async (và close_old_connections)
+        return await chat_state_query(self.conversation_id, self.user).afirst()
 
+    def apply_state(self, conversation):
+        self.conversation = conversation
+        self.is_participant = conversation.is_participant
+        self.receiver_id = conversation.other_participant_id
+        self.restricted_until = RESTRICTED_FOREVER if conversation.restricted_forever else conversation.restricted_until
+        if self.typing:
+            self.typing.group = user_group_name(self.receiver_id)
+
+    def is_restricted(self):
+        return self.restricted_until is not None and self.restricted_until > timezone.now()
+
+    # Django chưa có giao dịch bất đồng bộ: INSERT và các UPDATE đi kèm chạy chung một lần database_sync_to_async
     @database_sync_to_async
-    def save_message(self, content, message_type, receiver, song_id=None, playlist_id=None):
+    def save_message(self, content, message_type, receiver_id, song_id=None, playlist_id=None):
         try:
-            message_data = {
-                'sender': self.user,
-                'receiver': receiver,
-                'conversation': self.conversation,
-                'content': content,
-                'is_read': False,
-                'message_type': message_type
-            }
-            
-            if song_id and message_type == 'SONG':
-                from music.models import Song
-                try:
-                    song = Song.objects.get(id=song_id)
-                    message_data['shared_song'] = song
-                except Song.DoesNotExist:
-                    pass
-                    
-            if playlist_id and message_type == 'PLAYLIST':
-                from music.models import Playlist
-                try:
-                    playlist = Playlist.objects.get(id=playlist_id)
-                    message_data['shared_playlist'] = playlist
-                except Playlist.DoesNotExist:
-                    pass
-                    
-            return Message.objects.create(**message_data)
+            return create_message(self.user, self.conversation, receiver_id, content, message_type)
         except Exception as e:
             print(f"Error saving message: {str(e)}")
             return None
 
     @database_sync_to_async
-    def update_conversation_time(self, conversation):
-        conversation.updated_at = timezone.now()
-        conversation.save(update_fields=['updated_at'])
-
-    @database_sync_to_async
-    def check_user_restriction(self, user):
+    def mark_read(self, message_id):
         try:
-            active_restrictions = ChatRestriction.objects.filter(
-                user=user, 
-                is_active=True
-            )
-            
-            for restriction in active_restrictions:
-                if restriction.restriction_type == 'PERMANENT' or not restriction.is_expired:
-                    return True
-                    
-            return False
-        except Exception:
+            message_id = int(message_id) if message_id is not None else None
+        except (TypeError, ValueError):
             return False
+        return mark_read(self.conversation, self.user, message_id, participant_ids=[self.user.id, self.receiver_id])
 
     async def send_error(self, code, message):
         await self.send(text_data=json.dumps({
@@ -202,3 +323,234 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'code': code,
             'message': message
         }))
+
+
+class UserChatConsumer(AsyncWebsocketConsumer):
+    """
+    Một kết nối cho mọi cuộc trò chuyện của người dùng (ws/chat/).
+
+    Tham gia group ``user_{id}``; khung gửi lên và gửi xuống đều kèm
+    ``conversation_id``:
+
+    - lên: ``{"type": "message" | "read" | "typing", "conversation_id": ..., ...}``
+      (các trường còn lại như ChatConsumer)
+    - xuống: ``message``, ``read``, ``typing`` (kèm ``conversation_id``),
+      ``presence`` (``{"user_id", "online"}``) và ``conversations`` khi danh
+      sách cuộc trò chuyện thay đổi
+    """
+    ERROR_CODES = ChatConsumer.ERROR_CODES
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = None
+        self.user_group_name = None
+        # conversation_id -> id người còn lại, nạp khi kết nối và khi nhận chat_state_changed
+        self.conversations = {}
+        self.restricted_until = None
+        self.typing = {}
+        self.counted_online = False
+
+    async def connect(self):
+        self.user = self.scope["user"]
+        if not self.user.is_authenticated:
+            await self.send_error('UNAUTHORIZED', 'Vui lòng đăng nhập để sử dụng tính năng chat')
+            await self.close(code=self.ERROR_CODES['UNAUTHORIZED'])
+            return
+
+        # ChatRestrictionMiddleware không kiểm tra hạn chế cho đường dẫn này
+        await self.load_state()
+        if self.is_restricted():
+            await self.send_error('RESTRICTED', 'Tính năng chat của bạn đã bị hạn chế')
+            await self.close(code=self.ERROR_CODES['RESTRICTED'])
+            return
+
+        self.user_group_name = user_group_name(self.user.id)
+        await self.channel_layer.group_add(self.user_group_name, self.channel_name)
+        await self.accept()
+
+        self.counted_online = True
+        if await user_connected(self.user.id):
+            await self.broadcast_presence(True)
+        online = await online_users(self.contact_ids())
+        await self.send(text_data=json.dumps({
+            'type': 'success',
+            'code': 'CONNECTED',
+            'message': 'Kết nối WebSocket thành công',
+            'data': {
+                'conversations': self.conversation_list(),
+                'online': sorted(online),
+            }
+        }))
+
+    async def disconnect(self, close_code):
+        for typing in self.typing.values():
+            await typing.stop()
+        self.typing = {}
+        if self.user_group_name:
+            await self.channel_layer.group_discard(self.user_group_name, self.channel_name)
+        if self.counted_online and await user_disconnected(self.user.id):
+            await self.broadcast_presence(False)
+
+    async def receive(self, text_data):
+        try:
+            data = json.loads(text_data)
+            frame_type = data.get('type', 'message')
+            try:
+                conversation_id = int(data.get('conversation_id'))
+            except (TypeError, ValueError):
+                conversation_id = None
+            if conversation_id not in self.conversations:
+                await self.send_error('CONVERSATION_NOT_FOUND', f'Không tìm thấy cuộc trò chuyện ID: {data.get("conversation_id")}')
+                return
+            receiver_id = self.conversations[conversation_id]
+
+            if frame_type == 'read':
+                await self.mark_read(conversation_id, receiver_id, data.get('message_id'))
+                return
+
+            if frame_type == 'typing':
+                await self.get_typing(conversation_id).update(data.get('is_typing', False))
+                return
+
+            parsed = parse_message(data)
+            if parsed is None:
+                await self.send_error('INVALID_MESSAGE', 'Tin nhắn không hợp lệ')
+                return
+            message, message_type, song_id, playlist_id = parsed
+
+            if self.is_restricted():
+                await self.send_error('RESTRICTED', 'Tính năng chat của bạn đã bị hạn chế')
+                await self.close(code=self.ERROR_CODES['RESTRICTED'])
+                return
+
+            saved_message = await self.save_message(conversation_id, receiver_id, message, message_type)
+            if saved_message:
+                if conversation_id in self.typing:
+                    await self.typing[conversation_id].stop(broadcast=False)
+                await send_to_users(
+                    self.channel_layer,
+                    [self.user.id, receiver_id],
+                    message_event(saved_message, self.user, song_id, playlist_id)
+                )
+
+        except json.JSONDecodeError:
+            await self.send_error('INVALID_MESSAGE', 'Định dạng tin nhắn không hợp lệ')
+        except Exception as e:
+            await self.send_error('INTERNAL_ERROR', f'Lỗi hệ thống: {str(e)}')
+
+    async def chat_message(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'message',
+            'conversation_id': event['conversation_id'],
+            'data': event['message_data']
+        }))
+
+    async def read_receipt(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'read',
+            'conversation_id': event['conversation_id'],
+            'data': event['data']
+        }))
+
+    async def typing_indicator(self, event):
+        if event['user_id'] == self.user.id:
+            return
+        await self.send(text_data=json.dumps({
+            'type': 'typing',
+            'conversation_id': event.get('conversation_id'),
+            'data': {
+                'user_id': event['user_id'],
+                'username': event.get('username'),
+                'is_typing': event['is_typing']
+            }
+        }))
+
+    async def presence(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'presence',
+            'data': event['data']
+        }))
+
+    async def chat_state_changed(self, event):
+        """Người tham gia hoặc hạn chế chat đã thay đổi: nạp lại danh sách cuộc trò chuyện"""
+        await self.load_state()
+        if self.is_restricted():
+            await self.send_error('RESTRICTED', 'Tính năng chat của bạn đã bị hạn chế')
+            await self.close(code=self.ERROR_CODES['RESTRICTED'])
+            return
+        for conversation_id in list(self.typing):
+            if conversation_id not in self.conversations:
+                await self.typing.pop(conversation_id).stop()
+        await self.send(text_data=json.dumps({
+            'type': 'conversations',
+            'data': {'conversations': self.conversation_list()}
+        }))
+
+    async def load_state(self):
+        """Các cuộc trò chuyện (kèm người còn lại) và thời điểm hết hạn chế chat: hai truy vấn"""
+        conversations = {}
+        async for conversation_id, user_id in Conversation.participants.through.objects.filter(
+            conversation__participants=self.user
+        ).values_list('conversation_id', 'user_id'):
+            conversations.setdefault(conversation_id, None)
+            if user_id != self.user.id:
+                conversations[conversation_id] = user_id
+        self.conversations = conversations
+        self.restricted_until = restricted_until([
+            restriction async for restriction in ChatRestriction.objects.filter(
+                user=self.user, is_active=True
+            ).values_list('restriction_type', 'expires_at')
+        ])
+
+    def is_restricted(self):
+        return self.restricted_until is not None and self.restricted_until > timezone.now()
+
+    def contact_ids(self):
+        return {user_id for user_id in self.conversations.values() if user_id is not None}
+
+    def conversation_list(self):
+        return [
+            {'conversation_id': conversation_id, 'user_id': user_id}
+            for conversation_id, user_id in sorted(self.conversations.items())
+        ]
+
+    def get_typing(self, conversation_id):
+        if conversation_id not in self.typing:
+            self.typing[conversation_id] = TypingCoalescer(
+                self.channel_layer, user_group_name(self.conversations[conversation_id]), self.user.id,
+                extra={'username': self.user.username, 'conversation_id': conversation_id}
+            )
+        return self.typing[conversation_id]
+
+    async def broadcast_presence(self, online):
+        """Socket đầu tiên / cuối cùng của người dùng: báo cho những người đã trò chuyện cùng"""
+        await send_to_users(self.channel_layer, sorted(self.contact_ids()), {
+            'type': 'presence',
+            'data': {'user_id': self.user.id, 'online': online}
+        })
+
+    @database_sync_to_async
+    def save_message(self, conversation_id, receiver_id, content, message_type):
+        try:
+            return create_message(self.user, Conversation(id=conversation_id), receiver_id, content, message_type)
+        except Exception as e:
+            print(f"Error saving message: {str(e)}")
+            return None
+
+    @database_sync_to_async
+    def mark_read(self, conversation_id, receiver_id, message_id):
+        try:
+            message_id = int(message_id) if message_id is not None else None
+        except (TypeError, ValueError):
+            return False
+        return mark_read(
+            Conversation(id=conversation_id), self.user, message_id,
+            participant_ids=[self.user.id, receiver_id]
+        )
+
+    async def send_error(self, code, message):
+        await self.send(text_data=json.dumps({
+            'type': 'error',
+            'code': code,
+            'message': message
+        }))
@@ -0,0 +1,20 @@
+"""
+Phát sự kiện chat qua channel layer theo người nhận.
+
+Mỗi kết nối WebSocket chat (ChatConsumer theo từng cuộc trò chuyện hay
+UserChatConsumer dùng chung cho mọi cuộc trò chuyện) tham gia group
+``user_{user_id}`` của người dùng. Tin nhắn mới, con trỏ đã đọc, trạng thái
+gõ và trạng thái trực tuyến được gửi bằng một ``group_send`` cho mỗi người
+nhận, kèm ``conversation_id`` để consumer lọc hoặc gắn nhãn khung gửi xuống.
+"""
+
+
+def user_group_name(user_id):
+    return f'user_{user_id}'
+
+
+async def send_to_users(channel_layer, user_ids, event):
+    """Một group_send cho mỗi người nhận (bỏ trùng, giữ thứ tự)"""
+    for user_id in dict.fromkeys(user_ids):
+        if user_id is not None:
+            await channel_layer.group_send(user_group_name(user_id), event)
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from channels.layers import DEFAULT_CHANNEL_LAYER, InMemoryChannelLayer, channel_layers
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from chat.models import Conversation
+from chat.routing import websocket_urlpatterns
+
+User = get_user_model()
+
+
+class CountingChannelLayer(InMemoryChannelLayer):
+    """InMemoryChannelLayer đếm số lần group_send"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.group_sends = 0
+
+    async def group_send(self, group, message):
+        self.group_sends += 1
+        await super().group_send(group, message)
+
+
+class Command(BaseCommand):
+    help = (
+        'Đo số lần group_send mỗi giây do sự kiện "đang gõ" của ChatConsumer, '
+        'khi chuyển tiếp từng sự kiện (cũ) và khi gộp bằng TypingCoalescer'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conversations', type=int, default=50, help='Số cuộc trò chuyện, mỗi cuộc hai socket')
+        parser.add_argument('--duration', type=float, default=5.0, help='Số giây giả lập gõ phím')
+        parser.add_argument('--keystroke', type=float, default=0.08,
+                            help='Giây giữa hai sự kiện typing của một client')
+        parser.add_argument('--interval', type=float, default=0.5, help='CHAT_TYPING INTERVAL khi gộp')
+
+    def handle(self, *args, **options):
+        marker = f'bench-{uuid.uuid4().hex[:8]}'
+        users, conversations = [], []
+        for i in range(options['conversations']):
+            pair = [
+                User.objects.create_user(
+                    username=f'{marker}-{i}-{side}',
+                    email=f'{marker}-{i}-{side}@example.com',
+                    password=uuid.uuid4().hex,
+                )
+                for side in ('a', 'b')
+            ]
+            users.extend(pair)
+            conversations.append((Conversation.get_or_create_conversation(*pair), pair))
+
+        try:
+            results = []
+            for label, typing_settings in (
+                ('Chuyển tiếp từng sự kiện', {'COALESCE': False}),
+                ('Gộp sự kiện', {'COALESCE': True, 'INTERVAL': options['interval']}),
+            ):
+                with override_settings(CHAT_TYPING=typing_settings):
+                    received, sends, elapsed = asyncio.run(self._run(conversations, options))
+                results.append(sends / elapsed)
+                self.stdout.write(
+                    f'{label}: {received} sự kiện typing -> {sends} group_send '
+                    f'({sends / elapsed:.0f}/giây, {received / elapsed:.0f} sự kiện/giây)'
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f'Số group_send mỗi giây giảm {results[0] / max(results[1], 1e-9):.1f} lần'
+            ))
+        finally:
+            Conversation.objects.filter(participants__in=users).delete()
+            User.objects.filter(id__in=[user.id for user in users]).delete()
+
+    async def _run(self, conversations, options):
+        layer = CountingChannelLayer()
+        previous = channel_layers.backends.get(DEFAULT_CHANNEL_LAYER)
+        channel_layers.backends[DEFAULT_CHANNEL_LAYER] = layer
+        try:
+            sockets = []
+            for conversation, pair in conversations:
+                for user in pair:
+                    communicator = WebsocketCommunicator(
+                        URLRouter(websocket_urlpatterns), f'/ws/chat/{conversation.id}/'
+                    )
+                    communicator.scope['user'] = user
+                    connected, _ = await communicator.connect()
+                    if not connected:
+                        raise RuntimeError(f'Không kết nối được tới cuộc trò chuyện {conversation.id}')
+                    await communicator.receive_from()  # CONNECTED
+                    sockets.append(communicator)
+
+            layer.group_sends = 0
+            started = time.perf_counter()
+            deadline = started + options['duration']
+            counts = await asyncio.gather(*(
+                self._type(communicator, deadline, options['keystroke']) for communicator in sockets
+            ))
+            elapsed = time.perf_counter() - started
+            sends = layer.group_sends
+
+            for communicator in sockets:
+                await communicator.disconnect()
+            return sum(counts), sends, elapsed
+        finally:
+            if previous is None:
+                channel_layers.backends.pop(DEFAULT_CHANNEL_LAYER, None)
+            else:
+                channel_layers.backends[DEFAULT_CHANNEL_LAYER] = previous
+
+    async def _type(self, communicator, deadline, keystroke):
+        """Gõ từng đợt 1-3 giây, gửi typing mỗi lần gõ phím, rồi dừng một lúc"""
+        rng = random.Random()
+        sent = 0
+        while time.perf_counter() < deadline:
+            burst_end = time.perf_counter() + rng.uniform(1, 3)
+            while time.perf_counter() < min(burst_end, deadline):
+                await communicator.send_to(text_data=json.dumps({'type': 'typing', 'is_typing': True}))
+                sent += 1
+                await asyncio.sleep(keystroke * rng.uniform(0.5, 1.5))
+            await communicator.send_to(text_data=json.dumps({'type': 'typing', 'is_typing': False}))
+            sent += 1
+            await asyncio.sleep(rng.uniform(0.2, 1))
+        return sent
@@ -0,0 +1,175 @@
+import asyncio
+import json
+import time
+import tracemalloc
+import uuid
+
+from channels.layers import DEFAULT_CHANNEL_LAYER, InMemoryChannelLayer, channel_layers
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from chat.models import Conversation, Message
+from chat.presence import PRESENCE_PREFIX
+from chat.routing import websocket_urlpatterns
+
+User = get_user_model()
+
+
+class CountingChannelLayer(InMemoryChannelLayer):
+    """InMemoryChannelLayer đếm số lần group_send và số sự kiện được đưa vào hàng đợi của socket"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.group_sends = 0
+        self.deliveries = 0
+
+    async def group_send(self, group, message):
+        self.group_sends += 1
+        await super().group_send(group, message)
+
+    async def send(self, channel, message):
+        self.deliveries += 1
+        await super().send(channel, message)
+
+    def memberships(self):
+        return sum(len(channels) for channels in self.groups.values())
+
+
+class Command(BaseCommand):
+    help = (
+        'So sánh mở một socket ws/chat/<id>/ cho mỗi cuộc trò chuyện với một socket ws/chat/ dùng chung '
+        'cho mọi cuộc trò chuyện của người dùng: số kết nối, số thành viên group, bộ nhớ (tracemalloc, '
+        'gồm cả WebsocketCommunicator giả lập client), kết nối/giây, group_send và số sự kiện phải chuyển '
+        'tới socket cho mỗi tin nhắn'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--conversations', type=int, default=10,
+                            help='Số cuộc trò chuyện của mỗi người dùng (số chẵn)')
+        parser.add_argument('--messages', type=int, default=2, help='Số tin nhắn gửi trong mỗi cuộc trò chuyện')
+
+    def handle(self, *args, **options):
+        marker = f'bench-{uuid.uuid4().hex[:8]}'
+        count = options['users']
+        # Tạo hàng loạt, không băm mật khẩu cho từng người dùng
+        User.objects.bulk_create([
+            User(username=f'{marker}-{i}', email=f'{marker}-{i}@example.com', password='!')
+            for i in range(count)
+        ])
+        users = list(User.objects.filter(username__startswith=f'{marker}-').order_by('id'))
+        # Mỗi người dùng trò chuyện với conversations/2 người kế tiếp trên vòng tròn
+        conversations = []
+        for i, user in enumerate(users):
+            for step in range(1, options['conversations'] // 2 + 1):
+                other = users[(i + step) % count]
+                conversations.append((Conversation.get_or_create_conversation(user, other).id, user, other))
+
+        try:
+            results = {}
+            for label, multiplexed in (('Mỗi cuộc trò chuyện một socket', False), ('ws/chat/ dùng chung', True)):
+                cache.delete_many([f'{PRESENCE_PREFIX}{user.id}' for user in users])
+                results[label] = asyncio.run(self._run(users, conversations, options['messages'], multiplexed))
+                Message.objects.filter(sender__in=users).delete()
+                sent = len(conversations) * options['messages']
+                result = results[label]
+                self.stdout.write(
+                    f'{label}: {result["sockets"]} socket, {result["memberships"]} thành viên group, '
+                    f'{result["memory"] / 1024 / 1024:.1f} MB ({result["memory"] / result["sockets"] / 1024:.1f} KB/socket), '
+                    f'{result["connects_per_second"]:.0f} kết nối/giây, '
+                    f'{result["group_sends"] / sent:.1f} group_send và {result["deliveries"] / sent:.1f} sự kiện '
+                    f'tới socket mỗi tin nhắn, {sent / result["elapsed"]:.0f} tin nhắn/giây'
+                )
+            legacy, multiplexed = results.values()
+            self.stdout.write(self.style.SUCCESS(
+                f'Socket: {legacy["sockets"]} -> {multiplexed["sockets"]}, '
+                f'bộ nhớ x{legacy["memory"] / multiplexed["memory"]:.1f} ít hơn, '
+                f'thời gian kết nối mọi socket x{legacy["connect_time"] / multiplexed["connect_time"]:.1f} ngắn hơn'
+            ))
+        finally:
+            Conversation.objects.filter(participants__in=users).delete()
+            User.objects.filter(id__in=[user.id for user in users]).delete()
+
+    async def _run(self, users, conversations, messages, multiplexed):
+        layer = CountingChannelLayer(capacity=len(conversations) * messages + 100)
+        previous = channel_layers.backends.get(DEFAULT_CHANNEL_LAYER)
+        channel_layers.backends[DEFAULT_CHANNEL_LAYER] = layer
+        application = URLRouter(websocket_urlpatterns)
+        try:
+            # (socket, số tin nhắn socket phải nhận), và socket dùng để gửi tin của từng cuộc trò chuyện
+            sockets, senders = [], {}
+            tracemalloc.start()
+            baseline = tracemalloc.get_traced_memory()[0]
+            started = time.perf_counter()
+            if multiplexed:
+                per_user = {}
+                for user in users:
+                    communicator = WebsocketCommunicator(application, '/ws/chat/')
+                    communicator.scope['user'] = user
+                    per_user[user.id] = communicator
+                await asyncio.gather(*(self._connect(communicator) for communicator in per_user.values()))
+                # Mỗi người dùng nhận tin của mọi cuộc trò chuyện trên cùng một socket
+                per_socket = 2 * len(conversations) // len(users) * messages
+                sockets = [(communicator, per_socket) for communicator in per_user.values()]
+                senders = {conversation_id: per_user[first.id] for conversation_id, first, _ in conversations}
+            else:
+                for conversation_id, first, other in conversations:
+                    for user in (first, other):
+                        communicator = WebsocketCommunicator(application, f'/ws/chat/{conversation_id}/')
+                        communicator.scope['user'] = user
+                        sockets.append((communicator, messages))
+                        if user is first:
+                            senders[conversation_id] = communicator
+                await asyncio.gather(*(self._connect(communicator) for communicator, _ in sockets))
+            connect_time = time.perf_counter() - started
+            memory = tracemalloc.get_traced_memory()[0] - baseline
+            tracemalloc.stop()
+            memberships = layer.memberships()
+
+            layer.group_sends = layer.deliveries = 0
+            started = time.perf_counter()
+            for conversation_id, communicator in senders.items():
+                for i in range(messages):
+                    frame = {'message': f'Tin nhắn {i}'}
+                    if multiplexed:
+                        frame['conversation_id'] = conversation_id
+                    await communicator.send_to(text_data=json.dumps(frame))
+            await asyncio.gather(*(self._receive(communicator, expected) for communicator, expected in sockets))
+            elapsed = time.perf_counter() - started
+            group_sends, deliveries = layer.group_sends, layer.deliveries
+
+            await asyncio.gather(*(communicator.disconnect() for communicator, _ in sockets))
+            return {
+                'sockets': len(sockets),
+                'memberships': memberships,
+                'memory': memory,
+                'connect_time': connect_time,
+                'connects_per_second': len(sockets) / connect_time,
+                'group_sends': group_sends,
+                'deliveries': deliveries,
+                'elapsed': elapsed,
+            }
+        finally:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            if previous is None:
+                channel_layers.backends.pop(DEFAULT_CHANNEL_LAYER, None)
+            else:
+                channel_layers.backends[DEFAULT_CHANNEL_LAYER] = previous
+
+    async def _connect(self, communicator):
+        connected, _ = await communicator.connect(timeout=60)
+        if not connected:
+            raise RuntimeError('Không kết nối được socket')
+        await communicator.receive_from(timeout=60)  # CONNECTED
+
+    async def _receive(self, communicator, expected):
+        """Chờ nhận đủ ``expected`` tin nhắn (bỏ qua sự kiện trực tuyến)"""
+        received = 0
+        while received < expected:
+            frame = json.loads(await communicator.receive_from(timeout=120))
+            if frame.get('type') == 'message':
+                received += 1
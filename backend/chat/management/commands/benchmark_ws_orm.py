@@ -0,0 +1,166 @@
+import asyncio
+import json
+import time
+import uuid
+
+from channels.db import database_sync_to_async
+from channels.layers import DEFAULT_CHANNEL_LAYER, InMemoryChannelLayer, channel_layers
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.urls import re_path
+from rest_framework_simplejwt.tokens import AccessToken
+
+from chat.consumers import ChatConsumer
+from chat.middleware import ChatRestrictionMiddleware, TokenAuthMiddleware, get_user_from_token
+from chat.models import ChatRestriction, Conversation, Message
+
+User = get_user_model()
+
+
+class LegacyChatConsumer(ChatConsumer):
+    """Nạp trạng thái bằng nhiều truy vấn qua database_sync_to_async như trước khi dùng ORM bất đồng bộ"""
+
+    @database_sync_to_async
+    def load_state(self):
+        conversation = Conversation.objects.filter(id=self.conversation_id).first()
+        if conversation is None:
+            return None
+        participants = list(User.objects.filter(conversations=conversation))
+        restrictions = [
+            restriction for restriction in ChatRestriction.objects.filter(user=self.user, is_active=True)
+            if restriction.restriction_type == 'PERMANENT' or not restriction.is_expired
+        ]
+        conversation.is_participant = any(user.id == self.user.id for user in participants)
+        conversation.other_participant_id = next((user.id for user in participants if user.id != self.user.id), None)
+        conversation.restricted_forever = bool(restrictions)
+        conversation.restricted_until = None
+        return conversation
+
+
+class LegacyTokenAuthMiddleware(TokenAuthMiddleware):
+    async def __call__(self, scope, receive, send):
+        token = scope['query_string'].decode().split('token=')[-1]
+        user = await database_sync_to_async(get_user_from_token)(token)
+        return await self.inner(dict(scope, user=user), receive, send)
+
+
+class LegacyChatRestrictionMiddleware(ChatRestrictionMiddleware):
+    """Kiểm tra hạn chế ở cả middleware lẫn consumer như trước"""
+
+    async def __call__(self, scope, receive, send):
+        if await self.check_user_restriction(scope['user']):
+            return await send({'type': 'websocket.close', 'code': 4000})
+        return await self.inner(scope, receive, send)
+
+    @database_sync_to_async
+    def check_user_restriction(self, user):
+        if user.is_admin:
+            return False
+        return any(
+            restriction.restriction_type == 'PERMANENT' or not restriction.is_expired
+            for restriction in ChatRestriction.objects.filter(user=user, is_active=True)
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        'Mô phỏng nhiều socket ws/chat/ trên InMemoryChannelLayer: so sánh kết nối/giây và tin nhắn/giây '
+        'của cách cũ (database_sync_to_async, nhiều truy vấn khi bắt tay) và hiện tại (ORM bất đồng bộ, '
+        'một truy vấn khi bắt tay, người dùng lưu cache theo jti). Từ vòng thứ hai, các socket kết nối lại '
+        'với token cũ như sau khi deploy'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sockets', type=int, default=1000, help='Số socket (mỗi cuộc trò chuyện hai socket)')
+        parser.add_argument('--messages', type=int, default=5, help='Số tin nhắn mỗi socket gửi')
+        parser.add_argument('--rounds', type=int, default=2)
+
+    def handle(self, *args, **options):
+        marker = f'bench-{uuid.uuid4().hex[:8]}'
+        pairs = max(1, options['sockets'] // 2)
+        # Tạo hàng loạt, không băm mật khẩu cho từng người dùng
+        users = User.objects.bulk_create([
+            User(username=f'{marker}-{i}', email=f'{marker}-{i}@example.com', password='!')
+            for i in range(pairs * 2)
+        ])
+        users = list(User.objects.filter(username__startswith=f'{marker}-').order_by('id'))
+        sessions = []
+        for i in range(pairs):
+            first, second = users[2 * i], users[2 * i + 1]
+            conversation = Conversation.get_or_create_conversation(first, second)
+            sessions.extend(
+                (conversation.id, str(AccessToken.for_user(user))) for user in (first, second)
+            )
+
+        legacy = LegacyTokenAuthMiddleware(LegacyChatRestrictionMiddleware(URLRouter([
+            re_path(r'ws/chat/(?P<conversation_id>\d+)/$', LegacyChatConsumer.as_asgi()),
+        ])))
+        current = TokenAuthMiddleware(ChatRestrictionMiddleware(URLRouter([
+            re_path(r'ws/chat/(?P<conversation_id>\d+)/$', ChatConsumer.as_asgi()),
+        ])))
+
+        try:
+            results = {'database_sync_to_async': [], 'ORM bất đồng bộ': []}
+            for _ in range(options['rounds']):
+                for label, application in (('database_sync_to_async', legacy), ('ORM bất đồng bộ', current)):
+                    results[label].append(asyncio.run(self._run(application, sessions, options['messages'])))
+                    Message.objects.filter(sender__in=users).delete()
+
+            for label, outcomes in results.items():
+                connects = ', '.join(f'{connects_per_second:.0f}' for connects_per_second, _ in outcomes)
+                messages_per_second = max(rate for _, rate in outcomes)
+                self.stdout.write(
+                    f'{label}: kết nối/giây theo vòng [{connects}], {messages_per_second:.0f} tin nhắn/giây '
+                    f'({len(sessions)} socket, {options["messages"]} tin nhắn mỗi socket)'
+                )
+            legacy_connects, legacy_rate = results['database_sync_to_async'][-1]
+            current_connects, current_rate = results['ORM bất đồng bộ'][-1]
+            self.stdout.write(self.style.SUCCESS(
+                f'Kết nối lại: x{current_connects / legacy_connects:.2f}, '
+                f'tin nhắn/giây: x{current_rate / legacy_rate:.2f} so với cách cũ'
+            ))
+        finally:
+            Conversation.objects.filter(participants__in=users).delete()
+            User.objects.filter(id__in=[user.id for user in users]).delete()
+
+    async def _run(self, application, sessions, messages):
+        previous = channel_layers.backends.get(DEFAULT_CHANNEL_LAYER)
+        channel_layers.backends[DEFAULT_CHANNEL_LAYER] = InMemoryChannelLayer(capacity=messages * 4 + 10)
+        try:
+            sockets = [
+                WebsocketCommunicator(application, f'/ws/chat/{conversation_id}/?token={token}')
+                for conversation_id, token in sessions
+            ]
+            started = time.perf_counter()
+            await asyncio.gather(*(self._connect(communicator) for communicator in sockets))
+            connects_per_second = len(sockets) / (time.perf_counter() - started)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(self._chat(communicator, messages) for communicator in sockets))
+            messages_per_second = len(sockets) * messages / (time.perf_counter() - started)
+
+            await asyncio.gather(*(communicator.disconnect() for communicator in sockets))
+            return connects_per_second, messages_per_second
+        finally:
+            if previous is None:
+                channel_layers.backends.pop(DEFAULT_CHANNEL_LAYER, None)
+            else:
+                channel_layers.backends[DEFAULT_CHANNEL_LAYER] = previous
+
+    async def _connect(self, communicator):
+        connected, _ = await communicator.connect(timeout=60)
+        if not connected:
+            raise RuntimeError('Không kết nối được socket')
+        await communicator.receive_from(timeout=60)  # CONNECTED
+
+    async def _chat(self, communicator, messages):
+        """Gửi ``messages`` tin nhắn và chờ nhận đủ tin của mình và của người còn lại"""
+        for i in range(messages):
+            await communicator.send_to(text_data=json.dumps({'message': f'Tin nhắn {i}'}))
+        received = 0
+        while received < messages * 2:
+            frame = json.loads(await communicator.receive_from(timeout=120))
+            if frame.get('type') == 'message':
+                received += 1
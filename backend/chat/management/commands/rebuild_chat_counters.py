@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from chat.receipts import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Dựng lại tin nhắn mới nhất (last_message, last_message_at) của cuộc trò chuyện, '
+        'con trỏ đã đọc còn thiếu và số tin chưa đọc từ bảng chat_messages'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conversation', type=int, action='append', dest='conversations',
+                            help='Chỉ dựng lại cuộc trò chuyện này (có thể lặp lại)')
+
+    def handle(self, *args, **options):
+        conversations, created, cursors = rebuild_counters(options['conversations'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Đã dựng lại {conversations} cuộc trò chuyện, tạo {created} con trỏ đã đọc, '
+            f'cập nhật số tin chưa đọc của {cursors} con trỏ'
+        ))
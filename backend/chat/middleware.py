@@ -1,7 +1,9 @@
 import json
+import re
+import time
+from django.core.cache import cache
 from django.utils import timezone
 from django.contrib.auth import get_user_model
-from channels.db import database_sync_to_async
 from .models import ChatRestriction
 from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.tokens import AccessToken, UntypedToken
@@ -13,6 +15,11 @@ from django.conf import settings
 
 User = get_user_model()
 
+# ChatConsumer (chat_state_query) và UserChatConsumer tự kiểm tra hạn chế khi nạp trạng thái
+CONSUMER_CHECKED_PATH = re.compile(r'^/?ws/chat/(\d+/)?$')
+
+USER_CACHE_PREFIX = 'ws:user:'
+
 class ChatRestrictionMiddleware:
     """
     Middleware để kiểm tra xem người dùng có bị hạn chế tính năng chat không
@@ -27,6 +34,10 @@ class ChatRestrictionMiddleware:
         if scope["type"] != "websocket":
             return await self.inner(scope, receive, send)
             
+        # ChatConsumer đã kiểm tra hạn chế khi kết nối, không truy vấn hai lần
+        if CONSUMER_CHECKED_PATH.match(scope.get("path", "")):
+            return await self.inner(scope, receive, send)
+            
         # Lấy thông tin người dùng từ scope
         user = scope.get("user", None)
         if not user or not user.is_authenticated:
@@ -47,8 +58,7 @@ class ChatRestrictionMiddleware:
         # Người dùng không bị hạn chế, cho phép kết nối đi tiếp
         return await self.inner(scope, receive, send)
     
-    @database_sync_to_async
-    def check_user_restriction(self, user):
+    async def check_user_restriction(self, user):
         """Kiểm tra xem người dùng có bị hạn chế chat không"""
         
         # Admin luôn được phép chat
@@ -62,7 +72,7 @@ class ChatRestrictionMiddleware:
         )
         
         now = timezone.now()
-        for restriction in active_restrictions:
+        async for restriction in active_restrictions:
             # Nếu là hạn chế vĩnh viễn hoặc chưa hết hạn
             if restriction.restriction_type == 'PERMANENT' or (restriction.expires_at and restriction.expires_at > now):
                 return True
@@ -70,7 +80,7 @@ class ChatRestrictionMiddleware:
             # Nếu đã hết hạn, cập nhật trạng thái
             if restriction.expires_at and restriction.expires_at <= now:
                 restriction.is_active = False
-                restriction.save(update_fields=['is_active'])
+                await restriction.asave(update_fields=['is_active'])
                 
         return False
         
@@ -90,6 +100,36 @@ def get_user_from_token(token):
         except (TokenError, User.DoesNotExist):
             return None
 
+async def aget_user_from_token(token):
+    """
+    Phiên bản bất đồng bộ của get_user_from_token, dùng ORM bất đồng bộ.
+
+    Người dùng được lưu trong cache theo ``jti`` của token trong
+    CHAT_WS_USER_CACHE_TTL giây (không quá thời hạn của token), để các lần
+    kết nối lại hàng loạt (vd. sau khi deploy) không truy vấn lại.
+    """
+    # Đầu tiên thử với AccessToken, sau đó với UntypedToken
+    for token_class in (AccessToken, UntypedToken):
+        try:
+            token_obj = token_class(token)
+        except TokenError:
+            continue
+        jti = token_obj.get('jti')
+        key = f"{USER_CACHE_PREFIX}{jti}" if jti else None
+        if key:
+            user = await cache.aget(key)
+            if user is not None:
+                return user
+        try:
+            user = await User.objects.aget(id=token_obj['user_id'])
+        except User.DoesNotExist:
+            continue
+        ttl = min(getattr(settings, 'CHAT_WS_USER_CACHE_TTL', 60), int(token_obj.get('exp', 0) - time.time()))
+        if key and ttl > 0:
+            await cache.aset(key, user, ttl)
+        return user
+    return None
+
 class TokenAuthMiddleware(BaseMiddleware):
     """
     Middleware xác thực JWT token từ query parameter
@@ -112,15 +152,10 @@ class TokenAuthMiddleware(BaseMiddleware):
         # Nếu có token, xác thực và lấy thông tin người dùng
         try:
             # Thử xác thực token
-            user = await self.get_user_from_token(token)
+            user = await aget_user_from_token(token)
             scope["user"] = user if user else AnonymousUser()
         except Exception:
             # Nếu có lỗi, đặt người dùng là AnonymousUser
             scope["user"] = AnonymousUser()
         
         return await self.inner(scope, receive, send)
-    
-    @database_sync_to_async
-    def get_user_from_token(self, token):
-        """Lấy user từ token"""
-        return get_user_from_token(token) 
\ No newline at end of file
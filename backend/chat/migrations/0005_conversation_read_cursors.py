@@ -0,0 +1,65 @@
+# Generated by Django 5.0.1 on 2026-10-17 04:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max, Min
+
+
+def backfill_read_cursors(apps, schema_editor):
+    """
+    Tạo con trỏ đã đọc cho mọi người tham gia từ cờ is_read: con trỏ dừng ngay
+    trước tin nhắn chưa đọc đầu tiên của người đó, hoặc ở tin nhắn mới nhất nếu
+    đã đọc hết.
+    """
+    Conversation = apps.get_model('chat', 'Conversation')
+    Message = apps.get_model('chat', 'Message')
+    ConversationReadCursor = apps.get_model('chat', 'ConversationReadCursor')
+
+    latest = dict(
+        Message.objects.exclude(conversation=None).values('conversation_id')
+        .annotate(latest=Max('id')).order_by().values_list('conversation_id', 'latest')
+    )
+    first_unread = {
+        (row['conversation_id'], row['receiver_id']): row['first_unread']
+        for row in Message.objects.filter(is_read=False).exclude(conversation=None)
+        .values('conversation_id', 'receiver_id').annotate(first_unread=Min('id')).order_by()
+    }
+
+    Participant = Conversation.participants.through
+    cursors = []
+    for conversation_id, user_id in Participant.objects.values_list('conversation_id', 'user_id').iterator():
+        unread = first_unread.get((conversation_id, user_id))
+        last_read = unread - 1 if unread is not None else latest.get(conversation_id, 0)
+        cursors.append(ConversationReadCursor(
+            conversation_id=conversation_id, user_id=user_id, last_read_message_id=last_read
+        ))
+        if len(cursors) >= 1000:
+            ConversationReadCursor.objects.bulk_create(cursors, ignore_conflicts=True)
+            cursors = []
+    ConversationReadCursor.objects.bulk_create(cursors, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_remove_message_shared_playlist_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationReadCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_message_id', models.PositiveBigIntegerField(default=0)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to='chat.conversation')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_read_cursors', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'chat_read_cursors',
+                'unique_together': {('conversation', 'user')},
+            },
+        ),
+        migrations.RunPython(backfill_read_cursors, migrations.RunPython.noop),
+    ]
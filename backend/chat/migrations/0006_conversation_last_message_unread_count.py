@@ -0,0 +1,61 @@
+# Generated by Django 5.0.1 on 2026-10-17 05:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_last_message_and_unread(apps, schema_editor):
+    """
+    Điền tin nhắn mới nhất của mỗi cuộc trò chuyện và số tin chưa đọc của mỗi
+    con trỏ từ chat_messages (như lệnh rebuild_chat_counters)
+    """
+    Conversation = apps.get_model('chat', 'Conversation')
+    Message = apps.get_model('chat', 'Message')
+    ConversationReadCursor = apps.get_model('chat', 'ConversationReadCursor')
+
+    latest = Message.objects.filter(conversation=OuterRef('pk')).order_by('-id')
+    Conversation.objects.update(
+        last_message=Subquery(latest.values('id')[:1]),
+        last_message_at=Subquery(latest.values('timestamp')[:1]),
+    )
+    ConversationReadCursor.objects.update(unread_count=Coalesce(Subquery(
+        Message.objects.filter(
+            conversation=OuterRef('conversation'),
+            receiver=OuterRef('user'),
+            id__gt=OuterRef('last_read_message_id'),
+        ).order_by().values('conversation').annotate(count=Count('id')).values('count')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_conversation_read_cursors'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.message'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversationreadcursor',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['-last_message_at'], name='chat_conv_last_message_at'),
+        ),
+        migrations.RunPython(backfill_last_message_and_unread, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q
 from django.conf import settings
 from music.models import Song, Playlist
 
@@ -9,16 +10,21 @@ class Conversation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
+    # Tin nhắn mới nhất, cập nhật cùng giao dịch với câu INSERT tin nhắn (Message.save);
+    # dựng lại bằng lệnh rebuild_chat_counters
+    last_message = models.ForeignKey(
+        'Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    last_message_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         db_table = 'chat_conversations'
+        indexes = [
+            models.Index(fields=['-last_message_at'], name='chat_conv_last_message_at'),
+        ]
     
     def __str__(self):
         return f"Conversation {self.id}"
-    
-    @property
-    def last_message(self):
-        return self.messages.order_by('-timestamp').first()
         
     def get_other_participant(self, user):
         return self.participants.exclude(id=user.id).first()
@@ -32,6 +38,10 @@ class Conversation(models.Model):
         
         conversation = cls.objects.create()
         conversation.participants.add(user1, user2)
+        ConversationReadCursor.objects.bulk_create(
+            [ConversationReadCursor(conversation=conversation, user=user) for user in (user1, user2)],
+            ignore_conflicts=True,
+        )
         return conversation
 
 class Message(models.Model):
@@ -82,19 +92,13 @@ class Message(models.Model):
             bool(self.attachment),
             bool(self.image),
             bool(self.voice_note),
-            bool(self.shared_song),
-            bool(self.shared_playlist)
         ]
         if sum(attachments) > 1:
             raise ValidationError('Chỉ được phép đính kèm một loại nội dung')
 
     def save(self, *args, **kwargs):
         self.clean()
-        if self.shared_song:
-            self.message_type = 'SONG'
-        elif self.shared_playlist:
-            self.message_type = 'PLAYLIST'
-        elif self.image:
+        if self.image:
             self.message_type = 'IMAGE'
         elif self.voice_note:
             self.message_type = 'VOICE'
@@ -103,8 +107,43 @@ class Message(models.Model):
             
         if not self.conversation and self.sender and self.receiver:
             self.conversation = Conversation.get_or_create_conversation(self.sender, self.receiver)
-            
-        super().save(*args, **kwargs)
+
+        if not self._state.adding or self.conversation_id is None:
+            super().save(*args, **kwargs)
+            return
+
+        # Tin nhắn mới: con trỏ tin nhắn mới nhất và số tin chưa đọc của người nhận
+        # được cập nhật trong cùng giao dịch với câu INSERT
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Conversation.objects.filter(
+                Q(last_message__isnull=True) | Q(last_message_id__lt=self.id),
+                id=self.conversation_id,
+            ).update(last_message=self, last_message_at=self.timestamp, updated_at=self.timestamp)
+            ConversationReadCursor.objects.filter(
+                conversation_id=self.conversation_id,
+                user_id=self.receiver_id,
+                last_read_message_id__lt=self.id,
+            ).update(unread_count=F('unread_count') + 1)
+
+class ConversationReadCursor(models.Model):
+    """
+    Vị trí đã đọc của một người tham gia trong cuộc trò chuyện: mọi tin nhắn có
+    id <= last_read_message_id được coi là đã đọc - xem chat/receipts.py.
+    ``unread_count`` là số tin nhắn người dùng nhận được sau con trỏ, tăng khi
+    có tin nhắn mới và tính lại khi con trỏ tiến lên.
+    """
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='read_cursors')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_read_cursors')
+    last_read_message_id = models.PositiveBigIntegerField(default=0)
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'chat_read_cursors'
+        unique_together = ('conversation', 'user')
+
+    def __str__(self):
+        return f"{self.user} đã đọc tới tin nhắn {self.last_read_message_id} trong {self.conversation}"
 
 class MessageReport(models.Model):
     REPORT_REASONS = (
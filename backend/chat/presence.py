@@ -0,0 +1,54 @@
+"""
+Trạng thái trực tuyến của người dùng chat.
+
+Mỗi kết nối UserChatConsumer tăng một bộ đếm trong cache (``chat:presence:{user_id}``)
+khi kết nối và giảm khi ngắt. Chỉ khi bộ đếm đổi 0 -> 1 (socket đầu tiên) hoặc
+1 -> 0 (socket cuối cùng) thì sự kiện ``presence`` mới được gửi tới group
+``user_{id}`` của từng người đã trò chuyện với người dùng; mở thêm tab không
+phát thêm gì. Với cache dùng chung (Redis) bộ đếm đúng trên nhiều tiến trình;
+``CHAT_PRESENCE_TTL`` giới hạn thời gian bộ đếm còn sót lại khi tiến trình
+dừng đột ngột mà không kịp ngắt kết nối.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+PRESENCE_PREFIX = 'chat:presence:'
+
+
+def presence_key(user_id):
+    return f'{PRESENCE_PREFIX}{user_id}'
+
+
+async def user_connected(user_id):
+    """Ghi nhận một socket mới; True nếu đây là socket đầu tiên của người dùng"""
+    key = presence_key(user_id)
+    if await cache.aadd(key, 1, settings.CHAT_PRESENCE_TTL):
+        return True
+    try:
+        return await cache.aincr(key) == 1
+    except ValueError:
+        # Khóa vừa hết hạn giữa hai lệnh
+        await cache.aset(key, 1, settings.CHAT_PRESENCE_TTL)
+        return True
+
+
+async def user_disconnected(user_id):
+    """Ghi nhận một socket đã đóng; True nếu người dùng không còn socket nào"""
+    key = presence_key(user_id)
+    try:
+        remaining = await cache.adecr(key)
+    except ValueError:
+        return True
+    if remaining <= 0:
+        await cache.adelete(key)
+        return True
+    return False
+
+
+async def online_users(user_ids):
+    """Những người dùng trong ``user_ids`` đang có ít nhất một socket"""
+    user_ids = [user_id for user_id in user_ids if user_id is not None]
+    if not user_ids:
+        return set()
+    counts = await cache.aget_many([presence_key(user_id) for user_id in user_ids])
+    return {user_id for user_id in user_ids if counts.get(presence_key(user_id), 0) > 0}
@@ -0,0 +1,187 @@
+"""
+Đánh dấu đã đọc bằng con trỏ (ConversationReadCursor).
+
+Mỗi người tham gia có một ``last_read_message_id`` cho từng cuộc trò chuyện.
+Đánh dấu đã đọc chỉ là một câu UPDATE tiến con trỏ về phía trước (không bao
+giờ lùi lại), thay vì lưu từng tin nhắn. Số tin chưa đọc (``unread_count``)
+được lưu trên con trỏ: Message.save() tăng nó khi có tin nhắn mới, câu UPDATE
+tiến con trỏ tính lại nó bằng cách so sánh id tin nhắn với con trỏ mới.
+
+Khi con trỏ tiến lên, sự kiện ``read_receipt`` được gửi tới group
+``user_{user_id}`` của từng người tham gia để các client đang mở cập nhật.
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models import Count, Exists, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .events import send_to_users
+from .models import Conversation, ConversationReadCursor, Message
+
+logger = logging.getLogger(__name__)
+
+
+def broadcast_read_receipt(conversation_id, user_id, last_read_message_id, participant_ids):
+    """Gửi sự kiện đã đọc tới group của từng người tham gia cuộc trò chuyện"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(send_to_users)(
+            channel_layer,
+            participant_ids,
+            {
+                'type': 'read_receipt',
+                'conversation_id': conversation_id,
+                'data': {
+                    'conversation_id': conversation_id,
+                    'user_id': user_id,
+                    'last_read_message_id': last_read_message_id,
+                },
+            }
+        )
+    except Exception as e:
+        logger.error(f"Không thể gửi read receipt cho cuộc trò chuyện {conversation_id}: {str(e)}")
+
+
+def unread_after(last_read_message_id):
+    """
+    Số tin nhắn người dùng của con trỏ nhận được sau ``last_read_message_id``,
+    dùng trong câu UPDATE trên ConversationReadCursor
+    """
+    return Coalesce(Subquery(
+        Message.objects.filter(
+            conversation=OuterRef('conversation'),
+            receiver=OuterRef('user'),
+            id__gt=last_read_message_id,
+        ).order_by().values('conversation').annotate(count=Count('id')).values('count')
+    ), 0)
+
+
+def mark_read(conversation, user, up_to_message_id=None, broadcast=True, participant_ids=None):
+    """
+    Tiến con trỏ đã đọc của ``user`` tới ``up_to_message_id`` (mặc định: tin
+    nhắn mới nhất của cuộc trò chuyện). Trả về True nếu con trỏ thay đổi.
+
+    ``participant_ids`` (người nhận read receipt) được truy vấn khi không truyền vào.
+    """
+    # Chỉ nhận id của tin nhắn có thật trong cuộc trò chuyện, không cho con trỏ vượt quá tin mới nhất
+    messages = Message.objects.filter(conversation=conversation)
+    if up_to_message_id is not None:
+        messages = messages.filter(id__lte=up_to_message_id)
+    up_to_message_id = messages.aggregate(latest=Max('id'))['latest']
+    if not up_to_message_id:
+        return False
+
+    with transaction.atomic():
+        advanced = ConversationReadCursor.objects.filter(
+            conversation=conversation,
+            user=user,
+            last_read_message_id__lt=up_to_message_id,
+        ).update(last_read_message_id=up_to_message_id, unread_count=unread_after(up_to_message_id))
+
+        if not advanced:
+            # Cuộc trò chuyện tạo trước khi có con trỏ: tạo mới ở vị trí đã đọc
+            _, advanced = ConversationReadCursor.objects.get_or_create(
+                conversation=conversation,
+                user=user,
+                defaults={
+                    'last_read_message_id': up_to_message_id,
+                    'unread_count': Message.objects.filter(
+                        conversation=conversation, receiver=user, id__gt=up_to_message_id
+                    ).count(),
+                },
+            )
+
+        if advanced:
+            # Giữ cờ is_read cũ đồng bộ cho trang admin / client cũ, cũng chỉ bằng một câu UPDATE
+            Message.objects.filter(
+                conversation=conversation,
+                receiver=user,
+                is_read=False,
+                id__lte=up_to_message_id,
+            ).update(is_read=True)
+
+    if advanced and broadcast:
+        conversation_id, user_id = conversation.pk, user.pk
+        if participant_ids is None:
+            participant_ids = list(
+                Conversation.participants.through.objects.filter(
+                    conversation_id=conversation_id
+                ).values_list('user_id', flat=True)
+            )
+        transaction.on_commit(
+            lambda: broadcast_read_receipt(conversation_id, user_id, up_to_message_id, participant_ids)
+        )
+    return bool(advanced)
+
+
+def with_read_state(conversations, user):
+    """
+    Giới hạn queryset cuộc trò chuyện vào các cuộc ``user`` có con trỏ đã đọc và
+    thêm ``last_read_message_id``, ``unread_count`` từ con trỏ (một phép JOIN)
+    """
+    return conversations.filter(read_cursors__user=user).annotate(
+        last_read_message_id=F('read_cursors__last_read_message_id'),
+        unread_count=F('read_cursors__unread_count'),
+    )
+
+
+def unread_count(conversation, user):
+    """Số tin nhắn ``user`` nhận được sau con trỏ đã đọc (bộ đếm lưu trên con trỏ)"""
+    return ConversationReadCursor.objects.filter(
+        conversation=conversation, user=user
+    ).values_list('unread_count', flat=True).first() or 0
+
+
+def message_deleted(message):
+    """Tin nhắn bị xóa: giảm số tin chưa đọc và tìm lại tin nhắn mới nhất nếu cần"""
+    if message.conversation_id is None:
+        return
+    ConversationReadCursor.objects.filter(
+        conversation_id=message.conversation_id,
+        user_id=message.receiver_id,
+        last_read_message_id__lt=message.id,
+        unread_count__gt=0,
+    ).update(unread_count=F('unread_count') - 1)
+    # last_message đã được SET_NULL khi xóa chính tin nhắn mới nhất
+    latest = Message.objects.filter(conversation=OuterRef('pk')).order_by('-id')
+    Conversation.objects.filter(id=message.conversation_id, last_message__isnull=True).update(
+        last_message=Subquery(latest.values('id')[:1]),
+        last_message_at=Subquery(latest.values('timestamp')[:1]),
+    )
+
+
+def rebuild_counters(conversation_ids=None):
+    """
+    Dựng lại tin nhắn mới nhất của cuộc trò chuyện, con trỏ còn thiếu và số tin
+    chưa đọc từ chat_messages (lệnh rebuild_chat_counters). Trả về số cuộc trò
+    chuyện, số con trỏ được tạo và số con trỏ được cập nhật.
+    """
+    conversations = Conversation.objects.all()
+    cursors = ConversationReadCursor.objects.all()
+    participants = Conversation.participants.through.objects.all()
+    if conversation_ids is not None:
+        conversations = conversations.filter(id__in=conversation_ids)
+        cursors = cursors.filter(conversation_id__in=conversation_ids)
+        participants = participants.filter(conversation_id__in=conversation_ids)
+
+    latest = Message.objects.filter(conversation=OuterRef('pk')).order_by('-id')
+    with transaction.atomic():
+        updated_conversations = conversations.update(
+            last_message=Subquery(latest.values('id')[:1]),
+            last_message_at=Subquery(latest.values('timestamp')[:1]),
+        )
+        # Người tham gia chưa có con trỏ: chưa đọc tin nào
+        missing = participants.exclude(Exists(
+            ConversationReadCursor.objects.filter(conversation=OuterRef('conversation'), user=OuterRef('user'))
+        )).values_list('conversation_id', 'user_id')
+        created = ConversationReadCursor.objects.bulk_create(
+            [ConversationReadCursor(conversation_id=c, user_id=u) for c, u in missing],
+            ignore_conflicts=True,
+        )
+        updated_cursors = cursors.update(unread_count=unread_after(OuterRef('last_read_message_id')))
+    return updated_conversations, len(created), updated_cursors
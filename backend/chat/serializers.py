@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from .models import Message, MessageReport, ChatRestriction, Conversation
+from .receipts import unread_count
 from music.models import User, Song, Playlist
 from music.serializers import SongSerializer, PlaylistSerializer, UserSerializer, SongBasicSerializer, PlaylistBasicSerializer
 
@@ -14,15 +15,11 @@ class UserBasicSerializer(serializers.ModelSerializer):
 class MessageSerializer(serializers.ModelSerializer):
     sender_info = UserBasicSerializer(source='sender', read_only=True)
     receiver_info = UserBasicSerializer(source='receiver', read_only=True)
-    shared_song_info = SongBasicSerializer(source='shared_song', read_only=True)
-    shared_playlist_info = PlaylistBasicSerializer(source='shared_playlist', read_only=True)
     
     class Meta:
         model = Message
         fields = ('id', 'sender', 'receiver', 'conversation', 'content', 'timestamp', 'is_read', 
-                  'message_type', 'attachment', 'image', 'voice_note', 'shared_song', 
-                  'shared_playlist', 'sender_info', 'receiver_info', 'shared_song_info', 
-                  'shared_playlist_info')
+                  'message_type', 'attachment', 'image', 'voice_note', 'sender_info', 'receiver_info')
         read_only_fields = ('sender', 'timestamp', 'is_read', 'conversation')
 
 class MessageCreateSerializer(serializers.ModelSerializer):
@@ -31,8 +28,7 @@ class MessageCreateSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Message
-        fields = ('id', 'receiver_id', 'content', 'image', 'voice_note', 'attachment', 
-                 'shared_song', 'shared_playlist')
+        fields = ('id', 'receiver_id', 'content', 'image', 'voice_note', 'attachment')
     
     def validate_receiver_id(self, value):
         try:
@@ -67,17 +63,13 @@ class MessageCreateSerializer(serializers.ModelSerializer):
 class AdminMessageSerializer(serializers.ModelSerializer):
     sender_info = UserBasicSerializer(source='sender', read_only=True)
     receiver_info = UserBasicSerializer(source='receiver', read_only=True)
-    shared_song_info = SongBasicSerializer(source='shared_song', read_only=True)
-    shared_playlist_info = PlaylistBasicSerializer(source='shared_playlist', read_only=True)
     reviewed_by_info = UserBasicSerializer(source='reviewed_by', read_only=True)
 
     class Meta:
         model = Message
         fields = ('id', 'sender', 'receiver', 'conversation', 'content', 'timestamp', 'is_read', 
-                  'message_type', 'attachment', 'image', 'voice_note', 'shared_song', 
-                  'shared_playlist', 'sender_info', 'receiver_info', 'shared_song_info', 
-                  'shared_playlist_info', 'content_status', 'review_note', 'reviewed_by', 
-                  'reviewed_at', 'reviewed_by_info')
+                  'message_type', 'attachment', 'image', 'voice_note', 'sender_info', 'receiver_info',
+                  'content_status', 'review_note', 'reviewed_by', 'reviewed_at', 'reviewed_by_info')
 
 class ConversationSerializer(serializers.ModelSerializer):
     partner = serializers.SerializerMethodField()
@@ -94,18 +86,20 @@ class ConversationSerializer(serializers.ModelSerializer):
             return None
         
         user = request.user
-        partner = obj.get_other_participant(user)
+        # Dùng danh sách người tham gia đã prefetch (ConversationListView) nếu có
+        partner = next((participant for participant in obj.participants.all() if participant.id != user.id), None)
         return UserBasicSerializer(partner).data if partner else None
     
     def get_last_message(self, obj):
-        last_msg = obj.messages.order_by('-timestamp').first()
+        # Tin nhắn mới nhất được lưu sẵn trên cuộc trò chuyện
+        last_msg = obj.last_message
         if not last_msg:
             return None
             
         return {
             'id': last_msg.id,
             'content': last_msg.content,
-            'sender_id': last_msg.sender.id,
+            'sender_id': last_msg.sender_id,
             'message_type': last_msg.message_type,
             'timestamp': last_msg.timestamp,
             'is_read': last_msg.is_read
@@ -116,8 +110,11 @@ class ConversationSerializer(serializers.ModelSerializer):
         if not request:
             return 0
             
-        user = request.user
-        return obj.messages.filter(receiver=user, is_read=False).count()
+        # Bộ đếm trên con trỏ đã đọc (ConversationListView đã annotate sẵn)
+        annotated = getattr(obj, 'unread_count', None)
+        if annotated is not None:
+            return annotated
+        return unread_count(obj, request.user)
 
 class MessageReportSerializer(serializers.ModelSerializer):
     reporter_info = UserBasicSerializer(source='reporter', read_only=True)
@@ -0,0 +1,93 @@
+"""
+Báo cho các kết nối WebSocket chat đang mở khi người tham gia hoặc hạn chế chat thay đổi.
+
+ChatConsumer và UserChatConsumer nạp người tham gia và hạn chế chat một lần
+khi kết nối và giữ trong suốt kết nối. Khi chúng thay đổi, sự kiện
+``chat_state_changed`` được gửi (sau khi giao dịch commit) tới group
+``user_{user_id}`` của:
+
+- mọi người tham gia (trước và sau thay đổi) khi danh sách người tham gia thay
+  đổi, kèm ``conversation_ids`` của các cuộc trò chuyện liên quan
+- chính người dùng khi hạn chế chat của họ thay đổi
+
+và consumer nạp lại trạng thái từ cơ sở dữ liệu.
+
+Xóa tin nhắn cũng cập nhật tin nhắn mới nhất và số tin chưa đọc đã lưu
+(chat/receipts.py).
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .events import user_group_name
+from .models import ChatRestriction, Conversation, Message
+from .receipts import message_deleted
+
+logger = logging.getLogger(__name__)
+
+
+def broadcast_state_changed(user_ids, conversation_ids=None):
+    """Gửi chat_state_changed tới group của từng người dùng (sau khi giao dịch hiện tại commit)"""
+    event = {'type': 'chat_state_changed'}
+    if conversation_ids is not None:
+        event['conversation_ids'] = list(conversation_ids)
+
+    def send():
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        for user_id in set(user_ids):
+            try:
+                async_to_sync(channel_layer.group_send)(user_group_name(user_id), event)
+            except Exception as e:
+                logger.error(f"Không thể gửi chat_state_changed tới người dùng {user_id}: {str(e)}")
+
+    transaction.on_commit(send)
+
+
+def participant_ids(conversation_ids):
+    return set(
+        Conversation.participants.through.objects.filter(
+            conversation_id__in=conversation_ids
+        ).values_list('user_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=ChatRestriction)
+@receiver(post_delete, sender=ChatRestriction)
+def restriction_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    broadcast_state_changed([instance.user_id])
+
+
+@receiver(m2m_changed, sender=Conversation.participants.through)
+def participants_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # Sau khi xóa hết không còn biết ai bị ảnh hưởng: ghi lại trước khi xóa
+        if reverse:
+            conversation_ids = list(instance.conversations.values_list('id', flat=True))
+        else:
+            conversation_ids = [instance.pk]
+        instance._chat_cleared = (conversation_ids, participant_ids(conversation_ids))
+        return
+    if action == 'post_clear':
+        conversation_ids, user_ids = getattr(instance, '_chat_cleared', ([], set()))
+        broadcast_state_changed(user_ids | ({instance.pk} if reverse else set()), conversation_ids)
+        return
+    if action not in ('post_add', 'post_remove'):
+        return
+    if reverse:
+        conversation_ids, changed_user_ids = list(pk_set), {instance.pk}
+    else:
+        conversation_ids, changed_user_ids = [instance.pk], set(pk_set)
+    broadcast_state_changed(participant_ids(conversation_ids) | changed_user_ids, conversation_ids)
+
+
+@receiver(post_delete, sender=Message)
+def message_removed(sender, instance, **kwargs):
+    message_deleted(instance)
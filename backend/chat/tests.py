@@ -1,3 +1,434 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+from datetime import timedelta
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .middleware import ChatRestrictionMiddleware, TokenAuthMiddleware
+from .models import ChatRestriction, Conversation, ConversationReadCursor, Message
+from .routing import websocket_urlpatterns
+from .typing import TypingCoalescer
+
+User = get_user_model()
+
+
+class ReadCursorTest(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='alicepassword123')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='bobpassword123')
+        self.conversation = Conversation.get_or_create_conversation(self.alice, self.bob)
+        self.messages = [
+            Message.objects.create(
+                sender=self.alice, receiver=self.bob, conversation=self.conversation, content=f'Tin {i}'
+            )
+            for i in range(5)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.bob)
+
+    def _cursor(self, user):
+        return ConversationReadCursor.objects.get(conversation=self.conversation, user=user).last_read_message_id
+
+    def test_reading_advances_cursor_without_per_message_saves(self):
+        """Test mở cuộc trò chuyện tiến con trỏ đã đọc và gửi read receipt"""
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(f'user_{self.alice.id}', channel)
+
+        response = self.client.get('/api/v1/chat/conversations/')
+        self.assertEqual(response.data[0]['unread_count'], 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(f'/api/v1/chat/conversations/{self.conversation.id}/messages/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._cursor(self.bob), self.messages[-1].id)
+        self.assertFalse(Message.objects.filter(receiver=self.bob, is_read=False).exists())
+
+        event = async_to_sync(channel_layer.receive)(channel)
+        self.assertEqual(event['type'], 'read_receipt')
+        self.assertEqual(event['data'], {
+            'conversation_id': self.conversation.id,
+            'user_id': self.bob.id,
+            'last_read_message_id': self.messages[-1].id,
+        })
+
+    def test_cursor_never_moves_backwards(self):
+        """Test con trỏ chỉ tiến lên và không vượt quá tin nhắn mới nhất"""
+        from .receipts import mark_read, unread_count
+
+        self.assertTrue(mark_read(self.conversation, self.bob, self.messages[2].id, broadcast=False))
+        self.assertEqual(unread_count(self.conversation, self.bob), 2)
+
+        self.assertFalse(mark_read(self.conversation, self.bob, self.messages[0].id, broadcast=False))
+        self.assertEqual(self._cursor(self.bob), self.messages[2].id)
+
+        mark_read(self.conversation, self.bob, self.messages[-1].id + 100, broadcast=False)
+        self.assertEqual(self._cursor(self.bob), self.messages[-1].id)
+        self.assertEqual(unread_count(self.conversation, self.bob), 0)
+
+    def test_backfill_from_is_read_flags(self):
+        """Test migration dựng con trỏ từ cờ is_read cũ"""
+        from importlib import import_module
+        from django.apps import apps
+
+        migration = import_module('chat.migrations.0005_conversation_read_cursors')
+        Message.objects.filter(id__in=[m.id for m in self.messages[:3]]).update(is_read=True)
+        ConversationReadCursor.objects.all().delete()
+
+        migration.backfill_read_cursors(apps, None)
+
+        self.assertEqual(self._cursor(self.bob), self.messages[2].id)
+        self.assertEqual(self._cursor(self.alice), self.messages[-1].id)
+
+
+class InboxTest(TestCase):
+    def setUp(self):
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='bobpassword123')
+        self.friends = [
+            User.objects.create_user(username=f'friend{i}', email=f'friend{i}@example.com', password='friendpassword123')
+            for i in range(4)
+        ]
+        self.conversations = [Conversation.get_or_create_conversation(friend, self.bob) for friend in self.friends]
+        # Cuộc trò chuyện với friend0 có tin nhắn mới nhất, với friend3 chưa có tin nhắn nào
+        self.messages = {}
+        for conversation, friend, count in reversed(list(zip(self.conversations[:3], self.friends, (3, 2, 1)))):
+            self.messages[conversation.id] = [
+                Message.objects.create(sender=friend, receiver=self.bob, conversation=conversation, content=f'Tin {i}')
+                for i in range(count)
+            ]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.bob)
+
+    def test_inbox_is_one_query_ordered_by_last_message(self):
+        """Test hộp thư đọc tin nhắn mới nhất và số tin chưa đọc đã lưu, số truy vấn không đổi theo số cuộc trò chuyện"""
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/v1/chat/conversations/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data], [c.id for c in self.conversations])
+        first = response.data[0]
+        self.assertEqual(first['partner']['id'], self.friends[0].id)
+        self.assertEqual(first['last_message']['id'], self.messages[self.conversations[0].id][-1].id)
+        self.assertEqual([item['unread_count'] for item in response.data], [3, 2, 1, 0])
+        self.assertIsNone(response.data[-1]['last_message'])
+
+    def test_counters_follow_deletes_and_rebuild_command_repairs_them(self):
+        """Test xóa tin nhắn cập nhật bộ đếm và rebuild_chat_counters dựng lại từ chat_messages"""
+        from django.core.management import call_command
+
+        conversation = self.conversations[0]
+        latest = self.messages[conversation.id][-1]
+        latest.delete()
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.last_message_id, self.messages[conversation.id][-2].id)
+        self.assertEqual(ConversationReadCursor.objects.get(conversation=conversation, user=self.bob).unread_count, 2)
+
+        Conversation.objects.update(last_message=None, last_message_at=None)
+        ConversationReadCursor.objects.update(unread_count=99)
+        ConversationReadCursor.objects.filter(conversation=self.conversations[1], user=self.bob).delete()
+        call_command('rebuild_chat_counters', stdout=io.StringIO())
+
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.last_message_id, self.messages[conversation.id][-2].id)
+        self.assertEqual(conversation.last_message_at, self.messages[conversation.id][-2].timestamp)
+        unread = dict(
+            ConversationReadCursor.objects.filter(user=self.bob).values_list('conversation_id', 'unread_count')
+        )
+        self.assertEqual(unread, {c.id: n for c, n in zip(self.conversations, (2, 2, 1, 0))})
+        self.assertFalse(ConversationReadCursor.objects.filter(unread_count=99).exists())
+
+
+class TypingIndicatorTest(TransactionTestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='alicepassword123')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='bobpassword123')
+        self.conversation = Conversation.get_or_create_conversation(self.alice, self.bob)
+
+    def test_only_state_changes_are_broadcast(self):
+        """Test sự kiện lặp lại bị bỏ qua, thay đổi dồn dập được gộp và tự tắt khi hết hạn"""
+        async def scenario():
+            layer = InMemoryChannelLayer()
+            channel = await layer.new_channel()
+            await layer.group_add('chat_1', channel)
+            typing = TypingCoalescer(layer, 'chat_1', self.alice.id, interval=0.1, timeout=0.3)
+
+            for _ in range(20):
+                await typing.update(True)
+            # Tắt rồi bật lại trong khoảng chờ: không có gì để phát
+            await typing.update(False)
+            await typing.update(True)
+            await asyncio.sleep(0.15)
+            # Hết khoảng chờ: thay đổi được phát ngay
+            await typing.update(True)
+            await typing.update(False)
+            # Bật lại trong khoảng chờ: phát khi hết khoảng chờ
+            await typing.update(True)
+            # Không có sự kiện mới: tự tắt sau timeout
+            await asyncio.sleep(0.45)
+
+            events = []
+            while True:
+                try:
+                    events.append(await asyncio.wait_for(layer.receive(channel), 0.05))
+                except asyncio.TimeoutError:
+                    return typing, events
+
+        typing, events = async_to_sync(scenario)()
+        self.assertEqual([event['is_typing'] for event in events], [True, False, True, False])
+        self.assertTrue(all(event['user_id'] == self.alice.id for event in events))
+        self.assertEqual((typing.received, typing.sent), (25, 4))
+
+    @override_settings(CHAT_TYPING={'INTERVAL': 0.05})
+    def test_consumer_sends_typing_to_the_other_participant(self):
+        """Test ChatConsumer chuyển trạng thái gõ tới người còn lại, không gửi lại cho người gõ"""
+        async def scenario():
+            sockets = []
+            for user in (self.alice, self.bob):
+                communicator = WebsocketCommunicator(
+                    URLRouter(websocket_urlpatterns), f'/ws/chat/{self.conversation.id}/'
+                )
+                communicator.scope['user'] = user
+                await communicator.connect()
+                await communicator.receive_from()
+                sockets.append(communicator)
+            alice, bob = sockets
+
+            for _ in range(10):
+                await alice.send_to(text_data=json.dumps({'type': 'typing', 'is_typing': True}))
+            frame = json.loads(await bob.receive_from())
+            alice_got_nothing = await alice.receive_nothing(0.1)
+            bob_got_one = await bob.receive_nothing(0.1)
+
+            # Ngắt kết nối khi đang gõ thì người còn lại nhận trạng thái tắt
+            await alice.disconnect()
+            closing = json.loads(await bob.receive_from())
+            await bob.disconnect()
+            return frame, closing, alice_got_nothing, bob_got_one
+
+        frame, closing, alice_got_nothing, bob_got_one = async_to_sync(scenario)()
+        self.assertEqual(frame['type'], 'typing')
+        self.assertEqual(frame['data'], {
+            'user_id': self.alice.id,
+            'username': 'alice',
+            'conversation_id': self.conversation.id,
+            'is_typing': True,
+        })
+        self.assertTrue(alice_got_nothing)
+        self.assertTrue(bob_got_one)
+        self.assertFalse(closing['data']['is_typing'])
+
+
+class ChatConsumerStateTest(TransactionTestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='alicepassword123')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='bobpassword123')
+        self.conversation = Conversation.get_or_create_conversation(self.alice, self.bob)
+
+    async def _connect(self, user):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/chat/{self.conversation.id}/')
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.receive_from()
+        return communicator
+
+    def test_message_is_one_write_without_participant_queries(self):
+        """Test mỗi tin nhắn là một câu INSERT, UPDATE cuộc trò chuyện và UPDATE số tin chưa đọc, không truy vấn người tham gia"""
+        async def scenario():
+            alice = await self._connect(self.alice)
+            # Bắt truy vấn trên luồng mà consumer dùng để truy cập cơ sở dữ liệu
+            queries = await database_sync_to_async(lambda: CaptureQueriesContext(connections['default']))()
+            await database_sync_to_async(queries.__enter__)()
+            await alice.send_to(text_data=json.dumps({'message': 'Xin chào'}))
+            frame = json.loads(await alice.receive_from())
+            await database_sync_to_async(queries.__exit__)(None, None, None)
+            await alice.disconnect()
+            return frame, queries.captured_queries
+
+        frame, sent = async_to_sync(scenario)()
+        message = Message.objects.get()
+        self.assertEqual(frame['data']['id'], message.id)
+        self.assertEqual(frame['data']['receiver_id'], self.bob.id)
+
+        statements = [query['sql'].split()[0].upper() for query in sent]
+        writes = [sql for sql in statements if sql not in ('BEGIN', 'COMMIT', 'SAVEPOINT', 'RELEASE')]
+        self.assertEqual(writes, ['INSERT', 'UPDATE', 'UPDATE'])
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.updated_at, message.timestamp)
+        self.assertEqual(self.conversation.last_message_id, message.id)
+        self.assertEqual(ConversationReadCursor.objects.get(user=self.bob).unread_count, 1)
+
+    def test_restrictions_and_participants_changes_reach_open_sockets(self):
+        """Test hạn chế mới hoặc bị xóa khỏi cuộc trò chuyện đóng kết nối đang mở"""
+        async def scenario():
+            alice = await self._connect(self.alice)
+            bob = await self._connect(self.bob)
+
+            await database_sync_to_async(ChatRestriction.objects.create)(
+                user=self.alice, restriction_type='PERMANENT', reason='spam'
+            )
+            restricted = json.loads(await alice.receive_from())
+            alice_closed = await alice.receive_output()
+
+            await database_sync_to_async(self.conversation.participants.remove)(self.bob)
+            removed = json.loads(await bob.receive_from())
+            bob_closed = await bob.receive_output()
+            return restricted, alice_closed, removed, bob_closed
+
+        restricted, alice_closed, removed, bob_closed = async_to_sync(scenario)()
+        self.assertEqual(restricted['code'], 'RESTRICTED')
+        self.assertEqual(alice_closed, {'type': 'websocket.close', 'code': 4006})
+        self.assertEqual(removed['code'], 'UNAUTHORIZED')
+        self.assertEqual(bob_closed, {'type': 'websocket.close', 'code': 4001})
+
+    def test_handshake_is_one_query_and_user_is_cached_by_jti(self):
+        """Test bắt tay qua middleware: một truy vấn cho consumer, người dùng lấy từ cache khi kết nối lại"""
+        cache.clear()
+        application = TokenAuthMiddleware(ChatRestrictionMiddleware(URLRouter(websocket_urlpatterns)))
+        path = f'/ws/chat/{self.conversation.id}/?token={AccessToken.for_user(self.alice)}'
+
+        async def handshake():
+            queries = await database_sync_to_async(lambda: CaptureQueriesContext(connections['default']))()
+            await database_sync_to_async(queries.__enter__)()
+            communicator = WebsocketCommunicator(application, path)
+            await communicator.connect()
+            output = await communicator.receive_output()
+            await database_sync_to_async(queries.__exit__)(None, None, None)
+            await communicator.disconnect()
+            return output, [query['sql'] for query in queries.captured_queries]
+
+        output, first = async_to_sync(handshake)()
+        self.assertEqual(json.loads(output['text'])['code'], 'CONNECTED')
+        # Lấy người dùng theo token và nạp cuộc trò chuyện + thành viên + hạn chế
+        self.assertEqual(len(first), 2)
+        self.assertIn('chat_restrictions', first[1])
+
+        output, reconnect = async_to_sync(handshake)()
+        self.assertEqual(json.loads(output['text'])['code'], 'CONNECTED')
+        self.assertEqual(len(reconnect), 1)
+
+        # Hạn chế có thời hạn vẫn bị từ chối, dù middleware không kiểm tra đường dẫn này
+        ChatRestriction.objects.create(
+            user=self.alice, restriction_type='TEMPORARY', reason='spam',
+            expires_at=timezone.now() + timedelta(hours=1)
+        )
+        output, _ = async_to_sync(handshake)()
+        self.assertEqual(output, {'type': 'websocket.close', 'code': 4006})
+
+
+class UserChatConsumerTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='alicepassword123')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='bobpassword123')
+        self.carol = User.objects.create_user(username='carol', email='carol@example.com', password='carolpassword123')
+        self.with_bob = Conversation.get_or_create_conversation(self.alice, self.bob)
+        self.with_carol = Conversation.get_or_create_conversation(self.alice, self.carol)
+
+    async def _connect(self, user, path='/ws/chat/'):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), path)
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator, json.loads(await communicator.receive_from())
+
+    def test_one_socket_carries_every_conversation_and_presence(self):
+        """Test một socket ws/chat/ gửi/nhận tin của mọi cuộc trò chuyện và báo trạng thái trực tuyến"""
+        async def scenario():
+            bob, _ = await self._connect(self.bob)
+            carol, _ = await self._connect(self.carol, f'/ws/chat/{self.with_carol.id}/')
+            alice, connected = await self._connect(self.alice)
+            bob_presence = json.loads(await bob.receive_from())
+            # Socket theo cuộc trò chuyện chỉ nhận trạng thái của người còn lại
+            carol_presence = json.loads(await carol.receive_from())
+
+            await alice.send_to(text_data=json.dumps({'conversation_id': self.with_bob.id, 'message': 'Chào Bob'}))
+            alice_echo = json.loads(await alice.receive_from())
+            bob_message = json.loads(await bob.receive_from())
+
+            await alice.send_to(text_data=json.dumps({'conversation_id': self.with_carol.id, 'message': 'Chào Carol'}))
+            await alice.receive_from()
+            carol_message = json.loads(await carol.receive_from())
+            bob_got_nothing = await bob.receive_nothing(0.1)
+
+            await alice.send_to(text_data=json.dumps({'conversation_id': 999999, 'message': 'Lạc'}))
+            unknown = json.loads(await alice.receive_from())
+
+            await alice.disconnect()
+            bob_offline = json.loads(await bob.receive_from())
+            await bob.disconnect()
+            await carol.disconnect()
+            return connected, bob_presence, carol_presence, alice_echo, bob_message, carol_message, bob_got_nothing, unknown, bob_offline
+
+        (connected, bob_presence, carol_presence, alice_echo, bob_message, carol_message,
+         bob_got_nothing, unknown, bob_offline) = async_to_sync(scenario)()
+        self.assertEqual(connected['code'], 'CONNECTED')
+        self.assertEqual(connected['data']['conversations'], [
+            {'conversation_id': self.with_bob.id, 'user_id': self.bob.id},
+            {'conversation_id': self.with_carol.id, 'user_id': self.carol.id},
+        ])
+        # Socket theo từng cuộc trò chuyện không tính là trực tuyến
+        self.assertEqual(connected['data']['online'], [self.bob.id])
+        self.assertEqual(bob_presence, {'type': 'presence', 'data': {'user_id': self.alice.id, 'online': True}})
+        self.assertEqual(carol_presence, bob_presence)
+        self.assertEqual(alice_echo['conversation_id'], self.with_bob.id)
+        self.assertEqual(bob_message['conversation_id'], self.with_bob.id)
+        self.assertEqual(bob_message['data']['message'], 'Chào Bob')
+        self.assertEqual(carol_message['data']['message'], 'Chào Carol')
+        self.assertTrue(bob_got_nothing)
+        self.assertEqual(unknown['code'], 'CONVERSATION_NOT_FOUND')
+        self.assertEqual(bob_offline['data'], {'user_id': self.alice.id, 'online': False})
+
+    @override_settings(CHAT_TYPING={'INTERVAL': 0.05})
+    def test_read_typing_and_new_conversations_are_tagged(self):
+        """Test con trỏ đã đọc, trạng thái gõ và cuộc trò chuyện mới đến đúng socket kèm conversation_id"""
+        message = Message.objects.create(
+            sender=self.alice, receiver=self.bob, conversation=self.with_bob, content='Tin 1'
+        )
+
+        async def scenario():
+            alice, _ = await self._connect(self.alice)
+            bob, _ = await self._connect(self.bob)
+            await alice.receive_from()  # bob trực tuyến
+
+            await bob.send_to(text_data=json.dumps({
+                'type': 'read', 'conversation_id': self.with_bob.id, 'message_id': message.id
+            }))
+            read = json.loads(await alice.receive_from())
+            await bob.receive_from()  # read receipt của chính bob
+
+            await bob.send_to(text_data=json.dumps({
+                'type': 'typing', 'conversation_id': self.with_bob.id, 'is_typing': True
+            }))
+            typing = json.loads(await alice.receive_from())
+
+            dave = await database_sync_to_async(User.objects.create_user)(
+                username='dave', email='dave@example.com', password='davepassword123'
+            )
+            await database_sync_to_async(Conversation.get_or_create_conversation)(self.alice, dave)
+            changed = json.loads(await alice.receive_from())
+
+            await bob.disconnect()
+            await alice.disconnect()
+            return read, typing, changed, dave
+
+        read, typing, changed, dave = async_to_sync(scenario)()
+        self.assertEqual(read['type'], 'read')
+        self.assertEqual(read['conversation_id'], self.with_bob.id)
+        self.assertEqual(read['data']['last_read_message_id'], message.id)
+        self.assertEqual(typing['conversation_id'], self.with_bob.id)
+        self.assertEqual(typing['data']['user_id'], self.bob.id)
+        self.assertEqual(changed['type'], 'conversations')
+        self.assertIn(dave.id, [item['user_id'] for item in changed['data']['conversations']])
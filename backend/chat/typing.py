@@ -0,0 +1,146 @@
+"""
+Gộp sự kiện "đang gõ" trước khi gửi qua channel layer.
+
+Client gửi ``typing`` gần như mỗi lần gõ phím; chuyển tiếp từng sự kiện là
+hàng chục lần ``group_send`` mỗi giây cho mỗi socket, chỉ để hiện một dòng
+"đang gõ...". ``TypingCoalescer`` giữ trạng thái gõ của một người dùng trong
+một cuộc trò chuyện (một socket) và chỉ phát đi khi trạng thái đổi:
+
+- sự kiện lặp lại trạng thái đã phát bị bỏ qua
+- hai lần phát cách nhau ít nhất ``INTERVAL`` giây; thay đổi đến sớm hơn được
+  gửi khi hết khoảng chờ, với trạng thái mới nhất (bật rồi tắt ngay trong
+  khoảng chờ thì không gửi gì)
+- không nhận được ``typing: true`` trong ``TIMEOUT`` giây thì tự phát
+  ``is_typing: false`` (client mất kết nối giữa chừng)
+
+Dùng chung cho ChatConsumer và AIChatConsumer; sự kiện phát đi có
+``type: typing_indicator`` như trước.
+
+Cấu hình (settings.CHAT_TYPING):
+    COALESCE  = True    # False: chuyển tiếp mọi sự kiện như trước (để so sánh)
+    INTERVAL  = 0.5     # giây tối thiểu giữa hai lần phát
+    TIMEOUT   = 6       # giây không có sự kiện trước khi tự tắt
+"""
+import asyncio
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+
+DEFAULT_TYPING = {
+    'COALESCE': True,
+    'INTERVAL': 0.5,
+    'TIMEOUT': 6,
+}
+
+
+def get_typing_settings() -> Dict[str, Any]:
+    return {**DEFAULT_TYPING, **getattr(settings, 'CHAT_TYPING', {})}
+
+
+class TypingCoalescer:
+    """
+    Trạng thái gõ của ``user_id`` trong ``group``, phát qua ``channel_layer``
+
+    ``extra`` được thêm vào mỗi sự kiện (vd. username, role). ``received`` và
+    ``sent`` đếm số sự kiện nhận từ client và số lần ``group_send``.
+    """
+
+    def __init__(self, channel_layer, group: str, user_id: Optional[int], extra: Optional[Dict[str, Any]] = None,
+                 interval: Optional[float] = None, timeout: Optional[float] = None, coalesce: Optional[bool] = None):
+        options = get_typing_settings()
+        self.channel_layer = channel_layer
+        self.group = group
+        self.user_id = user_id
+        self.extra = extra or {}
+        self.interval = options['INTERVAL'] if interval is None else interval
+        self.timeout = options['TIMEOUT'] if timeout is None else timeout
+        self.coalesce = options['COALESCE'] if coalesce is None else coalesce
+        self.is_typing = False  # trạng thái đã phát
+        self.wanted = False  # trạng thái mới nhất client báo
+        self.last_sent = None
+        self.expires_at = None
+        self.received = 0
+        self.sent = 0
+        self._flush_task = None
+        self._expiry_task = None
+
+    async def update(self, is_typing: bool) -> None:
+        """Ghi nhận một sự kiện typing từ client"""
+        self.received += 1
+        is_typing = bool(is_typing)
+        if not self.coalesce:
+            await self._send(is_typing)
+            return
+
+        self.wanted = is_typing
+        loop = asyncio.get_running_loop()
+        if is_typing:
+            self.expires_at = loop.time() + self.timeout
+            if self._expiry_task is None:
+                self._expiry_task = asyncio.create_task(self._expire())
+        else:
+            self.expires_at = None
+        await self._publish()
+
+    async def stop(self, broadcast: bool = True) -> None:
+        """
+        Kết thúc trạng thái gõ (ngắt kết nối, đã gửi tin nhắn). Với
+        ``broadcast=False`` chỉ đặt lại trạng thái, khi người nhận tự xóa dòng
+        "đang gõ" (vd. lúc nhận tin nhắn mới).
+        """
+        self.wanted = False
+        self.expires_at = None
+        for task in (self._flush_task, self._expiry_task):
+            if task is not None and task is not asyncio.current_task():
+                task.cancel()
+        self._flush_task = self._expiry_task = None
+        if self.is_typing:
+            if broadcast:
+                await self._send(False)
+            else:
+                self.is_typing = False
+
+    async def _publish(self) -> None:
+        if self.wanted == self.is_typing:
+            # Trạng thái quay về đúng giá trị đã phát trong khoảng chờ: không cần gửi
+            if self._flush_task is not None:
+                self._flush_task.cancel()
+                self._flush_task = None
+            return
+        if self._flush_task is not None:
+            return
+        loop = asyncio.get_running_loop()
+        wait = 0 if self.last_sent is None else self.last_sent + self.interval - loop.time()
+        if wait <= 0:
+            await self._send(self.wanted)
+        else:
+            self._flush_task = asyncio.create_task(self._flush_later(wait))
+
+    async def _flush_later(self, wait: float) -> None:
+        await asyncio.sleep(wait)
+        self._flush_task = None
+        if self.wanted != self.is_typing:
+            await self._send(self.wanted)
+
+    async def _expire(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self.expires_at is not None:
+            remaining = self.expires_at - loop.time()
+            if remaining <= 0:
+                self._expiry_task = None
+                await self.stop()
+                return
+            await asyncio.sleep(remaining)
+        self._expiry_task = None
+
+    async def _send(self, is_typing: bool) -> None:
+        self.is_typing = is_typing
+        self.last_sent = asyncio.get_running_loop().time()
+        self.sent += 1
+        if self.channel_layer:
+            await self.channel_layer.group_send(self.group, {
+                'type': 'typing_indicator',
+                'is_typing': is_typing,
+                'user_id': self.user_id,
+                **self.extra,
+            })
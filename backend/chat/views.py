@@ -15,6 +15,7 @@ from .serializers import (
     ChatRestrictionSerializer, ChatRestrictionCreateSerializer, UserBasicSerializer
 )
 from .permissions import IsAdminUser, IsMessageParticipant, IsReporter, IsNotRestricted
+from .receipts import mark_read, with_read_state
 
 User = get_user_model()
 
@@ -52,9 +53,11 @@ class ConversationListView(generics.ListAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        return Conversation.objects.filter(
-            participants=user
-        ).order_by('-updated_at')
+        # Một truy vấn theo chỉ mục last_message_at: tin nhắn mới nhất và số tin chưa đọc
+        # đã lưu sẵn trên cuộc trò chuyện / con trỏ đã đọc; người còn lại được prefetch
+        return with_read_state(Conversation.objects.all(), user).select_related(
+            'last_message'
+        ).prefetch_related('participants').order_by(F('last_message_at').desc(nulls_last=True), '-id')
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -71,22 +74,15 @@ class ConversationDetailView(generics.ListAPIView):
         
         conversation = get_object_or_404(Conversation, id=conversation_id)
         
-        if user not in conversation.participants.all():
+        if not conversation.participants.filter(id=user.id).exists():
             return Message.objects.none()
         
-        unread_messages = Message.objects.filter(
-            conversation=conversation,
-            receiver=user,
-            is_read=False
-        )
-        
-        for message in unread_messages:
-            message.is_read = True
-            message.save(update_fields=['is_read'])
+        # Tiến con trỏ đã đọc bằng một câu UPDATE thay vì lưu từng tin nhắn
+        mark_read(conversation, user)
             
         return Message.objects.filter(
             conversation=conversation
-        ).order_by('timestamp')
+        ).select_related('sender', 'receiver').order_by('timestamp')
 
 # API để bắt đầu cuộc trò chuyện mới với một người dùng khác
 class StartConversationView(APIView):
@@ -655,16 +651,8 @@ class MessageHistoryView(generics.ListAPIView):
             
         conversation = Conversation.get_or_create_conversation(user1, user2)
         
-        unread_messages = Message.objects.filter(
-            conversation=conversation,
-            receiver=current_user,
-            is_read=False
-        )
-        
-        for message in unread_messages:
-            message.is_read = True
-            message.save(update_fields=['is_read'])
+        mark_read(conversation, current_user)
             
         return Message.objects.filter(
             conversation=conversation
-        ).order_by('timestamp')
+        ).select_related('sender', 'receiver').order_by('timestamp')
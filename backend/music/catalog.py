@@ -0,0 +1,118 @@
+"""
+Liên kết chuẩn hóa giữa Song và Album / Artist / Genre.
+
+Song vẫn giữ các cột chuỗi ``album``, ``artist``, ``genre`` làm tên hiển thị
+(tương thích API cũ), nhưng mọi truy vấn lọc / gom nhóm đi qua các khóa ngoại
+``album_ref``, ``artist_ref``, ``genre_ref``. Module này giữ hai phía luôn
+khớp nhau:
+
+- khi lưu bài hát: gán khóa ngoại theo tên (hoặc cập nhật tên theo khóa ngoại
+  nếu khóa ngoại được gán trực tiếp)
+- khi đổi tên album / nghệ sĩ / thể loại: cập nhật tên hiển thị trên các bài
+  hát liên quan bằng một câu UPDATE
+- khi tạo (hoặc đổi sang tên mới) album / nghệ sĩ / thể loại: nối khóa ngoại
+  cho các bài hát đã mang tên đó từ trước nhưng chưa có khóa ngoại
+
+Dữ liệu cũ được nối khóa ngoại bằng lệnh ``backfill_song_refs``.
+"""
+from .models import Album, Artist, Genre, Song
+
+# (trường chuỗi trên Song, khóa ngoại trên Song, model đích, trường tên trên model đích)
+SONG_LINKS = (
+    ('album', 'album_ref', Album, 'title'),
+    ('artist', 'artist_ref', Artist, 'name'),
+    ('genre', 'genre_ref', Genre, 'name'),
+)
+
+
+def find_album(title, artist_name=None):
+    """Tìm album theo tên, ưu tiên album của đúng nghệ sĩ khi có nhiều album trùng tên"""
+    if not title:
+        return None
+    albums = Album.objects.filter(title=title)
+    if artist_name:
+        album = albums.filter(artist=artist_name).order_by('id').first()
+        if album is not None:
+            return album
+    return albums.order_by('id').first()
+
+
+def resolve_ref(song, string_field):
+    """Tìm đối tượng tương ứng với tên đang lưu trong ``song.<string_field>``"""
+    name = getattr(song, string_field)
+    if not name:
+        return None
+    if string_field == 'album':
+        return find_album(name, song.artist)
+    for field, _, model, name_field in SONG_LINKS:
+        if field == string_field:
+            return model.objects.filter(**{name_field: name}).order_by('id').first()
+    raise ValueError(f'Song không có liên kết cho trường {string_field}')
+
+
+def sync_song_refs(song):
+    """
+    Đồng bộ tên hiển thị và khóa ngoại của một bài hát trước khi lưu.
+
+    - khóa ngoại vừa được gán trực tiếp: tên hiển thị lấy theo đối tượng
+    - tên hiển thị vừa đổi (hoặc bài hát mới chưa có khóa ngoại): tìm khóa ngoại theo tên
+    """
+    loaded = getattr(song, '_loaded_values', None)
+
+    for string_field, ref_field, model, name_field in SONG_LINKS:
+        ref_attname = f'{ref_field}_id'
+        ref_id = getattr(song, ref_attname)
+
+        if loaded is None:
+            ref_changed = ref_id is not None
+            string_changed = True
+        else:
+            ref_changed = loaded.get(ref_attname) != ref_id
+            string_changed = loaded.get(string_field) != getattr(song, string_field)
+
+        if ref_changed and ref_id is not None:
+            setattr(song, string_field, getattr(getattr(song, ref_field), name_field))
+        elif string_changed:
+            setattr(song, ref_field, resolve_ref(song, string_field))
+
+
+def _link_for(instance):
+    for link in SONG_LINKS:
+        if isinstance(instance, link[2]):
+            return link
+    raise ValueError(f'{type(instance).__name__} không liên kết với Song')
+
+
+def link_unlinked_songs(instance):
+    """
+    Nối khóa ngoại tới ``instance`` cho các bài hát mang tên của nó nhưng chưa có
+    khóa ngoại (bài hát được lưu trước khi album / nghệ sĩ / thể loại được tạo).
+    Trả về danh sách id bài hát đã cập nhật.
+    """
+    string_field, ref_field, model, name_field = _link_for(instance)
+    name = getattr(instance, name_field)
+    if not name:
+        return []
+
+    songs = Song.objects.filter(**{string_field: name, f'{ref_field}__isnull': True})
+    song_ids = list(songs.values_list('id', flat=True))
+    if song_ids:
+        Song.objects.filter(id__in=song_ids).update(**{ref_field: instance})
+    return song_ids
+
+
+def propagate_rename(instance, old_name):
+    """
+    Cập nhật tên hiển thị trên các bài hát trỏ tới ``instance`` sau khi đổi tên.
+    Trả về danh sách id bài hát đã cập nhật.
+    """
+    string_field, ref_field, model, name_field = _link_for(instance)
+    new_name = getattr(instance, name_field)
+    if old_name == new_name:
+        return []
+
+    songs = Song.objects.filter(**{ref_field: instance})
+    song_ids = list(songs.values_list('id', flat=True))
+    if song_ids:
+        Song.objects.filter(id__in=song_ids).update(**{string_field: new_name})
+    return song_ids
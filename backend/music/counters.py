@@ -0,0 +1,120 @@
+"""
+Bộ đếm phi chuẩn hóa songs_count / total_play_count trên Album, Artist, Genre.
+
+Bài hát được gắn với album / nghệ sĩ / thể loại qua khóa ngoại album_ref,
+artist_ref, genre_ref. Các bộ đếm được cập nhật tăng dần qua signals của Song
+(tạo / sửa / xóa) và khi bộ đệm lượt nghe ghi xuống DB, nên các API danh sách không còn phải đếm
+bài hát cho từng dòng. Lệnh ``rebuild_counters`` tính lại toàn bộ khi cần sửa
+sai lệch (ví dụ sau khi nhập dữ liệu bằng bulk_create / update).
+"""
+from collections import defaultdict
+
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Greatest
+
+from .models import Album, Artist, Genre, Song
+
+# (khóa ngoại trên Song, model đích)
+COUNTER_TARGETS = (
+    ('album_ref_id', Album),
+    ('artist_ref_id', Artist),
+    ('genre_ref_id', Genre),
+)
+
+TRACKED_SONG_FIELDS = ('album_ref_id', 'artist_ref_id', 'genre_ref_id', 'play_count')
+
+
+def _apply_deltas(model, deltas):
+    """Cộng ``deltas`` ({id: (số bài hát, số lượt nghe)}) vào các dòng tương ứng"""
+    groups = defaultdict(list)
+    for pk, delta in deltas.items():
+        if pk is not None and delta != (0, 0):
+            groups[delta].append(pk)
+
+    for (songs_delta, plays_delta), ids in groups.items():
+        model.objects.filter(id__in=ids).update(
+            songs_count=Greatest(F('songs_count') + songs_delta, Value(0)),
+            total_play_count=Greatest(F('total_play_count') + plays_delta, Value(0)),
+        )
+
+
+def apply_song_change(old, new):
+    """
+    Cập nhật bộ đếm khi một bài hát thay đổi.
+
+    ``old`` / ``new`` là dict các trường album_ref_id, artist_ref_id,
+    genre_ref_id, play_count (None khi bài hát vừa được tạo / vừa bị xóa).
+    """
+    for song_field, model in COUNTER_TARGETS:
+        deltas = defaultdict(lambda: (0, 0))
+        if old is not None:
+            songs, plays = deltas[old[song_field]]
+            deltas[old[song_field]] = (songs - 1, plays - (old['play_count'] or 0))
+        if new is not None:
+            songs, plays = deltas[new[song_field]]
+            deltas[new[song_field]] = (songs + 1, plays + (new['play_count'] or 0))
+        _apply_deltas(model, dict(deltas))
+
+
+def add_plays(play_counts):
+    """Cộng lượt nghe ({song_id: n}) vào total_play_count của album / nghệ sĩ / thể loại"""
+    if not play_counts:
+        return
+
+    song_fields = [song_field for song_field, _ in COUNTER_TARGETS]
+    songs = Song.objects.filter(id__in=list(play_counts)).values('id', *song_fields)
+    deltas = {song_field: defaultdict(int) for song_field in song_fields}
+    for song in songs:
+        for song_field in song_fields:
+            deltas[song_field][song[song_field]] += play_counts[song['id']]
+
+    for song_field, model in COUNTER_TARGETS:
+        _apply_deltas(model, {
+            pk: (0, plays) for pk, plays in deltas[song_field].items()
+        })
+
+
+def _song_field_for(model):
+    for song_field, target_model in COUNTER_TARGETS:
+        if target_model is model:
+            return song_field
+    raise ValueError(f'{model.__name__} không có bộ đếm bài hát')
+
+
+def compute_counters(instance):
+    """Gán lại songs_count / total_play_count cho một album / nghệ sĩ / thể loại (chưa lưu)"""
+    if instance.pk is None:
+        instance.songs_count = 0
+        instance.total_play_count = 0
+        return
+
+    song_field = _song_field_for(type(instance))
+    totals = Song.objects.filter(**{song_field: instance.pk}).aggregate(
+        songs=Count('id'), plays=Sum('play_count')
+    )
+    instance.songs_count = totals['songs']
+    instance.total_play_count = totals['plays'] or 0
+
+
+def rebuild_counters(batch_size=1000):
+    """Tính lại toàn bộ bộ đếm từ bảng songs, trả về {tên model: số dòng đã sửa}"""
+    fixed = {}
+    for song_field, model in COUNTER_TARGETS:
+        totals = {
+            row[song_field]: (row['songs'], row['plays'] or 0)
+            for row in Song.objects.values(song_field).annotate(
+                songs=Count('id'), plays=Sum('play_count')
+            ).order_by()
+        }
+
+        changed = []
+        for obj in model.objects.only('id', 'songs_count', 'total_play_count').iterator():
+            songs, plays = totals.get(obj.pk, (0, 0))
+            if (obj.songs_count, obj.total_play_count) != (songs, plays):
+                obj.songs_count = songs
+                obj.total_play_count = plays
+                changed.append(obj)
+
+        model.objects.bulk_update(changed, ['songs_count', 'total_play_count'], batch_size=batch_size)
+        fixed[model.__name__] = len(changed)
+    return fixed
@@ -0,0 +1,144 @@
+"""
+Snapshot thống kê cho trang quản trị (AdminStatisticsView).
+
+Toàn bộ số liệu được tính trong một lần với mỗi chiều là một câu GROUP BY:
+thể loại (bảng songs), lượt nghe theo ngày (bucket trending, không quét
+song_play_history) và người dùng mới theo ngày. Kết quả được lưu trong cache:
+
+- snapshot còn mới (dưới ``ADMIN_DASHBOARD_TTL`` giây): trả về ngay
+- snapshot cũ: vẫn trả về ngay, đồng thời một luồng nền tính lại
+- chưa có snapshot: tính đồng bộ một lần
+
+Lệnh ``refresh_dashboard_snapshot`` làm mới snapshot định kỳ (cron / worker)
+để trang admin không bao giờ phải chờ tính toán.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Playlist, Song, SongPlayBucket
+from .serializers import PlaylistSerializer, SongSerializer
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'music:admin_dashboard'
+DAYS = 30
+
+_refresh_lock = threading.Lock()
+
+
+def get_dashboard_ttl():
+    return getattr(settings, 'ADMIN_DASHBOARD_TTL', 300)
+
+
+def _daily(rows, today):
+    """Điền đủ DAYS ngày (mới nhất trước), ngày không có dữ liệu bằng 0"""
+    counts = {row['day']: row['count'] for row in rows}
+    result = {}
+    for i in range(DAYS):
+        date = today - timedelta(days=i)
+        result[date.strftime('%Y-%m-%d')] = counts.get(date, 0)
+    return result
+
+
+def compute_snapshot(now=None):
+    """Tính toàn bộ số liệu của trang thống kê admin"""
+    User = get_user_model()
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    start = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=DAYS - 1)
+
+    song_totals = Song.objects.aggregate(total_songs=Count('id'), total_plays=Sum('play_count'))
+    user_totals = User.objects.aggregate(
+        total_users=Count('id'),
+        active_users=Count('id', filter=Q(last_login__gte=now - timedelta(days=30))),
+    )
+
+    genre_stats = {}
+    genre_rows = Song.objects.exclude(genre__isnull=True).exclude(genre='').values('genre').annotate(
+        song_count=Count('id'), total_plays=Sum('play_count')
+    ).order_by()
+    for row in genre_rows:
+        plays = row['total_plays'] or 0
+        genre_stats[row['genre']] = {
+            'song_count': row['song_count'],
+            'total_plays': plays,
+            'avg_plays': round(plays / row['song_count'], 2) if row['song_count'] > 0 else 0
+        }
+
+    # Bucket giờ và bucket ngày đã gộp đều được tính, không đọc song_play_history
+    play_rows = SongPlayBucket.objects.filter(bucket_start__gte=start).annotate(
+        day=TruncDate('bucket_start')
+    ).values('day').annotate(count=Sum('play_count')).order_by()
+
+    join_rows = User.objects.filter(date_joined__gte=start).annotate(
+        day=TruncDate('date_joined')
+    ).values('day').annotate(count=Count('id')).order_by()
+
+    top_songs = Song.objects.select_related('uploaded_by').order_by('-play_count')[:10]
+    top_playlists = Playlist.objects.annotate(
+        follower_count=Count('followers')
+    ).order_by('-follower_count')[:10]
+
+    return {
+        'overview': {
+            'total_songs': song_totals['total_songs'],
+            'total_playlists': Playlist.objects.count(),
+            'total_users': user_totals['total_users'],
+            'active_users': user_totals['active_users'],
+            'total_plays': song_totals['total_plays'] or 0,
+        },
+        'genre_stats': genre_stats,
+        'monthly_plays': _daily(play_rows, today),
+        'top_songs': list(SongSerializer(top_songs, many=True).data),
+        'top_playlists': list(PlaylistSerializer(top_playlists, many=True).data),
+        'new_users': _daily(join_rows, today),
+        'generated_at': now.isoformat(),
+    }
+
+
+def refresh_snapshot():
+    """Tính lại snapshot và lưu vào cache"""
+    snapshot = compute_snapshot()
+    # Giữ trong cache lâu hơn TTL để luôn có dữ liệu trả về trong lúc làm mới
+    cache.set(CACHE_KEY, (time.time(), snapshot), get_dashboard_ttl() * 10)
+    return snapshot
+
+
+def _refresh_in_background():
+    if not _refresh_lock.acquire(blocking=False):
+        # Đã có luồng khác đang làm mới
+        return
+
+    def run():
+        close_old_connections()
+        try:
+            refresh_snapshot()
+        except Exception as e:
+            logger.error(f"Không thể làm mới snapshot thống kê: {str(e)}")
+        finally:
+            close_old_connections()
+            _refresh_lock.release()
+
+    threading.Thread(target=run, name='admin-dashboard-refresh', daemon=True).start()
+
+
+def get_snapshot(force_refresh=False):
+    """Trả về snapshot thống kê, làm mới nền khi snapshot đã quá TTL"""
+    cached = None if force_refresh else cache.get(CACHE_KEY)
+    if cached is None:
+        return refresh_snapshot()
+
+    generated, snapshot = cached
+    if time.time() - generated > get_dashboard_ttl():
+        _refresh_in_background()
+    return snapshot
@@ -0,0 +1,374 @@
+"""
+Các backend phân phối file âm thanh cho SongStreamView và SongDownloadView.
+
+- ``SendfileBackend`` (mặc định): trả về FileResponse bọc một đoạn của file.
+  Dưới WSGI server có ``wsgi.file_wrapper`` (gunicorn, uWSGI...) nội dung được
+  gửi bằng ``os.sendfile`` (zero-copy), không đi qua Python.
+- ``XAccelRedirectBackend``: nhờ nginx gửi file qua header ``X-Accel-Redirect``.
+- ``XSendfileBackend``: nhờ Apache / lighttpd gửi file qua header ``X-Sendfile``.
+- ``AsyncChunkedBackend``: đọc file theo khối trong thread pool và trả về bằng
+  async iterator, không chiếm worker của Daphne trong suốt thời gian nghe.
+
+Các backend xử lý trong Python đều hỗ trợ đầy đủ ``Range`` (một hoặc nhiều
+đoạn, đoạn cuối dạng ``bytes=-500``), ``Content-Range``, ``ETag``, ``If-Range``
+và ``If-None-Match``. Với hai backend proxy, nginx / Apache tự xử lý Range.
+
+Cấu hình:
+    MUSIC_FILE_DELIVERY_BACKEND = 'music.delivery.SendfileBackend'
+    MUSIC_FILE_DELIVERY_ACCEL_PREFIX = '/protected-media/'  # location internal của nginx
+    MUSIC_FILE_DELIVERY_CHUNK_SIZE = 64 * 1024
+"""
+import asyncio
+import mimetypes
+import os
+import uuid
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header, http_date
+from django.utils.module_loading import import_string
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Số đoạn tối đa được chấp nhận trong một Range header (tránh bị lạm dụng)
+MAX_RANGES = 16
+
+
+class RangeNotSatisfiable(Exception):
+    """Range header hợp lệ nhưng không đoạn nào nằm trong file (HTTP 416)"""
+
+
+def parse_range_header(header, size):
+    """
+    Phân tích header ``Range`` thành danh sách đoạn (start, end) (bao gồm end).
+
+    Trả về None nếu header không phải dạng ``bytes=...`` hợp lệ (khi đó trả về
+    toàn bộ file như RFC 9110 quy định). Các đoạn chồng lấn được gộp lại.
+    """
+    if not header:
+        return None
+    unit, _, ranges_spec = header.strip().partition('=')
+    if unit.strip().lower() != 'bytes' or not ranges_spec:
+        return None
+
+    specs = [spec.strip() for spec in ranges_spec.split(',') if spec.strip()]
+    if not specs or len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        first, sep, last = spec.partition('-')
+        if not sep:
+            return None
+        first, last = first.strip(), last.strip()
+        if (first and not first.isdigit()) or (last and not last.isdigit()):
+            return None
+
+        if not first:
+            # Đoạn cuối file: bytes=-500
+            if not last:
+                return None
+            length = int(last)
+            if length == 0:
+                continue
+            ranges.append((max(size - length, 0), size - 1))
+            continue
+
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        end = int(last) if last else size - 1
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size - 1)))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _etag_matches(header, etag, weak=True):
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if weak:
+            candidate = candidate[2:] if candidate.startswith('W/') else candidate
+        if candidate == etag:
+            return True
+    return False
+
+
+class FileInfo:
+    def __init__(self, path, content_type=None):
+        stat = os.stat(path)
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+        self.last_modified = http_date(stat.st_mtime)
+        self.content_type = content_type or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+class RangedFile:
+    """
+    Đối tượng file chỉ cho đọc ``length`` byte kể từ ``start``.
+
+    Giữ lại ``fileno()`` để WSGI server có thể dùng sendfile: file gốc đã được
+    seek tới ``start`` và Content-Length giới hạn số byte được gửi.
+    """
+
+    def __init__(self, path, start, length):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = length
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        self._file.close()
+
+
+class BaseDeliveryBackend:
+    """Xử lý header điều kiện / Range chung, lớp con chỉ cần tạo phần thân"""
+
+    chunk_size = DEFAULT_CHUNK_SIZE
+
+    def __init__(self):
+        self.chunk_size = getattr(settings, 'MUSIC_FILE_DELIVERY_CHUNK_SIZE', self.chunk_size)
+
+    def serve(self, request, path, content_type=None, filename=None, as_attachment=False):
+        info = FileInfo(path, content_type)
+
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and _etag_matches(if_none_match, info.etag):
+            response = HttpResponse(status=304)
+            return self._finalize(response, info, filename, as_attachment)
+
+        ranges = None
+        range_header = request.META.get('HTTP_RANGE')
+        if range_header and self._if_range_allows(request, info):
+            try:
+                ranges = parse_range_header(range_header, info.size)
+            except RangeNotSatisfiable:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{info.size}'
+                return self._finalize(response, info, filename, as_attachment)
+
+        if not ranges:
+            response = self.single_part_response(info, 0, info.size)
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            response = self.single_part_response(info, start, end - start + 1)
+            response.status_code = 206
+            response['Content-Range'] = f'bytes {start}-{end}/{info.size}'
+        else:
+            response = self.multipart_response(info, ranges)
+
+        return self._finalize(response, info, filename, as_attachment)
+
+    def _if_range_allows(self, request, info):
+        """If-Range: chỉ áp dụng Range khi file chưa thay đổi so với bản client đang có"""
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if not if_range:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith('"') or if_range.startswith('W/'):
+            # If-Range yêu cầu so sánh mạnh nên ETag yếu không bao giờ khớp
+            return if_range == info.etag
+        return if_range == info.last_modified
+
+    def _finalize(self, response, info, filename, as_attachment):
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = info.etag
+        response['Last-Modified'] = info.last_modified
+        if filename:
+            response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+        return response
+
+    def _multipart_layout(self, info, ranges):
+        boundary = uuid.uuid4().hex
+        parts = []
+        for start, end in ranges:
+            header = (
+                f'--{boundary}\r\n'
+                f'Content-Type: {info.content_type}\r\n'
+                f'Content-Range: bytes {start}-{end}/{info.size}\r\n\r\n'
+            ).encode('ascii')
+            parts.append((header, start, end - start + 1))
+        closing = f'--{boundary}--\r\n'.encode('ascii')
+        length = sum(len(header) + part_length + 2 for header, _, part_length in parts) + len(closing)
+        return boundary, parts, closing, length
+
+    def single_part_response(self, info, start, length):
+        raise NotImplementedError
+
+    def multipart_response(self, info, ranges):
+        raise NotImplementedError
+
+
+class SendfileBackend(BaseDeliveryBackend):
+    """FileResponse trên một đoạn của file, WSGI server sẽ dùng os.sendfile nếu hỗ trợ"""
+
+    def single_part_response(self, info, start, length):
+        response = FileResponse(
+            RangedFile(info.path, start, length),
+            content_type=info.content_type,
+        )
+        response.block_size = self.chunk_size
+        response['Content-Length'] = length
+        return response
+
+    def multipart_response(self, info, ranges):
+        boundary, parts, closing, length = self._multipart_layout(info, ranges)
+        chunk_size = self.chunk_size
+
+        def body():
+            with open(info.path, 'rb') as f:
+                for header, start, part_length in parts:
+                    yield header
+                    f.seek(start)
+                    remaining = part_length
+                    while remaining > 0:
+                        data = f.read(min(chunk_size, remaining))
+                        if not data:
+                            break
+                        remaining -= len(data)
+                        yield data
+                    yield b'\r\n'
+            yield closing
+
+        response = StreamingHttpResponse(
+            body(), status=206, content_type=f'multipart/byteranges; boundary={boundary}'
+        )
+        response['Content-Length'] = length
+        return response
+
+
+class AsyncChunkedBackend(BaseDeliveryBackend):
+    """Đọc file trong thread pool và trả về qua async iterator (dành cho ASGI / Daphne)"""
+
+    async def _read_ranges(self, path, ranges, suffix=None):
+        chunk_size = self.chunk_size
+        f = await asyncio.to_thread(open, path, 'rb')
+        try:
+            for header, start, length in ranges:
+                if header:
+                    yield header
+                await asyncio.to_thread(f.seek, start)
+                remaining = length
+                while remaining > 0:
+                    data = await asyncio.to_thread(f.read, min(chunk_size, remaining))
+                    if not data:
+                        break
+                    remaining -= len(data)
+                    yield data
+                if header:
+                    yield b'\r\n'
+            if suffix:
+                yield suffix
+        finally:
+            await asyncio.to_thread(f.close)
+
+    def single_part_response(self, info, start, length):
+        response = StreamingHttpResponse(
+            self._read_ranges(info.path, [(None, start, length)]),
+            content_type=info.content_type,
+        )
+        response['Content-Length'] = length
+        return response
+
+    def multipart_response(self, info, ranges):
+        boundary, parts, closing, length = self._multipart_layout(info, ranges)
+        response = StreamingHttpResponse(
+            self._read_ranges(info.path, parts, suffix=closing),
+            status=206,
+            content_type=f'multipart/byteranges; boundary={boundary}',
+        )
+        response['Content-Length'] = length
+        return response
+
+
+class ProxyOffloadBackend(BaseDeliveryBackend):
+    """
+    Chỉ trả về header chỉ định file, proxy phía trước sẽ gửi nội dung.
+    Proxy tự xử lý Range / If-Range / ETag nên Django không đọc file.
+    """
+
+    header_name = None
+
+    def get_header_value(self, path):
+        raise NotImplementedError
+
+    def serve(self, request, path, content_type=None, filename=None, as_attachment=False):
+        content_type = content_type or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        response = HttpResponse(content_type=content_type)
+        response[self.header_name] = self.get_header_value(path)
+        if filename:
+            response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+        return response
+
+
+class XAccelRedirectBackend(ProxyOffloadBackend):
+    """
+    nginx: cần một location internal trỏ tới MEDIA_ROOT, ví dụ
+
+        location /protected-media/ {
+            internal;
+            alias /path/to/media/;
+        }
+    """
+
+    header_name = 'X-Accel-Redirect'
+
+    def get_header_value(self, path):
+        prefix = getattr(settings, 'MUSIC_FILE_DELIVERY_ACCEL_PREFIX', '/protected-media/')
+        relative = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+        return prefix.rstrip('/') + '/' + quote(relative)
+
+
+class XSendfileBackend(ProxyOffloadBackend):
+    """Apache mod_xsendfile / lighttpd: gửi đường dẫn tuyệt đối của file"""
+
+    header_name = 'X-Sendfile'
+
+    def get_header_value(self, path):
+        return os.path.abspath(path)
+
+
+_backend = None
+
+
+def get_delivery_backend():
+    global _backend
+    if _backend is None:
+        backend_path = getattr(settings, 'MUSIC_FILE_DELIVERY_BACKEND', 'music.delivery.SendfileBackend')
+        _backend = import_string(backend_path)()
+    return _backend
+
+
+def serve_file(request, path, content_type=None, filename=None, as_attachment=False):
+    """Trả về response phân phối file ``path`` bằng backend đã cấu hình"""
+    return get_delivery_backend().serve(
+        request, path, content_type=content_type, filename=filename, as_attachment=as_attachment
+    )
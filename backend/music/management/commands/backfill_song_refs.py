@@ -0,0 +1,87 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from music.catalog import SONG_LINKS
+from music.counters import rebuild_counters
+from music.models import Album, Artist, Genre, Song
+
+
+class Command(BaseCommand):
+    help = (
+        'Nối khóa ngoại album_ref / artist_ref / genre_ref cho các bài hát theo tên album, '
+        'nghệ sĩ, thể loại. Chạy theo lô, có thể dừng và chạy tiếp bằng --start-id'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Số bài hát mỗi lô')
+        parser.add_argument('--start-id', type=int, default=0, help='Bắt đầu từ bài hát có id lớn hơn giá trị này')
+        parser.add_argument('--sleep', type=float, default=0, help='Số giây nghỉ giữa hai lô để giảm tải DB')
+        parser.add_argument('--skip-counters', action='store_true', help='Không tính lại bộ đếm sau khi nối xong')
+
+    def build_lookups(self):
+        """Bảng tra tên -> id; album trùng tên được phân biệt theo nghệ sĩ"""
+        artists = {}
+        for pk, name in Artist.objects.order_by('-id').values_list('id', 'name'):
+            artists[name] = pk
+        genres = dict(Genre.objects.values_list('name', 'id'))
+
+        albums_by_title = {}
+        albums_by_title_artist = {}
+        for pk, title, artist in Album.objects.order_by('-id').values_list('id', 'title', 'artist'):
+            # Duyệt id giảm dần để album cũ nhất được giữ lại, giống music.catalog.find_album
+            albums_by_title[title] = pk
+            albums_by_title_artist[(title, artist)] = pk
+        return artists, genres, albums_by_title, albums_by_title_artist
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = options['start_id']
+        artists, genres, albums_by_title, albums_by_title_artist = self.build_lookups()
+        ref_fields = [ref_field for _, ref_field, _, _ in SONG_LINKS]
+
+        processed = 0
+        updated = 0
+        while True:
+            songs = list(
+                Song.objects.filter(id__gt=last_id).order_by('id')
+                .only('id', 'album', 'artist', 'genre', *ref_fields)[:batch_size]
+            )
+            if not songs:
+                break
+
+            changed = []
+            for song in songs:
+                refs = {
+                    'album_ref_id': (
+                        albums_by_title_artist.get((song.album, song.artist))
+                        or albums_by_title.get(song.album)
+                    ) if song.album else None,
+                    'artist_ref_id': artists.get(song.artist) if song.artist else None,
+                    'genre_ref_id': genres.get(song.genre) if song.genre else None,
+                }
+                if any(getattr(song, field) != value for field, value in refs.items()):
+                    for field, value in refs.items():
+                        setattr(song, field, value)
+                    changed.append(song)
+
+            # Mỗi lô một transaction ngắn, không giữ khóa trên cả bảng songs
+            with transaction.atomic():
+                Song.objects.bulk_update(changed, ref_fields)
+
+            processed += len(songs)
+            updated += len(changed)
+            last_id = songs[-1].id
+            self.stdout.write(f'Đã xử lý {processed} bài hát, cập nhật {updated} (id cuối: {last_id})')
+
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Hoàn tất: {processed} bài hát, cập nhật {updated}. Chạy tiếp với --start-id {last_id} nếu bị gián đoạn'
+        ))
+
+        if not options['skip_counters']:
+            for model_name, count in rebuild_counters(batch_size=batch_size).items():
+                self.stdout.write(self.style.SUCCESS(f'{model_name}: đã sửa {count} bộ đếm'))
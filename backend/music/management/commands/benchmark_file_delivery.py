@@ -0,0 +1,125 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from music.delivery import AsyncChunkedBackend, SendfileBackend, XAccelRedirectBackend
+
+
+class Command(BaseCommand):
+    help = 'Đo số stream đồng thời mà một worker phục vụ được với từng backend phân phối file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--streams', type=int, default=50, help='Số stream đồng thời')
+        parser.add_argument('--size-mb', type=int, default=8, help='Kích thước file âm thanh giả lập (MB)')
+        parser.add_argument('--range', default='', help='Range header gửi kèm, ví dụ "bytes=1000-"')
+
+    def handle(self, *args, **options):
+        streams = options['streams']
+        size = options['size_mb'] * 1024 * 1024
+
+        with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as f:
+            f.write(os.urandom(size))
+            path = f.name
+
+        factory = RequestFactory()
+        headers = {'HTTP_RANGE': options['range']} if options['range'] else {}
+        self.devnull = os.open(os.devnull, os.O_WRONLY)
+
+        try:
+            self._report('Generator 8KB (cũ)', streams, *self._threads(streams, lambda: self._legacy(path)))
+
+            backend = SendfileBackend()
+            self._report('SendfileBackend', streams, *self._threads(
+                streams, lambda: self._sendfile(backend.serve(factory.get('/', **headers), path))
+            ))
+
+            backend = AsyncChunkedBackend()
+            self._report('AsyncChunkedBackend (1 event loop)', streams, *asyncio.run(
+                self._async(backend, factory, headers, path, streams)
+            ))
+
+            backend = XAccelRedirectBackend()
+            start = time.perf_counter()
+            for _ in range(streams):
+                backend.serve(factory.get('/', **headers), path)
+            self._report('XAccelRedirectBackend (chỉ tạo header)', streams, time.perf_counter() - start, 0)
+        finally:
+            os.close(self.devnull)
+            os.remove(path)
+
+    def _legacy(self, path):
+        # Tái hiện cách đọc cũ của SongDownloadView
+        sent = 0
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(8192)
+                if not chunk:
+                    break
+                os.write(self.devnull, chunk)
+                sent += len(chunk)
+        return sent
+
+    def _sendfile(self, response):
+        # Giả lập wsgi.file_wrapper của gunicorn: os.sendfile từ vị trí hiện tại, giới hạn bởi Content-Length
+        filelike = getattr(response, 'file_to_stream', None)
+        if filelike is None:
+            # Phản hồi multipart/byteranges không dùng sendfile được
+            try:
+                return sum(os.write(self.devnull, chunk) for chunk in response.streaming_content)
+            finally:
+                response.close()
+
+        fileno = filelike.fileno()
+        offset = os.lseek(fileno, 0, os.SEEK_CUR)
+        remaining = int(response['Content-Length'])
+        sent = 0
+        try:
+            while remaining > 0:
+                count = os.sendfile(self.devnull, fileno, offset + sent, remaining)
+                if count == 0:
+                    break
+                sent += count
+                remaining -= count
+        finally:
+            response.close()
+        return sent
+
+    def _threads(self, streams, serve):
+        totals = []
+        lock = threading.Lock()
+
+        def worker():
+            sent = serve()
+            with lock:
+                totals.append(sent)
+
+        threads = [threading.Thread(target=worker) for _ in range(streams)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.perf_counter() - start, sum(totals)
+
+    async def _async(self, backend, factory, headers, path, streams):
+        async def consume():
+            response = backend.serve(factory.get('/', **headers), path)
+            sent = 0
+            async for chunk in response.streaming_content:
+                sent += len(chunk)
+            return sent
+
+        start = time.perf_counter()
+        totals = await asyncio.gather(*(consume() for _ in range(streams)))
+        return time.perf_counter() - start, sum(totals)
+
+    def _report(self, label, streams, elapsed, sent):
+        throughput = sent / elapsed / (1024 * 1024) if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'{label}: {streams} stream trong {elapsed:.2f}s, {throughput:.0f} MB/s'
+        ))
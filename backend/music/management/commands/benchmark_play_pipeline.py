@@ -0,0 +1,103 @@
+import threading
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from music.models import Song, SongPlayHistory
+from music.play_buffer import PlayEventBuffer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'So sánh throughput ghi lượt nghe: ghi trực tiếp (cũ) và ghi qua bộ đệm theo lô'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plays', type=int, default=2000, help='Tổng số lượt nghe giả lập')
+        parser.add_argument('--threads', type=int, default=8, help='Số luồng gửi lượt nghe đồng thời')
+        parser.add_argument('--songs', type=int, default=5, help='Số bài hát "hot" nhận lượt nghe')
+        parser.add_argument('--flush-size', type=int, default=500, help='Kích thước lô của bộ đệm')
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        # Mỗi luồng gửi cùng một số lượt nghe
+        plays = options['plays'] // threads * threads
+        marker = f'bench-{uuid.uuid4().hex[:8]}'
+
+        user = User.objects.create_user(
+            username=marker,
+            email=f'{marker}@example.com',
+            password=uuid.uuid4().hex,
+        )
+        songs = [
+            Song.objects.create(
+                title=f'{marker}-{i}',
+                artist=marker,
+                duration=180,
+                audio_file='songs/benchmark.mp3',
+                uploaded_by=user,
+            )
+            for i in range(options['songs'])
+        ]
+
+        try:
+            legacy_time = self._run(plays, threads, songs, self._legacy_play(user))
+            legacy_total = self._total_play_count(songs)
+            self._report('Ghi trực tiếp', plays, legacy_time, legacy_total)
+
+            Song.objects.filter(id__in=[s.id for s in songs]).update(play_count=0)
+            SongPlayHistory.objects.filter(song__in=songs).delete()
+
+            buffer = PlayEventBuffer(flush_interval=1.0, flush_size=options['flush_size'])
+
+            def buffered_play(song):
+                buffer.record(user.id, song.id)
+
+            start = time.perf_counter()
+            self._run(plays, threads, songs, buffered_play)
+            buffer.stop()
+            buffered_time = time.perf_counter() - start
+            self._report('Bộ đệm theo lô', plays, buffered_time, self._total_play_count(songs))
+        finally:
+            # Xóa dữ liệu benchmark (song_play_history bị xóa theo CASCADE)
+            Song.objects.filter(id__in=[s.id for s in songs]).delete()
+            user.delete()
+
+    def _legacy_play(self, user):
+        def play(song):
+            # Tái hiện cách ghi cũ của SongViewSet.play
+            song = Song.objects.get(id=song.id)
+            song.play_count += 1
+            song.save()
+            SongPlayHistory.objects.create(user=user, song=song)
+        return play
+
+    def _run(self, plays, threads, songs, play):
+        per_thread = plays // threads
+
+        def worker(offset):
+            try:
+                for i in range(per_thread):
+                    play(songs[(offset + i) % len(songs)])
+            finally:
+                close_old_connections()
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        start = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        return time.perf_counter() - start
+
+    def _total_play_count(self, songs):
+        return sum(Song.objects.filter(id__in=[s.id for s in songs]).values_list('play_count', flat=True))
+
+    def _report(self, label, plays, elapsed, total):
+        self.stdout.write(self.style.SUCCESS(
+            f'{label}: {elapsed:.2f}s, {plays / elapsed:.0f} lượt/giây, '
+            f'play_count={total} (mất {max(0, plays - total)} lượt)'
+        ))
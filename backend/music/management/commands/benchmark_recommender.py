@@ -0,0 +1,68 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from music.recommender import build_matrix, evaluate_recall, item_similarity, recommend
+
+
+class Command(BaseCommand):
+    help = (
+        'Đo thời gian dựng ma trận, tính độ tương đồng và sinh gợi ý trên dữ liệu tương tác '
+        'sinh ngẫu nhiên (người dùng thuộc các nhóm sở thích), kèm recall@K'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50000)
+        parser.add_argument('--songs', type=int, default=20000)
+        parser.add_argument('--interactions', type=int, default=30, help='Số tương tác trung bình mỗi người dùng')
+        parser.add_argument('--clusters', type=int, default=50, help='Số nhóm sở thích')
+        parser.add_argument('--top-k', type=int, default=20)
+        parser.add_argument('--neighbours', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        n_users, n_songs = options['users'], options['songs']
+
+        # Mỗi người dùng thuộc một nhóm, 80% tương tác rơi vào bài hát của nhóm đó
+        clusters = rng.integers(0, options['clusters'], size=n_users)
+        songs_per_cluster = max(1, n_songs // options['clusters'])
+        counts = rng.poisson(options['interactions'], size=n_users) + 1
+        user_ids = np.repeat(np.arange(n_users), counts)
+        in_cluster = rng.random(len(user_ids)) < 0.8
+        song_ids = np.where(
+            in_cluster,
+            np.repeat(clusters, counts) * songs_per_cluster + rng.integers(0, songs_per_cluster, size=len(user_ids)),
+            rng.integers(0, n_songs, size=len(user_ids)),
+        ) % n_songs
+        weights = rng.choice([1.0, 2.0, 4.0], size=len(user_ids), p=[0.7, 0.2, 0.1])
+
+        started = time.perf_counter()
+        interactions = build_matrix(user_ids, song_ids, weights)
+        self.stdout.write(
+            f'Dựng ma trận {interactions.matrix.shape} ({interactions.matrix.nnz} tương tác): '
+            f'{time.perf_counter() - started:.2f}s'
+        )
+
+        started = time.perf_counter()
+        similarity = item_similarity(interactions.matrix, neighbours=options['neighbours'])
+        self.stdout.write(f'Độ tương đồng ({similarity.nnz} cặp): {time.perf_counter() - started:.2f}s')
+
+        started = time.perf_counter()
+        produced = sum(1 for _ in recommend(interactions.matrix, similarity, k=options['top_k']))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Sinh top-{options["top_k"]} cho {produced} người dùng: {elapsed:.2f}s '
+            f'({elapsed / max(produced, 1) * 1e6:.0f}µs / người dùng)'
+        )
+
+        started = time.perf_counter()
+        result = evaluate_recall(
+            interactions.matrix, k=options['top_k'], neighbours=options['neighbours'], seed=options['seed']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"recall@{options['top_k']}: item-item {result['recall']:.4f}, "
+            f"phổ biến {result['popularity_recall']:.4f} "
+            f"({result['users']} người dùng, {time.perf_counter() - started:.2f}s)"
+        ))
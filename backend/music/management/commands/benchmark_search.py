@@ -0,0 +1,126 @@
+import random
+import statistics
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from music.models import Song
+from music.search import InMemorySearchBackend, get_search_backend
+
+User = get_user_model()
+
+SYLLABLES = [
+    'la', 'mi', 'son', 'ca', 'tinh', 'yeu', 'em', 'anh', 'dem', 'mua', 'nang', 'gio',
+    'song', 'trang', 'sao', 'xa', 'nho', 'buon', 'vui', 'hoa', 'ro', 'love', 'night',
+    'star', 'fire', 'blue', 'dream', 'heart', 'sky', 'rain', 'light', 'road', 'home',
+]
+GENRES = ['Pop', 'Rock', 'Ballad', 'Rap', 'EDM', 'Jazz', 'Bolero', 'Indie', 'R&B', 'Lofi']
+
+
+class Command(BaseCommand):
+    help = 'Đo độ trễ tìm kiếm trên một catalog bài hát sinh ngẫu nhiên (mặc định 1 triệu bài)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--songs', type=int, default=1000000, help='Số bài hát trong catalog')
+        parser.add_argument('--queries', type=int, default=500, help='Số truy vấn đo')
+        parser.add_argument(
+            '--database',
+            action='store_true',
+            help='Ghi catalog vào DB và đo backend đang cấu hình (mặc định chỉ đo InMemorySearchBackend)',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        vocabulary = self._build_vocabulary(rng)
+
+        if options['database']:
+            backend, cleanup = self._build_database_catalog(rng, vocabulary, options['songs'])
+        else:
+            backend, cleanup = self._build_memory_catalog(rng, vocabulary, options['songs']), None
+
+        # Catalog trong bộ nhớ không có bản ghi trong DB nên chỉ đo phần tra cứu id
+        if cleanup is None:
+            run_query = lambda query: backend.search_ids('song', query, limit=20)
+        else:
+            run_query = lambda query: backend.search('song', query, limit=20)
+
+        try:
+            self._run_queries(run_query, rng, vocabulary, options['queries'])
+        finally:
+            if cleanup:
+                cleanup()
+
+    def _build_vocabulary(self, rng):
+        words = set()
+        while len(words) < 5000:
+            words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3))))
+        return sorted(words)
+
+    def _song_row(self, rng, vocabulary, song_id):
+        return {
+            'id': song_id,
+            'title': ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(1, 4))),
+            'artist': ' '.join(rng.choice(vocabulary) for _ in range(2)),
+            'album': ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(0, 3))),
+            'genre': rng.choice(GENRES),
+            'play_count': rng.randint(0, 100000),
+        }
+
+    def _build_memory_catalog(self, rng, vocabulary, total):
+        backend = InMemorySearchBackend()
+        start = time.perf_counter()
+        batch = []
+        for song_id in range(1, total + 1):
+            batch.append(self._song_row(rng, vocabulary, song_id))
+            if len(batch) >= 10000:
+                backend.add_rows('song', batch)
+                batch = []
+        backend.add_rows('song', batch)
+        self.stdout.write(f'Đã đánh chỉ mục {total} bài hát trong {time.perf_counter() - start:.1f}s')
+        return backend
+
+    def _build_database_catalog(self, rng, vocabulary, total):
+        marker = f'bench-{uuid.uuid4().hex[:8]}'
+        user = User.objects.create_user(username=marker, email=f'{marker}@example.com', password=uuid.uuid4().hex)
+
+        start = time.perf_counter()
+        batch = []
+        for song_id in range(total):
+            row = self._song_row(rng, vocabulary, song_id)
+            row.pop('id')
+            batch.append(Song(duration=180, audio_file='songs/benchmark.mp3', uploaded_by=user, **row))
+            if len(batch) >= 5000:
+                Song.objects.bulk_create(batch)
+                batch = []
+        Song.objects.bulk_create(batch)
+
+        backend = get_search_backend()
+        backend.reindex('song')
+        self.stdout.write(f'Đã tạo và đánh chỉ mục {total} bài hát trong {time.perf_counter() - start:.1f}s')
+
+        def cleanup():
+            Song.objects.filter(uploaded_by=user).delete()
+            user.delete()
+            backend.reindex('song')
+
+        return backend, cleanup
+
+    def _run_queries(self, run_query, rng, vocabulary, count):
+        def measure(label, queries):
+            timings = []
+            for query in queries:
+                start = time.perf_counter()
+                run_query(query)
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            self.stdout.write(self.style.SUCCESS(
+                f'{label}: trung vị {statistics.median(timings):.2f}ms, p95 {p95:.2f}ms, tối đa {timings[-1]:.2f}ms'
+            ))
+
+        measure('Một từ đầy đủ', [rng.choice(vocabulary) for _ in range(count)])
+        measure('Hai từ', [f'{rng.choice(vocabulary)} {rng.choice(vocabulary)}' for _ in range(count)])
+        measure('Tiền tố (typeahead, 3 ký tự)', [rng.choice(vocabulary)[:3] for _ in range(count)])
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+
+from music.recommender import evaluate_recall, load_interactions, refresh_recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        'Tính gợi ý bài hát cho mọi người dùng bằng lọc cộng tác (item-item) '
+        'và ghi vào bảng user_recommendations'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=20, help='Số bài hát gợi ý cho mỗi người dùng')
+        parser.add_argument('--neighbours', type=int, default=50, help='Số bài tương đồng giữ lại cho mỗi bài hát')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Số người dùng / số dòng ghi mỗi lô')
+        parser.add_argument('--dry-run', action='store_true', help='Chỉ tính, không ghi vào DB')
+        parser.add_argument(
+            '--evaluate',
+            action='store_true',
+            help='Đánh giá recall@K trên 20%% tương tác bị giữ lại thay vì ghi gợi ý',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['evaluate']:
+            interactions = load_interactions()
+            result = evaluate_recall(
+                interactions.matrix,
+                k=options['top_k'],
+                neighbours=options['neighbours'],
+                seed=options['seed'],
+                batch_size=options['batch_size'],
+            )
+            self.stdout.write(
+                f"Người dùng được đánh giá: {result['users']}\n"
+                f"recall@{options['top_k']} (item-item): {result['recall']:.4f}\n"
+                f"recall@{options['top_k']} (phổ biến): {result['popularity_recall']:.4f}"
+            )
+            return
+
+        stats = refresh_recommendations(
+            k=options['top_k'],
+            neighbours=options['neighbours'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        for step, seconds in stats['timings'].items():
+            self.stdout.write(f'{step}: {seconds:.2f}s')
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã tính gợi ý cho {stats['users']} người dùng trên {stats['songs']} bài hát "
+            f"({stats['interactions']} tương tác), ghi {stats['written']} dòng"
+        ))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from music.trending import compact_buckets, rebuild_buckets
+
+
+class Command(BaseCommand):
+    help = 'Gộp các bucket lượt nghe theo giờ đã cũ thành bucket theo ngày (chạy định kỳ bằng cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Dựng lại toàn bộ bucket từ song_play_history trước khi gộp',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help='Số bucket giờ xử lý mỗi transaction')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            self.stdout.write('Đang dựng lại bucket từ song_play_history...')
+            compacted = rebuild_buckets()
+        else:
+            compacted = compact_buckets(batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f'Đã gộp {compacted} bucket giờ thành bucket ngày'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from music.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Tính lại songs_count / total_play_count của album, nghệ sĩ, thể loại từ bảng songs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Số dòng cập nhật mỗi lần')
+
+    def handle(self, *args, **options):
+        fixed = rebuild_counters(batch_size=options['batch_size'])
+        for model_name, count in fixed.items():
+            self.stdout.write(self.style.SUCCESS(f'{model_name}: đã sửa {count} dòng'))
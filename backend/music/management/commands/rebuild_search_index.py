@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from music.search import SEARCH_CONFIG, get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Dựng lại chỉ mục tìm kiếm (cần chạy sau khi nhập dữ liệu bằng bulk_create / update)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--kind',
+            choices=list(SEARCH_CONFIG),
+            action='append',
+            help='Chỉ dựng lại cho loại đối tượng này (mặc định: tất cả)',
+        )
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        for kind in options['kind'] or list(SEARCH_CONFIG):
+            count = backend.reindex(kind)
+            self.stdout.write(self.style.SUCCESS(f'{kind}: đã đánh chỉ mục {count} bản ghi'))
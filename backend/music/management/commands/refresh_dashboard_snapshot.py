@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from music.dashboard import get_dashboard_ttl, refresh_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Tính lại snapshot thống kê cho trang admin (chạy định kỳ hoặc lặp liên tục với --loop)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Chạy liên tục, làm mới sau mỗi --interval giây')
+        parser.add_argument('--interval', type=int, default=None, help='Mặc định bằng ADMIN_DASHBOARD_TTL')
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or get_dashboard_ttl()
+        while True:
+            started = time.perf_counter()
+            refresh_snapshot()
+            self.stdout.write(self.style.SUCCESS(
+                f'Đã làm mới snapshot thống kê trong {time.perf_counter() - started:.2f}s'
+            ))
+            if not options['loop']:
+                break
+            time.sleep(interval)
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.1 on 2026-10-17 03:46
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0006_remove_message_receiver_remove_message_sender_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='songplayhistory',
+            name='played_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
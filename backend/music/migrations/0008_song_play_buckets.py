@@ -0,0 +1,29 @@
+# Generated by Django 5.0.1 on 2026-10-17 03:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0007_song_play_history_played_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SongPlayBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Theo giờ'), ('day', 'Theo ngày')], default='hour', max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('play_count', models.PositiveIntegerField(default=0)),
+                ('song', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='play_buckets', to='music.song')),
+            ],
+            options={
+                'db_table': 'song_play_buckets',
+                'indexes': [models.Index(fields=['bucket_start', 'song'], name='play_bucket_start_song_idx')],
+                'unique_together': {('song', 'granularity', 'bucket_start')},
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.0.1 on 2026-10-17 03:50
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# Các trường được đánh chỉ mục kèm trọng số, giống SEARCH_CONFIG trong music/search.py
+SEARCH_TABLES = {
+    'songs': [('title', 'A'), ('artist', 'B'), ('album', 'C'), ('genre', 'D')],
+    'albums': [('title', 'A'), ('artist', 'B'), ('description', 'D')],
+    'playlists': [('name', 'A'), ('description', 'C')],
+}
+
+
+def create_search_indexes(apps, schema_editor):
+    # GIN index và tsvector chỉ có trên PostgreSQL, các DB khác dùng InMemorySearchBackend
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, fields in SEARCH_TABLES.items():
+        vector = ' || '.join(
+            f"setweight(to_tsvector('simple', coalesce({field}, '')), '{weight}')"
+            for field, weight in fields
+        )
+        schema_editor.execute(f'UPDATE {table} SET search_vector = {vector}')
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {table}_search_vector_gin ON {table} USING gin (search_vector)'
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in SEARCH_TABLES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {table}_search_vector_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0008_song_play_buckets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='playlist',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='song',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
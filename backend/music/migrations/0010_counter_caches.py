@@ -0,0 +1,66 @@
+# Generated by Django 5.0.1 on 2026-10-17 03:59
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_counters(apps, schema_editor):
+    Song = apps.get_model('music', 'Song')
+    targets = (
+        ('album', apps.get_model('music', 'Album'), 'title'),
+        ('artist', apps.get_model('music', 'Artist'), 'name'),
+        ('genre', apps.get_model('music', 'Genre'), 'name'),
+    )
+    for song_field, model, name_field in targets:
+        totals = {
+            row[song_field]: (row['songs'], row['plays'] or 0)
+            for row in Song.objects.values(song_field).annotate(
+                songs=Count('id'), plays=Sum('play_count')
+            ).order_by()
+        }
+        objs = []
+        for obj in model.objects.all():
+            obj.songs_count, obj.total_play_count = totals.get(getattr(obj, name_field), (0, 0))
+            objs.append(obj)
+        model.objects.bulk_update(objs, ['songs_count', 'total_play_count'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0009_search_vectors'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='album',
+            name='songs_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='total_play_count',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='artist',
+            name='songs_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='artist',
+            name='total_play_count',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='genre',
+            name='songs_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='genre',
+            name='total_play_count',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
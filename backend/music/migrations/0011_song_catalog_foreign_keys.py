@@ -0,0 +1,39 @@
+# Generated by Django 5.0.1 on 2026-10-17 04:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('music', '0010_counter_caches'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='song',
+            name='album_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='songs', to='music.album'),
+        ),
+        migrations.AddField(
+            model_name='song',
+            name='artist_ref',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='songs', to='music.artist'),
+        ),
+        migrations.AddField(
+            model_name='song',
+            name='genre_ref',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='songs', to='music.genre'),
+        ),
+        migrations.AddIndex(
+            model_name='song',
+            index=models.Index(fields=['genre_ref', '-play_count'], name='song_genre_play_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='song',
+            index=models.Index(fields=['artist_ref', '-play_count'], name='song_artist_play_count_idx'),
+        ),
+    ]
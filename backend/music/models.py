@@ -1,4 +1,5 @@
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
 from django.conf import settings
 from django.utils import timezone
 
@@ -19,14 +20,58 @@ class Song(models.Model):
     lyrics = models.TextField(blank=True)
     release_date = models.DateField(null=True, blank=True)
     is_approved = models.BooleanField(default=True, help_text="Đánh dấu bài hát đã được phê duyệt")
+    # Chỉ mục full-text (PostgreSQL), được cập nhật qua signals - xem music/search.py
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Liên kết chuẩn hóa tới album / nghệ sĩ / thể loại. Các trường chuỗi album, artist, genre
+    # được giữ làm tên hiển thị và luôn đồng bộ với liên kết - xem music/catalog.py
+    album_ref = models.ForeignKey('Album', on_delete=models.SET_NULL, null=True, blank=True, related_name='songs')
+    # Không cần index riêng cho artist_ref / genre_ref vì đã là cột đầu của index ghép bên dưới
+    artist_ref = models.ForeignKey('Artist', on_delete=models.SET_NULL, null=True, blank=True, related_name='songs', db_index=False)
+    genre_ref = models.ForeignKey('Genre', on_delete=models.SET_NULL, null=True, blank=True, related_name='songs', db_index=False)
     
     class Meta:
         db_table = 'songs'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['genre_ref', '-play_count'], name='song_genre_play_count_idx'),
+            models.Index(fields=['artist_ref', '-play_count'], name='song_artist_play_count_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.artist}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Giữ lại giá trị lúc đọc từ DB để signals tính chênh lệch cho các bộ đếm
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        if kwargs.get('update_fields') is None:
+            from .catalog import sync_song_refs
+            sync_song_refs(self)
+
+        # play_count được cộng dồn trực tiếp trong DB (xem music/play_buffer.py), nên nếu
+        # instance không đổi play_count thì không ghi đè giá trị cũ đang giữ lên DB
+        loaded = getattr(self, '_loaded_values', None)
+        if (
+            loaded is not None
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+            and loaded.get('play_count') == self.play_count
+        ):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'play_count'
+            ]
+        super().save(*args, **kwargs)
+
+        # Lần lưu tiếp theo của cùng instance sẽ so sánh với giá trị vừa lưu
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields
+        }
+
 class Playlist(models.Model):
     name = models.CharField(max_length=200)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='playlists')
@@ -40,6 +85,8 @@ class Playlist(models.Model):
 
     is_collaborative = models.BooleanField(default=False, help_text="Playlist có thể được chỉnh sửa bởi nhiều người cộng tác")
     collaborators = models.ManyToManyField(User, through='CollaboratorRole', related_name='collaborative_playlists', through_fields=('playlist', 'user'))
+    # Chỉ mục full-text (PostgreSQL), được cập nhật qua signals - xem music/search.py
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         db_table = 'playlists'
@@ -165,12 +212,37 @@ class UserActivity(models.Model):
 class SongPlayHistory(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='play_history')
     song = models.ForeignKey(Song, on_delete=models.CASCADE, related_name='play_history')
-    played_at = models.DateTimeField(auto_now_add=True)
+    # Dùng default thay cho auto_now_add để giữ đúng thời điểm nghe khi ghi theo lô
+    played_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         db_table = 'song_play_history'
         ordering = ['-played_at']
 
+class SongPlayBucket(models.Model):
+    """Tổng số lượt nghe của một bài hát trong một giờ hoặc một ngày (dùng cho trending)"""
+    GRANULARITY_HOUR = 'hour'
+    GRANULARITY_DAY = 'day'
+    GRANULARITY_CHOICES = [
+        (GRANULARITY_HOUR, 'Theo giờ'),
+        (GRANULARITY_DAY, 'Theo ngày'),
+    ]
+
+    song = models.ForeignKey(Song, on_delete=models.CASCADE, related_name='play_buckets')
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES, default=GRANULARITY_HOUR)
+    bucket_start = models.DateTimeField()
+    play_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'song_play_buckets'
+        unique_together = ['song', 'granularity', 'bucket_start']
+        indexes = [
+            models.Index(fields=['bucket_start', 'song'], name='play_bucket_start_song_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.song_id} - {self.granularity} {self.bucket_start}: {self.play_count}"
+
 class Album(models.Model):
     title = models.CharField(max_length=200)
     artist = models.CharField(max_length=200)
@@ -178,6 +250,11 @@ class Album(models.Model):
     cover_image = models.ImageField(upload_to='album_covers/%Y/%m/%d/', null=True, blank=True)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bộ đếm phi chuẩn hóa, cập nhật qua signals - xem music/counters.py
+    songs_count = models.PositiveIntegerField(default=0, editable=False)
+    total_play_count = models.PositiveBigIntegerField(default=0, editable=False)
+    # Chỉ mục full-text (PostgreSQL), được cập nhật qua signals - xem music/search.py
+    search_vector = SearchVectorField(null=True, editable=False)
     
     class Meta:
         db_table = 'albums'
@@ -187,6 +264,9 @@ class Genre(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to='genre_images/', null=True, blank=True)
+    # Bộ đếm phi chuẩn hóa, cập nhật qua signals - xem music/counters.py
+    songs_count = models.PositiveIntegerField(default=0, editable=False)
+    total_play_count = models.PositiveBigIntegerField(default=0, editable=False)
     
     class Meta:
         db_table = 'genres'
@@ -218,6 +298,9 @@ class Artist(models.Model):
     name = models.CharField(max_length=200)
     bio = models.TextField(blank=True)
     image = models.ImageField(upload_to='artist_images/', null=True, blank=True)
+    # Bộ đếm phi chuẩn hóa, cập nhật qua signals - xem music/counters.py
+    songs_count = models.PositiveIntegerField(default=0, editable=False)
+    total_play_count = models.PositiveBigIntegerField(default=0, editable=False)
     
     class Meta:
         db_table = 'artists'
@@ -0,0 +1,237 @@
+"""
+Bộ đệm ghi nhận lượt nghe (play event).
+
+Thay vì mỗi request POST /songs/{id}/play/ phải UPDATE bảng songs và INSERT
+vào song_play_history ngay lập tức, lượt nghe được đưa vào một hàng đợi
+trong bộ nhớ của process. Một luồng nền định kỳ gom các sự kiện lại rồi ghi
+xuống DB theo lô:
+
+- ``bulk_create`` toàn bộ SongPlayHistory của lô
+- cộng dồn ``play_count`` bằng ``F('play_count') + n`` (không mất lượt nghe
+  khi nhiều request ghi cùng một bài hát)
+
+Cấu hình qua ``settings.PLAY_BUFFER``:
+
+    PLAY_BUFFER = {
+        'ENABLED': True,         # False: ghi trực tiếp như cũ
+        'FLUSH_INTERVAL': 5.0,   # số giây giữa hai lần flush
+        'FLUSH_SIZE': 500,       # flush sớm khi hàng đợi đạt kích thước này
+        'MAX_SIZE': 100000,      # giới hạn hàng đợi, vượt quá sẽ ghi đồng bộ
+    }
+
+Hàng đợi được xả hết khi process tắt (atexit).
+"""
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict, deque
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PLAY_BUFFER_SETTINGS = {
+    'ENABLED': True,
+    'FLUSH_INTERVAL': 5.0,
+    'FLUSH_SIZE': 500,
+    'MAX_SIZE': 100000,
+}
+
+
+def get_play_buffer_settings():
+    """Trả về cấu hình PLAY_BUFFER đã gộp với giá trị mặc định"""
+    config = dict(DEFAULT_PLAY_BUFFER_SETTINGS)
+    config.update(getattr(settings, 'PLAY_BUFFER', {}) or {})
+    return config
+
+
+class PlayEvent(NamedTuple):
+    user_id: int
+    song_id: int
+    played_at: object
+
+
+def write_play_events(events):
+    """
+    Ghi một lô sự kiện nghe xuống DB trong một transaction.
+    Trả về số sự kiện đã được ghi.
+    """
+    from .models import Song, SongPlayHistory
+    from .trending import record_plays as record_trending_plays
+    from .counters import add_plays
+    from django.contrib.auth import get_user_model
+
+    if not events:
+        return 0
+
+    User = get_user_model()
+
+    # Bỏ qua các sự kiện của bài hát / người dùng đã bị xóa trong lúc chờ flush
+    song_ids = {event.song_id for event in events}
+    user_ids = {event.user_id for event in events}
+    existing_songs = set(Song.objects.filter(id__in=song_ids).values_list('id', flat=True))
+    existing_users = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+    events = [
+        event for event in events
+        if event.song_id in existing_songs and event.user_id in existing_users
+    ]
+    if not events:
+        return 0
+
+    counts = Counter(event.song_id for event in events)
+
+    # Gom các bài hát có cùng số lượt tăng để giảm số câu UPDATE
+    songs_by_increment = defaultdict(list)
+    for song_id, increment in counts.items():
+        songs_by_increment[increment].append(song_id)
+
+    with transaction.atomic():
+        SongPlayHistory.objects.bulk_create(
+            [
+                SongPlayHistory(
+                    user_id=event.user_id,
+                    song_id=event.song_id,
+                    played_at=event.played_at,
+                )
+                for event in events
+            ],
+            batch_size=1000,
+        )
+        for increment, ids in songs_by_increment.items():
+            Song.objects.filter(id__in=ids).update(play_count=F('play_count') + increment)
+        add_plays(counts)
+
+        # Cộng dồn vào các bucket trending trong cùng transaction
+        record_trending_plays(events)
+
+    return len(events)
+
+
+class PlayEventBuffer:
+    """Hàng đợi lượt nghe dùng chung trong một process, an toàn với nhiều luồng"""
+
+    def __init__(self, flush_interval=5.0, flush_size=500, max_size=100000):
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_size = max_size
+        self._events = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_settings(cls):
+        config = get_play_buffer_settings()
+        return cls(
+            flush_interval=float(config['FLUSH_INTERVAL']),
+            flush_size=int(config['FLUSH_SIZE']),
+            max_size=int(config['MAX_SIZE']),
+        )
+
+    def __len__(self):
+        return len(self._events)
+
+    def record(self, user_id, song_id, played_at=None):
+        """Đưa một lượt nghe vào hàng đợi"""
+        event = PlayEvent(user_id, song_id, played_at or timezone.now())
+
+        with self._lock:
+            if len(self._events) >= self.max_size:
+                # Hàng đợi đầy (DB chậm hoặc luồng nền chết): ghi đồng bộ để không mất dữ liệu
+                overflow = True
+            else:
+                self._events.append(event)
+                overflow = False
+            pending = len(self._events)
+
+        if overflow:
+            write_play_events([event])
+            return
+
+        self._ensure_started()
+        if pending >= self.flush_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """Ghi toàn bộ sự kiện đang chờ xuống DB, trả về số sự kiện đã ghi"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._events:
+                    return 0
+                events = list(self._events)
+                self._events.clear()
+
+            try:
+                return write_play_events(events)
+            except Exception as e:
+                logger.error(f"Không thể ghi {len(events)} lượt nghe xuống DB: {str(e)}")
+                # Trả lại hàng đợi để thử lại ở lần flush sau, không vượt quá max_size:
+                # DB đang lỗi nên bỏ các lượt nghe cũ nhất thay vì ghi đồng bộ
+                with self._lock:
+                    room = max(self.max_size - len(self._events), 0)
+                    kept = events[max(len(events) - room, 0):] if room else []
+                    self._events.extendleft(reversed(kept))
+                dropped = len(events) - len(kept)
+                if dropped:
+                    logger.error(f"Hàng đợi lượt nghe đầy, bỏ {dropped} lượt nghe không ghi được")
+                return 0
+
+    def start(self):
+        """Khởi động luồng flush nền"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run, name='play-event-flusher', daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout=10.0):
+        """Dừng luồng nền và xả hết hàng đợi"""
+        self._stopped.set()
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+        self._thread = None
+        return self.flush()
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+
+play_buffer = PlayEventBuffer.from_settings()
+
+
+@atexit.register
+def _drain_play_buffer():
+    if len(play_buffer):
+        play_buffer.stop()
+
+
+def record_play(user, song, played_at=None):
+    """
+    Ghi nhận một lượt nghe. Khi PLAY_BUFFER bị tắt sẽ ghi thẳng xuống DB.
+    """
+    if get_play_buffer_settings()['ENABLED']:
+        play_buffer.record(user.id, song.id, played_at)
+    else:
+        write_play_events([PlayEvent(user.id, song.id, played_at or timezone.now())])
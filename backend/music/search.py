@@ -0,0 +1,380 @@
+"""
+Hệ thống tìm kiếm cho bài hát, album và playlist.
+
+Có hai backend với cùng một giao diện:
+
+- ``PostgresSearchBackend``: dùng cột ``search_vector`` (tsvector, có GIN index)
+  được cập nhật qua signals, xếp hạng bằng ``SearchRank`` và hỗ trợ tìm theo
+  tiền tố (``từ:*``) cho typeahead.
+- ``InMemorySearchBackend``: inverted index trong bộ nhớ của process, dùng khi
+  chạy test với SQLite hoặc các môi trường không có PostgreSQL.
+
+Chọn backend qua ``settings.MUSIC_SEARCH_BACKEND`` (đường dẫn tới class). Nếu
+không cấu hình, backend được chọn theo loại database đang dùng.
+"""
+import heapq
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F
+from django.utils.module_loading import import_string
+
+from .models import Album, Playlist, Song
+
+SearchResult = namedtuple('SearchResult', ['objects', 'total'])
+
+# Cấu hình cho từng loại đối tượng: các trường được đánh chỉ mục kèm trọng số,
+# các trường dùng để lọc chính xác và trường độ phổ biến dùng khi bằng điểm
+SEARCH_CONFIG = {
+    'song': {
+        'model': Song,
+        'fields': [('title', 'A'), ('artist', 'B'), ('album', 'C'), ('genre', 'D')],
+        'filters': ['genre', 'artist'],
+        'popularity': 'play_count',
+    },
+    'album': {
+        'model': Album,
+        'fields': [('title', 'A'), ('artist', 'B'), ('description', 'D')],
+        'filters': [],
+        'popularity': None,
+    },
+    'playlist': {
+        'model': Playlist,
+        'fields': [('name', 'A'), ('description', 'C')],
+        'filters': ['is_public'],
+        'popularity': None,
+    },
+}
+
+# Trọng số mặc định của PostgreSQL cho các nhãn D, C, B, A
+WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2, 'D': 0.1}
+
+TEXT_SEARCH_CONFIG = 'simple'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Tách chuỗi thành các từ viết thường"""
+    if not text:
+        return []
+    return TOKEN_RE.findall(str(text).lower())
+
+
+def get_kind_for_model(model):
+    for kind, config in SEARCH_CONFIG.items():
+        if config['model'] is model:
+            return kind
+    return None
+
+
+class BaseSearchBackend:
+    """Giao diện chung của các search backend"""
+
+    def search(self, kind, query, filters=None, offset=0, limit=20, order_by=None):
+        """
+        Tìm các đối tượng loại ``kind`` khớp với ``query``.
+
+        Mỗi từ trong query được so khớp theo tiền tố và tất cả các từ đều phải
+        xuất hiện. Trả về SearchResult(objects, total) với objects đã được xếp
+        hạng (hoặc sắp xếp theo ``order_by`` nếu có).
+        """
+        raise NotImplementedError
+
+    def index_object(self, instance):
+        raise NotImplementedError
+
+    def remove_object(self, instance):
+        raise NotImplementedError
+
+    def index_queryset(self, queryset):
+        """Cập nhật chỉ mục cho các đối tượng bị sửa hàng loạt bằng queryset.update()"""
+        for instance in queryset.iterator():
+            self.index_object(instance)
+
+    def reindex(self, kind):
+        raise NotImplementedError
+
+    def _apply_filters(self, queryset, kind, filters):
+        allowed = SEARCH_CONFIG[kind]['filters']
+        for field, value in (filters or {}).items():
+            if field in allowed and value not in (None, ''):
+                queryset = queryset.filter(**{field: value})
+        return queryset
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """Tìm kiếm full-text bằng tsvector + GIN index của PostgreSQL"""
+
+    def build_vector(self, kind):
+        vector = None
+        for field, weight in SEARCH_CONFIG[kind]['fields']:
+            part = SearchVector(field, weight=weight, config=TEXT_SEARCH_CONFIG)
+            vector = part if vector is None else vector + part
+        return vector
+
+    def build_query(self, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+        # Mỗi token chỉ gồm ký tự \w nên có thể ghép an toàn thành tsquery
+        raw = ' & '.join(f'{token}:*' for token in tokens)
+        return SearchQuery(raw, search_type='raw', config=TEXT_SEARCH_CONFIG)
+
+    def search(self, kind, query, filters=None, offset=0, limit=20, order_by=None):
+        config = SEARCH_CONFIG[kind]
+        search_query = self.build_query(query)
+        if search_query is None:
+            return SearchResult([], 0)
+
+        queryset = config['model'].objects.filter(search_vector=search_query)
+        queryset = self._apply_filters(queryset, kind, filters)
+        total = queryset.count()
+
+        if order_by:
+            queryset = queryset.order_by(*order_by)
+        else:
+            ordering = ['-rank']
+            if config['popularity']:
+                ordering.append(f"-{config['popularity']}")
+            ordering.append('id')
+            queryset = queryset.annotate(
+                rank=SearchRank(F('search_vector'), search_query)
+            ).order_by(*ordering)
+
+        return SearchResult(list(queryset[offset:offset + limit]), total)
+
+    def index_object(self, instance):
+        kind = get_kind_for_model(type(instance))
+        type(instance).objects.filter(pk=instance.pk).update(search_vector=self.build_vector(kind))
+
+    def remove_object(self, instance):
+        # Dòng dữ liệu bị xóa thì cột search_vector cũng bị xóa theo
+        pass
+
+    def index_queryset(self, queryset):
+        kind = get_kind_for_model(queryset.model)
+        return queryset.update(search_vector=self.build_vector(kind))
+
+    def reindex(self, kind):
+        model = SEARCH_CONFIG[kind]['model']
+        return model.objects.update(search_vector=self.build_vector(kind))
+
+
+class InMemorySearchBackend(BaseSearchBackend):
+    """
+    Inverted index trong bộ nhớ: từ -> {id: trọng số lớn nhất của trường chứa từ}.
+    Danh sách từ được giữ đã sắp xếp để tra cứu tiền tố bằng bisect.
+
+    Dữ liệu của mỗi loại được nạp từ DB ở lần tìm kiếm đầu tiên, sau đó được
+    cập nhật qua signals.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._indexes = {}
+
+    def _new_index(self):
+        return {
+            'postings': {},     # từ -> {id: trọng số}
+            'vocabulary': [],   # danh sách từ đã sắp xếp
+            'documents': {},    # id -> (các từ, giá trị lọc, độ phổ biến)
+        }
+
+    def _get_index(self, kind):
+        with self._lock:
+            if kind not in self._indexes:
+                self._indexes[kind] = self._load(kind)
+            return self._indexes[kind]
+
+    def _load(self, kind):
+        config = SEARCH_CONFIG[kind]
+        index = self._new_index()
+        fields = [field for field, _ in config['fields']]
+        extra = list(config['filters'])
+        if config['popularity']:
+            extra.append(config['popularity'])
+
+        rows = config['model'].objects.values('id', *fields, *extra).order_by()
+        for row in rows.iterator(chunk_size=2000):
+            self._add_document(kind, index, row)
+        return index
+
+    def _add_document(self, kind, index, row):
+        config = SEARCH_CONFIG[kind]
+        doc_id = row['id']
+        term_weights = {}
+        for field, label in config['fields']:
+            for token in tokenize(row.get(field)):
+                term_weights[token] = max(term_weights.get(token, 0.0), WEIGHTS[label])
+
+        postings = index['postings']
+        for token, weight in term_weights.items():
+            if token not in postings:
+                postings[token] = {}
+                insort(index['vocabulary'], token)
+            postings[token][doc_id] = weight
+
+        filter_values = {field: row.get(field) for field in config['filters']}
+        popularity = (row.get(config['popularity']) or 0) if config['popularity'] else 0
+        index['documents'][doc_id] = (tuple(term_weights), filter_values, popularity)
+
+    def _remove_document(self, index, doc_id):
+        document = index['documents'].pop(doc_id, None)
+        if document is None:
+            return
+        for token in document[0]:
+            posting = index['postings'].get(token)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                # Từ không còn tài liệu nào vẫn nằm trong vocabulary, được bỏ qua khi tra cứu
+
+    def add_rows(self, kind, rows):
+        """Nạp trực tiếp các dict dữ liệu vào index (dùng cho benchmark)"""
+        with self._lock:
+            index = self._indexes.setdefault(kind, self._new_index())
+            for row in rows:
+                self._remove_document(index, row['id'])
+                self._add_document(kind, index, row)
+
+    def _expand(self, index, prefix):
+        """Trả về {id: trọng số} của mọi từ bắt đầu bằng ``prefix``"""
+        vocabulary = index['vocabulary']
+        postings = index['postings']
+        matches = {}
+        position = bisect_left(vocabulary, prefix)
+        while position < len(vocabulary) and vocabulary[position].startswith(prefix):
+            token = vocabulary[position]
+            # Khớp chính xác được ưu tiên hơn khớp tiền tố
+            factor = 1.0 if token == prefix else 0.9
+            for doc_id, weight in postings[token].items():
+                score = weight * factor
+                if score > matches.get(doc_id, 0.0):
+                    matches[doc_id] = score
+            position += 1
+        return matches
+
+    def _match(self, kind, query, filters):
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return {}
+
+        with self._lock:
+            index = self._get_index(kind)
+            scores = None
+            for token in tokens:
+                matches = self._expand(index, token)
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {
+                        doc_id: score + matches[doc_id]
+                        for doc_id, score in scores.items()
+                        if doc_id in matches
+                    }
+                if not scores:
+                    return {}
+
+            allowed = SEARCH_CONFIG[kind]['filters']
+            active_filters = {
+                field: value for field, value in (filters or {}).items()
+                if field in allowed and value not in (None, '')
+            }
+            documents = index['documents']
+            if not active_filters:
+                return {doc_id: (score, documents[doc_id][2]) for doc_id, score in scores.items()}
+
+            results = {}
+            for doc_id, score in scores.items():
+                filter_values = documents[doc_id][1]
+                if all(filter_values.get(field) == value for field, value in active_filters.items()):
+                    results[doc_id] = (score, documents[doc_id][2])
+            return results
+
+    def search_ids(self, kind, query, filters=None, offset=0, limit=20):
+        """Trả về (danh sách id đã xếp hạng, tổng số kết quả) mà không truy vấn DB"""
+        matches = self._match(kind, query, filters)
+        # Chỉ cần offset + limit kết quả đầu nên dùng heap thay vì sắp xếp toàn bộ
+        ranked = heapq.nsmallest(
+            offset + limit, matches.items(),
+            key=lambda item: (-item[1][0], -item[1][1], item[0])
+        )
+        return [doc_id for doc_id, _ in ranked[offset:]], len(matches)
+
+    def search(self, kind, query, filters=None, offset=0, limit=20, order_by=None):
+        model = SEARCH_CONFIG[kind]['model']
+        if order_by:
+            matches = self._match(kind, query, filters)
+            queryset = model.objects.filter(id__in=list(matches)).order_by(*order_by)
+            return SearchResult(list(queryset[offset:offset + limit]), len(matches))
+
+        ids, total = self.search_ids(kind, query, filters, offset, limit)
+        objects_by_id = model.objects.in_bulk(ids)
+        return SearchResult([objects_by_id[pk] for pk in ids if pk in objects_by_id], total)
+
+    def _row_for(self, kind, instance):
+        config = SEARCH_CONFIG[kind]
+        names = [field for field, _ in config['fields']] + list(config['filters'])
+        if config['popularity']:
+            names.append(config['popularity'])
+        row = {name: getattr(instance, name, None) for name in names}
+        row['id'] = instance.pk
+        return row
+
+    def index_object(self, instance):
+        kind = get_kind_for_model(type(instance))
+        with self._lock:
+            if kind not in self._indexes:
+                # Chưa nạp thì lần tìm kiếm đầu tiên sẽ đọc dữ liệu mới nhất từ DB
+                return
+            index = self._indexes[kind]
+            self._remove_document(index, instance.pk)
+            self._add_document(kind, index, self._row_for(kind, instance))
+
+    def remove_object(self, instance):
+        kind = get_kind_for_model(type(instance))
+        with self._lock:
+            if kind in self._indexes:
+                self._remove_document(self._indexes[kind], instance.pk)
+
+    def reindex(self, kind):
+        with self._lock:
+            self._indexes[kind] = self._load(kind)
+            return len(self._indexes[kind]['documents'])
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend():
+    """Trả về search backend dùng chung cho process"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend_path = getattr(settings, 'MUSIC_SEARCH_BACKEND', None)
+                if backend_path:
+                    backend_class = import_string(backend_path)
+                elif connection.vendor == 'postgresql':
+                    backend_class = PostgresSearchBackend
+                else:
+                    backend_class = InMemorySearchBackend
+                _backend = backend_class()
+    return _backend
+
+
+def reset_search_backend():
+    """Bỏ backend hiện tại (dùng trong test hoặc khi đổi cấu hình)"""
+    global _backend
+    with _backend_lock:
+        _backend = None
+
+
+def search(kind, query, filters=None, offset=0, limit=20, order_by=None):
+    return get_search_backend().search(kind, query, filters, offset, limit, order_by)
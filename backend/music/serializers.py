@@ -6,6 +6,7 @@ from .models import (
 )
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.db.models import Count
 import os
 
 User = get_user_model()
@@ -88,14 +89,11 @@ class ArtistSerializer(serializers.ModelSerializer):
         return None
 
 class ArtistDetailSerializer(serializers.ModelSerializer):
-    songs_count = serializers.SerializerMethodField()
+    songs_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Artist
-        fields = ('id', 'name', 'bio', 'image', 'songs_count')
-        
-    def get_songs_count(self, obj):
-        return Song.objects.filter(artist=obj.name).count()
+        fields = ('id', 'name', 'bio', 'image', 'songs_count', 'total_play_count')
 
 class GenreBasicSerializer(serializers.ModelSerializer):
     class Meta:
@@ -341,16 +339,13 @@ class UserActivitySerializer(serializers.ModelSerializer):
 
 
 class AlbumSerializer(serializers.ModelSerializer):
-    songs_count = serializers.SerializerMethodField()
+    songs_count = serializers.IntegerField(read_only=True)
     cover_image = serializers.SerializerMethodField()
     
     class Meta:
         model = Album
-        fields = ('id', 'title', 'artist', 'release_date', 'cover_image', 'description', 'created_at', 'songs_count')
+        fields = ('id', 'title', 'artist', 'release_date', 'cover_image', 'description', 'created_at', 'songs_count', 'total_play_count')
     
-    def get_songs_count(self, obj):
-        return Song.objects.filter(album=obj.title).count()
-        
     def get_cover_image(self, obj):
         if obj.cover_image:
             request = self.context.get('request')
@@ -368,7 +363,7 @@ class AlbumDetailSerializer(serializers.ModelSerializer):
         fields = ('id', 'title', 'artist', 'release_date', 'cover_image', 'description', 'created_at', 'songs')
     
     def get_songs(self, obj):
-        songs = Song.objects.filter(album=obj.title)
+        songs = Song.objects.filter(album_ref=obj)
         context = self.context
         return SongSerializer(songs, many=True, context=context).data
     
@@ -381,14 +376,11 @@ class AlbumDetailSerializer(serializers.ModelSerializer):
         return None
 
 class GenreSerializer(serializers.ModelSerializer):
-    songs_count = serializers.SerializerMethodField()
+    songs_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Genre
-        fields = ('id', 'name', 'description', 'image', 'songs_count')
-    
-    def get_songs_count(self, obj):
-        return Song.objects.filter(genre=obj.name).count()
+        fields = ('id', 'name', 'description', 'image', 'songs_count', 'total_play_count')
 
 class GenreDetailSerializer(serializers.ModelSerializer):
     top_songs = serializers.SerializerMethodField()
@@ -399,19 +391,14 @@ class GenreDetailSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'description', 'image', 'top_songs', 'top_artists')
     
     def get_top_songs(self, obj):
-        songs = Song.objects.filter(genre=obj.name).order_by('-play_count')[:10]
+        songs = Song.objects.filter(genre_ref=obj).order_by('-play_count')[:10]
         return SongSerializer(songs, many=True).data
         
     def get_top_artists(self, obj):
-        artists = {}
-        for song in Song.objects.filter(genre=obj.name):
-            if song.artist in artists:
-                artists[song.artist] += 1
-            else:
-                artists[song.artist] = 1
-        
-        top_artists = sorted(artists.items(), key=lambda x: x[1], reverse=True)[:5]
-        return [{'name': artist[0], 'songs_count': artist[1]} for artist in top_artists]
+        top_artists = Song.objects.filter(genre_ref=obj).values('artist').annotate(
+            songs_count=Count('id')
+        ).order_by('-songs_count', 'artist')[:5]
+        return [{'name': row['artist'], 'songs_count': row['songs_count']} for row in top_artists]
 
 class SongPlayHistorySerializer(serializers.ModelSerializer):
     song = SongSerializer(read_only=True)
@@ -682,9 +669,9 @@ class SongAdminSerializer(serializers.ModelSerializer):
         return 0
         
     def get_album_info(self, obj):
-        if obj and obj.album:
+        if obj and obj.album_ref_id:
             try:
-                album = Album.objects.filter(title=obj.album).first()
+                album = obj.album_ref
                 if album:
                     return {
                         'id': album.id,
@@ -696,9 +683,9 @@ class SongAdminSerializer(serializers.ModelSerializer):
         return None
         
     def get_genre_info(self, obj):
-        if obj and obj.genre:
+        if obj and obj.genre_ref_id:
             try:
-                genre = Genre.objects.filter(name=obj.genre).first()
+                genre = obj.genre_ref
                 if genre:
                     return {
                         'id': genre.id,
@@ -833,20 +820,17 @@ class SongAdminSerializer(serializers.ModelSerializer):
 class AdminAlbumSerializer(serializers.ModelSerializer):
     cover_image = serializers.SerializerMethodField()
     cover_image_upload = serializers.ImageField(write_only=True, required=False)
-    songs_count = serializers.SerializerMethodField()
+    songs_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Album
         fields = ('id', 'title', 'artist', 'release_date', 'cover_image', 'cover_image_upload',
-                  'description', 'created_at', 'songs_count')
+                  'description', 'created_at', 'songs_count', 'total_play_count')
         extra_kwargs = {
             'title': {'required': False},
             'artist': {'required': False},
         }
     
-    def get_songs_count(self, obj):
-        return Song.objects.filter(album=obj.title).count()
-        
     def get_cover_image(self, obj):
         if obj and obj.cover_image:
             request = self.context.get('request')
@@ -874,18 +858,15 @@ class AdminAlbumSerializer(serializers.ModelSerializer):
 class AdminArtistSerializer(serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
     image_upload = serializers.ImageField(write_only=True, required=False)
-    songs_count = serializers.SerializerMethodField()
+    songs_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Artist
-        fields = ('id', 'name', 'bio', 'image', 'image_upload', 'songs_count')
+        fields = ('id', 'name', 'bio', 'image', 'image_upload', 'songs_count', 'total_play_count')
         extra_kwargs = {
             'name': {'required': False},
         }
     
-    def get_songs_count(self, obj):
-        return Song.objects.filter(artist=obj.name).count()
-        
     def get_image(self, obj):
         if obj and obj.image:
             request = self.context.get('request')
@@ -913,18 +894,15 @@ class AdminArtistSerializer(serializers.ModelSerializer):
 class AdminGenreSerializer(serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
     image_upload = serializers.ImageField(write_only=True, required=False)
-    songs_count = serializers.SerializerMethodField()
+    songs_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Genre
-        fields = ('id', 'name', 'description', 'image', 'image_upload', 'songs_count')
+        fields = ('id', 'name', 'description', 'image', 'image_upload', 'songs_count', 'total_play_count')
         extra_kwargs = {
             'name': {'required': False},
         }
     
-    def get_songs_count(self, obj):
-        return Song.objects.filter(genre=obj.name).count()
-        
     def get_image(self, obj):
         if obj and obj.image:
             request = self.context.get('request')
@@ -1,7 +1,10 @@
 import os
-from django.db.models.signals import post_delete
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
-from .models import Song
+from .models import Song, Album, Artist, Genre, Playlist
+from .search import get_search_backend
+from .counters import TRACKED_SONG_FIELDS, apply_song_change, compute_counters
+from .catalog import SONG_LINKS, link_unlinked_songs, propagate_rename
 
 
 @receiver(post_delete, sender=Song)
@@ -24,4 +27,111 @@ def delete_song_files(sender, instance, **kwargs):
             try:
                 os.remove(instance.cover_image.path)
             except (FileNotFoundError, PermissionError) as e:
-                print(f"Không thể xóa file ảnh bìa: {e}") 
\ No newline at end of file
+                print(f"Không thể xóa file ảnh bìa: {e}") 
+
+@receiver(post_save, sender=Song)
+@receiver(post_save, sender=Album)
+@receiver(post_save, sender=Playlist)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    """Cập nhật chỉ mục tìm kiếm khi bài hát, album hoặc playlist thay đổi"""
+    if raw:
+        return
+    get_search_backend().index_object(instance)
+
+
+@receiver(post_delete, sender=Song)
+@receiver(post_delete, sender=Album)
+@receiver(post_delete, sender=Playlist)
+def remove_from_search_index(sender, instance, **kwargs):
+    """Xóa đối tượng khỏi chỉ mục tìm kiếm"""
+    get_search_backend().remove_object(instance)
+
+
+@receiver(pre_save, sender=Song)
+def remember_song_counter_values(sender, instance, raw=False, **kwargs):
+    """Ghi nhớ album / nghệ sĩ / thể loại / lượt nghe trước khi lưu để tính chênh lệch bộ đếm"""
+    if raw or instance._state.adding:
+        instance._counter_old_values = None
+        return
+
+    loaded = getattr(instance, '_loaded_values', {})
+    if all(field in loaded for field in TRACKED_SONG_FIELDS):
+        instance._counter_old_values = {field: loaded[field] for field in TRACKED_SONG_FIELDS}
+    else:
+        instance._counter_old_values = Song.objects.filter(pk=instance.pk).values(*TRACKED_SONG_FIELDS).first()
+
+
+@receiver(post_save, sender=Song)
+def update_song_counters(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Cập nhật songs_count / total_play_count của album, nghệ sĩ, thể loại"""
+    if raw:
+        return
+    tracked = set(TRACKED_SONG_FIELDS) | {field[:-3] for field in TRACKED_SONG_FIELDS if field.endswith('_id')}
+    if update_fields is not None and not set(update_fields) & tracked:
+        return
+
+    old = None if created else getattr(instance, '_counter_old_values', None)
+    new = {field: getattr(instance, field) for field in TRACKED_SONG_FIELDS}
+    if old != new:
+        apply_song_change(old, new)
+
+    # Lần lưu tiếp theo của cùng instance sẽ so sánh với giá trị vừa lưu
+    if not hasattr(instance, '_loaded_values'):
+        instance._loaded_values = {}
+    instance._loaded_values.update(new)
+
+
+@receiver(post_delete, sender=Song)
+def release_song_counters(sender, instance, **kwargs):
+    apply_song_change({field: getattr(instance, field) for field in TRACKED_SONG_FIELDS}, None)
+
+
+@receiver(pre_save, sender=Album)
+@receiver(pre_save, sender=Artist)
+@receiver(pre_save, sender=Genre)
+def refresh_catalog_counters(sender, instance, raw=False, **kwargs):
+    """
+    Tính lại bộ đếm khi lưu album / nghệ sĩ / thể loại: tránh ghi đè giá trị cũ
+    đang giữ trong instance và cập nhật đúng khi đổi tên
+    """
+    if raw:
+        return
+    compute_counters(instance)
+
+
+@receiver(pre_save, sender=Album)
+@receiver(pre_save, sender=Artist)
+@receiver(pre_save, sender=Genre)
+def remember_catalog_name(sender, instance, raw=False, **kwargs):
+    """Ghi nhớ tên cũ để cập nhật tên hiển thị trên các bài hát khi đổi tên"""
+    if raw or instance._state.adding:
+        instance._old_catalog_name = None
+        return
+    name_field = next(name_field for _, _, model, name_field in SONG_LINKS if model is sender)
+    instance._old_catalog_name = sender.objects.filter(pk=instance.pk).values_list(name_field, flat=True).first()
+
+
+@receiver(post_save, sender=Album)
+@receiver(post_save, sender=Artist)
+@receiver(post_save, sender=Genre)
+def rename_linked_songs(sender, instance, created, raw=False, **kwargs):
+    """
+    Đồng bộ tên album / nghệ sĩ / thể loại mới sang các bài hát liên kết, và nối
+    khóa ngoại cho các bài hát đã mang tên mới từ trước khi đối tượng được tạo / đổi tên
+    """
+    if raw:
+        return
+    song_ids = [] if created else propagate_rename(instance, getattr(instance, '_old_catalog_name', None))
+    name_field = next(name_field for _, _, model, name_field in SONG_LINKS if model is sender)
+    linked_ids = []
+    if created or getattr(instance, '_old_catalog_name', None) != getattr(instance, name_field):
+        linked_ids = link_unlinked_songs(instance)
+    if linked_ids:
+        # Bộ đếm đã tính ở pre_save chưa gồm các bài hát vừa nối, cập nhật không qua signals
+        compute_counters(instance)
+        sender.objects.filter(pk=instance.pk).update(
+            songs_count=instance.songs_count, total_play_count=instance.total_play_count
+        )
+    song_ids = song_ids + linked_ids
+    if song_ids:
+        get_search_backend().index_queryset(Song.objects.filter(id__in=song_ids))
@@ -388,3 +388,599 @@ class AdminMediaUploadTest(TestCase):
         if self.playlist.cover_image:
             if os.path.isfile(self.playlist.cover_image.path):
                 os.remove(self.playlist.cover_image.path)
+
+
+class PlayBufferTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='listener',
+            email='listener@example.com',
+            password='listenerpassword123'
+        )
+        self.song = Song.objects.create(
+            title='Buffered Song',
+            artist='Test Artist',
+            duration=180,
+            audio_file='songs/buffered.mp3',
+            uploaded_by=self.user
+        )
+
+    def test_flush_writes_history_and_increments(self):
+        """Test bộ đệm gom lượt nghe và ghi theo lô khi flush"""
+        from .models import SongPlayHistory
+        from .play_buffer import PlayEventBuffer
+
+        buffer = PlayEventBuffer(flush_size=1000)
+        # Không khởi động luồng nền, flush thủ công
+        buffer._ensure_started = lambda: None
+        for _ in range(5):
+            buffer.record(self.user.id, self.song.id)
+
+        self.assertEqual(SongPlayHistory.objects.count(), 0)
+        self.assertEqual(buffer.flush(), 5)
+
+        self.song.refresh_from_db()
+        self.assertEqual(self.song.play_count, 5)
+        self.assertEqual(SongPlayHistory.objects.filter(song=self.song).count(), 5)
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_flush_skips_deleted_songs(self):
+        """Test lượt nghe của bài hát đã bị xóa không làm hỏng cả lô"""
+        from .models import SongPlayHistory
+        from .play_buffer import PlayEventBuffer
+
+        buffer = PlayEventBuffer()
+        buffer._ensure_started = lambda: None
+        buffer.record(self.user.id, self.song.id)
+        buffer.record(self.user.id, self.song.id + 1000)
+
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(SongPlayHistory.objects.count(), 1)
+
+    def test_failed_flush_requeues_within_max_size(self):
+        """Test lô ghi lỗi được trả lại hàng đợi nhưng không vượt quá max_size"""
+        from unittest import mock
+        from .play_buffer import PlayEventBuffer
+
+        buffer = PlayEventBuffer(max_size=3, flush_size=1000)
+        buffer._ensure_started = lambda: None
+        for _ in range(3):
+            buffer.record(self.user.id, self.song.id)
+
+        def failing_write(events):
+            # Lượt nghe mới đến trong lúc DB đang lỗi
+            buffer.record(self.user.id, self.song.id)
+            buffer.record(self.user.id, self.song.id)
+            raise RuntimeError('database is down')
+
+        with mock.patch('music.play_buffer.write_play_events', side_effect=failing_write), \
+                self.assertLogs('music.play_buffer', level='ERROR') as logs:
+            self.assertEqual(buffer.flush(), 0)
+
+        self.assertEqual(len(buffer), 3)
+        self.assertTrue(any('bỏ 2 lượt nghe' in line for line in logs.output))
+
+        # Còn chỗ nhiều hơn số lượt nghe ghi lỗi: giữ lại tất cả, không bỏ lượt nào
+        buffer = PlayEventBuffer(max_size=100, flush_size=1000)
+        buffer._ensure_started = lambda: None
+        for _ in range(60):
+            buffer.record(self.user.id, self.song.id)
+
+        with mock.patch('music.play_buffer.write_play_events', side_effect=RuntimeError('database is down')), \
+                mock.patch('music.play_buffer.logger') as logger:
+            self.assertEqual(buffer.flush(), 0)
+
+        self.assertEqual(len(buffer), 60)
+        self.assertEqual(logger.error.call_count, 1)
+
+
+class TrendingBucketTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='trender',
+            email='trender@example.com',
+            password='trenderpassword123'
+        )
+        self.pop_song = Song.objects.create(
+            title='Pop Song', artist='A', genre='Pop', duration=180,
+            audio_file='songs/pop.mp3', uploaded_by=self.user
+        )
+        self.rock_song = Song.objects.create(
+            title='Rock Song', artist='B', genre='Rock', duration=180,
+            audio_file='songs/rock.mp3', uploaded_by=self.user
+        )
+
+    def _play(self, song, played_at, times=1):
+        from .play_buffer import PlayEvent, write_play_events
+        write_play_events([PlayEvent(self.user.id, song.id, played_at)] * times)
+
+    def test_trending_sums_buckets_after_compaction(self):
+        """Test trending vẫn đúng sau khi gộp bucket giờ thành bucket ngày"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import SongPlayBucket
+        from .trending import compact_buckets, get_trending_counts
+
+        now = timezone.now()
+        self._play(self.pop_song, now - timedelta(days=5), times=3)
+        self._play(self.pop_song, now - timedelta(days=5, hours=1), times=1)
+        self._play(self.rock_song, now - timedelta(hours=1), times=2)
+        self._play(self.rock_song, now - timedelta(days=30), times=10)
+
+        self.assertGreater(compact_buckets(now=now), 0)
+        self.assertFalse(SongPlayBucket.objects.filter(
+            granularity=SongPlayBucket.GRANULARITY_HOUR,
+            bucket_start__lt=now - timedelta(days=3)
+        ).exists())
+
+        start = now - timedelta(days=7)
+        self.assertEqual(get_trending_counts(start), [(self.pop_song.id, 4), (self.rock_song.id, 2)])
+        self.assertEqual(get_trending_counts(start, genre='Rock'), [(self.rock_song.id, 2)])
+
+    def test_trending_endpoint_reports_recent_plays(self):
+        """Test API trending trả về recent_plays từ bucket"""
+        from django.utils import timezone
+
+        self._play(self.rock_song, timezone.now(), times=2)
+
+        response = self.client.get('/api/v1/music/songs/trending/?days=7')
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(results[0]['id'], self.rock_song.id)
+        self.assertEqual(results[0]['recent_plays'], 2)
+
+
+class SearchBackendTest(TestCase):
+    def setUp(self):
+        from .search import reset_search_backend
+        reset_search_backend()
+        self.user = User.objects.create_user(
+            username='searcher',
+            email='searcher@example.com',
+            password='searcherpassword123'
+        )
+        self.ballad = Song.objects.create(
+            title='Nắng Ấm Xa Dần', artist='Son Tung', genre='Ballad', duration=200,
+            audio_file='songs/nang.mp3', uploaded_by=self.user, play_count=10
+        )
+        self.rock = Song.objects.create(
+            title='Night Rider', artist='Nang Band', genre='Rock', duration=200,
+            audio_file='songs/night.mp3', uploaded_by=self.user, play_count=50
+        )
+
+    def tearDown(self):
+        from .search import reset_search_backend
+        reset_search_backend()
+
+    def test_ranking_prefix_and_filters(self):
+        """Test xếp hạng theo trọng số trường, tìm theo tiền tố và lọc"""
+        from .search import search
+
+        result = search('song', 'nắng')
+        self.assertEqual(result.total, 1)
+        self.assertEqual(result.objects, [self.ballad])
+
+        # Không bỏ dấu: 'nang' chỉ khớp tên nghệ sĩ của bài Rock
+        self.assertEqual(search('song', 'nang').objects, [self.rock])
+        self.assertEqual(search('song', 'ni').objects, [self.rock])
+        self.assertEqual(search('song', 'night', filters={'genre': 'Ballad'}).total, 0)
+
+    def test_index_follows_signals(self):
+        """Test chỉ mục được cập nhật khi bài hát thay đổi hoặc bị xóa"""
+        from .search import search
+
+        self.assertEqual(search('song', 'rider').total, 1)
+        self.rock.title = 'Morning Walk'
+        self.rock.save()
+        self.assertEqual(search('song', 'rider').total, 0)
+        self.assertEqual(search('song', 'morn').objects, [self.rock])
+
+        self.rock.delete()
+        self.assertEqual(search('song', 'morn').total, 0)
+
+    def test_search_view_is_paginated(self):
+        """Test API tìm kiếm tổng hợp trả về kết quả theo trang"""
+        for i in range(3):
+            Song.objects.create(
+                title=f'Night {i}', artist='X', duration=100,
+                audio_file=f'songs/n{i}.mp3', uploaded_by=self.user
+            )
+
+        response = self.client.get('/api/v1/music/search/?q=night&page_size=2')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data['songs']), 2)
+        self.assertEqual(data['total']['songs'], 4)
+
+    def test_filter_and_genre_songs_report_total(self):
+        """Test API lọc bài hát và bài hát theo thể loại trả về tổng số cùng trang kết quả"""
+        from .models import Genre
+        genre = Genre.objects.create(name='Jazz')
+        for i in range(2):
+            Song.objects.create(
+                title=f'Jazz {i}', artist='Son Tung', genre='Jazz', duration=100,
+                audio_file=f'songs/j{i}.mp3', uploaded_by=self.user
+            )
+
+        from rest_framework.test import APIClient
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+
+        response = client.get('/api/v1/music/songs/filter/?genre=Jazz&page_size=1')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(len(data['results']), 1)
+
+        response = client.get(f'/api/v1/music/genres/{genre.id}/songs/?page_size=1')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(len(data['songs']), 1)
+
+    def test_suggest_ignores_invalid_limit(self):
+        """Test gợi ý dùng giới hạn mặc định khi limit không phải số"""
+        response = self.client.get('/api/v1/music/search/suggest/?q=n&limit=abc')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['songs'][0]['id'], self.rock.id)
+
+
+class FileDeliveryTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.user = User.objects.create_user(
+            username='streamer',
+            email='streamer@example.com',
+            password='streamerpassword123'
+        )
+        self.content = bytes(range(256)) * 40  # 10240 byte
+        os.makedirs(os.path.join(self.media_root, 'songs'))
+        with open(os.path.join(self.media_root, 'songs', 'stream.mp3'), 'wb') as f:
+            f.write(self.content)
+        self.song = Song.objects.create(
+            title='Stream Song', artist='A', duration=60,
+            audio_file='songs/stream.mp3', uploaded_by=self.user
+        )
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def _get(self, **headers):
+        from django.test import override_settings
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with override_settings(MEDIA_ROOT=self.media_root):
+            response = client.get(f'/api/v1/music/songs/{self.song.id}/stream/', **headers)
+            body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_parse_range_header(self):
+        """Test phân tích Range: suffix, nhiều đoạn, gộp đoạn và đoạn ngoài file"""
+        from .delivery import RangeNotSatisfiable, parse_range_header
+
+        self.assertEqual(parse_range_header('bytes=-500', 1000), [(500, 999)])
+        self.assertEqual(parse_range_header('bytes=100-', 1000), [(100, 999)])
+        self.assertEqual(parse_range_header('bytes=0-9,5-20,50-59', 1000), [(0, 20), (50, 59)])
+        self.assertEqual(parse_range_header('bytes=900-5000', 1000), [(900, 999)])
+        self.assertIsNone(parse_range_header('items=0-1', 1000))
+        self.assertIsNone(parse_range_header('bytes=10-5', 1000))
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range_header('bytes=2000-3000', 1000)
+
+    def test_single_and_suffix_range(self):
+        """Test trả về 206 với Content-Range đúng"""
+        response, body = self._get(HTTP_RANGE='bytes=-500')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 9740-10239/10240')
+        self.assertEqual(body, self.content[-500:])
+
+        response, body = self._get(HTTP_RANGE='bytes=10-19')
+        self.assertEqual(body, self.content[10:20])
+        self.assertEqual(response['Content-Length'], '10')
+
+    def test_multi_range(self):
+        """Test nhiều đoạn được trả về dạng multipart/byteranges"""
+        response, body = self._get(HTTP_RANGE='bytes=0-3,100-103')
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response['Content-Type'].startswith('multipart/byteranges'))
+        self.assertEqual(int(response['Content-Length']), len(body))
+        self.assertIn(b'Content-Range: bytes 100-103/10240\r\n\r\n' + self.content[100:104], body)
+
+    def test_conditional_requests(self):
+        """Test ETag / If-None-Match / If-Range và Range ngoài file"""
+        response, body = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.content)
+        etag = response['ETag']
+
+        response, _ = self._get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        response, _ = self._get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+
+        # ETag cũ: bỏ qua Range và trả về toàn bộ file
+        response, body = self._get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(body), len(self.content))
+
+        response, _ = self._get(HTTP_RANGE='bytes=20000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10240')
+
+
+class CounterCacheTest(TestCase):
+    def setUp(self):
+        from .models import Album, Artist, Genre
+        self.user = User.objects.create_user(
+            username='counter',
+            email='counter@example.com',
+            password='counterpassword123'
+        )
+        self.album = Album.objects.create(title='Album A', artist='Artist A', release_date='2024-01-01')
+        self.other_album = Album.objects.create(title='Album B', artist='Artist A', release_date='2024-01-01')
+        self.artist = Artist.objects.create(name='Artist A')
+        self.genre = Genre.objects.create(name='Pop')
+
+    def _song(self, **kwargs):
+        data = dict(
+            title='Song', artist='Artist A', album='Album A', genre='Pop',
+            duration=100, audio_file='songs/c.mp3', uploaded_by=self.user
+        )
+        data.update(kwargs)
+        return Song.objects.create(**data)
+
+    def test_counters_follow_song_changes(self):
+        """Test bộ đếm thay đổi khi tạo, chuyển album, nghe và xóa bài hát"""
+        from .play_buffer import PlayEvent, write_play_events
+
+        song = self._song(play_count=5)
+        self._song()
+        self.album.refresh_from_db()
+        self.artist.refresh_from_db()
+        self.assertEqual((self.album.songs_count, self.album.total_play_count), (2, 5))
+        self.assertEqual(self.artist.songs_count, 2)
+
+        write_play_events([PlayEvent(self.user.id, song.id, song.created_at)] * 3)
+        self.genre.refresh_from_db()
+        self.assertEqual(self.genre.total_play_count, 8)
+
+        # Instance cũ vẫn giữ play_count=5, lưu lại không được ghi đè lượt nghe mới
+        song.album = 'Album B'
+        song.save()
+        song.refresh_from_db()
+        self.assertEqual(song.play_count, 8)
+        self.other_album.refresh_from_db()
+        self.assertEqual(self.other_album.songs_count, 1)
+
+        song.delete()
+        self.artist.refresh_from_db()
+        self.assertEqual(self.artist.songs_count, 1)
+
+    def test_rebuild_counters(self):
+        """Test rebuild_counters sửa lại bộ đếm bị lệch"""
+        from .models import Album
+        from .counters import rebuild_counters
+
+        self._song(play_count=7)
+        Album.objects.filter(pk=self.album.pk).update(songs_count=99, total_play_count=0)
+
+        self.assertEqual(rebuild_counters()['Album'], 1)
+        self.album.refresh_from_db()
+        self.assertEqual((self.album.songs_count, self.album.total_play_count), (1, 7))
+
+    def test_album_list_does_not_count_per_row(self):
+        """Test danh sách album không truy vấn đếm bài hát cho từng dòng"""
+        from .serializers import AlbumSerializer
+        from .models import Album
+
+        self._song()
+        with self.assertNumQueries(1):
+            data = AlbumSerializer(Album.objects.all(), many=True).data
+        self.assertEqual({row['title']: row['songs_count'] for row in data}, {'Album A': 1, 'Album B': 0})
+
+
+class SongCatalogRefTest(TestCase):
+    def setUp(self):
+        from .models import Album, Artist, Genre
+        self.user = User.objects.create_user(
+            username='catalog',
+            email='catalog@example.com',
+            password='catalogpassword123'
+        )
+        self.artist = Artist.objects.create(name='Artist A')
+        self.genre = Genre.objects.create(name='Pop')
+        self.album = Album.objects.create(title='Greatest', artist='Artist A', release_date='2024-01-01')
+        self.other_album = Album.objects.create(title='Greatest', artist='Artist B', release_date='2024-01-01')
+
+    def _song(self, **kwargs):
+        data = dict(
+            title='Song', artist='Artist A', album='Greatest', genre='Pop',
+            duration=100, audio_file='songs/r.mp3', uploaded_by=self.user
+        )
+        data.update(kwargs)
+        return Song.objects.create(**data)
+
+    def test_refs_resolved_on_save(self):
+        """Test khóa ngoại được gán theo tên, album trùng tên chọn theo nghệ sĩ"""
+        song = self._song()
+        self.assertEqual(song.artist_ref, self.artist)
+        self.assertEqual(song.genre_ref, self.genre)
+        self.assertEqual(song.album_ref, self.album)
+
+        song.artist = 'Artist B'
+        song.album_ref = self.other_album
+        song.save()
+        song.refresh_from_db()
+        self.assertIsNone(song.artist_ref)
+        self.assertEqual(song.album_ref, self.other_album)
+
+        # Gán khóa ngoại trực tiếp thì tên hiển thị được cập nhật theo
+        from .models import Genre
+        rock = Genre.objects.create(name='Rock')
+        song.genre_ref = rock
+        song.save()
+        song.refresh_from_db()
+        self.assertEqual(song.genre, 'Rock')
+        self.assertEqual(list(Song.objects.filter(genre_ref=rock)), [song])
+
+    def test_rename_propagates_to_songs(self):
+        """Test đổi tên nghệ sĩ cập nhật tên hiển thị trên bài hát"""
+        song = self._song()
+        self.artist.name = 'Artist Renamed'
+        self.artist.save()
+
+        song.refresh_from_db()
+        self.assertEqual(song.artist, 'Artist Renamed')
+        self.assertEqual(song.artist_ref, self.artist)
+        self.artist.refresh_from_db()
+        self.assertEqual(self.artist.songs_count, 1)
+
+    def test_catalog_created_after_songs_links_them(self):
+        """Test nghệ sĩ / thể loại / album tạo sau bài hát vẫn được nối khóa ngoại và đếm bài hát"""
+        from .models import Album, Artist, Genre
+        song = self._song(artist='Late', genre='Late Genre', album='Late Album', play_count=3)
+        self.assertIsNone(song.artist_ref)
+
+        artist = Artist.objects.create(name='Late')
+        genre = Genre.objects.create(name='Late Genre')
+        album = Album.objects.create(title='Late Album', artist='Late', release_date='2024-01-01')
+
+        song.refresh_from_db()
+        self.assertEqual((song.artist_ref, song.genre_ref, song.album_ref), (artist, genre, album))
+        for obj in (artist, genre, album):
+            obj.refresh_from_db()
+            self.assertEqual((obj.songs_count, obj.total_play_count), (1, 3))
+
+        # Đổi tên sang tên đang có trên bài hát chưa được nối
+        other = self._song(title='Other', artist='Renamed Later')
+        artist.name = 'Renamed Later'
+        artist.save()
+        other.refresh_from_db()
+        self.assertEqual(other.artist_ref, artist)
+        artist.refresh_from_db()
+        self.assertEqual(artist.songs_count, 2)
+        self.assertEqual(Song.objects.filter(artist_ref=artist).count(), 2)
+
+    def test_backfill_command(self):
+        """Test lệnh backfill_song_refs nối khóa ngoại cho dữ liệu cũ và có thể chạy lại"""
+        from io import StringIO
+        from django.core.management import call_command
+
+        songs = [self._song(title=f'Song {i}') for i in range(5)]
+        Song.objects.update(album_ref=None, artist_ref=None, genre_ref=None)
+
+        out = StringIO()
+        call_command('backfill_song_refs', batch_size=2, start_id=songs[1].id, stdout=out)
+        self.assertEqual(Song.objects.filter(artist_ref=self.artist).count(), 3)
+
+        call_command('backfill_song_refs', batch_size=2, stdout=out)
+        self.assertEqual(Song.objects.filter(album_ref=self.album, genre_ref=self.genre).count(), 5)
+        self.genre.refresh_from_db()
+        self.assertEqual(self.genre.songs_count, 5)
+
+
+class RecommenderTest(TestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(username=f'rec{i}', email=f'rec{i}@example.com', password='recpassword123')
+            for i in range(4)
+        ]
+        self.songs = [
+            Song.objects.create(
+                title=f'Song {i}', artist='Artist', duration=100,
+                audio_file='songs/rec.mp3', uploaded_by=self.users[0], play_count=i
+            )
+            for i in range(6)
+        ]
+
+    def test_item_item_recommendations(self):
+        """Test gợi ý bài hát được nghe cùng, không gợi ý bài đã tương tác"""
+        from .recommender import build_matrix, item_similarity, recommend
+
+        # Người dùng 0..2 cùng nghe bài 0 và 1, người dùng 3 chỉ nghe bài 0
+        interactions = build_matrix(
+            [0, 0, 1, 1, 2, 2, 2, 3],
+            [0, 1, 0, 1, 0, 1, 5, 0],
+            [1.0] * 8,
+        )
+        similarity = item_similarity(interactions.matrix, neighbours=10)
+        results = {row: items for row, items, _ in recommend(interactions.matrix, similarity, k=2)}
+
+        self.assertEqual(interactions.song_ids[results[3][0]], 1)
+        self.assertNotIn(0, [interactions.song_ids[item] for item in results[3]])
+
+    def test_refresh_writes_and_view_reads(self):
+        """Test lệnh tính gợi ý ghi vào UserRecommendation và API chỉ đọc kết quả"""
+        from django.core.management import call_command
+        from io import StringIO
+        from .models import UserRecommendation
+
+        for user in self.users[:3]:
+            user.favorite_songs.add(self.songs[0], self.songs[1])
+        self.users[3].favorite_songs.add(self.songs[0])
+        UserRecommendation.objects.create(user=self.users[3], song=self.songs[4], score=9.0)
+
+        call_command('build_recommendations', top_k=2, stdout=StringIO())
+        call_command('build_recommendations', top_k=2, stdout=StringIO())
+
+        # Gợi ý cũ (bài 4) bị thay bằng kết quả mới, chạy lại không tạo dòng trùng
+        rows = list(UserRecommendation.objects.filter(user=self.users[3]).order_by('-score'))
+        self.assertEqual([row.song for row in rows], [self.songs[1]])
+
+        from rest_framework.test import APIClient
+        client = APIClient()
+        client.force_authenticate(user=self.users[3])
+        with self.assertNumQueries(1):
+            response = client.get('/api/v1/music/recommendations/songs/?limit=5')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([song['id'] for song in response.data['results']], [self.songs[1].id])
+
+    def test_fallback_without_rating_model(self):
+        """Test gợi ý dự phòng cho người dùng mới chạy được và ưu tiên bài phổ biến"""
+        from .utils import generate_song_recommendations
+
+        songs = generate_song_recommendations(self.users[0], limit=3)
+        self.assertEqual(songs, [self.songs[5], self.songs[4], self.songs[3]])
+
+
+class AdminDashboardTest(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.admin = User.objects.create_user(
+            username='dashadmin', email='dashadmin@example.com', password='dashpassword123', is_staff=True
+        )
+        self.song = Song.objects.create(
+            title='Dash', artist='Artist', genre='Pop', duration=100,
+            audio_file='songs/dash.mp3', uploaded_by=self.admin
+        )
+
+    def test_snapshot_uses_buckets_and_cache(self):
+        """Test snapshot lấy lượt nghe từ bucket, các lần đọc sau không truy vấn DB"""
+        from django.utils import timezone
+        from rest_framework.test import APIClient
+        from .models import SongPlayHistory
+        from .play_buffer import PlayEvent, write_play_events
+
+        now = timezone.now()
+        write_play_events([PlayEvent(self.admin.id, self.song.id, now)] * 3)
+        # Dữ liệu chỉ có trong lịch sử (không có bucket) không được đọc khi tải trang
+        SongPlayHistory.objects.create(user=self.admin, song=self.song)
+
+        client = APIClient()
+        client.force_authenticate(user=self.admin)
+        response = client.get('/api/v1/music/admin/statistics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['monthly_plays'][now.strftime('%Y-%m-%d')], 3)
+        self.assertEqual(len(response.data['monthly_plays']), 30)
+        self.assertEqual(response.data['genre_stats']['Pop'], {'song_count': 1, 'total_plays': 3, 'avg_plays': 3.0})
+        self.assertEqual(response.data['new_users'][now.strftime('%Y-%m-%d')], 1)
+        self.assertEqual(response.data['overview']['total_plays'], 3)
+
+        with self.assertNumQueries(0):
+            cached = client.get('/api/v1/music/admin/statistics/')
+        self.assertEqual(cached.data['generated_at'], response.data['generated_at'])
@@ -0,0 +1,171 @@
+"""
+Kho dữ liệu trending: số lượt nghe của từng bài hát được cộng dồn vào các
+bucket theo giờ (song_play_buckets) ngay khi lượt nghe được ghi xuống DB.
+
+Lệnh ``compact_trending_buckets`` định kỳ gộp các bucket giờ cũ thành bucket
+ngày, nên truy vấn trending cho một cửa sổ ``days`` bất kỳ chỉ phải cộng vài
+chục bucket ngày + tối đa vài chục bucket giờ cho mỗi bài hát thay vì quét
+toàn bộ song_play_history.
+
+Cấu hình:
+    TRENDING_HOURLY_RETENTION_DAYS: số ngày giữ bucket giờ trước khi gộp (mặc định 2)
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import SongPlayBucket, SongPlayHistory
+
+HOUR = SongPlayBucket.GRANULARITY_HOUR
+DAY = SongPlayBucket.GRANULARITY_DAY
+
+
+def truncate_hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def truncate_day(value):
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def get_hourly_retention():
+    return timedelta(days=getattr(settings, 'TRENDING_HOURLY_RETENTION_DAYS', 2))
+
+
+def _to_utc(value):
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value.astimezone(dt_timezone.utc)
+
+
+def _increment_buckets(granularity, counts):
+    """
+    Cộng dồn ``counts`` ({(song_id, bucket_start): n}) vào các bucket.
+
+    Tạo trước các bucket còn thiếu với play_count=0 (bỏ qua nếu đã có) rồi
+    tăng bằng F(), nên nhiều process cùng ghi cũng không mất lượt nghe.
+    """
+    if not counts:
+        return
+
+    SongPlayBucket.objects.bulk_create(
+        [
+            SongPlayBucket(song_id=song_id, granularity=granularity, bucket_start=bucket_start)
+            for song_id, bucket_start in counts
+        ],
+        ignore_conflicts=True,
+        batch_size=1000,
+    )
+
+    # Gom theo (bucket_start, số lượt tăng) để mỗi nhóm chỉ cần một câu UPDATE
+    groups = defaultdict(list)
+    for (song_id, bucket_start), increment in counts.items():
+        groups[(bucket_start, increment)].append(song_id)
+
+    for (bucket_start, increment), song_ids in groups.items():
+        SongPlayBucket.objects.filter(
+            granularity=granularity,
+            bucket_start=bucket_start,
+            song_id__in=song_ids,
+        ).update(play_count=F('play_count') + increment)
+
+
+def record_plays(events):
+    """
+    Cập nhật bucket giờ cho một lô sự kiện nghe (các đối tượng có song_id, played_at).
+    Được gọi trong cùng transaction với việc ghi song_play_history.
+    """
+    counts = Counter(
+        (event.song_id, truncate_hour(_to_utc(event.played_at)))
+        for event in events
+    )
+    _increment_buckets(HOUR, counts)
+
+
+def get_trending_counts(start, genre=None, limit=10):
+    """
+    Trả về danh sách (song_id, số lượt nghe) từ ``start`` đến hiện tại, giảm dần.
+
+    Bucket ngày được tính nếu bắt đầu cùng ngày hoặc sau ``start`` nên biên
+    cửa sổ có độ chính xác theo ngày với dữ liệu đã gộp, theo giờ với dữ liệu mới.
+    """
+    start = _to_utc(start)
+    buckets = SongPlayBucket.objects.filter(
+        Q(granularity=HOUR, bucket_start__gte=truncate_hour(start)) |
+        Q(granularity=DAY, bucket_start__gte=truncate_day(start))
+    )
+    if genre:
+        buckets = buckets.filter(song__genre=genre)
+
+    rows = buckets.values('song_id').annotate(
+        plays=Sum('play_count')
+    ).order_by('-plays', 'song_id')
+    if limit:
+        rows = rows[:limit]
+
+    return [(row['song_id'], row['plays']) for row in rows]
+
+
+def compact_buckets(now=None, batch_size=5000):
+    """
+    Gộp các bucket giờ cũ hơn thời gian lưu giữ thành bucket ngày.
+    Trả về số bucket giờ đã gộp.
+    """
+    now = now or timezone.now()
+    cutoff = truncate_day(_to_utc(now) - get_hourly_retention())
+    compacted = 0
+
+    while True:
+        with transaction.atomic():
+            rows = list(
+                SongPlayBucket.objects.select_for_update()
+                .filter(granularity=HOUR, bucket_start__lt=cutoff)
+                .order_by('id')
+                .values_list('id', 'song_id', 'bucket_start', 'play_count')[:batch_size]
+            )
+            if not rows:
+                break
+
+            counts = Counter()
+            for _, song_id, bucket_start, play_count in rows:
+                counts[(song_id, truncate_day(_to_utc(bucket_start)))] += play_count
+
+            _increment_buckets(DAY, counts)
+            SongPlayBucket.objects.filter(id__in=[row[0] for row in rows]).delete()
+            compacted += len(rows)
+
+    return compacted
+
+
+def rebuild_buckets(now=None):
+    """
+    Dựng lại toàn bộ bucket từ song_play_history (dùng khi khởi tạo hoặc sau
+    khi dữ liệu lịch sử được sinh trực tiếp bằng các lệnh generate_*).
+    """
+    with transaction.atomic():
+        SongPlayBucket.objects.all().delete()
+        hourly = (
+            SongPlayHistory.objects.annotate(bucket=TruncHour('played_at'))
+            .values('song_id', 'bucket')
+            .annotate(plays=Count('id'))
+            .order_by()
+        )
+        SongPlayBucket.objects.bulk_create(
+            (
+                SongPlayBucket(
+                    song_id=row['song_id'],
+                    granularity=HOUR,
+                    bucket_start=row['bucket'],
+                    play_count=row['plays'],
+                )
+                for row in hourly.iterator()
+            ),
+            batch_size=1000,
+        )
+
+    return compact_buckets(now=now)
@@ -48,6 +48,7 @@ urlpatterns = [
     
 
     path('search/', views.SearchView.as_view(), name='search'),
+    path('search/suggest/', views.SearchSuggestView.as_view(), name='search-suggest'),
     path('trending/', views.TrendingSongsView.as_view(), name='trending'),
     path('recommended/', views.RecommendedSongsView.as_view(), name='recommended'),
 
@@ -304,7 +304,8 @@ def get_waveform_data(file_path: str, num_points: int = 100) -> List[float]:
 def generate_song_recommendations(user, limit=10):
     """
     Tạo danh sách gợi ý bài hát cho người dùng dựa trên lịch sử nghe, bài hát yêu thích,
-    và lịch sử tìm kiếm
+    và lịch sử tìm kiếm. Chỉ dùng cho người dùng chưa có gợi ý tính sẵn bằng lệnh
+    build_recommendations (xem music/recommender.py)
     
     Args:
         user: Đối tượng người dùng cần tạo gợi ý
@@ -313,102 +314,54 @@ def generate_song_recommendations(user, limit=10):
     Returns:
         List[Song]: Danh sách các bài hát được gợi ý
     """
-    from django.db.models import Count, Q
-    from django.contrib.auth import get_user_model
-    from utils.pylance_helpers import safe_get_related_field
-    from .models import Song, SongPlayHistory, Genre, Artist, SearchHistory, Rating
-    
-    User = get_user_model()
-    
-    # Lấy các thể loại yêu thích của người dùng từ lịch sử nghe và bài hát đã thích
-    favorite_genres = set()
-    
-    # Thêm thể loại từ bài hát yêu thích
-    favorite_songs = safe_get_related_field(user, 'favorite_songs')
-    if favorite_songs:
-        for song in favorite_songs.all():
-            if song.genre:
-                favorite_genres.add(song.genre)
-    
-    # Thêm thể loại từ lịch sử nghe
-    play_history = safe_get_related_field(user, 'play_history')
-    if play_history:
-        for history in play_history.all()[:50]:  # Chỉ xem xét 50 bài hát gần đây nhất
-            if history.song.genre:
-                favorite_genres.add(history.song.genre)
-    
-    # Lấy bài hát đã được đánh giá cao (4-5 sao)
-    high_rated_songs = Rating.objects.filter(user=user, rating__gte=4).values_list('song_id', flat=True)
-    
-    # Lấy danh sách ID bài hát đã nghe gần đây để loại trừ
-    recent_songs = set()
-    if play_history:
-        recent_songs = set(play_history.all()[:20].values_list('song_id', flat=True))
-    
-    # Lấy danh sách ID bài hát đã thích để loại trừ
-    favorite_song_ids = set()
-    if favorite_songs:
-        favorite_song_ids = set(favorite_songs.all().values_list('id', flat=True))
-    
-    # Lấy từ khóa tìm kiếm gần đây
-    recent_searches = SearchHistory.objects.filter(user=user).order_by('-timestamp')[:10]
-    search_keywords = [search.query for search in recent_searches]
-    
-    # Tạo truy vấn gợi ý
-    recommendations = Song.objects.exclude(id__in=recent_songs.union(favorite_song_ids))
-    
-    # Nếu không có bài hát nào sau khi loại trừ (người dùng đã nghe tất cả), lấy bài hát phổ biến
-    if recommendations.count() == 0:
-        print(f"User {user.username} đã nghe tất cả bài hát, không loại trừ")
-        recommendations = Song.objects.all()
-    
-    # Ưu tiên bài hát có cùng thể loại với thể loại yêu thích
+    from django.db.models import Q
+    from .models import Song, SongPlayHistory, SearchHistory
+    
+    favorite_song_ids = set(user.favorite_songs.values_list('id', flat=True))
+    recent_played_ids = list(
+        SongPlayHistory.objects.filter(user=user).order_by('-played_at').values_list('song_id', flat=True)[:50]
+    )
+    
+    # Thể loại / nghệ sĩ yêu thích lấy từ bài hát đã thích và 50 lượt nghe gần nhất
+    taste = Song.objects.filter(Q(id__in=favorite_song_ids) | Q(id__in=recent_played_ids))
+    favorite_genres = set(taste.exclude(genre_ref=None).values_list('genre_ref_id', flat=True))
+    favorite_artists = set(
+        Song.objects.filter(id__in=favorite_song_ids).exclude(artist_ref=None).values_list('artist_ref_id', flat=True)
+    )
+    
+    # Loại trừ bài hát đã thích và 20 bài nghe gần nhất
+    excluded = favorite_song_ids | set(recent_played_ids[:20])
+    candidates = Song.objects.exclude(id__in=excluded).order_by('-play_count')
+    
+    results = []
+    
+    def add(queryset, count):
+        if count <= 0:
+            return
+        taken = [song.id for song in results]
+        results.extend(queryset.exclude(id__in=taken)[:count])
+    
+    # Ưu tiên bài hát cùng thể loại, sau đó cùng nghệ sĩ với bài hát yêu thích
     if favorite_genres:
-        genre_filter = Q()
-        for genre in favorite_genres:
-            genre_filter |= Q(genre__iexact=genre)
-        genre_recommendations = recommendations.filter(genre_filter)
-        
-        # Nếu có đủ bài hát trong thể loại yêu thích
-        if genre_recommendations.count() >= limit:
-            return list(genre_recommendations.order_by('-play_count')[:limit])
-    
-    # Ưu tiên bài hát cùng nghệ sĩ với các bài hát yêu thích
-    favorite_artists = set()
-    if favorite_songs:
-        favorite_artists = set(favorite_songs.all().values_list('artist', flat=True))
-    
+        add(candidates.filter(genre_ref_id__in=favorite_genres), limit)
     if favorite_artists:
-        artist_filter = Q()
-        for artist in favorite_artists:
-            artist_filter |= Q(artist__iexact=artist)
-        artist_recommendations = recommendations.filter(artist_filter)
-        
-        if artist_recommendations.count() >= limit // 2:
-            return list(artist_recommendations.order_by('-play_count')[:limit // 2]) + \
-                   list(recommendations.exclude(id__in=artist_recommendations.values_list('id', flat=True))
-                       .order_by('-play_count')[:limit - limit // 2])
+        add(candidates.filter(artist_ref_id__in=favorite_artists), limit // 2 - len(results))
     
-    # Thêm gợi ý dựa trên từ khóa tìm kiếm
+    # Thêm gợi ý dựa trên từ khóa tìm kiếm gần đây
+    search_keywords = list(
+        SearchHistory.objects.filter(user=user).order_by('-timestamp').values_list('query', flat=True)[:10]
+    )
     if search_keywords:
         search_filter = Q()
         for keyword in search_keywords:
-            # Tìm trong tiêu đề, nghệ sĩ và album
             search_filter |= Q(title__icontains=keyword) | Q(artist__icontains=keyword) | Q(album__icontains=keyword)
-        
-        search_recommendations = recommendations.filter(search_filter)
-        if search_recommendations.count() > 0:
-            # Kết hợp với bài hát phổ biến
-            popular_recommendations = recommendations.order_by('-play_count')[:limit - min(limit // 3, search_recommendations.count())]
-            return list(search_recommendations[:limit // 3]) + list(popular_recommendations)
-    
-    # Đảm bảo luôn trả về ít nhất một số bài hát
-    popular_songs = recommendations.order_by('-play_count')[:limit]
-    if popular_songs.count() > 0:
-        return list(popular_songs)
-    
-    # Nếu vẫn không có gì, trả về bất kỳ bài hát nào
-    return list(Song.objects.all().order_by('?')[:limit])
+        add(candidates.filter(search_filter), limit // 3)
+    
+    # Bù bằng bài hát phổ biến; nếu người dùng đã nghe tất cả thì không loại trừ
+    add(candidates, limit - len(results))
+    add(Song.objects.order_by('-play_count'), limit - len(results))
+    
+    return results[:limit]
 
 
 def download_song_for_offline(song, target_dir: Optional[str] = None) -> Tuple[bool, str, Optional[str]]:
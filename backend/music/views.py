@@ -29,13 +29,17 @@ import django.utils.timezone
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.request import Request
 from .utils import get_audio_metadata, convert_audio_format, extract_synchronized_lyrics, import_synchronized_lyrics, normalize_audio, get_waveform_data, generate_song_recommendations, download_song_for_offline, verify_offline_song, get_offline_song_metadata
+from .play_buffer import record_play
+from .trending import get_trending_counts
+from . import search as music_search
+from .delivery import serve_file
+from .dashboard import get_snapshot as get_dashboard_snapshot
 import os
 from io import BytesIO
 from django.conf import settings
 import logging
 import mimetypes
 import re
-from wsgiref.util import FileWrapper
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 from django.db import transaction
@@ -50,7 +54,7 @@ class HomePageView(APIView):
         featured_by_genre = {}
         
         for genre in genres:
-            top_songs = Song.objects.filter(genre=genre.name).order_by('-play_count')[:5]
+            top_songs = Song.objects.filter(genre_ref=genre).order_by('-play_count')[:5]
             featured_by_genre[genre.name] = SongSerializer(top_songs, many=True).data
         
         one_month_ago = datetime.now().date() - timedelta(days=30)
@@ -83,16 +87,22 @@ class UserPlaylistView(APIView):
         serializer = PlaylistSerializer(playlists, many=True)
         return Response(serializer.data)
 
+def get_search_page_params(request, default_page_size=20, max_page_size=100):
+    """Đọc tham số page / page_size cho các API tìm kiếm"""
+    try:
+        page = max(int(request.query_params.get('page', 1)), 1)
+        page_size = int(request.query_params.get('page_size', default_page_size))
+    except (TypeError, ValueError):
+        return 1, default_page_size
+    return page, min(max(page_size, 1), max_page_size)
+
 class PublicSearchView(APIView):
     permission_classes = [AllowAny]
     
     def get(self, request):
         query = request.GET.get('q', '')
-        songs = Song.objects.filter(
-            Q(title__icontains=query) | 
-            Q(artist__icontains=query) | 
-            Q(album__icontains=query)
-        )
+        page, page_size = get_search_page_params(request)
+        songs = music_search.search('song', query, offset=(page - 1) * page_size, limit=page_size).objects
         serializer = SongSerializer(songs, many=True)
         return Response(serializer.data)
 
@@ -158,14 +168,8 @@ class SongViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def play(self, request, pk=None):
         song = self.get_object()
-        song.play_count += 1
-        song.save()
-        
-        SongPlayHistory.objects.create(
-            user=request.user,
-            song=song,
-            played_at=datetime.now()
-        )
+        # Lượt nghe được đưa vào bộ đệm và ghi xuống DB theo lô
+        record_play(request.user, song)
         
         return Response({'status': 'play logged'})
     
@@ -194,28 +198,26 @@ class SongViewSet(viewsets.ModelViewSet):
         start_date = django.utils.timezone.now() - timedelta(days=days)
         
         try:
-            query = Song.objects.filter(
-                play_history__played_at__gte=start_date
-            )
-            
-            if genre:
-                query = query.filter(genre=genre)
-            
-            trending_songs = query.annotate(
-                recent_plays=Count('play_history')
-            ).order_by('-recent_plays', '-likes_count')[:limit]
-        
-            if not trending_songs.exists():
-                trending_songs = Song.objects.all().order_by('-likes_count', '-play_count')[:limit]
+            # Cộng các bucket lượt nghe đã tổng hợp sẵn thay vì quét song_play_history
+            trending_counts = get_trending_counts(start_date, genre=genre, limit=limit)
+            
+            if trending_counts:
+                songs_by_id = Song.objects.in_bulk([song_id for song_id, _ in trending_counts])
+                trending_songs = []
+                recent_plays = []
+                for song_id, plays in trending_counts:
+                    if song_id in songs_by_id:
+                        trending_songs.append(songs_by_id[song_id])
+                        recent_plays.append(plays)
+            else:
+                trending_songs = list(Song.objects.all().order_by('-likes_count', '-play_count')[:limit])
+                recent_plays = [0] * len(trending_songs)
 
             serializer = self.get_serializer(trending_songs, many=True)
             
             result_data = serializer.data
-            for i, song in enumerate(trending_songs):
-                result_data[i]['recent_plays'] = SongPlayHistory.objects.filter(
-                    song=song, 
-                    played_at__gte=start_date
-                ).count()
+            for i, plays in enumerate(recent_plays):
+                result_data[i]['recent_plays'] = plays
             
             return Response({
                 'trending_period_days': days,
@@ -273,36 +275,26 @@ class SongViewSet(viewsets.ModelViewSet):
         if not query:
             return Response({'error': 'Cần cung cấp từ khóa tìm kiếm'}, status=status.HTTP_400_BAD_REQUEST)
         
-        songs = Song.objects.filter(
-            Q(title__icontains=query) | 
-            Q(artist__icontains=query) | 
-            Q(album__icontains=query) |
-            Q(genre__icontains=query)
-        )
-        
-        genre = request.query_params.get('genre', None)
-        artist = request.query_params.get('artist', None)
-        
-        if genre:
-            songs = songs.filter(genre=genre)
-        
-        if artist:
-            songs = songs.filter(artist=artist)
-        
-        sort_by = request.query_params.get('sort', 'title')
-        if sort_by == 'title':
-            songs = songs.order_by('title')
-        elif sort_by == 'artist':
-            songs = songs.order_by('artist')
-        elif sort_by == 'release_date':
-            songs = songs.order_by('-release_date')
+        filters = {
+            'genre': request.query_params.get('genre', None),
+            'artist': request.query_params.get('artist', None),
+        }
         
-        page_size = int(request.query_params.get('page_size', 20))
-        page = int(request.query_params.get('page', 1))
-        start = (page - 1) * page_size
-        end = start + page_size
+        # Mặc định xếp theo độ liên quan, có thể sắp xếp lại theo tiêu đề / nghệ sĩ / ngày phát hành
+        sort_by = request.query_params.get('sort', 'relevance')
+        order_by = {
+            'title': ['title'],
+            'artist': ['artist'],
+            'release_date': ['-release_date'],
+        }.get(sort_by)
+        
+        page, page_size = get_search_page_params(request)
+        result = music_search.search(
+            'song', query, filters=filters,
+            offset=(page - 1) * page_size, limit=page_size, order_by=order_by
+        )
         
-        serializer = self.get_serializer(songs[start:end], many=True)
+        serializer = self.get_serializer(result.objects, many=True)
         
         if request.user.is_authenticated:
             SearchHistory.objects.create(
@@ -311,7 +303,7 @@ class SongViewSet(viewsets.ModelViewSet):
             )
         
         return Response({
-            'total': songs.count(),
+            'total': result.total,
             'page': page, 
             'page_size': page_size,
             'results': serializer.data
@@ -686,7 +678,7 @@ class AlbumViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'], permission_classes=[AllowAny])
     def songs(self, request, pk=None):
         album = self.get_object()
-        songs = Song.objects.filter(album=album.title)
+        songs = Song.objects.filter(album_ref=album)
         serializer = SongSerializer(songs, many=True, context={'request': request})
         return Response(serializer.data)
     
@@ -723,7 +715,7 @@ class GenreViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'], permission_classes=[AllowAny])
     def songs(self, request, pk=None):
         genre = self.get_object()
-        songs = Song.objects.filter(genre=genre.name)
+        songs = Song.objects.filter(genre_ref=genre)
         
         page_size = int(request.query_params.get('page_size', 20))
         page = int(request.query_params.get('page', 1))
@@ -743,24 +735,19 @@ class GenreViewSet(viewsets.ModelViewSet):
     def artists(self, request, pk=None):
         genre = self.get_object()
         
-        artists = {}
-        for song in Song.objects.filter(genre=genre.name):
-            if song.artist in artists:
-                artists[song.artist] += 1
-            else:
-                artists[song.artist] = 1
-        
-        top_artists = sorted(artists.items(), key=lambda x: x[1], reverse=True)[:10]
+        top_artists = Song.objects.filter(genre_ref=genre).values('artist').annotate(
+            songs_count=Count('id')
+        ).order_by('-songs_count', 'artist')[:10]
         
         return Response([
-            {'name': artist[0], 'songs_count': artist[1]} 
-            for artist in top_artists
+            {'name': row['artist'], 'songs_count': row['songs_count']} 
+            for row in top_artists
         ])
     
     @action(detail=True, methods=['get'], permission_classes=[AllowAny])
     def top_songs(self, request, pk=None):
         genre = self.get_object()
-        top_songs = Song.objects.filter(genre=genre.name).order_by('-play_count')[:10]
+        top_songs = Song.objects.filter(genre_ref=genre).order_by('-play_count')[:10]
         serializer = SongSerializer(top_songs, many=True)
         return Response(serializer.data)
 
@@ -811,25 +798,19 @@ class SearchView(APIView):
         if not query:
             return Response({'error': 'Search query is required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        songs = Song.objects.filter(
-            Q(title__icontains=query) | 
-            Q(artist__icontains=query) | 
-            Q(album__icontains=query)
-        )
-        song_serializer = SongSerializer(songs, many=True)
+        page, page_size = get_search_page_params(request)
+        offset = (page - 1) * page_size
         
-        playlists = Playlist.objects.filter(
-            Q(name__icontains=query) | 
-            Q(description__icontains=query),
-            is_public=True
-        )
-        playlist_serializer = PlaylistSerializer(playlists, many=True)
+        songs = music_search.search('song', query, offset=offset, limit=page_size)
+        song_serializer = SongSerializer(songs.objects, many=True)
         
-        albums = Album.objects.filter(
-            Q(title__icontains=query) | 
-            Q(artist__icontains=query)
+        playlists = music_search.search(
+            'playlist', query, filters={'is_public': True}, offset=offset, limit=page_size
         )
-        album_serializer = AlbumSerializer(albums, many=True)
+        playlist_serializer = PlaylistSerializer(playlists.objects, many=True)
+        
+        albums = music_search.search('album', query, offset=offset, limit=page_size)
+        album_serializer = AlbumSerializer(albums.objects, many=True)
         
         if request.user.is_authenticated:
             SearchHistory.objects.create(
@@ -840,7 +821,33 @@ class SearchView(APIView):
         return Response({
             'songs': song_serializer.data,
             'playlists': playlist_serializer.data,
-            'albums': album_serializer.data
+            'albums': album_serializer.data,
+            'page': page,
+            'page_size': page_size,
+            'total': {
+                'songs': songs.total,
+                'playlists': playlists.total,
+                'albums': albums.total,
+            }
+        })
+
+class SearchSuggestView(APIView):
+    """Gợi ý nhanh (typeahead) theo tiền tố khi người dùng đang gõ"""
+    permission_classes = [AllowAny]
+    
+    def get(self, request, format=None):
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(max(int(request.query_params.get('limit', 5)), 1), 20)
+        except (TypeError, ValueError):
+            limit = 5
+        
+        songs = music_search.search('song', query, limit=limit).objects
+        albums = music_search.search('album', query, limit=limit).objects
+        
+        return Response({
+            'songs': [{'id': song.id, 'title': song.title, 'artist': song.artist} for song in songs],
+            'albums': [{'id': album.id, 'title': album.title, 'artist': album.artist} for album in albums],
         })
 
 # Thêm endpoint để xử lý lời bài hát đồng bộ
@@ -891,64 +898,9 @@ class AdminStatisticsView(APIView):
     permission_classes = [permissions.IsAdminUser]
     
     def get(self, request, format=None):
-        total_songs = Song.objects.count()
-        total_playlists = Playlist.objects.count()
-        total_users = User.objects.count()
-        total_active_users = User.objects.filter(last_login__gte=django.utils.timezone.now() - timedelta(days=30)).count()
-        
-        total_plays = sum(Song.objects.values_list('play_count', flat=True))
-        
-        genre_stats = {}
-        genres = set(Song.objects.values_list('genre', flat=True).distinct())
-        for genre in genres:
-            if genre:  # Một số bài hát có thể không có thể loại
-                genre_count = Song.objects.filter(genre=genre).count()
-                genre_plays = Song.objects.filter(genre=genre).aggregate(total=Sum('play_count'))['total'] or 0
-                genre_stats[genre] = {
-                    'song_count': genre_count,
-                    'total_plays': genre_plays,
-                    'avg_plays': round(genre_plays / genre_count, 2) if genre_count > 0 else 0
-                }
-        
-        today = django.utils.timezone.now().date()
-        month_plays = {}
-        for i in range(30):
-            date = today - timedelta(days=i)
-            count = SongPlayHistory.objects.filter(played_at__date=date).count()
-            month_plays[date.strftime('%Y-%m-%d')] = count
-        
-        top_songs = Song.objects.order_by('-play_count')[:10]
-        top_songs_data = SongSerializer(top_songs, many=True).data
-        
-        top_playlists = Playlist.objects.annotate(
-            follower_count=Count('followers')
-        ).order_by('-follower_count')[:10]
-        top_playlists_data = PlaylistSerializer(top_playlists, many=True).data
-        
-        new_users_by_day = {}
-        for i in range(30):
-            date = today - timedelta(days=i)
-            count = User.objects.filter(
-                date_joined__year=date.year,
-                date_joined__month=date.month,
-                date_joined__day=date.day
-            ).count()
-            new_users_by_day[date.strftime('%Y-%m-%d')] = count
-        
-        return Response({
-            'overview': {
-                'total_songs': total_songs,
-                'total_playlists': total_playlists,
-                'total_users': total_users,
-                'active_users': total_active_users,
-                'total_plays': total_plays,
-            },
-            'genre_stats': genre_stats,
-            'monthly_plays': month_plays,
-            'top_songs': top_songs_data,
-            'top_playlists': top_playlists_data,
-            'new_users': new_users_by_day
-        })
+        # Snapshot tính sẵn, làm mới nền theo ADMIN_DASHBOARD_TTL - xem music/dashboard.py
+        force_refresh = request.query_params.get('refresh') in ('1', 'true')
+        return Response(get_dashboard_snapshot(force_refresh=force_refresh))
 
 
 class AdminUserActivityView(APIView):
@@ -1103,7 +1055,7 @@ class ArtistViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=True, methods=['get'])
     def songs(self, request, pk=None):
         artist = self.get_object()
-        songs = Song.objects.filter(artist=artist.name)
+        songs = Song.objects.filter(artist_ref=artist)
         serializer = SongSerializer(songs, many=True)
         return Response(serializer.data)
     
@@ -1121,7 +1073,7 @@ class ArtistViewSet(viewsets.ReadOnlyModelViewSet):
         artists_data = []
         
         for artist in artists:
-            songs = Song.objects.filter(artist=artist.name)
+            songs = Song.objects.filter(artist_ref=artist)
             song_count = songs.count()
             play_count = songs.aggregate(total_plays=Sum('play_count'))['total_plays'] or 0
             
@@ -1411,20 +1363,15 @@ class SongRecommendationView(APIView):
             except (ValueError, TypeError):
                 limit = 10
                 
-            user_recommendations = UserRecommendation.objects.filter(user=request.user).order_by('-score')[:limit]
+            # Gợi ý được tính sẵn bằng lệnh build_recommendations (xem music/recommender.py)
+            user_recommendations = UserRecommendation.objects.filter(
+                user=request.user
+            ).select_related('song', 'song__uploaded_by').order_by('-score')[:limit]
             recommended_songs = [rec.song for rec in user_recommendations]
             
             if not recommended_songs:
+                # Người dùng mới chưa có trong lần tính gần nhất
                 recommended_songs = generate_song_recommendations(request.user, limit=limit)
-                
-                if recommended_songs:
-                    for i, song in enumerate(recommended_songs):
-                        score = 1.0 - (i / len(recommended_songs))
-                        UserRecommendation.objects.create(
-                            user=request.user,
-                            song=song,
-                            score=score
-                        )
             
             serializer = SongSerializer(recommended_songs, many=True, context={'request': request})
             
@@ -1753,31 +1700,23 @@ class AdminTopSongsReportView(APIView):
             period_label = 'Tất cả thời gian'
         
         if start_date:
-            recent_plays = SongPlayHistory.objects.filter(
-                played_at__gte=start_date
-            ).values('song').annotate(
-                recent_play_count=Count('id')
-            ).order_by('-recent_play_count')[:limit]
-            
-            song_ids = [item['song'] for item in recent_plays]
-            songs = Song.objects.filter(id__in=song_ids)
+            trending_counts = get_trending_counts(start_date, limit=limit)
+            songs_by_id = Song.objects.in_bulk([song_id for song_id, _ in trending_counts])
             
             results = []
-            for song in songs:
-                play_item = next((item for item in recent_plays if item['song'] == song.id), None)
-                if play_item:
+            for song_id, plays in trending_counts:
+                song = songs_by_id.get(song_id)
+                if song:
                     results.append({
                         'id': song.id,
                         'title': song.title,
                         'artist': song.artist,
                         'album': song.album,
                         'total_plays': song.play_count,
-                        'recent_plays': play_item['recent_play_count'],
+                        'recent_plays': plays,
                         'likes': song.likes_count,
                     })
             
-            results = sorted(results, key=lambda x: x['recent_plays'], reverse=True)
-            
         else:
             top_songs = Song.objects.all().order_by('-play_count')[:limit]
             results = []
@@ -1874,57 +1813,9 @@ class SongDownloadView(APIView):
             content_type = 'audio/mpeg'  # Mặc định cho file MP3
             
         filename = os.path.basename(file_path)
-        file_size = os.path.getsize(file_path)
-        
-        range_header = request.META.get('HTTP_RANGE', '').strip()
-        range_match = re.match(r'bytes=(\d+)-(\d*)', range_header)
-        
-        if range_match:
-            start_byte = int(range_match.group(1))
-            end_byte = int(range_match.group(2)) if range_match.group(2) else file_size - 1
-            
-            if end_byte >= file_size:
-                end_byte = file_size - 1
-            
-            content_length = end_byte - start_byte + 1
-            
-            def file_iterator_partial(file_path, start, length, chunk_size=8192):
-                with open(file_path, 'rb') as f:
-                    f.seek(start)
-                    bytes_read = 0
-                    while bytes_read < length:
-                        bytes_to_read = min(chunk_size, length - bytes_read)
-                        data = f.read(bytes_to_read)
-                        if not data:
-                            break
-                        bytes_read += len(data)
-                        yield data
-            
-            response = StreamingHttpResponse(
-                file_iterator_partial(file_path, start_byte, content_length),
-                status=206,
-                content_type=content_type
-            )
-            
-            response['Content-Length'] = content_length
-            response['Content-Range'] = f'bytes {start_byte}-{end_byte}/{file_size}'
-        else:
-            def file_iterator_full(file_path, chunk_size=8192):
-                with open(file_path, 'rb') as f:
-                    while True:
-                        chunk = f.read(chunk_size)
-                        if not chunk:
-                            break
-                        yield chunk
-            
-            response = StreamingHttpResponse(
-                file_iterator_full(file_path),
-                content_type=content_type
-            )
-            response['Content-Length'] = file_size
         
-        response['Accept-Ranges'] = 'bytes'
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        # Range / ETag / If-Range do backend phân phối file xử lý (xem music/delivery.py)
+        response = serve_file(request, file_path, content_type=content_type, filename=filename, as_attachment=True)
         
         response['Cache-Control'] = 'public, max-age=86400'  # Cache 1 ngày
         return response
@@ -1948,53 +1839,17 @@ class SongStreamView(APIView):
         if content_type is None:
             content_type = 'application/octet-stream'
         
-        file_size = os.path.getsize(file_path)
-        
-        range_header = request.META.get('HTTP_RANGE', '').strip()
-        range_match = re.match(r'bytes=(\d+)-(\d*)', range_header)
-        
-        if range_match:
-            start_byte = int(range_match.group(1))
-            end_byte = int(range_match.group(2)) if range_match.group(2) else file_size - 1
-            
-            if end_byte >= file_size:
-                end_byte = file_size - 1
-            
-            content_length = end_byte - start_byte + 1
-            
-            file_obj = open(file_path, 'rb')
-            file_obj.seek(start_byte)
-            
-            response = StreamingHttpResponse(
-                FileWrapper(file_obj, 8192),  # Chunk size 8KB
-                status=206,
-                content_type=content_type
-            )
-            
-            response['Content-Length'] = content_length
-            response['Content-Range'] = f'bytes {start_byte}-{end_byte}/{file_size}'
-            response['Accept-Ranges'] = 'bytes'
-        else:
-            file_obj = open(file_path, 'rb')
-            response = StreamingHttpResponse(
-                FileWrapper(file_obj),
-                content_type=content_type
-            )
-            response['Content-Length'] = file_size
-            response['Accept-Ranges'] = 'bytes'
-        
-
-        return response
+        return serve_file(request, file_path, content_type=content_type)
 
 # Admin API ViewSets
 class AdminSongViewSet(viewsets.ModelViewSet):
     """ViewSet để quản lý bài hát dành riêng cho admin"""
-    queryset = Song.objects.all().order_by('-created_at')
+    queryset = Song.objects.select_related('album_ref', 'genre_ref').order_by('-created_at')
     serializer_class = SongAdminSerializer
     permission_classes = [IsAdminUser]
     parser_classes = (MultiPartParser, FormParser)
     filter_backends = [SearchFilter, OrderingFilter, DjangoFilterBackend]
-    search_fields = ['title', 'artist__name', 'album__title']
+    search_fields = ['title', 'artist_ref__name', 'album_ref__title']
     ordering_fields = ['title', 'play_count', 'release_date', 'created_at', 'likes_count']
     filterset_fields = ['artist', 'genre', 'album', 'is_approved']
     pagination_class = PageNumberPagination
@@ -2193,7 +2048,7 @@ class AdminArtistViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def songs(self, request, pk=None):
         artist = self.get_object()
-        songs = Song.objects.filter(artist=artist.name)
+        songs = Song.objects.filter(artist_ref=artist)
         serializer = SongSerializer(songs, many=True)
         return Response(serializer.data)
     
@@ -2277,7 +2132,7 @@ class AdminAlbumViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def songs(self, request, pk=None):
         album = self.get_object()
-        songs = Song.objects.filter(album=album.title)
+        songs = Song.objects.filter(album_ref=album)
         
         page = self.paginate_queryset(songs)
         if page is not None:
@@ -2300,7 +2155,7 @@ class AdminAlbumViewSet(viewsets.ModelViewSet):
         
         try:
             song = Song.objects.get(id=song_id)
-            song.album = album.title
+            song.album_ref = album
             song.save()
             return Response({'status': f'Đã thêm bài hát "{song.title}" vào album'})
         except Song.DoesNotExist:
@@ -2321,8 +2176,9 @@ class AdminAlbumViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            song = Song.objects.get(id=song_id)
-            song.album = album.title
+            song = Song.objects.get(id=song_id, album_ref=album)
+            song.album = ''
+            song.album_ref = None
             song.save()
             return Response({'status': f'Đã xóa bài hát "{song.title}" khỏi album'})
         except Song.DoesNotExist:
@@ -2380,7 +2236,7 @@ class AdminGenreViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def songs(self, request, pk=None):
         genre = self.get_object()
-        songs = Song.objects.filter(genre=genre.name)
+        songs = Song.objects.filter(genre_ref=genre)
         
         paginator = PageNumberPagination()
         paginator.page_size = 20
@@ -2407,26 +2263,21 @@ class AdminGenreViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def stats(self, request):
         genres = Genre.objects.all()
+        # Số nghệ sĩ của mọi thể loại trong một truy vấn, số bài hát / lượt nghe lấy từ bộ đếm
+        artists_count = dict(
+            Song.objects.values('genre_ref').annotate(
+                count=Count('artist_ref', distinct=True)
+            ).order_by().values_list('genre_ref', 'count')
+        )
         result = []
         
         for genre in genres:
-            songs = Song.objects.filter(genre=genre.name)
-            songs_count = songs.count()
-            
-            # Số lượt nghe
-            play_count = songs.aggregate(total=Sum('play_count'))['total'] or 0
-            
-            # Số nghệ sĩ
-            artists = set()
-            for song in songs:
-                artists.add(song.artist)
-            
             result.append({
                 'id': genre.id,
                 'name': genre.name,
-                'songs_count': songs_count,
-                'play_count': play_count,
-                'artists_count': len(artists)
+                'songs_count': genre.songs_count,
+                'play_count': genre.total_play_count,
+                'artists_count': artists_count.get(genre.id, 0)
             })
         
         return Response(result)